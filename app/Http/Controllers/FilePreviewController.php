@@ -33,7 +33,7 @@ public function generate(FileUpload $fileUpload, Request $request)
             // $this->authorize('update', $fileUpload);
 
             $request->validate([
-                'render_type' => 'in:2d,wireframe,wireframe_2d,3d'
+                'render_type' => 'in:2d,wireframe,wireframe_2d,3d,turntable,turntable_animated'
             ]);
 
             $renderType = $request->input('render_type', '2d');
@@ -207,8 +207,13 @@ public function destroy(FileUpload $fileUpload, FilePreview $preview)
             abort(404);
         }
 
-        // Delete physical file
-        Storage::disk('public')->delete($preview->image_path);
+        // Delete physical file unless another preview shares the same by-hash image
+        $shared = FilePreview::where('image_path', $preview->image_path)
+            ->where('id', '!=', $preview->id)
+            ->exists();
+        if (!$shared) {
+            Storage::disk('public')->delete($preview->image_path);
+        }
 
         // Delete record
         $preview->delete();
@@ -248,15 +253,20 @@ private function generatePreview(FileUpload $fileUpload, string $renderType)
                 'render_type' => $renderType
             ]);
 
+            // Turntable previews render width x height per frame (24 frames): keep each one small
+            $isTurntable = in_array($renderType, ['turntable', 'turntable_animated'], true);
+
             // Prepare request payload matching FastAPI schema
             $payload = [
                 'file_id' => (string) $fileUpload->id,
                 'file_path' => $filePath, // Send relative path, Python will convert to absolute
                 'preview_type' => $renderType,
-                'width' => 800,
-                'height' => 600,
+                'width' => $isTurntable ? 256 : 800,
+                'height' => $isTurntable ? 256 : 600,
                 'background_color' => '#FFFFFF',
-                'file_type' => $fileUpload->extension
+                'file_type' => $fileUpload->extension,
+                // Only the stored preview URL and metadata, not the image as base64
+                'delivery' => 'url'
             ];
 
             $response = Http::timeout(120)
@@ -309,9 +319,9 @@ private function generatePreview(FileUpload $fileUpload, string $renderType)
                     'response_keys' => array_keys($data ?? []),
                     'has_success' => isset($data['success']),
                     'success_value' => $data['success'] ?? null,
-                    'has_image_data' => isset($data['image_data']),
-                    'image_data_length' => isset($data['image_data']) ? strlen($data['image_data']) : 0,
-                    'data_type' => gettype($data['image_data'] ?? null)
+                    'preview_url' => $data['preview_url'] ?? null,
+                    'preview_filename' => $data['preview_filename'] ?? null,
+                    'bytes' => $data['bytes'] ?? null
                 ]);
 
                 // Check if the Python server indicates success
@@ -325,56 +335,35 @@ private function generatePreview(FileUpload $fileUpload, string $renderType)
                     throw new \Exception('Preview service reported failure: ' . ($data['message'] ?? 'Unknown error'));
                 }
 
-                // Get the image data from the correct field
-                $imageData = $data['image_data'] ?? null;
-                
-                Log::info('Checking image data', [
-                    'image_data_exists' => isset($data['image_data']),
-                    'image_data_null' => is_null($imageData),
-                    'image_data_type' => gettype($imageData),
-                    'image_data_length' => is_string($imageData) ? strlen($imageData) : 0,
-                    'raw_image_data_preview' => is_string($imageData) ? substr($imageData, 0, 100) : 'not string'
-                ]);
-                
-                if (!isset($data['image_data']) || !is_string($imageData) || strlen($imageData) < 100) {
-                    Log::error('No image data in response', [
+                // The service stores the image content-addressed under public/storage/previews/by-hash
+                // and only returns its URL and metadata (delivery=url): no base64 round trip
+                $storedName = $data['preview_filename'] ?? null;
+                if (!is_string($storedName) || $storedName === '' || str_contains($storedName, '..') || empty($data['preview_url'])) {
+                    Log::error('No stored preview in response', [
                         'response_data' => $data,
-                        'payload' => $payload,
-                        'image_data_isset' => isset($data['image_data']),
-                        'image_data_type' => gettype($imageData),
-                        'image_data_length' => is_string($imageData) ? strlen($imageData) : 0
+                        'payload' => $payload
                     ]);
-                    throw new \Exception('No image data received from preview service');
+                    throw new \Exception('No stored preview received from preview service');
                 }
 
-                // Save preview image with correct naming convention
-                if ($renderType === '2d') {
-                    $filename = 'stl_2d_preview_' . substr(md5($fileUpload->id . time()), 0, 8) . '.png';
-                } elseif ($renderType === 'wireframe') {
-                    $filename = 'stl_wireframe_preview_' . substr(md5($fileUpload->id . time()), 0, 8) . '.png';
-                } else {
-                    $filename = 'stl_' . $renderType . '_preview_' . substr(md5($fileUpload->id . time()), 0, 8) . '.png';
+                // Path on the public disk (storage/app/public/previews/by-hash/hh/sha.ext)
+                $publicPreviewPath = 'previews/by-hash/' . ltrim($storedName, '/');
+                if (!Storage::disk('public')->exists($publicPreviewPath)) {
+                    throw new \Exception('Preview service stored the image outside the public disk: ' . $publicPreviewPath);
                 }
-                
-                // Save in the correct directory structure: storage/app/previews/
-                $previewPath = 'previews/' . $filename;
-                Storage::disk('local')->put($previewPath, base64_decode($imageData));
-                
-                // Create symlink path for public access: public/storage/previews/{id}/{filename}
-                $publicPreviewPath = 'previews/' . $fileUpload->id . '/' . $filename;
-                
-                // Ensure the public directory exists
-                if (!Storage::disk('public')->exists('previews/' . $fileUpload->id)) {
-                    Storage::disk('public')->makeDirectory('previews/' . $fileUpload->id);
-                }
-                
-                // Copy to public storage for web access
-                Storage::disk('public')->put($publicPreviewPath, base64_decode($imageData));
 
-                // Create preview record with public path
+                // Create preview record with public path and the stored image metadata
                 return $fileUpload->previews()->create([
                     'image_path' => $publicPreviewPath,
+                    'image_url' => $data['preview_url'],
                     'render_type' => $renderType,
+                    'format' => $data['format'] ?? null,
+                    'bytes' => $data['bytes'] ?? null,
+                    'sha256' => $data['sha256'] ?? null,
+                    'width' => $data['width'] ?? null,
+                    'height' => $data['height'] ?? null,
+                    // Frames, frame size and sprite grid (or frame_ms) for the turntable viewer
+                    'layout' => $data['turntable'] ?? null,
                 ]);
             } else {
                 Log::error('Preview service returned non-successful response', [
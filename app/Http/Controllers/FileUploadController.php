@@ -3,6 +3,7 @@
 namespace App\Http\Controllers;
 
 use App\Models\FileUpload;
+use App\Models\FilePreview;
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\Storage;
 use Illuminate\Support\Facades\Log;
@@ -227,9 +228,14 @@ public function destroy(FileUpload $fileUpload)
         // Delete physical file
         Storage::disk($fileUpload->disk)->delete($fileUpload->storage_path);
 
-        // Delete previews
+        // Delete previews (by-hash images may be shared with other uploads' previews)
         foreach ($fileUpload->previews as $preview) {
-            Storage::disk('public')->delete($preview->image_path);
+            $shared = FilePreview::where('image_path', $preview->image_path)
+                ->where('file_upload_id', '!=', $fileUpload->id)
+                ->exists();
+            if (!$shared) {
+                Storage::disk('public')->delete($preview->image_path);
+            }
         }
 
         // Delete record (cascades to related tables)
@@ -13,12 +13,23 @@ class FilePreview extends Model
     protected $fillable = [
         'file_upload_id',
         'image_path',
+        'image_url',
         'render_type',
+        'format',
+        'bytes',
+        'sha256',
+        'width',
+        'height',
+        'layout',
         'generated_at',
     ];
 
     protected $casts = [
         'generated_at' => 'datetime',
+        'layout' => 'array',
+        'bytes' => 'integer',
+        'width' => 'integer',
+        'height' => 'integer',
     ];
 
     /**
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Análisis de fabricación aditiva: voladizos, volumen de soporte y orientación de impresión
+Evalúa decenas de orientaciones candidatas a la vez y afina las mejores con rayos sobre el BVH
+"""
+
+import numpy as np
+
+from mesh_bvh import BVH
+
+# Ángulo de voladizo (grados desde la vertical) a partir del cual una cara necesita soporte
+OVERHANG_ANGLE = 45.0
+
+# Direcciones "arriba" candidatas repartidas por la esfera (más los 6 ejes)
+ORIENTATIONS = 64
+
+# Caras procesadas a la vez en la evaluación por lotes (caras x orientaciones)
+FACE_CHUNK = 1 << 15
+
+# Candidatas que se afinan con rayos hacia abajo y rayos por candidata
+RAY_CANDIDATES = 3
+RAY_SAMPLES = 2000
+
+# Entre candidatas con soporte dentro de este margen gana la de menor altura
+SUPPORT_TOLERANCE = 0.05
+
+# Las caras a esta fracción de la diagonal de la cama se apoyan en ella
+PLATE_TOLERANCE = 1e-4
+
+# Fracción sólida de las estructuras de soporte (relleno típico de los slicers)
+SUPPORT_DENSITY = 0.2
+
+
+def candidate_directions(count=ORIENTATIONS):
+    """Unit 'up' vectors: the six axes plus a Fibonacci sphere of `count` points"""
+    axes = np.vstack([np.eye(3), -np.eye(3)])
+    i = np.arange(count) + 0.5
+    z = 1 - 2 * i / count
+    radius = np.sqrt(1 - z * z)
+    angle = np.pi * (1 + 5 ** 0.5) * i
+    sphere = np.column_stack([radius * np.cos(angle), radius * np.sin(angle), z])
+    # Empezar por +Z: es la orientación del archivo
+    return np.vstack([axes[[2, 0, 1, 5, 3, 4]], sphere])
+
+
+def rotation_to_z(up):
+    """Rotation matrix that takes the `up` vector of the model to +Z (Rodrigues)"""
+    up = np.asarray(up, dtype=np.float64)
+    up = up / np.linalg.norm(up)
+    axis = np.cross(up, [0.0, 0.0, 1.0])
+    sine, cosine = np.linalg.norm(axis), up[2]
+    if sine < 1e-12:
+        return np.eye(3) if cosine > 0 else np.diag([1.0, -1.0, -1.0])
+    k = axis / sine
+    cross = np.array([[0, -k[2], k[1]], [k[2], 0, -k[0]], [-k[1], k[0], 0]])
+    return np.eye(3) + sine * cross + (1 - cosine) * cross @ cross
+
+
+def _outward_normals(triangles):
+    """Unit normals pointing out of the part and face areas"""
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+    # Con volumen con signo negativo la malla está invertida
+    if np.einsum('ij,ij->', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])) < 0:
+        normals = -normals
+    return normals, 0.5 * lengths
+
+
+def evaluate_orientations(triangles, directions, overhang_angle=OVERHANG_ANGLE):
+    """
+    Overhang area, estimated support volume and build height per candidate.
+
+    Todas las orientaciones se evalúan en el mismo producto matricial por
+    bloques de caras. El soporte de cada cara en voladizo se estima como una
+    columna desde su centro hasta la cama (área proyectada x altura), sin
+    descontar las partes de la pieza que queden debajo: es una cota superior
+    que `support_by_rays` corrige para las mejores candidatas.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    directions = np.asarray(directions, dtype=np.float64)
+    normals, areas = _outward_normals(triangles)
+    centroids = triangles.mean(axis=1)
+    threshold = -np.sin(np.radians(overhang_angle))
+
+    low = np.full(len(directions), np.inf)
+    high = np.full(len(directions), -np.inf)
+    points = triangles.reshape(-1, 3)
+    for start in range(0, len(points), FACE_CHUNK):
+        heights = points[start:start + FACE_CHUNK] @ directions.T
+        low = np.minimum(low, heights.min(axis=0))
+        high = np.maximum(high, heights.max(axis=0))
+    plate = (high - low) * PLATE_TOLERANCE
+
+    overhang_area = np.zeros(len(directions))
+    support_volume = np.zeros(len(directions))
+    for start in range(0, len(triangles), FACE_CHUNK):
+        chunk = slice(start, start + FACE_CHUNK)
+        facing = normals[chunk] @ directions.T
+        height = centroids[chunk] @ directions.T - low
+        overhang = (facing < threshold) & (height > plate)
+        area = np.where(overhang, areas[chunk, None], 0.0)
+        overhang_area += area.sum(axis=0)
+        support_volume += (area * -facing * height).sum(axis=0)
+
+    return {
+        "overhang_area": overhang_area,
+        "support_volume": support_volume,
+        "build_height": high - low,
+        "plate": low,
+    }
+
+
+def support_by_rays(triangles, bvh, up, plate, overhang_angle=OVERHANG_ANGLE, samples=RAY_SAMPLES, seed=0):
+    """
+    Support volume for one orientation casting rays down from the overhangs.
+
+    Cada columna llega hasta la primera cara de la pieza que tenga debajo o
+    hasta la cama. Con más caras en voladizo que `samples` se muestrean
+    proporcionalmente a su área proyectada y el volumen se estima como área
+    proyectada total x altura media. Devuelve (volumen, altura máxima).
+    """
+    normals, areas = _outward_normals(triangles)
+    up = np.asarray(up, dtype=np.float64)
+    facing = normals @ up
+    centroids = triangles.mean(axis=1)
+    height = centroids @ up - plate
+    extent = float(np.ptp(triangles.reshape(-1, 3) @ up))
+    overhang = np.flatnonzero((facing < -np.sin(np.radians(overhang_angle))) & (height > extent * PLATE_TOLERANCE))
+    if len(overhang) == 0:
+        return 0.0, 0.0
+    projected = areas[overhang] * -facing[overhang]
+    if len(overhang) > samples:
+        rng = np.random.default_rng(seed)
+        faces = rng.choice(overhang, size=samples, p=projected / projected.sum())
+        weights = np.full(samples, projected.sum() / samples)
+    else:
+        faces, weights = overhang, projected
+
+    origins = centroids[faces]
+    directions = np.repeat(-up[None], len(origins), axis=0)
+    distance, _ = bvh.intersect(origins, directions, t_min=bvh.diagonal * 1e-7)
+    column = np.minimum(distance, height[faces])
+    return float(np.dot(weights, column)), float(column.max())
+
+
+def _summary(up, overhang_area, support_volume, build_height, support_height=None):
+    summary = {
+        "up": [round(float(x), 6) for x in up],
+        "overhang_area": round(float(overhang_area), 4),
+        "support_volume": round(float(support_volume), 4),
+        "build_height": round(float(build_height), 4),
+    }
+    if support_height is not None:
+        summary["max_support_height"] = round(float(support_height), 4)
+    return summary
+
+
+def analyze(triangles, bvh=None, overhang_angle=OVERHANG_ANGLE, orientations=ORIENTATIONS):
+    """
+    Additive manufacturing report for a (n, 3, 3) triangle array.
+
+    Compara la orientación del archivo (+Z arriba) con la mejor candidata:
+    menor volumen de soporte y, entre las que quedan dentro de
+    SUPPORT_TOLERANCE de él, menor altura de impresión. Los volúmenes de la
+    orientación del archivo y de las RAY_CANDIDATES mejores se recalculan
+    con rayos; el resto usa la estimación por columnas hasta la cama.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    if len(triangles) == 0:
+        return {}
+    bvh = bvh or BVH(triangles)
+    directions = candidate_directions(orientations)
+    estimate = evaluate_orientations(triangles, directions, overhang_angle)
+
+    # Afinar con rayos la orientación original (índice 0) y las mejores estimaciones
+    refined = {}
+    for index in dict.fromkeys([0, *np.argsort(estimate["support_volume"], kind='stable')[:RAY_CANDIDATES]]):
+        refined[int(index)] = support_by_rays(triangles, bvh, directions[index], estimate["plate"][index], overhang_angle)
+    support = estimate["support_volume"].copy()
+    for index, (volume, _) in refined.items():
+        support[index] = volume
+
+    floor = support.min()
+    eligible = np.flatnonzero(support <= floor + SUPPORT_TOLERANCE * max(floor, bvh.diagonal ** 3 * 1e-9))
+    # Menor altura; a igual altura, menor soporte
+    height = np.round(estimate["build_height"][eligible] / bvh.diagonal, 3)
+    best = int(eligible[np.lexsort((support[eligible], height))[0]])
+    if best not in refined:
+        refined[best] = support_by_rays(triangles, bvh, directions[best], estimate["plate"][best], overhang_angle)
+        support[best] = refined[best][0]
+
+    def report(index):
+        return _summary(directions[index], estimate["overhang_area"][index], support[index],
+                        estimate["build_height"][index], refined.get(index, (None, None))[1])
+
+    best_report = report(best)
+    best_report["rotation"] = [[round(float(x), 6) for x in row] for row in rotation_to_z(directions[best])]
+    return {
+        "overhang_angle": overhang_angle,
+        "orientations_evaluated": int(len(directions)),
+        "current": report(0),
+        "best": best_report,
+        "support_density": SUPPORT_DENSITY,
+        "support_material_volume": round(float(support[best]) * SUPPORT_DENSITY, 4),
+    }
@@ -3,78 +3,179 @@ import sys
 import json
 import subprocess
 import os
+import re
+import struct
 import time
-# Importar configuración portable
-from portable_config import get_config
+# Ejecución de Ghostscript compartida (pool + versión en caché)
+import ghostscript_pool
+import metrics
 
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
 
-def analyze_ai_eps(filepath):
-    """Analyze AI/EPS files using Ghostscript"""
+# Bytes leídos del principio y del final del archivo en la ruta rápida
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 64 * 1024
+
+# Cabecera binaria de los EPS "DOS" (preview TIFF/WMF + sección PostScript)
+DOS_EPS_MAGIC = b'\xc5\xd0\xd3\xc6'
+
+_NUMBER = rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_DSC_BBOX_RE = {
+    name: re.compile(rb'^%%' + name.encode() + rb':[ \t]*((?:' + _NUMBER + rb'[ \t]*){4})\s*$', re.MULTILINE)
+    for name in ('HiResBoundingBox', 'BoundingBox')
+}
+_PDF_BOX_RE = {
+    name: re.compile(rb'/' + name.encode() + rb'\s*\[\s*((?:' + _NUMBER + rb'\s*){4})\]')
+    for name in ('ArtBox', 'TrimBox', 'CropBox', 'MediaBox')
+}
+
+def _read_head_tail(filepath):
+    """Leer el principio y el final del archivo (o de la sección PostScript de un EPS DOS)"""
+    with open(filepath, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+        offset, length = 0, os.path.getsize(filepath)
+
+        if head.startswith(DOS_EPS_MAGIC) and len(head) >= 12:
+            offset, length = struct.unpack('<II', head[4:12])
+            f.seek(offset)
+            head = f.read(min(HEAD_BYTES, length))
+
+        if length <= HEAD_BYTES:
+            return head, b''
+
+        f.seek(offset + max(HEAD_BYTES, length - TAIL_BYTES))
+        tail = f.read(min(TAIL_BYTES, length - HEAD_BYTES))
+    return head, tail
+
+def _valid_box(values):
+    x1, y1, x2, y2 = values
+    return x2 > x1 and y2 > y1
+
+def read_header_bbox(filepath):
+    """
+    Buscar la caja envolvente declarada en el propio archivo, sin Ghostscript.
+
+    Prioridad: ArtBox/TrimBox/CropBox/MediaBox para AI basados en PDF y
+    %%HiResBoundingBox/%%BoundingBox (incluido "(atend)") para PostScript.
+
+    Returns:
+        dict con bbox, línea original y origen, o None si no se encuentra
+    """
+    head, tail = _read_head_tail(filepath)
+
+    if head.startswith(b'%PDF'):
+        candidates = list(_PDF_BOX_RE.items())
+        source_prefix = 'pdf_'
+    else:
+        candidates = list(_DSC_BBOX_RE.items())
+        source_prefix = 'dsc_'
+
+    for name, regex in candidates:
+        # En la cabecera manda la primera aparición; en el trailer ("(atend)") la última
+        match = regex.search(head)
+        if not match and tail:
+            matches = list(regex.finditer(tail))
+            match = matches[-1] if matches else None
+        if not match:
+            continue
+
+        values = tuple(float(v) for v in match.group(1).split())
+        if not _valid_box(values):
+            continue
+
+        return {
+            "bbox": values,
+            "raw": match.group(0).decode('latin-1').strip(),
+            "source": source_prefix + name.lower()
+        }
+
+    return None
+
+def analyze_ai_eps(filepath, preview_path=None, resolution=100):
+    """
+    Analyze AI/EPS files.
+
+    La caja envolvente se lee primero de la cabecera del archivo; Ghostscript
+    solo se ejecuta si no aparece, y si tampoco mide nada (página sin marcas)
+    se usa su página por defecto. Con `preview_path` el análisis y la
+    rasterización comparten una única invocación de Ghostscript.
+    """
     debug(f"Analyzing file: {filepath}")
     start_time = time.time()
-    config = get_config()
 
     try:
         # Verificar que el archivo existe
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File not found: {filepath}")
 
-        # Verificar que Ghostscript está instalado usando configuración portable
-        gs_path = config.ghostscript_path
-        if not gs_path:
-            raise RuntimeError("Ghostscript not found. Please install Ghostscript and make sure it's in your PATH")
-            
-        try:
-            version = subprocess.run([gs_path, '--version'],
-                                  capture_output=True,
-                                  text=True,
-                                  timeout=5)
-            debug(f"Ghostscript version: {version.stdout.strip()}")
-        except subprocess.SubprocessError:
-            raise RuntimeError(f"Failed to run Ghostscript at: {gs_path}")
-
-        # Ejecutar Ghostscript
-        debug("Running Ghostscript analysis...")
-        result = subprocess.run(
-            [gs_path, '-dBATCH', '-dNOPAUSE', '-sDEVICE=bbox', filepath],
-            stderr=subprocess.PIPE,
-            stdout=subprocess.DEVNULL,
-            timeout=15,
-            text=True  # Para manejar la salida como texto en lugar de bytes
-        )
-
-        bbox_lines = result.stderr.splitlines()
-        debug(f"Ghostscript output lines: {len(bbox_lines)}")
-        bbox_data = next((line for line in bbox_lines if line.startswith('%%BoundingBox:')), None)
-
-        if bbox_data:
-            debug(f"Found BoundingBox: {bbox_data}")
-            parts = bbox_data.strip().split()
-            if len(parts) == 5:  # %%BoundingBox: x1 y1 x2 y2
-                _, x1, y1, x2, y2 = parts
-                dimensions = {
-                    "width": float(x2) - float(x1),
-                    "height": float(y2) - float(y1),
-                    "depth": 0
-                }
-            else:
-                raise ValueError(f"Invalid BoundingBox format: {bbox_data}")
-        else:
+        metrics.mark('read')
+        header = read_header_bbox(filepath)
+        bbox = header["bbox"] if header else None
+        bbox_raw = header["raw"] if header else None
+        bbox_source = header["source"] if header else None
+        gs_lines = 0
+        gs_used = False
+
+        if header:
+            debug(f"Found {bbox_source} in file header: {bbox_raw}")
+
+        if preview_path:
+            debug("Running Ghostscript rasterization...")
+            metrics.mark('render')
+            rendered = ghostscript_pool.render_png(filepath, preview_path, resolution,
+                                                   measure_bbox=bbox is None)
+            gs_used = True
+            if bbox is None and rendered["bbox"]:
+                bbox = rendered["bbox"]
+                bbox_source = "ghostscript_raster"
+            elif bbox is None and rendered["page"]:
+                # Página en blanco: sin nada que medir, la caja es la página renderizada
+                bbox = rendered["page"]
+                bbox_source = "ghostscript_page"
+
+        if bbox is None:
+            debug("Running Ghostscript analysis...")
+            metrics.mark('analyze')
+            bbox, bbox_raw, gs_lines = ghostscript_pool.ghostscript_bbox(filepath)
+            gs_used = True
+            bbox_source = "ghostscript_bbox"
+            debug(f"Ghostscript output lines: {gs_lines}")
+
+        if bbox is None:
+            # Ni cabecera ni marcas: la página por defecto de Ghostscript (sin -dEPSCrop)
+            bbox = ghostscript_pool.default_page_bbox()
+            bbox_source = "ghostscript_page"
+
+        if bbox is None:
             raise ValueError("No BoundingBox information found in the file")
 
+        x1, y1, x2, y2 = bbox
+        if bbox_raw is None:
+            bbox_raw = "%%BoundingBox: {:g} {:g} {:g} {:g}".format(*bbox)
+
+        dimensions = {
+            "width": float(x2) - float(x1),
+            "height": float(y2) - float(y1),
+            "depth": 0
+        }
+
         # Información adicional del archivo
         file_size = os.path.getsize(filepath)
         file_type = os.path.splitext(filepath)[1].lower()
 
         metadata = {
-            "bounding_box_raw": bbox_data,
+            "bounding_box_raw": bbox_raw,
+            "bounding_box_source": bbox_source,
             "file_size_kb": round(file_size / 1024, 2),
             "file_type": file_type[1:].upper(),  # Remove dot and convert to uppercase
-            "gs_output_lines": len(bbox_lines)
+            "gs_output_lines": gs_lines
         }
+        if gs_used:
+            metadata["ghostscript_version"] = ghostscript_pool.get_ghostscript_version()
+        if preview_path:
+            metadata["preview_path"] = preview_path
 
         elapsed_ms = int((time.time() - start_time) * 1000)
 
@@ -106,7 +207,8 @@ def main():
         sys.exit(1)
 
     try:
-        result = analyze_ai_eps(sys.argv[1])
+        with metrics.script_timeline(sys.argv[1]):
+            result = analyze_ai_eps(sys.argv[1])
         print(json.dumps(result))
     except Exception as e:
         import traceback
@@ -4,14 +4,17 @@ import json
 import time
 import os
 import ezdxf
+import ezdxf.bbox
 from ezdxf.tools.standards import linetypes
 
+import metrics
+
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
 
-def analyze_dxf(filepath):
-    """Analyze DXF/DWG files using ezdxf"""
+def analyze_dxf(filepath, parsed=None):
+    """Analyze DXF/DWG files using ezdxf (`parsed`: ezdxf document already read by the caller)"""
     debug(f"Analyzing file: {filepath}")
     start_time = time.time()
 
@@ -20,14 +23,16 @@ def analyze_dxf(filepath):
             raise FileNotFoundError(f"File not found: {filepath}")
 
         debug("Loading DXF file...")
-        doc = ezdxf.readfile(filepath)
+        metrics.mark('parse')
+        doc = parsed if parsed is not None else ezdxf.readfile(filepath)
         debug("DXF file loaded successfully")
 
+        metrics.mark('analyze')
         msp = doc.modelspace()
         debug("Accessing modelspace...")
 
         # Get bounding box
-        ext = msp.bbox()
+        ext = ezdxf.bbox.extents(msp)
         if ext and ext.has_data:
             dimensions = {
                 "width": ext.size.x,
@@ -88,7 +93,8 @@ def main():
         sys.exit(1)
 
     try:
-        result = analyze_dxf(sys.argv[1])
+        with metrics.script_timeline(sys.argv[1]):
+            result = analyze_dxf(sys.argv[1])
         print(json.dumps(result))
     except Exception as e:
         import traceback
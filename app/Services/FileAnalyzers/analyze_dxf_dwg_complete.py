@@ -4,14 +4,25 @@ import json
 import time
 import os
 import ezdxf
+import ezdxf.bbox
 from ezdxf.tools.standards import linetypes
 
+import metrics
+import nesting
+
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
 
-def calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts):
-    """Calculate manufacturing metrics for 2D CAD files (cutting, engraving, etc.)"""
+def calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts, sheet_nesting=None):
+    """
+    Calculate manufacturing metrics for 2D CAD files (cutting, engraving, etc.)
+    
+    Con `sheet_nesting` (resultado de nesting.nest con fill=True) el peso usa
+    el área real de las piezas y el coste la chapa que consume cada juego,
+    incluido el retal; sin él, o si el anidado se cortó en el tope de piezas
+    (capped), se usa el área del bbox.
+    """
     debug("Calculating 2D manufacturing metrics...")
     
     # Material properties for 2D cutting/engraving (thickness assumed 3mm)
@@ -35,6 +46,12 @@ def calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts):
     
     weight_estimates = {}
     area_m2 = area_cm2 / 10000.0  # Convert cm² to m²
+    # Chapa consumida por juego de piezas según el anidado
+    sheet_m2 = area_m2
+    nested = bool(sheet_nesting and sheet_nesting.get("sets_per_sheet") and not sheet_nesting.get("capped"))
+    if nested:
+        area_cm2 = sheet_nesting["part_area"] / sheet_nesting["sets_per_sheet"] / 100.0
+        sheet_m2 = sheet_nesting["sheet"]["length"] * sheet_nesting["sheet"]["width"] / 1e6 / sheet_nesting["sets_per_sheet"]
     
     for material_id, props in materials.items():
         # Calculate volume with material-specific thickness
@@ -44,8 +61,8 @@ def calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts):
         weight_grams = material_volume_cm3 * props['density']
         weight_kg = weight_grams / 1000.0
         
-        # Calculate estimated cost based on area
-        estimated_cost = area_m2 * props['cost_per_m2']
+        # Calculate estimated cost based on the sheet area consumed
+        estimated_cost = sheet_m2 * props['cost_per_m2']
         
         weight_estimates[material_id] = {
             'name': props['name'],
@@ -74,6 +91,12 @@ def calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts):
         cutting_complexity = "Compleja"
         estimated_cutting_time_min = 30
     
+    # Aprovechamiento de la chapa: anidado real si hay contornos cerrados
+    if nested:
+        material_efficiency = round(sheet_nesting["utilization"] * 100, 2)
+    else:
+        material_efficiency = round(max(0.0, min(95.0, 90.0 - (total_cut_entities * 0.5))), 2)
+    
     manufacturing_data = {
         'cutting_method': 'laser_cutting',  # Assumed for DXF/DWG
         'cutting_perimeter_mm': round(perimeter_mm, 2),
@@ -88,9 +111,16 @@ def calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts):
             'secondary': 'cnc_routing',
             'finishing': 'edge_smoothing'
         },
-        'material_efficiency': round(min(95.0, 90.0 - (total_cut_entities * 0.5)), 2),
+        'material_efficiency': material_efficiency,
         'weight_estimates': weight_estimates
     }
+    if sheet_nesting and "error" not in sheet_nesting:
+        manufacturing_data['nesting'] = {
+            key: sheet_nesting[key] for key in (
+                'sheet', 'spacing', 'resolution_mm', 'sets_per_sheet', 'placed',
+                'utilization', 'scrap_area', 'part_area', 'unplaced', 'capped'
+            )
+        }
     
     debug(f"Generated 2D manufacturing data for {len(weight_estimates)} materials")
     return manufacturing_data
@@ -141,8 +171,8 @@ def calculate_perimeter(msp):
     
     return total_perimeter
 
-def analyze_dxf_complete(filepath):
-    """Complete analysis of DXF/DWG files with manufacturing data"""
+def analyze_dxf_complete(filepath, parsed=None):
+    """Complete analysis of DXF/DWG files with manufacturing data (`parsed`: ezdxf document already read by the caller)"""
     debug(f"Analyzing file: {filepath}")
     start_time = time.time()
 
@@ -151,14 +181,16 @@ def analyze_dxf_complete(filepath):
             raise FileNotFoundError(f"File not found: {filepath}")
 
         debug("Loading DXF file...")
-        doc = ezdxf.readfile(filepath)
+        metrics.mark('parse')
+        doc = parsed if parsed is not None else ezdxf.readfile(filepath)
         debug("DXF file loaded successfully")
 
+        metrics.mark('analyze')
         msp = doc.modelspace()
         debug("Accessing modelspace...")
 
         # Get bounding box
-        ext = msp.bbox()
+        ext = ezdxf.bbox.extents(msp)
         if ext and ext.has_data:
             dimensions = {
                 "width": ext.size.x,
@@ -187,8 +219,16 @@ def analyze_dxf_complete(filepath):
         perimeter_mm = calculate_perimeter(msp)
         debug(f"Calculated perimeter: {perimeter_mm} mm")
 
+        # Anidado en chapa estándar: cuántos juegos de piezas caben en una chapa
+        parts = nesting.parts_from_loops(nesting.dxf_loops(msp), os.path.splitext(os.path.basename(filepath))[0])
+        if parts and len(parts) <= nesting.MAX_PART_TYPES:
+            sheet_nesting = nesting.nest(parts, fill=True)
+        else:
+            sheet_nesting = None
+        debug(f"Nested {len(parts)} distinct closed outlines")
+
         # Calculate manufacturing metrics
-        manufacturing_data = calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts)
+        manufacturing_data = calculate_manufacturing_metrics_2d(area_cm2, perimeter_mm, entity_counts, sheet_nesting)
 
         # Get file info
         file_size = os.path.getsize(filepath)
@@ -231,7 +271,8 @@ def main():
         sys.exit(1)
 
     try:
-        result = analyze_dxf_complete(sys.argv[1])
+        with metrics.script_timeline(sys.argv[1]):
+            result = analyze_dxf_complete(sys.argv[1])
         print(json.dumps(result))
     except Exception as e:
         import traceback
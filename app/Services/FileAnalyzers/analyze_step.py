@@ -4,8 +4,7 @@ import json
 import time
 
 try:
-    from OCC.Core.STEPControl import STEPControl_Reader
-    from OCC.Core.IFSelect import IFSelect_RetDone
+    import step_cache
     from OCC.Core.Bnd import Bnd_Box
     from OCC.Core.BRepBndLib import brepbndlib_Add
     from OCC.Core.GProp import GProp_GProps
@@ -27,18 +26,19 @@ def analyze_step(filepath):
 
     t0 = time.time()
 
-    # Leer STEP
-    reader = STEPControl_Reader()
-    status = reader.ReadFile(filepath)
-    if status != IFSelect_RetDone:
-        raise RuntimeError(f"Error al leer STEP ({status})")
-
-    reader.TransferRoot()
-    shape = reader.OneShape()
+    # Leer STEP como ensamblaje: cada pieza distinta una vez más sus instancias
+    # (desde la caché BRep si este contenido ya se tradujo antes)
+    try:
+        assembly = step_cache.load_assembly(filepath)
+    except AssertionError as e:
+        raise RuntimeError(f"Error al leer STEP ({e})")
+    if not assembly.instances:
+        raise RuntimeError("El archivo STEP no contiene geometría")
+    instance_counts = assembly.instance_counts()
 
-    # Bounding box
+    # Bounding box (compuesto de instancias que comparten la geometría de sus piezas)
     bbox = Bnd_Box()
-    brepbndlib_Add(shape, bbox)
+    brepbndlib_Add(assembly.compound(), bbox)
     xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
     dims = {
         "width": round(xmax - xmin, 3),
@@ -46,31 +46,41 @@ def analyze_step(filepath):
         "depth": round(zmax - zmin, 3),
     }
 
-    # Propiedades de volumen
-    vp = GProp_GProps()
-    brepgprop_VolumeProperties(shape, vp)
-    volume = round(vp.Mass(), 3)
-
-    # Propiedades de superficie
-    sp = GProp_GProps()
-    brepgprop_SurfaceProperties(shape, sp)
-    area = round(sp.Mass(), 3)
-
-    # Conteo de caras, aristas, vértices
+    # Volumen, área y conteos: una vez por pieza, multiplicados por sus instancias
+    volume = area = 0.0
+    moment = [0.0, 0.0, 0.0]
     counts = {"faces": 0, "edges": 0, "vertices": 0}
-    for explorer, key in [
-        (TopAbs_FACE, "faces"),
-        (TopAbs_EDGE, "edges"),
-        (TopAbs_VERTEX, "vertices")
-    ]:
-        exp = TopExp_Explorer(shape, explorer)
-        while exp.More():
-            counts[key] += 1
-            exp.Next()
+    prototype_props = []
+    for prototype, instances in zip(assembly.prototypes, instance_counts):
+        vp = GProp_GProps()
+        brepgprop_VolumeProperties(prototype.shape, vp)
+        sp = GProp_GProps()
+        brepgprop_SurfaceProperties(prototype.shape, sp)
+        prototype_props.append((vp.Mass(), vp.CentreOfMass()))
+        volume += vp.Mass() * instances
+        area += sp.Mass() * instances
+
+        for explorer, key in [
+            (TopAbs_FACE, "faces"),
+            (TopAbs_EDGE, "edges"),
+            (TopAbs_VERTEX, "vertices")
+        ]:
+            exp = TopExp_Explorer(prototype.shape, explorer)
+            while exp.More():
+                counts[key] += instances
+                exp.Next()
 
-    # Centro de masa
-    com = vp.CentreOfMass()
-    center_of_mass = {"x": round(com.X(), 3), "y": round(com.Y(), 3), "z": round(com.Z(), 3)}
+    # Centro de masa: centro de cada pieza llevado a cada instancia
+    for instance in assembly.instances:
+        mass, com = prototype_props[instance.prototype]
+        placed = com.Transformed(instance.location.Transformation())
+        moment[0] += mass * placed.X()
+        moment[1] += mass * placed.Y()
+        moment[2] += mass * placed.Z()
+    com = [m / volume if volume else 0.0 for m in moment]
+    center_of_mass = {"x": round(com[0], 3), "y": round(com[1], 3), "z": round(com[2], 3)}
+    volume = round(volume, 3)
+    area = round(area, 3)
 
     elapsed_ms = int((time.time() - t0) * 1000)
 
@@ -80,7 +90,15 @@ def analyze_step(filepath):
         "area": area,
         "metadata": {
             **counts,
-            "center_of_mass": center_of_mass
+            "center_of_mass": center_of_mass,
+            "assembly": {
+                "unique_parts": len(assembly.prototypes),
+                "instances": len(assembly.instances),
+                "parts": [
+                    {"name": prototype.name, "instances": instances}
+                    for prototype, instances in zip(assembly.prototypes, instance_counts)
+                ]
+            }
         },
         "analysis_time_ms": elapsed_ms
     }
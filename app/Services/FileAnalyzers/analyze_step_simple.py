@@ -10,6 +10,8 @@ import os
 import re
 import traceback
 
+import metrics
+
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
@@ -25,6 +27,7 @@ def analyze_step_simple(filepath):
             raise FileNotFoundError(f"File not found: {filepath}")
 
         # Leer archivo con diferentes encodings
+        metrics.mark('read')
         content = ""
         tried_encodings = []
         for encoding in ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']:
@@ -41,6 +44,7 @@ def analyze_step_simple(filepath):
             raise ValueError(f"Could not read file with any encoding. Tried: {', '.join(tried_encodings)}")
 
         # Información básica
+        metrics.mark('parse')
         metadata = {}
         debug("Analyzing file content...")
 
@@ -126,6 +130,7 @@ def analyze_step_simple(filepath):
 
         # Buscar puntos para calcular dimensiones
         debug("Calculating dimensions...")
+        metrics.mark('analyze')
         points = []
         point_pattern = r'CARTESIAN_POINT\s*\([^)]*\(\s*([-\d.eE+]+)\s*,\s*([-\d.eE+]+)\s*,\s*([-\d.eE+]+)\s*\)'
 
@@ -179,7 +184,8 @@ def main():
         sys.exit(1)
 
     try:
-        result = analyze_step_simple(sys.argv[1])
+        with metrics.script_timeline(sys.argv[1]):
+            result = analyze_step_simple(sys.argv[1])
         print(json.dumps(result))
     except Exception as e:
         error_info = {
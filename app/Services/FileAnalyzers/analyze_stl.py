@@ -11,6 +11,9 @@ import traceback
 import codecs
 from pathlib import Path
 
+import metrics
+import mesh_topology
+
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
@@ -21,29 +24,31 @@ def read_binary_stl(filepath):
         with open(filepath, 'rb') as f:
             # Read and save header
             header = f.read(80)
+            # Read number of triangles
+            count = struct.unpack('I', f.read(4))[0]
+
+            # Validate triangle count
+            file_size = Path(filepath).stat().st_size
+            expected_size = 84 + (50 * count)  # Header + count + triangles
+
             # Check if it might be ASCII by looking for 'solid' at start
+            # (many exporters also write 'solid' in binary headers; the size settles it)
             try:
                 header_str = header.decode('utf-8', errors='ignore')
-                if header_str.strip().lower().startswith('solid'):
+                if header_str.strip().lower().startswith('solid') and file_size != expected_size:
                     return None, None
             except:
                 pass  # Ignore decoding errors in header
 
-            # Read number of triangles
-            count = struct.unpack('I', f.read(4))[0]
-
-            # Validate triangle count
-            file_size = Path(filepath).stat().st_size
-            expected_size = 84 + (50 * count)  # Header + count + triangles
             if file_size != expected_size:
                 debug(f"File size mismatch: expected {expected_size}, got {file_size}")
                 if count > 1000000:  # Unreasonable number of triangles
                     return None, None
 
             # Each triangle is 50 bytes: normal(3*4), vertices(9*4), attribute(2)
-            data = np.frombuffer(f.read(count * 50), dtype=np.uint8)
-            triangles = data.view(dtype=np.float32).reshape((-1, 12))[:, 3:12]
-            return triangles.reshape((-1, 3, 3)), "binary"
+            record = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attr', '<u2')])
+            data = np.frombuffer(f.read(count * 50), dtype=record)
+            return data['vertices'].astype(np.float64), "binary"
     except Exception as e:
         debug(f"Binary read error: {str(e)}")
         return None, None
@@ -107,6 +112,7 @@ def analyze_stl(filepath):
 
     try:
         # Try binary first
+        metrics.mark('parse')
         triangles, format_type = read_binary_stl(filepath)
         if triangles is None:
             triangles, format_type = read_ascii_stl(filepath)
@@ -120,6 +126,7 @@ def analyze_stl(filepath):
             raise ValueError("Invalid STL file: No geometry found")
 
         # Calculate bounding box and dimensions
+        metrics.mark('analyze')
         vertices = triangles.reshape(-1, 3)
         min_corner = np.min(vertices, axis=0)
         max_corner = np.max(vertices, axis=0)
@@ -136,27 +143,9 @@ def analyze_stl(filepath):
         signed_volumes = np.sum(cross_products * centroids, axis=1) / 6.0
         volume = float(abs(np.sum(signed_volumes)))
 
-        # Get unique vertices for topology information
-        unique_vertices = np.unique(vertices.round(decimals=6), axis=0)
-        vertex_count = len(unique_vertices)
-
-        # Count edges and analyze mesh topology
-        edges = {}
-        for i, tri in enumerate(triangles):
-            for j in range(3):
-                v1 = tuple(np.round(tri[j], decimals=6))
-                v2 = tuple(np.round(tri[(j + 1) % 3], decimals=6))
-                edge = tuple(sorted([v1, v2]))
-                if edge in edges:
-                    edges[edge].append(i)
-                else:
-                    edges[edge] = [i]
-
-        # Analyze mesh quality
-        edge_count = len(edges)
-        manifold_edges = sum(1 for edge_faces in edges.values() if len(edge_faces) == 2)
-        non_manifold_edges = sum(1 for edge_faces in edges.values() if len(edge_faces) > 2)
-        boundary_edges = sum(1 for edge_faces in edges.values() if len(edge_faces) == 1)
+        # Weld vertices and analyze mesh topology (edge multiplicities)
+        mesh = mesh_topology.MeshTopology.from_triangles(triangles)
+        topology = mesh.stats()
 
         # Create result dictionary
         dims = {
@@ -176,16 +165,24 @@ def analyze_stl(filepath):
             "volume": round(volume, 6),
             "topology": {
                 "triangles": len(triangles),
-                "vertices": vertex_count,
-                "edges": edge_count
+                "vertices": topology["vertices"],
+                "edges": topology["edges"],
+                "components": topology["components"],
+                "euler_characteristic": topology["euler_characteristic"],
+                "genus": topology["genus"]
             },
             "quality": {
-                "is_watertight": boundary_edges == 0,
-                "is_manifold": non_manifold_edges == 0,
-                "boundary_edges": boundary_edges,
-                "non_manifold_edges": non_manifold_edges,
-                "manifold_edges": manifold_edges
+                "is_watertight": topology["is_watertight"],
+                "is_manifold": topology["is_manifold"],
+                "is_consistently_oriented": topology["is_consistently_oriented"],
+                "boundary_edges": topology["boundary_edges"],
+                "non_manifold_edges": topology["non_manifold_edges"],
+                "manifold_edges": topology["manifold_edges"],
+                "inconsistent_edges": topology["inconsistent_edges"],
+                "boundary_loops": topology["boundary_loops"],
+                "degenerate_triangles": topology["degenerate_triangles"]
             },
+            "shells": mesh.shells(),
             "processing_time": round(time.time() - t0, 3)
         }
 
@@ -9,14 +9,22 @@ import json
 import numpy as np
 import time
 from pathlib import Path
-from collections import defaultdict
 
-def calculate_weight_estimates(volume_mm3):
+import metrics
+import wall_thickness
+import additive
+import slicing
+import stl_streaming
+import mesh_cache
+from mesh_bvh import BVH
+
+def calculate_weight_estimates(volume_mm3, support_volume_mm3=0.0):
     """
     Calcular estimaciones de peso para diferentes materiales comunes en fabricación
     
     Args:
         volume_mm3: Volumen en mm³
+        support_volume_mm3: Material de soporte al imprimir (plásticos), en mm³
     
     Returns:
         dict: Estimaciones de peso para diferentes materiales
@@ -116,11 +124,26 @@ def calculate_weight_estimates(volume_mm3):
             "estimated_cost_usd": round(estimated_cost, 2),
             "cost_per_kg": props["cost_per_kg"]
         }
+        
+        # Impresión 3D: la pieza más el material de los soportes
+        if props["type"] == "Plástico" and support_volume_mm3 > 0:
+            support_grams = support_volume_mm3 / 1000.0 * props["density"]
+            weight_estimates[material_id].update({
+                "support_weight_grams": round(support_grams, 2),
+                "print_weight_grams": round(weight_grams + support_grams, 2),
+                "print_cost_usd": round((weight_grams + support_grams) / 1000.0 * props["cost_per_kg"], 2)
+            })
     
     return weight_estimates
 
-def analyze_stl_with_manufacturing(filepath):
-    """Analizar archivo STL con métricas de fabricación"""
+def analyze_stl_with_manufacturing(filepath, parsed=None):
+    """
+    Analizar archivo STL con métricas de fabricación
+    
+    La malla soldada, la topología y los shells salen de mesh_cache (memmap;
+    solo la primera vez se suelda). `parsed` = (triangles, format) ya leídos
+    por quien llama: se usan para construir la caché sin volver a leer el STL.
+    """
     debug_enabled = False
     
     def debug(msg):
@@ -135,197 +158,85 @@ def analyze_stl_with_manufacturing(filepath):
             raise FileNotFoundError(f"File not found: {filepath}")
         
         debug("Reading STL file...")
+        metrics.mark('parse')
         
-        # Leer archivo STL
-        with open(filepath, 'rb') as f:
-            header = f.read(80)
+        if parsed is None and stl_streaming.should_stream(filepath):
+            # Archivo mayor que el límite de memoria: análisis por bloques. El espesor,
+            # los soportes y el laminado necesitan la malla entera y se omiten
+            debug("Streaming analysis (file exceeds the memory limit)...")
+            metrics.mark('analyze')
+            streamed = stl_streaming.analyze(filepath)
+            geometry = streamed["geometry"]
+            topology = streamed["topology"]
+            format_type = streamed["format"]
+            cutting_perimeter_length = streamed["boundary_length"]
+            shells = None
+            skipped = {"skipped": "streaming analysis", "memory_limit_mb": streamed["streaming"]["memory_limit_mb"]}
+            thickness = printing = layers = skipped
+            streaming = streamed["streaming"]
+        else:
+            if parsed is not None:
+                triangles, format_type = parsed
+                if triangles is None or len(triangles) == 0:
+                    raise ValueError("No valid triangles found in STL file")
+            else:
+                triangles = format_type = None
+            # Malla preprocesada (vértices soldados, topología y shells): se suelda
+            # solo la primera vez que se usa el archivo, con los triángulos ya leídos
+            cached, _ = mesh_cache.load_or_build(filepath, triangles, format_type)
+            if triangles is None:
+                triangles = cached.triangles()
+            format_type = cached.source["format"]
+            metrics.mark('analyze')
+            mesh = cached.topology_mesh()
+            topology = cached.topology
+            shells = cached.shells
+            cutting_perimeter_length = cached.boundary_length
             
-            # Detectar formato
-            is_ascii = False
-            try:
-                header_str = header.decode('ascii', errors='ignore').strip()
-                if header_str.startswith('solid'):
-                    f.seek(0)
-                    sample = f.read(1024).decode('ascii', errors='ignore')
-                    if 'vertex' in sample and 'facet' in sample:
-                        is_ascii = True
-            except:
-                pass
+            debug(f"Successfully read STL: {len(triangles)} triangles")
             
-            triangles = []
-            vertices = []
+            # Dimensiones, área, volumen, normales y planos (un único bloque)
+            geometry = stl_streaming.GeometryReducer()
+            geometry.add(triangles)
             
-            if is_ascii:
-                debug("Processing ASCII STL")
-                with open(filepath, 'r', encoding='utf-8', errors='ignore') as f_text:
-                    content = f_text.read()
-                    lines = content.split('\n')
-                    current_triangle = []
-                    
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith('vertex'):
-                            parts = line.split()
-                            if len(parts) >= 4:
-                                try:
-                                    x, y, z = float(parts[1]), float(parts[2]), float(parts[3])
-                                    vertex = [x, y, z]
-                                    vertices.append(vertex)
-                                    current_triangle.append(len(vertices) - 1)
-                                    
-                                    if len(current_triangle) == 3:
-                                        triangles.append(current_triangle)
-                                        current_triangle = []
-                                except (ValueError, IndexError):
-                                    continue
-            else:
-                debug("Processing Binary STL")
-                f.seek(0)
-                f.read(80)  # Skip header
-                
-                num_triangles_data = f.read(4)
-                if len(num_triangles_data) == 4:
-                    num_triangles = int.from_bytes(num_triangles_data, byteorder='little')
-                    debug(f"Expected triangles: {num_triangles}")
-                    
-                    for i in range(num_triangles):
-                        # Skip normal (12 bytes)
-                        f.read(12)
-                        
-                        triangle_vertices = []
-                        for j in range(3):
-                            vertex_data = f.read(12)
-                            if len(vertex_data) == 12:
-                                x, y, z = np.frombuffer(vertex_data, dtype=np.float32)
-                                vertex = [float(x), float(y), float(z)]
-                                vertices.append(vertex)
-                                triangle_vertices.append(len(vertices) - 1)
-                        
-                        if len(triangle_vertices) == 3:
-                            triangles.append(triangle_vertices)
-                        
-                        # Skip attribute byte count (2 bytes)
-                        f.read(2)
-        
-        debug(f"Successfully read STL: {len(triangles)} triangles, {len(vertices)} vertices")
-        
-        if not triangles:
-            raise ValueError("No valid triangles found in STL file")
-        
-        vertices = np.array(vertices)
+            # Espesor de pared (rayos hacia el interior sobre un BVH)
+            bvh = BVH(triangles)
+            thickness = wall_thickness.analyze(triangles, bvh)
+            
+            # Impresión 3D: voladizos, soportes y mejor orientación
+            printing = additive.analyze(triangles, bvh)
+            
+            # Laminado en la orientación del archivo: capas, área y tiempo de impresión
+            layers = slicing.analyze(mesh=mesh)
+            streaming = None
+        is_ascii = format_type == "ascii"
         
         # Calcular dimensiones
-        bbox_min = np.min(vertices, axis=0)
-        bbox_max = np.max(vertices, axis=0)
-        dimensions = bbox_max - bbox_min
-        
-        # Calcular área superficial
-        total_surface_area = 0
-        for triangle in triangles:
-            v1, v2, v3 = vertices[triangle[0]], vertices[triangle[1]], vertices[triangle[2]]
-            edge1 = v2 - v1
-            edge2 = v3 - v1
-            cross = np.cross(edge1, edge2)
-            area = 0.5 * np.linalg.norm(cross)
-            total_surface_area += area
+        bbox_min = geometry.low
+        bbox_max = geometry.high
+        dimensions = geometry.dimensions
         
-        # Calcular volumen
-        volume = 0.0
-        for triangle in triangles:
-            v1, v2, v3 = vertices[triangle[0]], vertices[triangle[1]], vertices[triangle[2]]
-            volume += np.dot(v1, np.cross(v2, v3)) / 6.0
-        volume = abs(volume)
+        # Calcular área superficial y volumen
+        total_surface_area = geometry.area
+        volume = geometry.volume
         
         # Calcular centro de masa
-        center_of_mass = np.mean(vertices, axis=0)
+        center_of_mass = geometry.center_of_mass
         
         # --- ANÁLISIS DE FABRICACIÓN ---
         debug("Analyzing manufacturing features...")
         
-        # 1. Análisis de aristas (perímetros de corte)
-        edge_count = defaultdict(int)
-        for triangle in triangles:
-            for i in range(3):
-                v1_idx, v2_idx = triangle[i], triangle[(i + 1) % 3]
-                edge = tuple(sorted([v1_idx, v2_idx]))
-                edge_count[edge] += 1
+        # 1. Análisis de aristas (perímetros de corte): aristas usadas por una sola cara
+        cutting_perimeters = topology["boundary_edges"]
         
-        open_edges = [edge for edge, count in edge_count.items() if count == 1]
-        cutting_perimeters = len(open_edges)
-        
-        # Calcular longitud de corte
-        cutting_perimeter_length = 0
-        for edge in open_edges:
-            v1, v2 = vertices[edge[0]], vertices[edge[1]]
-            length = np.linalg.norm(v2 - v1)
-            cutting_perimeter_length += length
-        
-        # 2. Análisis de orientaciones (normales)
-        normal_groups = defaultdict(list)
-        for triangle in triangles:
-            v1, v2, v3 = vertices[triangle[0]], vertices[triangle[1]], vertices[triangle[2]]
-            edge1 = v2 - v1
-            edge2 = v3 - v1
-            normal = np.cross(edge1, edge2)
-            
-            if np.linalg.norm(normal) > 0:
-                normal = normal / np.linalg.norm(normal)
-                key = tuple(np.round(normal, 2))
-                normal_groups[key].append(triangle)
-        
-        major_orientations = len([group for group in normal_groups.values() if len(group) > 10])
+        # 2. Análisis de orientaciones (normales redondeadas a 2 decimales)
+        major_orientations = geometry.major_orientations()
         
         # 3. Análisis de planos de trabajo
-        xy_faces = xz_faces = yz_faces = 0
-        for triangle in triangles:
-            v1, v2, v3 = vertices[triangle[0]], vertices[triangle[1]], vertices[triangle[2]]
-            edge1 = v2 - v1
-            edge2 = v3 - v1
-            normal = np.cross(edge1, edge2)
-            
-            if np.linalg.norm(normal) > 0:
-                normal = normal / np.linalg.norm(normal)
-                abs_normal = np.abs(normal)
-                max_component = np.argmax(abs_normal)
-                
-                if abs_normal[max_component] > 0.8:
-                    if max_component == 2:  # Z normal -> XY plane
-                        xy_faces += 1
-                    elif max_component == 1:  # Y normal -> XZ plane
-                        xz_faces += 1
-                    else:  # X normal -> YZ plane
-                        yz_faces += 1
+        xy_faces, xz_faces, yz_faces = geometry.work_planes()
         
-        # 4. Detección de agujeros (clustering de aristas abiertas)
-        holes_detected = 0
-        if open_edges:
-            processed_edges = set()
-            for edge in open_edges:
-                if edge in processed_edges:
-                    continue
-                
-                cluster = [edge]
-                processed_edges.add(edge)
-                
-                # Buscar aristas cercanas
-                for other_edge in open_edges:
-                    if other_edge in processed_edges:
-                        continue
-                    
-                    # Calcular distancia mínima entre aristas
-                    dist = min(
-                        np.linalg.norm(vertices[edge[0]] - vertices[other_edge[0]]),
-                        np.linalg.norm(vertices[edge[0]] - vertices[other_edge[1]]),
-                        np.linalg.norm(vertices[edge[1]] - vertices[other_edge[0]]),
-                        np.linalg.norm(vertices[edge[1]] - vertices[other_edge[1]])
-                    )
-                    
-                    if dist < 3.0:  # Tolerance de 3mm
-                        cluster.append(other_edge)
-                        processed_edges.add(other_edge)
-                
-                if len(cluster) >= 3:
-                    holes_detected += 1
+        # 4. Detección de agujeros: lazos cerrados de aristas abiertas
+        holes_detected = topology["boundary_loops"]
         
         # Tiempo de análisis
         analysis_time = int((time.time() - start_time) * 1000)
@@ -344,12 +255,12 @@ def analyze_stl_with_manufacturing(filepath):
             "area": float(total_surface_area),
             "analysis_time_ms": analysis_time,
             "metadata": {
-                "triangles": len(triangles),
-                "faces": len(triangles),
-                "edges": len(vertices) * 3,  # Aproximado
-                "vertices": len(vertices),
-                "vertex_count": len(vertices),
-                "face_count": len(triangles),
+                "triangles": geometry.triangles,
+                "faces": geometry.triangles,
+                "edges": topology["edges"],
+                "vertices": topology["vertices"],
+                "vertex_count": topology["vertices"],
+                "face_count": geometry.triangles,
                 "center_of_mass": {
                     "x": float(center_of_mass[0]),
                     "y": float(center_of_mass[1]),
@@ -368,6 +279,8 @@ def analyze_stl_with_manufacturing(filepath):
                 "format": "ASCII" if is_ascii else "BINARY",
                 "file_size_bytes": Path(filepath).stat().st_size
             },
+            "topology": topology,
+            "shells": shells,
             "manufacturing": {
                 "cutting_perimeters": cutting_perimeters,
                 "cutting_length_mm": float(cutting_perimeter_length),
@@ -380,14 +293,20 @@ def analyze_stl_with_manufacturing(filepath):
                     "dominant_plane": dominant_plane
                 },
                 "complexity": {
-                    "surface_complexity": "High" if len(triangles) > 5000 else "Medium" if len(triangles) > 1000 else "Low",
+                    "surface_complexity": "High" if geometry.triangles > 5000 else "Medium" if geometry.triangles > 1000 else "Low",
                     "fabrication_difficulty": "Complex" if cutting_perimeters > 50 else "Medium" if cutting_perimeters > 10 else "Simple"
                 },
+                "wall_thickness": thickness,
+                "additive": printing,
+                "slicing": layers,
                 "material_efficiency": float(round((volume / (dimensions[0] * dimensions[1] * dimensions[2])) * 100, 1)) if np.prod(dimensions) > 0 else 0.0,
-                "weight_estimates": calculate_weight_estimates(volume)
+                "weight_estimates": calculate_weight_estimates(volume, printing.get("support_material_volume", 0.0))
             }
         }
         
+        if streaming:
+            result["metadata"]["streaming"] = streaming
+        
         debug("Analysis complete")
         return result
         
@@ -404,7 +323,8 @@ def main():
         sys.exit(1)
     
     filepath = sys.argv[1]
-    result = analyze_stl_with_manufacturing(filepath)
+    with metrics.script_timeline(filepath):
+        result = analyze_stl_with_manufacturing(filepath)
     print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
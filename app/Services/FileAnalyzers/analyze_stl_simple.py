@@ -7,6 +7,8 @@ import traceback
 import numpy as np
 from pathlib import Path
 
+import mesh_topology
+
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
@@ -75,15 +77,16 @@ def analyze_stl(filepath):
         dimensions = max_coords - min_coords
         debug(f"Dimensions: {dimensions}")
 
-        # Calculate other metrics
-        num_vertices = len(vertices)
-        num_triangles = num_vertices // 3
-        num_edges = num_triangles * 3
-        debug(f"Counted {num_triangles} triangles")
-
         # Reshape vertices into triangles
         triangles = vertices.reshape(-1, 3, 3)
 
+        # Calculate other metrics (welded vertices and real edge count)
+        topology = mesh_topology.analyze(triangles)
+        num_vertices = topology["vertices"]
+        num_triangles = len(triangles)
+        num_edges = topology["edges"]
+        debug(f"Counted {num_triangles} triangles")
+
         # Calculate areas
         v0 = triangles[:, 1] - triangles[:, 0]
         v1 = triangles[:, 2] - triangles[:, 0]
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmark de analizadores y previews sobre fixtures sintéticos escalables
+Mide tiempo, throughput (triángulos/s, MB/s) y pico de RSS; resultados en JSON
+
+Uso:
+    python benchmark_analyzers.py --preset standard
+    python benchmark_analyzers.py --fixtures sphere,gear --sizes 1000,100000 --output base.json
+    python benchmark_analyzers.py --preset quick --baseline base.json --threshold 0.25
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import importlib
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+import benchmark_fixtures
+from portable_config import get_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PREVIEW_SERVICE = os.path.join(os.path.dirname(HERE), 'PreviewService')
+
+RESULTS_VERSION = 1
+
+PRESETS = {
+    'quick': [1000, 10000],
+    'standard': [1000, 10000, 100000, 1000000],
+    'full': [1000, 10000, 100000, 1000000, 10000000],
+}
+
+# Tamaños máximos por fixture (los DXF de más de 100k entidades no son realistas)
+SIZE_LIMITS = {
+    'dxf_entities': 100000,
+    'step_text': 1000000,
+}
+
+# (módulo, función) de cada analizador por tipo de archivo
+ANALYZERS = {
+    'stl': [
+        ('analyze_stl', 'analyze_stl'),
+        ('analyze_stl_manufacturing', 'analyze_stl_with_manufacturing'),
+    ],
+    'step': [
+        ('analyze_step_simple', 'analyze_step_simple'),
+    ],
+    'dxf': [
+        ('analyze_dxf_dwg', 'analyze_dxf'),
+        ('analyze_dxf_dwg_complete', 'analyze_dxf_complete'),
+    ],
+}
+
+# Tipos de preview del servidor híbrido por tipo de archivo
+PREVIEWS = {
+    'stl': ['2d', 'wireframe'],
+    'dxf': ['2d'],
+}
+
+
+def debug(msg):
+    """Print debug messages to stderr"""
+    print(msg, file=sys.stderr, flush=True)
+
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB (None if unknown)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux devuelve KB, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 2)
+    except ImportError:
+        return None
+
+
+def _run_target(target, path, file_type, scratch_dir):
+    """Ejecutar un analizador o un preview y devolver su duración en segundos"""
+    kind, name, func = target
+    if kind == 'analyzer':
+        analyze = getattr(importlib.import_module(name), func)
+        started = time.perf_counter()
+        analyze(path)
+        return time.perf_counter() - started
+
+    sys.path.insert(0, PREVIEW_SERVICE)
+    hybrid = importlib.import_module('hybrid_preview_server')
+    from preview_store import PreviewStore
+    # Las imágenes del benchmark no deben acabar en el almacén público
+    hybrid.preview_store = PreviewStore(scratch_dir, '/benchmark')
+    started = time.perf_counter()
+    hybrid.render_preview_file(path, file_type, func, 800, 600)
+    return time.perf_counter() - started
+
+
+def _child(conn, target, path, file_type, scratch_dir, verbose):
+    """Proceso hijo: un caso por proceso para que el pico de RSS sea el suyo"""
+    if not verbose:
+        devnull = open(os.devnull, 'w')
+        sys.stderr = devnull
+        sys.stdout = devnull
+    sys.path.insert(0, HERE)
+    try:
+        rss_before = peak_rss_mb()
+        seconds = _run_target(target, path, file_type, scratch_dir)
+        conn.send({'status': 'ok', 'seconds': seconds,
+                   'rss_before_mb': rss_before, 'peak_rss_mb': peak_rss_mb()})
+    except BaseException as e:
+        conn.send({'status': 'error', 'error': f"{type(e).__name__}: {e}", 'peak_rss_mb': peak_rss_mb()})
+    finally:
+        conn.close()
+
+
+def run_case(target, fixture, scratch_dir, timeout, verbose=False):
+    """Run one target on one fixture in a fresh spawned process"""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(child, target, fixture['path'], fixture['file_type'],
+                                                   scratch_dir, verbose))
+    process.start()
+    child.close()
+    if parent.poll(timeout):
+        outcome = parent.recv()
+    else:
+        outcome = {'status': 'timeout', 'error': f"Exceeded {timeout}s"}
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+    kind, name, func = target
+    result = {
+        'fixture': fixture['fixture'],
+        'size': fixture['size'],
+        'file_type': fixture['file_type'],
+        'target': f"{kind}:{name}.{func}" if kind == 'analyzer' else f"preview:{func}",
+        'file_bytes': fixture['bytes'],
+        'triangles': fixture.get('triangles'),
+        'entities': fixture.get('entities'),
+    }
+    result.update(outcome)
+    seconds = outcome.get('seconds')
+    if seconds:
+        result['seconds'] = round(seconds, 6)
+        result['mb_per_s'] = round(fixture['bytes'] / (1024 * 1024) / seconds, 3)
+        if fixture.get('triangles'):
+            result['triangles_per_s'] = round(fixture['triangles'] / seconds, 1)
+        if fixture.get('entities'):
+            result['entities_per_s'] = round(fixture['entities'] / seconds, 1)
+    return result
+
+
+def targets_for(file_type, include_previews):
+    targets = [('analyzer', module, func) for module, func in ANALYZERS.get(file_type, [])]
+    if include_previews:
+        targets += [('preview', 'hybrid_preview_server', preview) for preview in PREVIEWS.get(file_type, [])]
+    return targets
+
+
+def environment_info():
+    info = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        info['git_commit'] = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        info['git_commit'] = None
+    return info
+
+
+def compare(results, baseline, threshold):
+    """Cases that got slower than the baseline by more than `threshold` (fraction)"""
+    previous = {
+        (r['fixture'], r['size'], r['target']): r
+        for r in baseline.get('results', []) if r.get('status') == 'ok'
+    }
+    regressions = []
+    for r in results:
+        before = previous.get((r['fixture'], r['size'], r['target']))
+        if before is None or r.get('status') != 'ok':
+            continue
+        change = r['seconds'] / before['seconds'] - 1.0
+        r['baseline_seconds'] = before['seconds']
+        r['change'] = round(change, 4)
+        if change > threshold:
+            regressions.append(r)
+    return regressions
+
+
+def run(fixtures, sizes, workdir, timeout, include_previews=True, limits=True, verbose=False):
+    scratch_dir = os.path.join(workdir, 'previews')
+    results = []
+    for name in fixtures:
+        timed_out = set()
+        for size in sizes:
+            if limits and size > SIZE_LIMITS.get(name, size):
+                continue
+            fixture = benchmark_fixtures.generate(name, size, workdir)
+            fixture['size'] = size
+            for target in targets_for(fixture['file_type'], include_previews):
+                # Si un tamaño menor ya superó el timeout, los mayores también lo harán
+                if target in timed_out:
+                    continue
+                result = run_case(target, fixture, scratch_dir, timeout, verbose)
+                results.append(result)
+                if result['status'] == 'timeout':
+                    timed_out.add(target)
+                debug(f"{result['target']:<60} {name:<18} {size:>9}  {result['status']:<7} "
+                      f"{result.get('seconds', float('nan')):>9.3f}s  peak RSS {result.get('peak_rss_mb')} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the file analyzers and preview paths")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--sizes', help="Comma separated sizes (overrides --preset)")
+    parser.add_argument('--fixtures', default=','.join(benchmark_fixtures.FIXTURES))
+    parser.add_argument('--workdir', default=os.path.join(get_config().get_temp_path(), 'pollux_benchmark'),
+                        help="Where fixtures are generated (reused between runs)")
+    parser.add_argument('--output', help="JSON results file (default: storage/app/benchmarks/<timestamp>.json)")
+    parser.add_argument('--timeout', type=float, default=300, help="Seconds per case")
+    parser.add_argument('--no-previews', action='store_true', help="Only benchmark the analyzers")
+    parser.add_argument('--no-limits', action='store_true', help="Ignore the per-fixture size limits")
+    parser.add_argument('--baseline', help="Previous results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument('--verbose', action='store_true', help="Show analyzer output")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else PRESETS[args.preset]
+    fixtures = [f.strip() for f in args.fixtures.split(',') if f.strip()]
+    unknown = set(fixtures) - set(benchmark_fixtures.FIXTURES)
+    if unknown:
+        parser.error(f"Unknown fixtures: {', '.join(sorted(unknown))}")
+
+    started = time.time()
+    results = run(fixtures, sizes, args.workdir, args.timeout,
+                  include_previews=not args.no_previews, limits=not args.no_limits, verbose=args.verbose)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration_seconds': round(time.time() - started, 2),
+        'environment': environment_info(),
+        'sizes': sizes,
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report['baseline'] = args.baseline
+        report['regressions'] = len(regressions)
+        for r in regressions:
+            debug(f"REGRESSION {r['target']} {r['fixture']} {r['size']}: "
+                  f"{r['baseline_seconds']:.3f}s -> {r['seconds']:.3f}s ({r['change']:+.0%})")
+
+    output = args.output or os.path.join(get_config().get_storage_path('benchmarks'),
+                                         time.strftime('benchmark_%Y%m%d_%H%M%S.json'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(output)
+
+    return 2 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Generadores vectorizados de archivos CAD sintéticos para benchmarks
+STL (esferas, engranajes, celosías, placas con agujeros), STEP de texto y DXF
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+
+# Registro binario STL: normal, 3 vértices y attribute byte count (50 bytes)
+STL_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+
+def debug(msg):
+    """Print debug messages to stderr"""
+    print(msg, file=sys.stderr, flush=True)
+
+
+def triangle_normals(triangles):
+    """Unit normals of an (n, 3, 3) triangle array (zero for degenerate faces)"""
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    return normals
+
+
+def write_binary_stl(path, triangles, name='pollux benchmark'):
+    """Write an (n, 3, 3) array as binary STL in a single write"""
+    records = np.zeros(len(triangles), dtype=STL_DTYPE)
+    records['vertices'] = triangles
+    records['normal'] = triangle_normals(triangles)
+    header = name.encode('ascii')[:80].ljust(80, b'\0')
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(np.uint32(len(triangles)).tobytes())
+        records.tofile(f)
+    return path
+
+
+def write_ascii_stl(path, triangles, name='pollux_benchmark'):
+    """Write an (n, 3, 3) array as ASCII STL (np.savetxt per facet block)"""
+    normals = triangle_normals(triangles)
+    rows = np.hstack([normals, triangles.reshape(-1, 9)])
+    facet = ("facet normal %e %e %e\n outer loop\n"
+             "  vertex %e %e %e\n  vertex %e %e %e\n  vertex %e %e %e\n"
+             " endloop\nendfacet")
+    with open(path, 'w') as f:
+        f.write(f"solid {name}\n")
+        np.savetxt(f, rows, fmt=facet)
+        f.write(f"endsolid {name}\n")
+    return path
+
+
+def _quad_grid_faces(rows, cols, wrap_cols=False):
+    """Triangle indices for a rows x cols vertex grid (two triangles per quad)"""
+    col_count = cols if wrap_cols else cols - 1
+    r, c = np.meshgrid(np.arange(rows - 1), np.arange(col_count), indexing='ij')
+    r = r.ravel()
+    c = c.ravel()
+    c1 = (c + 1) % cols
+    a = r * cols + c
+    b = r * cols + c1
+    d = (r + 1) * cols + c
+    e = (r + 1) * cols + c1
+    return np.concatenate([np.stack([a, b, e], axis=1), np.stack([a, e, d], axis=1)])
+
+
+def sphere(triangles, radius=50.0):
+    """Closed UV sphere with about `triangles` faces (fans at the poles)"""
+    # 2 * segments * (rings - 1) triángulos con segments = 2 * rings
+    rings = max(3, int(round(np.sqrt(triangles / 4.0))) + 1)
+    segments = 2 * rings
+    theta = np.linspace(0, np.pi, rings + 1)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    ring_vertices = radius * np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1).reshape(-1, 3)
+    north = len(ring_vertices)
+    south = north + 1
+    vertices = np.vstack([ring_vertices, [[0, 0, radius], [0, 0, -radius]]])
+
+    faces = [_quad_grid_faces(rings - 1, segments, wrap_cols=True)]
+    s = np.arange(segments)
+    s1 = (s + 1) % segments
+    faces.append(np.stack([np.full(segments, north), s1, s], axis=1))
+    last = (rings - 2) * segments
+    faces.append(np.stack([np.full(segments, south), last + s, last + s1], axis=1))
+    # Invertir el orden de los vértices para que las normales apunten hacia fuera
+    return vertices[np.concatenate(faces)[:, ::-1]]
+
+
+def gear(triangles, teeth=24, outer_radius=40.0, tooth_depth=5.0, thickness=10.0):
+    """Extruded spur gear outline (star-shaped, so the caps are fans)"""
+    points = max(teeth * 4, triangles // 4)
+    angles = np.linspace(0, 2 * np.pi, points, endpoint=False)
+    # Perfil trapezoidal de los dientes
+    phase = (angles * teeth / (2 * np.pi)) % 1.0
+    profile = np.clip(np.abs(phase - 0.5) * 4 - 0.5, 0, 1)
+    radius = outer_radius - tooth_depth * profile
+    outline = np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=1)
+
+    bottom = np.hstack([outline, np.zeros((points, 1))])
+    top = np.hstack([outline, np.full((points, 1), thickness)])
+    i = np.arange(points)
+    j = (i + 1) % points
+    center_bottom = np.zeros((points, 3))
+    center_top = np.tile([0.0, 0.0, thickness], (points, 1))
+
+    walls_a = np.stack([bottom[i], bottom[j], top[j]], axis=1)
+    walls_b = np.stack([bottom[i], top[j], top[i]], axis=1)
+    cap_bottom = np.stack([center_bottom, bottom[j], bottom[i]], axis=1)
+    cap_top = np.stack([center_top, top[i], top[j]], axis=1)
+    return np.concatenate([walls_a, walls_b, cap_bottom, cap_top])
+
+
+_BOX_FACES = np.array([
+    [0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7],
+    [0, 1, 5], [0, 5, 4], [1, 2, 6], [1, 6, 5],
+    [2, 3, 7], [2, 7, 6], [3, 0, 4], [3, 4, 7],
+])
+_BOX_CORNERS = np.array([
+    [0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+    [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1],
+], dtype=float)
+
+
+def boxes(origins, sizes):
+    """Triangles of axis-aligned boxes given (n, 3) origins and sizes"""
+    corners = origins[:, None, :] + _BOX_CORNERS[None, :, :] * sizes[:, None, :]
+    return corners[:, _BOX_FACES].reshape(-1, 3, 3)
+
+
+def lattice(triangles, cell=10.0, strut=1.5, gap=0.2):
+    """Cubic lattice of disjoint struts (many shells, 12 triangles per strut)"""
+    struts = max(1, triangles // 12)
+    per_axis = max(1, int(np.ceil((struts / 3.0) ** (1.0 / 3.0))))
+    grid = np.stack(np.meshgrid(*[np.arange(per_axis)] * 3, indexing='ij'), axis=-1).reshape(-1, 3) * cell
+    origins = []
+    sizes = []
+    for axis in range(3):
+        size = np.full(3, strut)
+        size[axis] = cell - strut - 2 * gap
+        offset = np.zeros(3)
+        offset[axis] = strut + gap
+        origins.append(grid + offset)
+        sizes.append(np.tile(size, (len(grid), 1)))
+    origins = np.concatenate(origins)[:struts]
+    sizes = np.concatenate(sizes)[:struts]
+    return boxes(origins, sizes)
+
+
+def plate_with_holes(triangles, width=200.0, depth=120.0, holes=12, hole_radius=6.0):
+    """Open tessellated surface with circular holes (boundary edges, not watertight)"""
+    quads = max(1, triangles // 2)
+    cols = max(2, int(np.sqrt(quads * width / depth)) + 1)
+    rows = max(2, int(quads / (cols - 1)) + 1)
+    x = np.linspace(0, width, cols)
+    y = np.linspace(0, depth, rows)
+    gx, gy = np.meshgrid(x, y)
+    gz = 2.0 * np.sin(gx / width * 2 * np.pi) * np.cos(gy / depth * 2 * np.pi)
+    vertices = np.stack([gx, gy, gz], axis=-1).reshape(-1, 3)
+    faces = _quad_grid_faces(rows, cols)
+
+    rng = np.random.default_rng(holes)
+    centers = rng.uniform([hole_radius * 2, hole_radius * 2],
+                          [width - hole_radius * 2, depth - hole_radius * 2], size=(holes, 2))
+    face_centers = vertices[faces].mean(axis=1)[:, :2]
+    inside = np.zeros(len(faces), dtype=bool)
+    for center in centers:
+        inside |= np.sum((face_centers - center) ** 2, axis=1) < hole_radius ** 2
+    return vertices[faces[~inside]]
+
+
+STL_FIXTURES = {
+    'sphere': sphere,
+    'gear': gear,
+    'lattice': lattice,
+    'plate_with_holes': plate_with_holes,
+}
+
+
+def write_step(path, points, seed=0):
+    """
+    Write an ISO-10303-21 text file with `points` CARTESIAN_POINTs plus
+    topology entities in the proportions of a typical exported part.
+    """
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform(-100, 100, size=(points, 3))
+    ids = np.arange(1, points + 1)
+    faces = max(1, points // 20)
+    edges = max(1, points // 4)
+
+    buffer = io.StringIO()
+    buffer.write(
+        "ISO-10303-21;\nHEADER;\n"
+        "FILE_DESCRIPTION(('Pollux benchmark fixture'),'2;1');\n"
+        f"FILE_NAME('benchmark_{points}.step','2024-01-01T00:00:00',('pollux'),('pollux'),'benchmark','benchmark','');\n"
+        "FILE_SCHEMA(('AUTOMOTIVE_DESIGN { 1 0 10303 214 1 1 1 1 }'));\nENDSEC;\nDATA;\n"
+    )
+    np.savetxt(buffer, np.column_stack([ids, coords]),
+               fmt="#%d=CARTESIAN_POINT('',(%.6f,%.6f,%.6f));")
+    next_id = points + 1
+    edge_ids = np.arange(next_id, next_id + edges)
+    np.savetxt(buffer, np.column_stack([edge_ids, (edge_ids - next_id) % points + 1]),
+               fmt="#%d=VERTEX_POINT('',#%d);")
+    next_id += edges
+    face_ids = np.arange(next_id, next_id + faces)
+    np.savetxt(buffer, np.column_stack([face_ids, face_ids]),
+               fmt="#%d=ADVANCED_FACE('',(#%d),#1,.T.);")
+    next_id += faces
+    buffer.write(f"#{next_id}=MANIFOLD_SOLID_BREP('',#{next_id - 1});\n")
+    buffer.write(f"#{next_id + 1}=PRODUCT('benchmark','benchmark','',(#{next_id}));\n")
+    buffer.write("ENDSEC;\nEND-ISO-10303-21;\n")
+
+    with open(path, 'w') as f:
+        f.write(buffer.getvalue())
+    return path
+
+
+def write_dxf(path, entities, seed=0):
+    """
+    Write a minimal ASCII DXF (R12 entities section) with `entities` LINE,
+    CIRCLE and ARC entities, generated with np.savetxt instead of ezdxf.
+    """
+    rng = np.random.default_rng(seed)
+    lines = entities // 2
+    circles = entities // 4
+    arcs = entities - lines - circles
+
+    with open(path, 'w') as f:
+        f.write("0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n0\nENDSEC\n")
+        f.write("0\nSECTION\n2\nENTITIES\n")
+        start = rng.uniform(0, 1000, size=(lines, 2))
+        end = start + rng.uniform(-20, 20, size=(lines, 2))
+        np.savetxt(f, np.hstack([start, end]),
+                   fmt="0\nLINE\n8\n0\n10\n%.4f\n20\n%.4f\n30\n0.0\n11\n%.4f\n21\n%.4f\n31\n0.0")
+        centers = rng.uniform(0, 1000, size=(circles, 2))
+        radii = rng.uniform(1, 15, size=(circles, 1))
+        np.savetxt(f, np.hstack([centers, radii]),
+                   fmt="0\nCIRCLE\n8\n0\n10\n%.4f\n20\n%.4f\n30\n0.0\n40\n%.4f")
+        centers = rng.uniform(0, 1000, size=(arcs, 2))
+        radii = rng.uniform(1, 15, size=(arcs, 1))
+        angles = np.sort(rng.uniform(0, 360, size=(arcs, 2)), axis=1)
+        np.savetxt(f, np.hstack([centers, radii, angles]),
+                   fmt="0\nARC\n8\n0\n10\n%.4f\n20\n%.4f\n30\n0.0\n40\n%.4f\n50\n%.4f\n51\n%.4f")
+        f.write("0\nENDSEC\n0\nEOF\n")
+    return path
+
+
+def generate(kind, size, directory, ascii_stl=False):
+    """
+    Generate (or reuse) a fixture and return its description.
+
+    `size` is the target triangle count for STL fixtures, the number of
+    CARTESIAN_POINTs for STEP and the number of entities for DXF.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if kind in STL_FIXTURES:
+        suffix = '_ascii' if ascii_stl else ''
+        path = os.path.join(directory, f"{kind}_{size}{suffix}.stl")
+        count_path = path + '.count'
+        if not (os.path.exists(path) and os.path.exists(count_path)):
+            triangles = STL_FIXTURES[kind](size).astype(np.float32)
+            debug(f"Generating {path} ({len(triangles)} triangles)")
+            if ascii_stl:
+                write_ascii_stl(path, triangles)
+            else:
+                write_binary_stl(path, triangles)
+            with open(count_path, 'w') as f:
+                f.write(str(len(triangles)))
+        with open(count_path) as f:
+            count = int(f.read())
+        return {'fixture': kind, 'file_type': 'stl', 'path': path, 'triangles': count,
+                'bytes': os.path.getsize(path)}
+
+    if kind == 'step_text':
+        path = os.path.join(directory, f"step_text_{size}.step")
+        if not os.path.exists(path):
+            debug(f"Generating {path}")
+            write_step(path, size)
+        return {'fixture': kind, 'file_type': 'step', 'path': path, 'entities': size,
+                'bytes': os.path.getsize(path)}
+
+    if kind == 'dxf_entities':
+        path = os.path.join(directory, f"dxf_entities_{size}.dxf")
+        if not os.path.exists(path):
+            debug(f"Generating {path}")
+            write_dxf(path, size)
+        return {'fixture': kind, 'file_type': 'dxf', 'path': path, 'entities': size,
+                'bytes': os.path.getsize(path)}
+
+    raise ValueError(f"Unknown fixture: {kind}")
+
+
+FIXTURES = tuple(STL_FIXTURES) + ('step_text', 'dxf_entities')
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python benchmark_fixtures.py <fixture> <size> [output_dir]")
+        print(f"Fixtures: {', '.join(FIXTURES)}")
+        sys.exit(1)
+    info = generate(sys.argv[1], int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else '.')
+    print(info)
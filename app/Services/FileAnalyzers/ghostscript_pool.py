@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Ejecución compartida de Ghostscript para analizadores y servidores de preview
+Limita los procesos simultáneos y guarda en caché la versión detectada
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import threading
+import subprocess
+
+import metrics
+from portable_config import get_config
+
+# Número máximo de procesos Ghostscript simultáneos por proceso Python
+GS_POOL_SIZE = int(os.environ.get('POLLUX_GS_POOL_SIZE', max(1, min(4, os.cpu_count() or 1))))
+
+_slots = threading.BoundedSemaphore(GS_POOL_SIZE)
+
+# Versión detectada por ruta del ejecutable (solo las detecciones correctas)
+_versions = {}
+
+# Página por defecto (PageSize en puntos) por ruta del ejecutable
+_default_pages = {}
+
+
+def debug(msg):
+    """Print debug messages to stderr"""
+    print(msg, file=sys.stderr, flush=True)
+
+
+def find_ghostscript():
+    """Return the Ghostscript executable detected by the portable config (no subprocess)"""
+    return get_config().ghostscript_path
+
+
+def _version_cache_file(gs_path):
+    key = hashlib.sha1(gs_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(get_config().get_temp_path(), f"pollux_gs_version_{key}.json")
+
+
+def get_ghostscript_version(gs_path=None):
+    """
+    Obtener la versión de Ghostscript una sola vez.
+
+    El resultado se guarda en memoria y en disco (clave: ruta + mtime del
+    ejecutable), así que `gs --version` solo se ejecuta tras instalar o
+    actualizar Ghostscript. Un fallo no se guarda: se reintenta en la
+    siguiente llamada.
+    """
+    gs_path = gs_path or find_ghostscript()
+    if not gs_path:
+        return None
+
+    version = _versions.get(gs_path)
+    if version is None:
+        version = _detect_version(gs_path)
+        if version is not None:
+            _versions[gs_path] = version
+    return version
+
+
+def _detect_version(gs_path):
+    """Version from the disk cache or from `gs --version` (None on failure)"""
+    try:
+        mtime = os.path.getmtime(gs_path)
+    except OSError:
+        return None
+
+    cache_file = _version_cache_file(gs_path)
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+        if cached['path'] == gs_path and cached['mtime'] == mtime:
+            metrics.cache_lookup('ghostscript_version', hit=True)
+            return cached['version']
+    except (OSError, ValueError, KeyError):
+        pass
+    metrics.cache_lookup('ghostscript_version', hit=False)
+
+    try:
+        result = run_ghostscript(['--version'], timeout=5, gs_path=gs_path)
+    except (RuntimeError, subprocess.SubprocessError, OSError) as e:
+        debug(f"Failed to run Ghostscript at {gs_path}: {e}")
+        return None
+
+    version = result.stdout.strip()
+    if result.returncode != 0 or not version:
+        return None
+
+    try:
+        with open(cache_file, 'w') as f:
+            json.dump({'path': gs_path, 'mtime': mtime, 'version': version}, f)
+    except OSError:
+        pass
+
+    return version
+
+
+def is_available():
+    """True if a working Ghostscript is installed"""
+    return get_ghostscript_version() is not None
+
+
+def run_ghostscript(args, timeout=15, gs_path=None):
+    """
+    Ejecutar Ghostscript dentro del pool.
+
+    Espera como máximo `timeout` segundos por un hueco libre y otros
+    `timeout` segundos por el propio proceso.
+    """
+    gs_path = gs_path or find_ghostscript()
+    if not gs_path:
+        raise RuntimeError("Ghostscript not found. Please install Ghostscript and make sure it's in your PATH")
+
+    if not _slots.acquire(timeout=timeout):
+        raise RuntimeError(f"Ghostscript pool busy ({GS_POOL_SIZE} processes running)")
+    try:
+        return subprocess.run(
+            [gs_path] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+            text=True
+        )
+    finally:
+        _slots.release()
+
+
+def _parse_bbox_output(lines):
+    """Extract the most precise bounding box printed by the bbox device"""
+    bbox = None
+    raw = None
+    for prefix in ('%%HiResBoundingBox:', '%%BoundingBox:'):
+        line = next((l for l in lines if l.startswith(prefix)), None)
+        if not line:
+            continue
+        parts = line.strip().split()
+        if len(parts) != 5:
+            raise ValueError(f"Invalid BoundingBox format: {line}")
+        bbox = tuple(float(p) for p in parts[1:])
+        raw = line.strip()
+        break
+    return bbox, raw
+
+
+def ghostscript_bbox(filepath, timeout=15):
+    """
+    Medir la caja envolvente con el dispositivo bbox de Ghostscript.
+
+    Returns:
+        tuple: ((x1, y1, x2, y2) o None, línea original, nº de líneas de salida)
+    """
+    result = run_ghostscript(
+        ['-dBATCH', '-dNOPAUSE', '-sDEVICE=bbox', filepath],
+        timeout=timeout
+    )
+    lines = result.stderr.splitlines()
+    bbox, raw = _parse_bbox_output(lines)
+    # Una página sin marcas da "%%BoundingBox: 0 0 0 0": no es una caja
+    if bbox is not None and not (bbox[2] > bbox[0] and bbox[3] > bbox[1]):
+        bbox = raw = None
+    return bbox, raw, len(lines)
+
+
+def default_page_bbox(timeout=15):
+    """
+    Página por defecto de Ghostscript (la que usa sin -dEPSCrop) como caja.
+
+    Depende de la instalación (Letter o A4 según -sPAPERSIZE y el locale),
+    así que se pregunta al propio Ghostscript una vez por ejecutable.
+
+    Returns:
+        tuple: (0, 0, ancho, alto) en puntos, o None si no se puede leer
+    """
+    gs_path = find_ghostscript()
+    if gs_path in _default_pages:
+        return _default_pages[gs_path]
+    result = run_ghostscript(
+        ['-q', '-dBATCH', '-dNOPAUSE', '-sDEVICE=bbox', '-c', 'currentpagedevice /PageSize get =='],
+        timeout=timeout
+    )
+    match = re.search(r'\[\s*([-+\d.eE]+)\s+([-+\d.eE]+)\s*\]', result.stdout)
+    if result.returncode != 0 or not match:
+        return None
+    width, height = float(match.group(1)), float(match.group(2))
+    if width <= 0 or height <= 0:
+        return None
+    _default_pages[gs_path] = (0.0, 0.0, width, height)
+    return _default_pages[gs_path]
+
+
+def _raster_bbox(png_path, resolution):
+    """
+    (ink, page): bounding boxes in points of the non-white pixels and of the
+    whole rendered page (ink is None for a blank page)
+    """
+    try:
+        import numpy as np
+        from PIL import Image
+    except ImportError:
+        return None, None
+
+    with Image.open(png_path) as img:
+        pixels = np.asarray(img.convert('L'))
+
+    scale = 72.0 / resolution
+    height = pixels.shape[0]
+    page = (0.0, 0.0, pixels.shape[1] * scale, height * scale)
+
+    ink = pixels < 250
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if rows.size == 0:
+        return None, page
+
+    return (
+        cols[0] * scale,
+        (height - rows[-1] - 1) * scale,
+        (cols[-1] + 1) * scale,
+        (height - rows[0]) * scale
+    ), page
+
+
+def render_png(filepath, output_path, resolution=100, measure_bbox=False, timeout=60):
+    """
+    Rasterizar un EPS/AI a PNG con una sola invocación de Ghostscript.
+
+    Con `measure_bbox` la caja envolvente se deduce del propio PNG, de modo
+    que análisis y preview comparten el mismo proceso; `page` es la página
+    renderizada, la de Ghostscript por defecto cuando no hay %%BoundingBox.
+
+    Returns:
+        dict: ruta de salida, caja envolvente medida y página (o None)
+    """
+    args = [
+        '-dNOPAUSE',
+        '-dBATCH',
+        '-dSAFER',
+        '-sDEVICE=png16m',
+        f'-r{resolution}',
+        '-dEPSCrop',
+        '-dFirstPage=1',
+        '-dLastPage=1',
+        f'-sOutputFile={output_path}',
+        filepath
+    ]
+    result = run_ghostscript(args, timeout=timeout)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        raise RuntimeError(f"Ghostscript failed to generate output file: {result.stderr.strip()}")
+
+    bbox = page = None
+    if measure_bbox:
+        # Sin %%BoundingBox, -dEPSCrop no recorta y la página parte del origen
+        bbox, page = _raster_bbox(output_path, resolution)
+
+    return {
+        'output_path': output_path,
+        'bbox': bbox,
+        'page': page
+    }
+
+
+if __name__ == "__main__":
+    print(f"Ghostscript: {find_ghostscript()}")
+    print(f"Version: {get_ghostscript_version()}")
+    print(f"Pool size: {GS_POOL_SIZE}")
@@ -3,12 +3,20 @@ import os
 import subprocess
 import json
 import traceback
+import functools
 import time
 
+import metrics
+import profiling
+
 def debug(msg):
     """Print debug messages to stderr"""
     print(msg, file=sys.stderr, flush=True)
 
+# Versión de los resultados de los analizadores: subirla cuando cambie su salida
+# para que backfill.py vuelva a analizar los archivos ya procesados
+ANALYZER_VERSION = "2025.11"
+
 # Extension to script mapping - FORCE MANUFACTURING ANALYZER FOR STL
 EXTENSION_MAP = {
     '.stl': 'analyze_stl_manufacturing.py',  # FORCE manufacturing analyzer
@@ -20,6 +28,26 @@ EXTENSION_MAP = {
     '.eps': 'analyze_ai_eps.py',
 }
 
+# Scripts que ejecuta FileAnalysisController por extensión: (principal, alternativo si falta)
+CONTROLLER_SCRIPTS = {
+    '.stl': ('analyze_stl_manufacturing.py', 'analyze_stl_no_numpy.py'),
+    '.step': ('analyze_step_simple.py', None),
+    '.stp': ('analyze_step_simple.py', None),
+    '.dxf': ('analyze_dxf_dwg_complete.py', 'analyze_dxf_dwg.py'),
+    '.dwg': ('analyze_dxf_dwg_complete.py', 'analyze_dxf_dwg.py'),
+    '.ai':  ('analyze_ai_eps_complete.py', 'analyze_ai_eps.py'),
+    '.eps': ('analyze_ai_eps_complete.py', 'analyze_ai_eps.py'),
+}
+
+def controller_script(ext):
+    """Path of the analyzer FileAnalysisController uses for `ext`, or its fallback if missing"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    primary, fallback = CONTROLLER_SCRIPTS[ext]
+    path = os.path.join(base, primary)
+    if not os.path.exists(path) and fallback:
+        path = os.path.join(base, fallback)
+    return path
+
 def get_extension(path):
     ext = os.path.splitext(path)[1].lower()
     debug(f"File extension: {ext}")
@@ -44,8 +72,15 @@ def verify_python_environment():
     except ImportError as e:
         return error_response(f"NumPy not installed: {str(e)}")
 
-def run_analyzer(script_path, file_path, timeout=120):
-    """Run an analyzer script and return its output."""
+def run_analyzer(script_path, file_path, timeout=120, profile=None, profile_id=None, parsed=None):
+    """
+    Run an analyzer script and return its output.
+
+    With `profile` ('cprofile' or 'sample') the analyzer runs under the profiler
+    and the result gets a `profile` summary with the hottest functions.
+    `parsed` is the file already read by the caller (STL triangles and format,
+    or an ezdxf document); the STL and DXF analyzers then skip reading it.
+    """
     start_time = time.time()
     debug(f"Starting analysis at: {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
@@ -91,8 +126,8 @@ def run_analyzer(script_path, file_path, timeout=120):
             '.stl': ['analyze_stl_with_manufacturing', 'analyze_stl', 'analyze_stl_simple'],
             '.step': ['analyze_step', 'analyze_step_simple'],
             '.stp': ['analyze_step', 'analyze_step_simple'],
-            '.dxf': ['analyze_dxf'],
-            '.dwg': ['analyze_dxf'],
+            '.dxf': ['analyze_dxf_complete', 'analyze_dxf'],
+            '.dwg': ['analyze_dxf_complete', 'analyze_dxf'],
             '.ai': ['analyze_ai_eps', 'analyze'],
             '.eps': ['analyze_ai_eps', 'analyze']
         }
@@ -103,7 +138,16 @@ def run_analyzer(script_path, file_path, timeout=120):
             if hasattr(analyzer, func_name):
                 debug(f"Using {func_name} function")
                 analyze_func = getattr(analyzer, func_name)
-                result = analyze_func(file_path)
+                if parsed is not None:
+                    analyze_func = functools.partial(analyze_func, parsed=parsed)
+                # Cada analizador marca sus etapas (read, parse, analyze...) con metrics.mark()
+                profile_summary = None
+                with metrics.timeline(ext, file_path) as stages:
+                    if profile:
+                        result, profile_summary = profiling.profile_call(
+                            profile, profile_id, None, analyze_func, file_path)
+                    else:
+                        result = analyze_func(file_path)
                 break
         else:
             raise AttributeError(f"No suitable analyze function found in {module_name} for {ext} files")
@@ -119,6 +163,9 @@ def run_analyzer(script_path, file_path, timeout=120):
 
         # Add analysis time
         result['analysis_time_ms'] = int((time.time() - start_time) * 1000)
+        result['stage_timings_ms'] = stages.as_ms()
+        if profile_summary:
+            result['profile'] = profile_summary
         return json.dumps(result)
 
     except ImportError as e:
@@ -134,11 +181,19 @@ def main():
         debug(f"Arguments: {sys.argv}")
         debug(f"Working directory: {os.getcwd()}")
 
-        if len(sys.argv) < 2:
+        # Opciones: --profile[=cprofile|sample] y --profile-id=<job id>
+        args = [a for a in sys.argv[1:] if not a.startswith('--')]
+        options = dict(a[2:].partition('=')[::2] for a in sys.argv[1:] if a.startswith('--'))
+        requested = options.get('profile', os.environ.get('POLLUX_PROFILE'))
+        if 'profile' in options and not requested:
+            requested = 'cprofile'
+        profile = profiling.resolve_mode(requested)
+
+        if not args:
             print(error_response("No input file specified"))
             return 1
 
-        file_path = sys.argv[1]
+        file_path = args[0]
         if not os.path.exists(file_path):
             print(error_response(f"File not found: {file_path}"))
             return 1
@@ -152,7 +207,10 @@ def main():
         script_path = os.path.join(os.path.dirname(__file__), analyzer_script)
         debug(f"Using analyzer: {script_path}")
 
-        result = run_analyzer(script_path, file_path)
+        # Proceso de un solo uso: las métricas de las etapas van al spool del servidor
+        metrics.enable_spool()
+        result = run_analyzer(script_path, file_path, profile=profile,
+                              profile_id=options.get('profile-id') or os.environ.get('POLLUX_JOB_ID'))
         print(result)
         debug("=== Analysis Complete ===")
         return 0
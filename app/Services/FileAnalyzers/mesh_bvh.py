@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Jerarquía de volúmenes envolventes (BVH) sobre arrays de triángulos con numpy
+Construcción por códigos Morton y recorrido por niveles de lotes de rayos
+"""
+
+import numpy as np
+
+# Triángulos por hoja del árbol
+LEAF_SIZE = 8
+
+# Rayos procesados a la vez (limita la memoria de los pares rayo-nodo)
+RAY_BATCH = 4096
+
+# Máximo de pares rayo-nodo vivos; por encima el lote se parte en dos
+MAX_PAIRS = 1 << 18
+
+_MORTON_BITS = 10
+
+# Triángulos vecinos en orden Morton usados como cota inicial del punto más cercano
+SEED_WINDOW = 32
+
+
+def _spread_bits(values):
+    """Intercalar dos ceros entre los 10 bits de cada valor (código Morton 3D)"""
+    v = values.astype(np.uint64) & np.uint64(0x3FF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x030000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x0300F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x030C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x09249249)
+    return v
+
+
+def morton_codes(points, origin, extent):
+    cells = (1 << _MORTON_BITS) - 1
+    scaled = np.clip((points - origin) / np.where(extent > 0, extent, 1.0) * cells, 0, cells)
+    return (_spread_bits(scaled[:, 0]) << np.uint64(2)) | (_spread_bits(scaled[:, 1]) << np.uint64(1)) \
+        | _spread_bits(scaled[:, 2])
+
+
+class BVH:
+    """
+    Árbol binario completo implícito sobre los triángulos ordenados por Morton.
+
+    Cada hoja agrupa LEAF_SIZE triángulos consecutivos; el nivel `d` tiene
+    2**d nodos y los hijos del nodo i son 2i y 2i+1, así que el árbol se
+    guarda como una lista de arrays (min, max) por nivel y se construye con
+    reducciones de pares de abajo arriba.
+    """
+
+    def __init__(self, triangles, leaf_size=LEAF_SIZE):
+        triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        self.leaf_size = leaf_size
+        self.count = len(triangles)
+
+        lower = triangles.min(axis=1)
+        upper = triangles.max(axis=1)
+        origin = lower.min(axis=0) if self.count else np.zeros(3)
+        extent = (upper.max(axis=0) - origin) if self.count else np.zeros(3)
+        self.bounds = (origin, origin + extent)
+
+        codes = morton_codes((lower + upper) * 0.5, origin, extent)
+        self.order = np.argsort(codes, kind='stable')
+        self.codes = codes[self.order]
+        self.triangles = triangles[self.order]
+        lower, upper = lower[self.order], upper[self.order]
+
+        # Hojas (rellenas hasta potencia de 2 con cajas vacías)
+        leaves = max(1, -(-self.count // leaf_size))
+        self.depth = int(np.ceil(np.log2(leaves))) if leaves > 1 else 0
+        padded = 1 << self.depth
+        box_min = np.full((padded, 3), np.inf)
+        box_max = np.full((padded, 3), -np.inf)
+        if self.count:
+            starts = np.arange(0, self.count, leaf_size)
+            box_min[:len(starts)] = np.minimum.reduceat(lower, starts)
+            box_max[:len(starts)] = np.maximum.reduceat(upper, starts)
+
+        self.box_min = [box_min]
+        self.box_max = [box_max]
+        # Nodos no vacíos por nivel: el relleno queda siempre al final
+        self.used = [leaves]
+        while len(self.box_min[0]) > 1:
+            child_min, child_max = self.box_min[0], self.box_max[0]
+            self.box_min.insert(0, np.minimum(child_min[0::2], child_min[1::2]))
+            self.box_max.insert(0, np.maximum(child_max[0::2], child_max[1::2]))
+            self.used.insert(0, -(-self.used[0] // 2))
+
+        # Aristas precalculadas para Möller-Trumbore
+        self._v0 = self.triangles[:, 0]
+        self._e1 = self.triangles[:, 1] - self._v0
+        self._e2 = self.triangles[:, 2] - self._v0
+
+    @property
+    def diagonal(self):
+        return float(np.linalg.norm(self.bounds[1] - self.bounds[0]))
+
+    def _leaf_triangles(self, leaves):
+        """(pairs, leaf_size) triangle indices of each leaf and a validity mask"""
+        index = leaves[:, None] * self.leaf_size + np.arange(self.leaf_size)
+        valid = index < self.count
+        return np.where(valid, index, 0), valid
+
+    def intersect(self, origins, directions, t_min=0.0, t_max=np.inf):
+        """
+        First hit of each ray.
+
+        Returns (t, triangle) arrays: `t` is inf and `triangle` -1 for rays
+        that hit nothing in (t_min, t_max]. `triangle` indexes the original
+        triangle array. Directions do not need to be normalized; `t` is in
+        units of the direction length.
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        t_result = np.full(len(origins), np.inf)
+        hit_result = np.full(len(origins), -1, dtype=np.int64)
+        if self.count == 0:
+            return t_result, hit_result
+
+        for start in range(0, len(origins), RAY_BATCH):
+            stop = min(start + RAY_BATCH, len(origins))
+            t, hit = self._intersect_batch(origins[start:stop], directions[start:stop], t_min, t_max)
+            t_result[start:stop] = t
+            hit_result[start:stop] = hit
+        return t_result, hit_result
+
+    def _intersect_batch(self, origins, directions, t_min, t_max):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / directions
+
+        # Recorrido por niveles: pares (rayo, nodo) que atraviesan la caja del nodo
+        ray = np.arange(len(origins))
+        node = np.zeros(len(origins), dtype=np.int64)
+        for level in range(self.depth + 1):
+            with np.errstate(invalid='ignore'):
+                t0 = (self.box_min[level][node] - origins[ray]) * inverse[ray]
+                t1 = (self.box_max[level][node] - origins[ray]) * inverse[ray]
+            near = np.fmax.reduce(np.minimum(t0, t1), axis=1)
+            far = np.fmin.reduce(np.maximum(t0, t1), axis=1)
+            keep = (far >= np.maximum(near, t_min)) & (near <= t_max) & (node < self.used[level])
+            ray, node = ray[keep], node[keep]
+            if len(ray) > MAX_PAIRS and len(origins) > 1:
+                # Triángulos largos (abanicos, astillas) solapan muchas cajas: lote más pequeño
+                half = len(origins) // 2
+                t_a, hit_a = self._intersect_batch(origins[:half], directions[:half], t_min, t_max)
+                t_b, hit_b = self._intersect_batch(origins[half:], directions[half:], t_min, t_max)
+                return np.concatenate([t_a, t_b]), np.concatenate([hit_a, hit_b])
+            if level < self.depth:
+                ray = np.repeat(ray, 2)
+                node = (node[:, None] * 2 + np.arange(2)).ravel()
+
+        t = np.full(len(origins), np.inf)
+        hit = np.full(len(origins), -1, dtype=np.int64)
+        if len(ray) == 0:
+            return t, hit
+
+        # Möller-Trumbore sobre los triángulos de cada hoja alcanzada
+        triangle, valid = self._leaf_triangles(node)
+        ray = np.broadcast_to(ray[:, None], triangle.shape)[valid]
+        triangle = triangle[valid]
+        d = directions[ray]
+        e1, e2 = self._e1[triangle], self._e2[triangle]
+        p = np.cross(d, e2)
+        det = np.einsum('ij,ij->i', e1, p)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_det = 1.0 / det
+            s = origins[ray] - self._v0[triangle]
+            u = np.einsum('ij,ij->i', s, p) * inv_det
+            q = np.cross(s, e1)
+            v = np.einsum('ij,ij->i', d, q) * inv_det
+            distance = np.einsum('ij,ij->i', e2, q) * inv_det
+            good = (np.abs(det) > 1e-300) & (u >= 0) & (v >= 0) & (u + v <= 1) \
+                & (distance > t_min) & (distance <= t_max)
+        ray, triangle, distance = ray[good], triangle[good], distance[good]
+        if len(ray) == 0:
+            return t, hit
+
+        # Primer impacto de cada rayo
+        order = np.lexsort((distance, ray))
+        ray, triangle, distance = ray[order], triangle[order], distance[order]
+        first = np.r_[True, ray[1:] != ray[:-1]]
+        t[ray[first]] = distance[first]
+        hit[ray[first]] = self.order[triangle[first]]
+        return t, hit
+
+    def closest_points(self, points):
+        """
+        Closest surface point of each query point.
+
+        Returns (closest (m, 3), distance (m,), triangle (m,)). Recorrido por
+        niveles con poda: la distancia a la esquina más lejana de una caja es
+        una cota superior de la distancia a sus triángulos, así que se
+        descartan las cajas cuya distancia mínima supera la mejor cota.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        closest = np.full((len(points), 3), np.nan)
+        distance = np.full(len(points), np.inf)
+        triangle = np.full(len(points), -1, dtype=np.int64)
+        if self.count == 0:
+            return closest, distance, triangle
+        for start in range(0, len(points), RAY_BATCH):
+            batch = slice(start, min(start + RAY_BATCH, len(points)))
+            closest[batch], distance[batch], triangle[batch] = self._closest_batch(points[batch])
+        return closest, distance, triangle
+
+    def _box_distance(self, level, node, points):
+        """Distancia al cuadrado de cada punto a la caja de su nodo"""
+        offset = points - np.clip(points, self.box_min[level][node], self.box_max[level][node])
+        return np.einsum('ij,ij->i', offset, offset)
+
+    def _leaf_closest(self, points, query, leaves):
+        """Closest candidate among the triangles of each (query, leaf) pair"""
+        triangle, valid = self._leaf_triangles(leaves)
+        query = np.broadcast_to(query[:, None], triangle.shape)[valid]
+        triangle = triangle[valid]
+        candidate = closest_point_on_triangles(points[query], self.triangles[triangle])
+        offset = candidate - points[query]
+        return query, triangle, candidate, np.einsum('ij,ij->i', offset, offset)
+
+    def _closest_batch(self, points):
+        # Cota inicial: triángulos vecinos en el orden Morton del punto consultado
+        origin, upper = self.bounds
+        position = np.searchsorted(self.codes, morton_codes(points, origin, upper - origin))
+        start = np.clip(position - SEED_WINDOW // 2, 0, max(self.count - SEED_WINDOW, 0))
+        window = np.minimum(start[:, None] + np.arange(SEED_WINDOW), self.count - 1)
+        candidate = closest_point_on_triangles(np.repeat(points, SEED_WINDOW, axis=0),
+                                               self.triangles[window.ravel()])
+        offset = (candidate - np.repeat(points, SEED_WINDOW, axis=0)).reshape(len(points), SEED_WINDOW, 3)
+        bound = np.einsum('ijk,ijk->ij', offset, offset).min(axis=1)
+
+        # Recorrido por niveles descartando cajas más lejanas que la cota
+        query = np.arange(len(points))
+        node = np.zeros(len(points), dtype=np.int64)
+        for level in range(self.depth + 1):
+            keep = (node < self.used[level]) & (self._box_distance(level, node, points[query]) <= bound[query])
+            query, node = query[keep], node[keep]
+            # Cualquier triángulo de la caja está a lo sumo a la distancia de su esquina más lejana
+            far = np.maximum(np.abs(points[query] - self.box_min[level][node]),
+                             np.abs(points[query] - self.box_max[level][node]))
+            np.minimum.at(bound, query, np.einsum('ij,ij->i', far, far))
+            if len(query) > MAX_PAIRS and len(points) > 1:
+                half = len(points) // 2
+                first, second = self._closest_batch(points[:half]), self._closest_batch(points[half:])
+                return tuple(np.concatenate([x, y]) for x, y in zip(first, second))
+            if level < self.depth:
+                query = np.repeat(query, 2)
+                node = (node[:, None] * 2 + np.arange(2)).ravel()
+
+        query, triangle, candidate, squared = self._leaf_closest(points, query, node)
+        order = np.lexsort((squared, query))
+        first = order[np.r_[True, query[order][1:] != query[order][:-1]]]
+        closest = np.full((len(points), 3), np.nan)
+        distance = np.full(len(points), np.inf)
+        hit = np.full(len(points), -1, dtype=np.int64)
+        closest[query[first]] = candidate[first]
+        distance[query[first]] = np.sqrt(squared[first])
+        hit[query[first]] = self.order[triangle[first]]
+        return closest, distance, hit
+
+
+def _closest_on_segments(points, a, b):
+    ab = b - a
+    length = np.einsum('ij,ij->i', ab, ab)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.einsum('ij,ij->i', points - a, ab) / length, 0.0, 1.0)
+    t = np.where(length > 0, t, 0.0)
+    return a + t[:, None] * ab
+
+
+def closest_point_on_triangles(points, triangles):
+    """
+    Closest point of triangle i to point i, vectorized.
+
+    Si la proyección sobre el plano cae dentro del triángulo es la solución;
+    si no, el punto más cercano está en uno de los tres lados.
+    """
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    ab, ac, ap = b - a, c - a, points - a
+    d00 = np.einsum('ij,ij->i', ab, ab)
+    d01 = np.einsum('ij,ij->i', ab, ac)
+    d11 = np.einsum('ij,ij->i', ac, ac)
+    d20 = np.einsum('ij,ij->i', ap, ab)
+    d21 = np.einsum('ij,ij->i', ap, ac)
+    denominator = d00 * d11 - d01 * d01
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v = (d11 * d20 - d01 * d21) / denominator
+        w = (d00 * d21 - d01 * d20) / denominator
+    inside = (denominator > 0) & (v >= 0) & (w >= 0) & (v + w <= 1)
+    result = a + np.where(inside, v, 0.0)[:, None] * ab + np.where(inside, w, 0.0)[:, None] * ac
+
+    outside = np.flatnonzero(~inside)
+    if len(outside):
+        p = points[outside]
+        edges = [_closest_on_segments(p, x[outside], y[outside]) for x, y in ((a, b), (b, c), (c, a))]
+        squared = np.stack([np.einsum('ij,ij->i', e - p, e - p) for e in edges], axis=1)
+        best = np.argmin(squared, axis=1)
+        result[outside] = np.stack(edges, axis=1)[np.arange(len(outside)), best]
+    return result
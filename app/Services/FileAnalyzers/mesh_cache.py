@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Caché de mallas preprocesadas: puntos exactos, vértices soldados, caras, normales, áreas, topología, shells y bbox
+Se escribe una vez al ingerir o analizar el archivo (o en backfill) y las etapas siguientes la abren
+con np.memmap sin volver a leer el STL; las previews solo la leen si ya existe
+
+Uso:
+    python mesh_cache.py modelo.stl            # construir (o reutilizar) y mostrar la cabecera
+    python mesh_cache.py modelo.stl --verify   # comprobar además los checksums de los datos
+    python mesh_cache.py --prune               # borrar entradas de archivos borrados o modificados
+    python mesh_cache.py --prune --max-bytes=10000000000   # y las menos usadas hasta caber
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import struct
+import zlib
+import hashlib
+import tempfile
+
+import numpy as np
+
+import metrics
+import mesh_topology
+from portable_config import get_config
+from analyze_stl import read_binary_stl, read_ascii_stl
+
+MAGIC = b'PLXMESH\x00'
+FORMAT_VERSION = 2
+EXTENSION = '.plxmesh'
+
+# Cabecera fija: magia, versión, longitud y CRC32 de los metadatos JSON
+PREFIX = struct.Struct('<8sIII')
+
+# Cada array empieza en un múltiplo de 64 bytes (línea de caché, válido para memmap)
+ALIGNMENT = 64
+
+# Directorio de la caché (variable de entorno o storage/app/mesh_cache)
+CACHE_DIR = os.environ.get('POLLUX_MESH_CACHE_DIR') or get_config().get_storage_path('mesh_cache')
+
+# Tamaño máximo de la caché para --prune (0 = sin límite, solo se borran las entradas huérfanas)
+MAX_BYTES = int(os.environ.get('POLLUX_MESH_CACHE_MAX_BYTES', '0'))
+
+# Temporales de escrituras interrumpidas que --prune puede borrar (segundos)
+STALE_TMP_SECONDS = 3600
+
+# points/corners: triángulos originales sin repetir puntos idénticos (exactos);
+# vertices/faces: la malla soldada con la que se calcula la topología
+ARRAYS = {
+    'points': np.float32,
+    'corners': np.uint32,
+    'vertices': np.float32,
+    'faces': np.uint32,
+    'normals': np.float32,
+    'areas': np.float32,
+}
+
+# Un STL binario ya trae float32; las coordenadas de un ASCII se guardan en
+# float64 para que los resultados coincidan con los de leer el archivo
+SOURCE_COORDINATE_DTYPES = {'binary': np.float32}
+
+
+class MeshCacheError(Exception):
+    """The cache file is missing pieces, corrupt or from another format version"""
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _dtypes(source_format):
+    coordinates = SOURCE_COORDINATE_DTYPES.get(source_format, np.float64)
+    return dict(ARRAYS, points=coordinates, vertices=coordinates)
+
+
+def _source_stat(source_path):
+    stat = os.stat(source_path)
+    return {'path': os.path.abspath(source_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def cache_path(source_path, cache_dir=None):
+    """Cache file for the current version (size, mtime) of `source_path`"""
+    source = _source_stat(source_path)
+    key = hashlib.sha1(source['path'].encode('utf-8')).hexdigest()
+    # El tamaño y el mtime van en el nombre: en Windows no se puede sustituir un archivo mapeado
+    return os.path.join(cache_dir or CACHE_DIR, key[:2], f"{key}.{source['size']}.{source['mtime_ns']}{EXTENSION}")
+
+
+def read_meta(path):
+    """Header metadata of a cache file (checked, without mapping the arrays)"""
+    with open(path, 'rb') as f:
+        prefix = f.read(PREFIX.size)
+        if len(prefix) < PREFIX.size:
+            raise MeshCacheError(f"Truncated mesh cache: {path}")
+        magic, version, meta_length, meta_crc = PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise MeshCacheError(f"Not a mesh cache file: {path}")
+        if version != FORMAT_VERSION:
+            raise MeshCacheError(f"Mesh cache version {version} (expected {FORMAT_VERSION})")
+        raw = f.read(meta_length)
+    if len(raw) != meta_length or zlib.crc32(raw) != meta_crc:
+        raise MeshCacheError(f"Corrupt mesh cache header: {path}")
+    return json.loads(raw)
+
+
+class MeshCache:
+    """
+    Malla preprocesada. Los arrays son np.memmap de solo lectura cuando se
+    abre desde disco (o arrays normales si no se pudo escribir la caché).
+    """
+
+    def __init__(self, meta, arrays, path=None):
+        self.meta = meta
+        self.path = path
+        self.points = arrays['points']
+        self.corners = arrays['corners']
+        self.vertices = arrays['vertices']
+        self.faces = arrays['faces']
+        self.normals = arrays['normals']
+        self.areas = arrays['areas']
+
+    @classmethod
+    def open(cls, path):
+        """Map a cache file (header checked, data not read)"""
+        meta = read_meta(path)
+
+        size = os.path.getsize(path)
+        arrays = {}
+        for name, dtype in _dtypes(meta['source']['format']).items():
+            spec = meta['arrays'][name]
+            if np.dtype(spec['dtype']) != np.dtype(dtype):
+                raise MeshCacheError(f"Unexpected {name} dtype {spec['dtype']}: {path}")
+            shape = tuple(spec['shape'])
+            if spec['offset'] + int(np.prod(shape)) * np.dtype(dtype).itemsize > size:
+                raise MeshCacheError(f"Truncated mesh cache: {path}")
+            if np.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=spec['offset'], shape=shape)
+        return cls(meta, arrays, path)
+
+    @property
+    def source(self):
+        return self.meta['source']
+
+    @property
+    def topology(self):
+        return self.meta['topology']
+
+    @property
+    def shells(self):
+        return self.meta['shells']
+
+    @property
+    def boundary_length(self):
+        return self.meta['boundary_length']
+
+    @property
+    def bbox(self):
+        return np.array(self.meta['bbox']['min']), np.array(self.meta['bbox']['max'])
+
+    def verify(self):
+        """Check the CRC32 of every array (reads the whole file)"""
+        for name, spec in self.meta['arrays'].items():
+            data = np.ascontiguousarray(getattr(self, name))
+            if zlib.crc32(data.view(np.uint8)) != spec['crc32']:
+                raise MeshCacheError(f"Checksum mismatch in {name}: {self.path}")
+        return True
+
+    def triangles(self, dtype=np.float64):
+        """(n, 3, 3) triangle array, identical to the one parsed from the file"""
+        return self.points[self.corners].astype(dtype, copy=False)
+
+    def topology_mesh(self):
+        """MeshTopology over the cached welding (no welding pass)"""
+        return mesh_topology.MeshTopology(self.vertices.astype(np.float64), self.faces.astype(np.int64))
+
+
+def write(path, meta, arrays):
+    """Write the container atomically (temporary file + os.replace)"""
+    arrays = {name: np.ascontiguousarray(arrays[name], dtype=dtype)
+              for name, dtype in _dtypes(meta['source']['format']).items()}
+
+    # Los offsets dependen de la longitud de los metadatos y viceversa: se fijan
+    # con un hueco de sobra para los números
+    specs = {name: {'offset': 0, 'dtype': np.dtype(array.dtype).str, 'shape': list(array.shape),
+                    'crc32': zlib.crc32(array.view(np.uint8))}
+             for name, array in arrays.items()}
+    meta = dict(meta, arrays=specs)
+    reserve = len(json.dumps(meta).encode('utf-8')) + 32 * len(specs)
+    offset = _align(PREFIX.size + reserve)
+    for name, array in arrays.items():
+        specs[name]['offset'] = offset
+        offset = _align(offset + array.nbytes)
+    raw = json.dumps(meta).encode('utf-8')
+    assert len(raw) <= reserve
+    raw = raw.ljust(reserve)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(raw), zlib.crc32(raw)))
+            f.write(raw)
+            for name, array in arrays.items():
+                f.seek(specs[name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def unique_points(points):
+    """(unique, inverse) over bit-identical rows (no tolerance)"""
+    points = np.ascontiguousarray(points)
+    rows = points.view(np.dtype((np.void, points.dtype.itemsize * 3))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return points[first], inverse.reshape(-1)
+
+
+def preprocess(triangles, coordinate_dtype=np.float64):
+    """Exact points, welded mesh, face normals and areas plus topology stats, shells and bbox"""
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    # Se guardan todas las caras (también las degeneradas) para conservar el número de triángulos
+    vertices, faces = mesh_topology.weld(triangles)
+    mesh = mesh_topology.MeshTopology(vertices, faces)
+    unique, inverse = unique_points(triangles.reshape(-1, 3).astype(coordinate_dtype))
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(cross, axis=1)
+    points = triangles.reshape(-1, 3)
+    return {
+        'points': unique,
+        'corners': inverse.reshape(-1, 3),
+        'vertices': vertices,
+        'faces': faces,
+        'normals': cross / np.where(lengths > 0, lengths, 1.0)[:, None],
+        'areas': 0.5 * lengths,
+    }, {
+        'topology': mesh.stats(),
+        'shells': mesh.shells(),
+        'bbox': {'min': points.min(axis=0).tolist(), 'max': points.max(axis=0).tolist()},
+        'boundary_length': mesh.boundary_length(),
+    }
+
+
+def build(source_path, triangles=None, source_format=None, cache_dir=None):
+    """
+    Parse (unless `triangles` is given), preprocess and write the cache.
+
+    Si no se puede escribir (disco lleno, directorio de solo lectura) se
+    devuelve la malla en memoria igualmente.
+    """
+    source = _source_stat(source_path)
+    if triangles is None:
+        with metrics.stage('parse', 'stl', source['size']):
+            triangles, source_format = read_binary_stl(source_path)
+            if triangles is None:
+                triangles, source_format = read_ascii_stl(source_path)
+        if triangles is None or len(triangles) == 0:
+            raise ValueError("No valid triangles found in STL file")
+
+    dtypes = _dtypes(source_format)
+    with metrics.stage('mesh', 'stl', source['size']):
+        arrays, derived = preprocess(triangles, dtypes['points'])
+    meta = dict(derived, source=dict(source, format=source_format),
+                counts={name: len(arrays[name]) for name in ('points', 'vertices', 'faces')},
+                weld_relative_tolerance=mesh_topology.WELD_RELATIVE_TOLERANCE,
+                created_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+    path = cache_path(source_path, cache_dir)
+    try:
+        write(path, meta, arrays)
+    except OSError:
+        return MeshCache(dict(meta, arrays={}), {name: arrays[name].astype(dtype) for name, dtype in dtypes.items()})
+    # Versiones anteriores del mismo archivo (el mapeo de otro proceso puede impedir borrarlas)
+    key = os.path.basename(path).split('.', 1)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{key}.*{EXTENSION}")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return MeshCache.open(path)
+
+
+def load(source_path, cache_dir=None):
+    """Cached mesh for the current version of `source_path`, or None"""
+    path = cache_path(source_path, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        cached = MeshCache.open(path)
+    except (MeshCacheError, OSError, ValueError, KeyError):
+        return None
+    source = _source_stat(source_path)
+    if any(cached.source.get(key) != source[key] for key in ('path', 'size', 'mtime_ns')):
+        return None
+    return cached
+
+
+def load_or_build(source_path, triangles=None, source_format=None, cache_dir=None):
+    """(MeshCache, hit): open the cache or build it on the first use of the file"""
+    cached = load(source_path, cache_dir)
+    metrics.cache_lookup('mesh_cache', hit=cached is not None)
+    if cached is not None:
+        return cached, True
+    return build(source_path, triangles, source_format, cache_dir), False
+
+
+def load_triangles(source_path, dtype=np.float64, cache_dir=None):
+    """
+    (triangles, source_format) of an STL: from the cache if it exists, else parsed.
+
+    Para las peticiones (previews, consultas de geometría): un fallo de caché
+    no la construye, porque soldar y escribir la malla cuesta mucho más que
+    leer el STL para una sola vista. La caché se crea al analizar o en backfill.
+    """
+    cached = load(source_path, cache_dir)
+    metrics.cache_lookup('mesh_cache', hit=cached is not None)
+    if cached is not None:
+        return cached.triangles(dtype), cached.source['format']
+    with metrics.stage('parse', 'stl', os.path.getsize(source_path)):
+        triangles, source_format = read_binary_stl(source_path)
+        if triangles is None:
+            triangles, source_format = read_ascii_stl(source_path)
+    if triangles is None or len(triangles) == 0:
+        raise ValueError("No valid triangles found in STL file")
+    return np.asarray(triangles, dtype=dtype), source_format
+
+
+def prune(cache_dir=None, max_bytes=None):
+    """
+    Delete entries whose source file is gone or changed, then the least
+    recently used ones (by access time) until the cache fits in `max_bytes`.
+
+    Un archivo que otro proceso tiene mapeado (Windows) no se puede borrar:
+    se deja para la siguiente pasada.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    result = {'removed_orphaned': 0, 'removed_evicted': 0, 'kept': 0, 'bytes': 0}
+
+    def remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    kept = []
+    now = time.time()
+    for path in glob.glob(os.path.join(cache_dir, '*', '*')):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if path.endswith('.tmp'):
+            if now - stat.st_mtime > STALE_TMP_SECONDS:
+                remove(path)
+            continue
+        if not path.endswith(EXTENSION):
+            continue
+        try:
+            source = read_meta(path)['source']
+            # Leer la cabecera no cuenta como uso: se conserva el tiempo de acceso para el LRU
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            current = _source_stat(source['path'])
+            orphaned = (current['size'] != source['size'] or current['mtime_ns'] != source['mtime_ns']
+                        or cache_path(source['path'], cache_dir) != path)
+        except (MeshCacheError, OSError, ValueError, KeyError):
+            orphaned = True
+        if orphaned:
+            result['removed_orphaned'] += remove(path)
+        else:
+            kept.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in kept)
+    if max_bytes:
+        for _, size, path in sorted(kept):
+            if total <= max_bytes:
+                break
+            if remove(path):
+                total -= size
+                result['removed_evicted'] += 1
+    result['kept'] = len(kept) - result['removed_evicted']
+    result['bytes'] = total
+    return result
+
+
+def main():
+    if '--prune' in sys.argv:
+        limits = [a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--max-bytes=')]
+        print(json.dumps(prune(max_bytes=int(limits[0]) if limits else None), indent=2))
+        return 0
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print("Usage: python mesh_cache.py <stl_file> [--verify] | --prune [--max-bytes=N]", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    cached, hit = load_or_build(args[0])
+    if '--verify' in sys.argv:
+        cached.verify()
+    print(json.dumps({
+        'cache_path': cached.path,
+        'hit': hit,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        **{key: value for key, value in cached.meta.items() if key != 'topology'},
+        'topology': cached.topology,
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Topología de mallas trianguladas vectorizada con numpy
+Soldadura de vértices, multiplicidad de aristas, estanqueidad, variedad,
+orientación, característica de Euler y género sin bucles por triángulo
+"""
+
+import numpy as np
+
+# Un shell es residuo si tiene menos triángulos que esto (no puede cerrar un volumen)
+# o un área menor que esta fracción de la del shell más grande
+DEBRIS_MIN_TRIANGLES = 4
+DEBRIS_MAX_AREA_RATIO = 0.001
+
+# Shells listados con detalle en el resultado (los mayores por área)
+MAX_LISTED_SHELLS = 100
+
+# Tolerancia de soldadura relativa a la diagonal del bbox
+WELD_RELATIVE_TOLERANCE = 1e-6
+
+# Pares de puntos comparados por lote entre celdas vecinas
+WELD_PAIR_BATCH = 1 << 22
+
+_CELL_BITS = 21
+_MAX_CELLS = 2 ** 20
+_NEIGHBOUR_OFFSETS = [
+    (dx, dy, dz)
+    for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+    if (dx, dy, dz) > (0, 0, 0)
+]
+
+
+def _group(keys):
+    """(order, starts): permutación que ordena `keys` y máscara del primero de cada grupo"""
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = np.empty(len(keys), dtype=bool)
+    starts[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=starts[1:])
+    return order, starts
+
+
+def _inverse(order, starts):
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    return inverse
+
+
+def _cell_pairs(first, count, a, b):
+    """
+    Every (point, point) pair between the cells `a` and `b` (arrays of cell
+    indices), as positions in the cell-sorted point order.
+    """
+    sizes = count[a] * count[b]
+    owner = np.repeat(np.arange(len(a)), sizes)
+    local = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    width = count[b][owner]
+    return owner, first[a][owner] + local // width, first[b][owner] + local % width
+
+
+def weld_points(points, tolerance=None):
+    """
+    Merge points closer than `tolerance` and return (vertices, remap).
+
+    `remap[i]` es el índice en `vertices` del punto i. La tolerancia por
+    defecto es WELD_RELATIVE_TOLERANCE por la diagonal del bbox. Los puntos
+    se agrupan en celdas de lado `tolerance` empaquetadas en una clave int64
+    (21 bits por eje); los de una misma celda se sueldan y, entre celdas
+    vecinas, se comparan todos los pares de puntos, de modo que dos puntos a
+    ambos lados del borde de una celda también se sueldan.
+
+    Raises ValueError when `tolerance` is below diagonal / 2**20, the finest
+    grid the packed key can address.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) == 0:
+        return np.empty((0, 3)), np.empty(0, dtype=np.int64)
+
+    origin = points.min(axis=0)
+    diagonal = float(np.linalg.norm(points.max(axis=0) - origin))
+    # Con menos de 2**20 celdas por eje la clave empaquetada no se desborda
+    floor = max(diagonal / _MAX_CELLS, np.finfo(np.float64).tiny)
+    if tolerance is None:
+        tolerance = max(diagonal * WELD_RELATIVE_TOLERANCE, floor)
+    elif float(tolerance) < floor:
+        raise ValueError(f"Weld tolerance {tolerance:g} is below the grid resolution "
+                         f"{floor:g} (bbox diagonal / {_MAX_CELLS})")
+    tolerance = float(tolerance)
+
+    # Celda de cada punto (+1 para que las vecinas no bajen de 0)
+    cells = np.floor((points - origin) / tolerance).astype(np.int64) + 1
+    keys = (cells[:, 0] << 2 * _CELL_BITS) | (cells[:, 1] << _CELL_BITS) | cells[:, 2]
+    order, starts = _group(keys)
+    cell_keys = keys[order[starts]]
+    cell_of_point = _inverse(order, starts)
+    first = np.flatnonzero(starts)
+    count = np.diff(first, append=len(order))
+    sorted_points = points[order]
+
+    # Celdas vecinas ocupadas (13 desplazamientos: la mitad de los 26, cada par una vez);
+    # se unen si algún punto de una está a menos de `tolerance` de alguno de la otra
+    pairs = []
+    for dx, dy, dz in _NEIGHBOUR_OFFSETS:
+        neighbour = cell_keys + ((dx << 2 * _CELL_BITS) + (dy << _CELL_BITS) + dz)
+        index = np.minimum(np.searchsorted(cell_keys, neighbour), len(cell_keys) - 1)
+        found = np.flatnonzero(cell_keys[index] == neighbour)
+        if len(found) == 0:
+            continue
+        total = np.cumsum(count[found] * count[index[found]])
+        bounds = np.searchsorted(total, np.arange(0, total[-1], WELD_PAIR_BATCH), side='right')
+        for lo, hi in zip(bounds, np.append(bounds[1:], len(found))):
+            a, b = found[lo:hi], index[found[lo:hi]]
+            owner, i, j = _cell_pairs(first, count, a, b)
+            close = np.linalg.norm(sorted_points[i] - sorted_points[j], axis=1) <= tolerance
+            linked = np.unique(owner[close])
+            pairs.append(np.stack([a[linked], b[linked]], axis=1))
+
+    representatives = sorted_points[first]
+    if pairs:
+        pairs = np.concatenate(pairs)
+    if len(pairs) == 0:
+        return representatives, cell_of_point
+
+    labels, components = connected_components(len(cell_keys), pairs)
+    first_cell = np.full(components, len(cell_keys), dtype=np.int64)
+    np.minimum.at(first_cell, labels, np.arange(len(cell_keys)))
+    return representatives[first_cell], labels[cell_of_point]
+
+
+def weld(triangles, tolerance=None):
+    """
+    Merge coincident vertices of a (n, 3, 3) triangle array.
+
+    Returns (vertices (k, 3), faces (n, 3) int64); see weld_points for the
+    tolerance.
+    """
+    vertices, remap = weld_points(np.asarray(triangles).reshape(-1, 3), tolerance)
+    return vertices, remap.reshape(-1, 3)
+
+
+def connected_components(count, pairs):
+    """
+    Label the connected components of a graph with `count` nodes.
+
+    `pairs` is an (m, 2) array of node indices. Union-find por arrays:
+    en cada ronda cada raíz se engancha a la menor raíz vecina y después
+    se comprimen los caminos saltando punteros. Returns (labels, components)
+    with labels numbered 0..components-1 in order of first node.
+    """
+    parent = np.arange(count, dtype=np.int64)
+    a = np.asarray(pairs[:, 0], dtype=np.int64)
+    b = np.asarray(pairs[:, 1], dtype=np.int64)
+    while len(a):
+        root_a, root_b = parent[a], parent[b]
+        active = root_a != root_b
+        if not active.any():
+            break
+        a, b = a[active], b[active]
+        low = np.minimum(root_a[active], root_b[active])
+        high = np.maximum(root_a[active], root_b[active])
+        np.minimum.at(parent, high, low)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    _, labels = np.unique(parent, return_inverse=True)
+    return labels, int(labels.max()) + 1 if count else 0
+
+
+class MeshTopology:
+    """Tabla de aristas de una malla soldada y las estadísticas derivadas"""
+
+    def __init__(self, vertices, faces):
+        self.vertices = vertices
+        faces = np.asarray(faces, dtype=np.int64)
+
+        # Triángulos con vértices repetidos tras soldar no aportan aristas
+        degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+        self.degenerate_faces = int(degenerate.sum())
+        self.faces = faces[~degenerate]
+
+        # Semiaristas (a->b) de cada cara y su arista no dirigida como clave int64
+        half_edges = self.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        low = half_edges.min(axis=1)
+        high = half_edges.max(axis=1)
+        stride = np.int64(max(len(vertices), 1))
+        keys = low * stride + high
+        order, starts = _group(keys)
+        first = np.flatnonzero(starts)
+        keys = keys[order[first]]
+        self.half_edge_index = _inverse(order, starts)
+        self.edge_counts = np.diff(first, append=len(order))
+        self._half_edge_order = order
+        self._half_edge_starts = starts
+        self.edges = np.stack([keys // stride, keys % stride], axis=1)
+
+        # Una arista interior bien orientada se recorre una vez en cada sentido
+        forward = np.bincount(self.half_edge_index, weights=half_edges[:, 0] < half_edges[:, 1],
+                              minlength=len(keys))
+        self._inconsistent = (self.edge_counts == 2) & (forward != 1)
+
+    @classmethod
+    def from_triangles(cls, triangles, tolerance=None):
+        vertices, faces = weld(triangles, tolerance)
+        return cls(vertices, faces)
+
+    @property
+    def boundary_edges(self):
+        """(k, 2) vertex indices of edges used by a single face"""
+        return self.edges[self.edge_counts == 1]
+
+    def boundary_length(self):
+        edges = self.boundary_edges
+        return float(np.linalg.norm(self.vertices[edges[:, 1]] - self.vertices[edges[:, 0]], axis=1).sum())
+
+    def face_components(self):
+        """
+        (labels, count): shell of each (non-degenerate) face.
+
+        Dos caras son adyacentes si comparten una arista soldada; las
+        semiaristas ya están ordenadas por arista, así que cada par de
+        semiaristas consecutivas de la misma arista es un enlace del grafo.
+        """
+        order = self._half_edge_order
+        same_edge = ~self._half_edge_starts[1:]
+        pairs = np.stack([order[:-1][same_edge], order[1:][same_edge]], axis=1) // 3
+        return connected_components(len(self.faces), pairs)
+
+    def shells(self, max_listed=MAX_LISTED_SHELLS):
+        """
+        Per-shell triangle count, area, volume, bbox and watertightness.
+
+        Los shells se listan de mayor a menor área; los residuos (pocos
+        triángulos o área despreciable) se marcan con `debris`. Un shell
+        abierto (con aristas de borde) no encierra volumen: `volume` es None.
+        """
+        labels, count = self.face_components()
+        if count == 0:
+            return {"count": 0, "debris": 0, "watertight": 0, "listed": 0, "shells": []}
+
+        corners = self.vertices[self.faces]
+        cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        area = np.bincount(labels, weights=0.5 * np.linalg.norm(cross, axis=1), minlength=count)
+        volume = np.bincount(labels, weights=np.einsum('ij,ij->i', corners[:, 0], cross) / 6.0, minlength=count)
+        triangles = np.bincount(labels, minlength=count)
+
+        # Aristas de borde por shell (la cara de su única semiarista)
+        single = self._half_edge_order[self._half_edge_starts][self.edge_counts == 1] // 3
+        open_edges = np.bincount(labels[single], minlength=count)
+
+        # bbox por shell: caras ordenadas por etiqueta y reduceat
+        by_shell = np.argsort(labels, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(labels[by_shell]) != 0])
+        bbox_min = np.minimum.reduceat(corners.min(axis=1)[by_shell], starts)
+        bbox_max = np.maximum.reduceat(corners.max(axis=1)[by_shell], starts)
+
+        debris = (triangles < DEBRIS_MIN_TRIANGLES) | (area < area.max() * DEBRIS_MAX_AREA_RATIO)
+        listed = np.argsort(-area, kind='stable')[:max_listed]
+        return {
+            "count": int(count),
+            "debris": int(debris.sum()),
+            "watertight": int(np.count_nonzero(open_edges == 0)),
+            "listed": int(len(listed)),
+            "shells": [
+                {
+                    "id": int(i),
+                    "triangles": int(triangles[i]),
+                    "area": round(float(area[i]), 6),
+                    "volume": round(abs(float(volume[i])), 6) if open_edges[i] == 0 else None,
+                    "bounding_box": {
+                        "min": [float(x) for x in bbox_min[i]],
+                        "max": [float(x) for x in bbox_max[i]]
+                    },
+                    "is_watertight": bool(open_edges[i] == 0),
+                    "boundary_edges": int(open_edges[i]),
+                    "debris": bool(debris[i])
+                }
+                for i in listed
+            ]
+        }
+
+    def stats(self):
+        counts = self.edge_counts
+        boundary = int(np.count_nonzero(counts == 1))
+        manifold = int(np.count_nonzero(counts == 2))
+        non_manifold = int(np.count_nonzero(counts > 2))
+        inconsistent = int(np.count_nonzero(self._inconsistent))
+
+        # Vértices realmente usados y sus componentes conexas (vía aristas)
+        used = np.flatnonzero(np.bincount(self.faces.ravel(), minlength=len(self.vertices)))
+        remap = np.full(len(self.vertices), -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        _, components = connected_components(len(used), remap[self.edges])
+
+        # Agujeros: componentes de los vértices del borde conectados por aristas de borde
+        loops = 0
+        if boundary:
+            boundary_edges = self.boundary_edges
+            boundary_vertices, local = np.unique(boundary_edges, return_inverse=True)
+            _, loops = connected_components(len(boundary_vertices), local.reshape(-1, 2))
+
+        euler = int(len(used) - len(self.edges) + len(self.faces))
+        closed = boundary == 0 and non_manifold == 0 and len(self.faces) > 0
+        # g = (2C - χ) / 2, solo definido para superficies cerradas orientables
+        genus = (2 * components - euler) // 2 if closed and inconsistent == 0 else None
+
+        return {
+            "triangles": int(len(self.faces) + self.degenerate_faces),
+            "degenerate_triangles": self.degenerate_faces,
+            "vertices": int(len(used)),
+            "edges": int(len(self.edges)),
+            "boundary_edges": boundary,
+            "manifold_edges": manifold,
+            "non_manifold_edges": non_manifold,
+            "inconsistent_edges": inconsistent,
+            "boundary_loops": int(loops),
+            "components": int(components),
+            "euler_characteristic": euler,
+            "genus": genus,
+            "is_watertight": boundary == 0 and len(self.faces) > 0,
+            "is_manifold": non_manifold == 0,
+            "is_consistently_oriented": inconsistent == 0,
+        }
+
+
+def analyze(triangles, tolerance=None):
+    """Topology statistics for a (n, 3, 3) triangle array"""
+    return MeshTopology.from_triangles(triangles, tolerance).stats()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Métricas de latencia por etapa para analizadores y servidores de preview
+Histogramas por tipo de archivo y tamaño, exportados en formato Prometheus
+"""
+
+import os
+import json
+import math
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+# Etapas del pipeline y sus alias (los nombres de progreso de la cola de trabajos)
+STAGES = ('read', 'parse', 'mesh', 'analyze', 'render', 'encode')
+STAGE_ALIASES = {
+    'reading': 'read',
+    'parsing': 'parse',
+    'meshing': 'mesh',
+    'tessellating': 'mesh',
+    'analyzing': 'analyze',
+    'rendering': 'render',
+    'encoding': 'encode',
+}
+
+# Límites de los histogramas de duración (segundos)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+# Tramos de tamaño de archivo usados como etiqueta
+SIZE_BUCKETS = (
+    (1024 * 1024, '<1MB'),
+    (10 * 1024 * 1024, '1-10MB'),
+    (100 * 1024 * 1024, '10-100MB'),
+    (1024 * 1024 * 1024, '100MB-1GB'),
+    (math.inf, '>1GB'),
+)
+
+STAGE_HISTOGRAM = 'pollux_stage_duration_seconds'
+HTTP_HISTOGRAM = 'pollux_http_request_duration_seconds'
+
+# Content-Type del formato de texto de Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Directorio donde los procesos sin /metrics propio (workers del pool, backfill, analizadores
+# lanzados por Laravel) dejan sus métricas; el servidor híbrido las suma al exponerlas
+SPOOL_DIR = os.environ.get('POLLUX_METRICS_SPOOL_DIR')
+
+
+def size_bucket(size):
+    """Label for a file size in bytes"""
+    if size is None:
+        return 'unknown'
+    for limit, label in SIZE_BUCKETS:
+        if size < limit:
+            return label
+    return SIZE_BUCKETS[-1][1]
+
+
+def file_type_label(file_type):
+    return (file_type or 'unknown').lower().lstrip('.')
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Histogramas, contadores y gauges en memoria (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._histograms = {}   # nombre -> {labels: [cuentas por bucket, suma, total]}
+        self._buckets = {}
+        self._counters = {}     # nombre -> {labels: valor}
+        self._gauges = {}       # nombre -> función que devuelve [(labels, valor)]
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._buckets.setdefault(name, tuple(buckets))
+            self._histograms.setdefault(name, {})
+
+    def counter(self, name, help_text):
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._counters.setdefault(name, {})
+
+    def gauge(self, name, help_text, collect):
+        """Register a gauge whose `collect()` returns a number or [(labels, value)]"""
+        with self._lock:
+            self._help[name] = help_text
+            self._gauges[name] = collect
+
+    def observe(self, name, value, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            buckets = self._buckets[name]
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def drain(self):
+        """Take and reset the histograms and counters (to ship them to another process)"""
+        with self._lock:
+            snapshot = {
+                'histograms': {name: dict(series) for name, series in self._histograms.items() if series},
+                'counters': {name: dict(series) for name, series in self._counters.items() if series},
+            }
+            for series in self._histograms.values():
+                series.clear()
+            for series in self._counters.values():
+                series.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a snapshot produced by `drain()` in another process"""
+        if not snapshot:
+            return
+        with self._lock:
+            for name, series in snapshot.get('histograms', {}).items():
+                target = self._histograms.get(name)
+                if target is None:
+                    continue
+                for key, (counts, total, count) in series.items():
+                    current = target.setdefault(key, [[0] * len(counts), 0.0, 0])
+                    current[0] = [a + b for a, b in zip(current[0], counts)]
+                    current[1] += total
+                    current[2] += count
+            for name, series in snapshot.get('counters', {}).items():
+                target = self._counters.get(name)
+                if target is None:
+                    continue
+                for key, value in series.items():
+                    target[key] = target.get(key, 0) + value
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels_key(labels), 0)
+
+    def render(self):
+        """Exposition text format (version 0.0.4) for Prometheus"""
+        lines = []
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = dict(self._gauges)
+
+        for name in sorted(histograms):
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            buckets = self._buckets[name]
+            for key, (counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == math.inf else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        for name in sorted(counters):
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {value}")
+
+        for name in sorted(gauges):
+            try:
+                values = gauges[name]()
+            except Exception:
+                continue
+            if not isinstance(values, list):
+                values = [({}, values)]
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                lines.append(f"{name}{_format_labels(_labels_key(labels))} {float(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    pairs = []
+    for k, v in key:
+        v = v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{k}="{v}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _encode_snapshot(snapshot):
+    """JSON-friendly snapshot: label keys become dicts"""
+    return {
+        'histograms': {name: [[dict(key), counts, total, count] for key, (counts, total, count) in series.items()]
+                       for name, series in snapshot['histograms'].items()},
+        'counters': {name: [[dict(key), value] for key, value in series.items()]
+                     for name, series in snapshot['counters'].items()},
+    }
+
+
+def _decode_snapshot(data):
+    return {
+        'histograms': {name: {_labels_key(labels): (counts, total, count) for labels, counts, total, count in series}
+                       for name, series in data.get('histograms', {}).items()},
+        'counters': {name: {_labels_key(labels): value for labels, value in series}
+                     for name, series in data.get('counters', {}).items()},
+    }
+
+
+registry = Registry()
+registry.histogram(STAGE_HISTOGRAM, 'Time spent per pipeline stage (read, parse, mesh, analyze, render, encode)')
+registry.histogram(HTTP_HISTOGRAM, 'HTTP request latency by route and status code')
+registry.counter('pollux_cache_requests_total', 'Cache lookups by cache and result (hit/miss)')
+
+
+def _cache_hit_ratios():
+    with registry._lock:
+        series = dict(registry._counters['pollux_cache_requests_total'])
+    totals = {}
+    for key, value in series.items():
+        labels = dict(key)
+        hits, count = totals.get(labels.get('cache'), (0, 0))
+        totals[labels.get('cache')] = (hits + (value if labels.get('result') == 'hit' else 0), count + value)
+    return [({'cache': cache}, hits / count) for cache, (hits, count) in sorted(totals.items()) if count]
+
+
+registry.gauge('pollux_cache_hit_ratio', 'Cache hit ratio since start', _cache_hit_ratios)
+
+
+def cache_lookup(cache, hit):
+    """Record a cache hit or miss"""
+    registry.inc('pollux_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+def observe_request(method, route, status_code, seconds):
+    """Record one HTTP request (use the route template, not the raw path)"""
+    registry.observe(HTTP_HISTOGRAM, seconds, method=method, route=route, status=status_code)
+
+
+def request_count():
+    """Total HTTP requests observed by this process"""
+    with registry._lock:
+        return sum(series[2] for series in registry._histograms[HTTP_HISTOGRAM].values())
+
+
+def observe_stage(stage, seconds, file_type=None, size=None):
+    registry.observe(STAGE_HISTOGRAM, seconds,
+                     stage=STAGE_ALIASES.get(stage, stage),
+                     file_type=file_type_label(file_type),
+                     size_bucket=size_bucket(size))
+    # Cada etapa cerrada sale ya al spool: si el proceso muere (timeout) no se pierde
+    if _spool is not None:
+        flush()
+
+
+_spool = None
+_spool_sequence = 0
+
+
+def spool_dir():
+    if SPOOL_DIR:
+        return SPOOL_DIR
+    from portable_config import get_config
+    return get_config().get_storage_path('metrics_spool')
+
+
+def enable_spool(directory=None):
+    """
+    Ship this process's metrics to the spool directory instead of keeping them.
+
+    Lo usan los procesos que nadie consulta en /metrics; las métricas
+    pendientes se escriben también al salir.
+    """
+    global _spool
+    directory = directory or spool_dir()
+    os.makedirs(directory, exist_ok=True)
+    if _spool is None:
+        atexit.register(flush)
+    _spool = directory
+
+
+def flush():
+    """Write the metrics recorded since the last flush as one spool file (no-op without spool)"""
+    global _spool_sequence
+    directory = _spool
+    if directory is None:
+        return
+    snapshot = registry.drain()
+    if not snapshot['histograms'] and not snapshot['counters']:
+        return
+    with registry._lock:
+        _spool_sequence += 1
+        name = f"{os.getpid()}-{time.time_ns()}-{_spool_sequence}"
+    tmp_path = os.path.join(directory, name + '.tmp')
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_encode_snapshot(snapshot), f)
+        os.replace(tmp_path, os.path.join(directory, name + '.json'))
+    except OSError:
+        # Sin disco: las métricas vuelven al registro y salen en el siguiente flush
+        registry.merge(snapshot)
+
+
+def collect_spool(directory=None):
+    """
+    Merge and delete the spool files left by other processes; returns how many.
+
+    Cada archivo se reclama renombrándolo, así que dos colectores nunca suman
+    el mismo.
+    """
+    directory = directory or spool_dir()
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith('.json'))
+    except OSError:
+        return 0
+    collected = 0
+    claim = f".claimed-{os.getpid()}"
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            os.rename(path, path + claim)
+        except OSError:
+            continue
+        try:
+            with open(path + claim, encoding='utf-8') as f:
+                registry.merge(_decode_snapshot(json.load(f)))
+            collected += 1
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                os.remove(path + claim)
+            except OSError:
+                pass
+    return collected
+
+
+class Timeline:
+    """Cronómetro de etapas consecutivas: cada `mark()` cierra la anterior"""
+
+    def __init__(self, file_type=None, size=None):
+        self.file_type = file_type
+        self.size = size
+        self.stages = {}
+        self._current = None
+        self._started = None
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self._close(now)
+        self._current = STAGE_ALIASES.get(stage, stage)
+        self._started = now
+
+    def close(self):
+        self._close(time.perf_counter())
+        self._current = None
+
+    def _close(self, now):
+        if self._current is None:
+            return
+        elapsed = now - self._started
+        self.stages[self._current] = self.stages.get(self._current, 0.0) + elapsed
+        observe_stage(self._current, elapsed, self.file_type, self.size)
+
+    def as_ms(self):
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+
+
+_local = threading.local()
+
+
+@contextmanager
+def timeline(file_type=None, file_path=None, size=None):
+    """Activate a Timeline for the current thread; `mark()` calls inside feed it"""
+    if size is None and file_path:
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = None
+    current = Timeline(file_type, size)
+    previous = getattr(_local, 'timeline', None)
+    _local.timeline = current
+    try:
+        yield current
+    finally:
+        current.close()
+        _local.timeline = previous
+
+
+@contextmanager
+def script_timeline(file_path):
+    """Timeline of an analyzer run as a one-shot script: its stages go to the spool"""
+    enable_spool()
+    with timeline(os.path.splitext(file_path)[1], file_path) as current:
+        yield current
+
+
+def mark(stage):
+    """Start a stage in the active timeline (no-op outside a timeline)"""
+    current = getattr(_local, 'timeline', None)
+    if current is not None:
+        current.mark(stage)
+
+
+@contextmanager
+def stage(name, file_type=None, size=None):
+    """Time an explicit block as one stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, file_type, size)
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Anidado (nesting) de piezas DXF en chapa: bottom-left-fill sobre una rejilla de ocupación
+Calcula chapas necesarias, aprovechamiento real y retal para los presupuestos de corte
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+
+import numpy as np
+
+# Chapa por defecto (largo x ancho, mm) y separación entre piezas (corte + holgura)
+SHEET_SIZE = (2440.0, 1220.0)
+SPACING = 5.0
+ROTATIONS = (0, 90, 180, 270)
+
+# Resolución de la rejilla: al menos PART_CELLS celdas en el lado menor de la
+# pieza más pequeña, sin pasar de MAX_SHEET_CELLS celdas por chapa
+PART_CELLS = 64
+MAX_SHEET_CELLS = 1 << 20
+
+# Tolerancias de aplanado de curvas y de unión de extremos (mm)
+FLATTEN_TOLERANCE = 0.1
+JOIN_TOLERANCE = 1e-3
+
+MAX_INSTANCES = 5000
+
+# Con `fill` se colocan juegos hasta que no quepa ninguno más; este tope solo
+# evita un bucle sin fin con piezas diminutas y, si se alcanza, se informa (capped)
+MAX_FILL_INSTANCES = 200000
+
+# Hasta este número de piezas en la chapa el mapa de una forma nueva se
+# construye con los núcleos de colisión; con más, con una FFT de la chapa
+KERNEL_MAP_PLACEMENTS = 2000
+
+# Con más piezas distintas el plano es un conjunto, no una pieza: el analizador no anida
+MAX_PART_TYPES = 20
+MAX_LISTED_PLACEMENTS = 500
+
+
+def polygon_area(points):
+    """Signed shoelace area of a closed (k, 2) polygon"""
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def contains(polygon, points):
+    """Even-odd point-in-polygon test of (m, 2) points, vectorized over the edges"""
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    px, py = points[:, 0, None], points[:, 1, None]
+    crosses = (a[:, 1] > py) != (b[:, 1] > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cut = a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return np.count_nonzero(crosses & (px < x_cut), axis=1) % 2 == 1
+
+
+def _join(pieces, tolerance=JOIN_TOLERANCE):
+    """Chain open polylines whose endpoints coincide into closed loops"""
+    ends = {}
+    for index, piece in enumerate(pieces):
+        for side in (0, -1):
+            key = tuple(np.round(piece[side] / tolerance).astype(np.int64))
+            ends.setdefault(key, []).append((index, side))
+
+    used = np.zeros(len(pieces), dtype=bool)
+    loops = []
+    for index in range(len(pieces)):
+        if used[index]:
+            continue
+        used[index] = True
+        chain = [pieces[index]]
+        start_key = tuple(np.round(pieces[index][0] / tolerance).astype(np.int64))
+        while True:
+            key = tuple(np.round(chain[-1][-1] / tolerance).astype(np.int64))
+            if key == start_key:
+                loops.append(np.vstack([c[:-1] for c in chain]))
+                break
+            following = next(((i, side) for i, side in ends.get(key, []) if not used[i]), None)
+            if following is None:
+                break
+            i, side = following
+            used[i] = True
+            chain.append(pieces[i] if side == 0 else pieces[i][::-1])
+    return loops
+
+
+def _entity_paths(entities):
+    import ezdxf.path
+
+    for entity in entities:
+        if entity.dxftype() == 'INSERT':
+            yield from _entity_paths(entity.virtual_entities())
+            continue
+        try:
+            path = ezdxf.path.make_path(entity)
+        except (TypeError, ValueError):
+            continue  # TEXT, DIMENSION, POINT...: no son contornos de corte
+        yield from path.sub_paths()
+
+
+def dxf_loops(msp, tolerance=FLATTEN_TOLERANCE):
+    """Closed (k, 2) polygons of a modelspace: closed entities plus joined LINE/ARC chains"""
+    loops, pieces = [], []
+    for path in _entity_paths(msp):
+        points = np.array([(v.x, v.y) for v in path.flattening(tolerance)], dtype=np.float64)
+        if len(points) < 2:
+            continue
+        if np.linalg.norm(points[0] - points[-1]) <= JOIN_TOLERANCE:
+            if len(points) >= 4:
+                loops.append(points[:-1])
+        else:
+            pieces.append(points)
+    loops.extend(loop for loop in _join(pieces) if len(loop) >= 3)
+    return loops
+
+
+def parts_from_loops(loops, name='part', quantity=1):
+    """
+    Group loops into parts: outline plus holes.
+
+    Cada lazo se asigna al lazo más pequeño que lo contiene; la
+    profundidad par es contorno exterior de una pieza y la impar es un
+    agujero (una isla dentro de un agujero vuelve a ser pieza).
+    """
+    areas = np.array([abs(polygon_area(loop)) for loop in loops])
+    order = np.argsort(-areas, kind='stable')
+    lower = np.array([loop.min(axis=0) for loop in loops]).reshape(-1, 2)
+    upper = np.array([loop.max(axis=0) for loop in loops]).reshape(-1, 2)
+    parent, depth, children = {}, {}, {}
+    for rank, index in enumerate(order):
+        parent[index] = None
+        # Solo los lazos mayores cuyo bbox contiene el primer vértice pueden contenerlo
+        point = loops[index][0]
+        larger = order[:rank]
+        larger = larger[np.all((lower[larger] <= point) & (point <= upper[larger]), axis=1)]
+        for candidate in larger[::-1]:
+            if contains(loops[candidate], loops[index][:1])[0]:
+                parent[index] = candidate
+                children.setdefault(candidate, []).append(index)
+                break
+        depth[index] = 0 if parent[index] is None else depth[parent[index]] + 1
+
+    parts, identical = [], {}
+    for index in order:
+        if depth[index] % 2 == 0 and areas[index] > 0:
+            holes = [loops[h] for h in children.get(index, [])]
+            # Contornos iguales salvo traslación (piezas repetidas en el plano): una sola pieza
+            key = (len(loops[index]), len(holes), round(float(areas[index]), 3),
+                   *np.round(np.ptp(loops[index], axis=0), 3))
+            if key in identical:
+                identical[key]["quantity"] += quantity
+                continue
+            identical[key] = {
+                "name": name if not parts else f"{name}-{len(parts) + 1}",
+                "outline": loops[index],
+                "holes": holes,
+                "area": float(areas[index] - sum(abs(polygon_area(h)) for h in holes)),
+                "quantity": quantity,
+            }
+            parts.append(identical[key])
+    return parts
+
+
+def parts_from_dxf(filepath, quantity=1):
+    import ezdxf
+
+    doc = ezdxf.readfile(filepath)
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    return parts_from_loops(dxf_loops(doc.modelspace()), name, quantity)
+
+
+def _rotate(points, degrees):
+    angle = np.radians(degrees)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    rotated = points @ rotation.T
+    return rotated - rotated.min(axis=0)
+
+
+def rasterize(outline, cell, pad):
+    """
+    Conservative occupancy mask [x, y] of a polygon, grown by `pad` cells.
+
+    Se marcan las celdas cuyo centro está dentro y las que cruza el borde;
+    el margen `pad` (media separación) en todas las piezas deja entre dos
+    piezas vecinas al menos la separación pedida.
+    """
+    size = np.maximum(np.ceil(outline.max(axis=0) / cell).astype(np.int64), 1)
+    xs, ys = np.meshgrid((np.arange(size[0]) + 0.5) * cell, (np.arange(size[1]) + 0.5) * cell, indexing='ij')
+    mask = contains(outline, np.column_stack([xs.ravel(), ys.ravel()])).reshape(size)
+
+    a, b = outline, np.roll(outline, -1, axis=0)
+    steps = np.maximum(np.ceil(np.linalg.norm(b - a, axis=1) / (cell * 0.5)).astype(np.int64), 1)
+    t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+    samples = np.repeat(a, steps, axis=0) + t[:, None] * np.repeat(b - a, steps, axis=0)
+    touched = np.minimum((samples / cell).astype(np.int64), size - 1)
+    mask[touched[:, 0], touched[:, 1]] = True
+
+    if pad:
+        grown = np.zeros(tuple(size + 2 * pad), dtype=bool)
+        offsets = np.arange(-pad, pad + 1)
+        for dx in offsets:
+            for dy in offsets[dx * dx + offsets ** 2 <= pad * pad]:
+                grown[pad + dx:pad + dx + size[0], pad + dy:pad + dy + size[1]] |= mask
+        mask = grown
+    return mask
+
+
+def collision_kernel(placed, other):
+    """
+    Cells where `other` may not start once `placed` sits at the origin.
+
+    Correlación de las dos máscaras por FFT: el elemento [dx + wo - 1,
+    dy + ho - 1] es True si `other` colocado en (dx, dy) solapa con
+    `placed`. Es el no-fit polygon de la pareja, rasterizado.
+    """
+    shape = (placed.shape[0] + other.shape[0] - 1, placed.shape[1] + other.shape[1] - 1)
+    product = np.fft.rfft2(placed, shape) * np.fft.rfft2(other[::-1, ::-1], shape)
+    return np.fft.irfft2(product, shape) > 0.5
+
+
+def _fast_length(n):
+    """Smallest 2**a * 3**b * 5**c >= n (tamaños rápidos para la FFT)"""
+    best = 1 << int(np.ceil(np.log2(max(n, 1))))
+    power5 = 1
+    while power5 < best:
+        power3 = power5
+        while power3 < best:
+            candidate = power3 << max(0, int(np.ceil(np.log2(n / power3))))
+            best = min(best, candidate)
+            power3 *= 3
+        power5 *= 5
+    return best
+
+
+class ShapeSet:
+    """
+    Máscaras rasterizadas de cada forma (pieza, rotación) con sus núcleos de
+    colisión por parejas y sus espectros al tamaño de FFT de la chapa,
+    calculados una sola vez y compartidos por todas las chapas.
+    """
+
+    def __init__(self, masks, grid):
+        self.masks = masks
+        self.grid = grid
+        widest = max((m.shape[0] for m in masks.values()), default=1)
+        tallest = max((m.shape[1] for m in masks.values()), default=1)
+        self.fft_shape = (_fast_length(grid[0] + widest - 1), _fast_length(grid[1] + tallest - 1))
+        self._kernels = {}
+        self._spectra = {}
+
+    def kernel(self, placed, other):
+        if (placed, other) not in self._kernels:
+            self._kernels[(placed, other)] = collision_kernel(self.masks[placed], self.masks[other])
+        return self._kernels[(placed, other)]
+
+    def spectrum(self, shape):
+        if shape not in self._spectra:
+            self._spectra[shape] = np.fft.rfft2(self.masks[shape][::-1, ::-1], self.fft_shape)
+        return self._spectra[shape]
+
+
+class Sheet:
+    """
+    Estado de una chapa: la rejilla de ocupación y, por cada forma en uso,
+    un mapa [x, y] de posiciones prohibidas. El mapa de una forma se crea al
+    primer uso correlando la ocupación con su máscara; después colocar una
+    pieza solo hace OR de su núcleo de colisión, y como los mapas solo ganan
+    celdas prohibidas la primera posición libre nunca retrocede.
+    """
+
+    def __init__(self, shapes):
+        self.shapes = shapes
+        self.grid = shapes.grid
+        self.occupied = np.zeros(self.grid, dtype=bool)
+        self.free_cells = self.grid[0] * self.grid[1]
+        self.blocked = {}
+        self.search = {}
+        self.placed = []
+        self.used_cells = 0
+        self._spectrum = None
+
+    def _blocked_map(self, shape):
+        mask = self.shapes.masks[shape]
+        if self.placed and len(self.placed) <= KERNEL_MAP_PLACEMENTS:
+            blocked = np.zeros(self.grid, dtype=bool)
+            for placed, x, y in self.placed:
+                self._stamp(blocked, self.shapes.kernel(placed, shape), mask, x, y)
+        elif self.placed:
+            if self._spectrum is None:
+                self._spectrum = np.fft.rfft2(self.occupied, self.shapes.fft_shape)
+            overlap = np.fft.irfft2(self._spectrum * self.shapes.spectrum(shape), self.shapes.fft_shape)
+            blocked = overlap[mask.shape[0] - 1:mask.shape[0] - 1 + self.grid[0],
+                              mask.shape[1] - 1:mask.shape[1] - 1 + self.grid[1]] > 0.5
+        else:
+            blocked = np.zeros(self.grid, dtype=bool)
+        blocked[self.grid[0] - mask.shape[0] + 1:, :] = True
+        blocked[:, self.grid[1] - mask.shape[1] + 1:] = True
+        self.blocked[shape] = blocked
+        self.search[shape] = 0
+        return blocked
+
+    def first_free(self, shape):
+        """Lowest (x, y) position where `shape` fits, in column-major order, or None"""
+        blocked = self.blocked.get(shape)
+        if blocked is None:
+            # Sin celdas libres suficientes no hace falta ni calcular el mapa
+            if self.free_cells < np.count_nonzero(self.shapes.masks[shape]):
+                return None
+            blocked = self._blocked_map(shape)
+        flat = blocked.ravel()
+        start = self.search[shape]
+        if start >= len(flat):
+            return None
+        offset = int(np.argmin(flat[start:]))
+        if flat[start + offset]:
+            self.search[shape] = len(flat)
+            return None
+        self.search[shape] = start + offset
+        return divmod(start + offset, self.grid[1])
+
+    def _stamp(self, blocked, kernel, mask, x, y):
+        """OR a collision kernel of a part placed at (x, y) into the map of `mask`"""
+        x0, y0 = x - (mask.shape[0] - 1), y - (mask.shape[1] - 1)
+        kx, ky = max(0, -x0), max(0, -y0)
+        x1, y1 = min(self.grid[0], x0 + kernel.shape[0]), min(self.grid[1], y0 + kernel.shape[1])
+        blocked[max(x0, 0):x1, max(y0, 0):y1] |= kernel[kx:kx + x1 - max(x0, 0), ky:ky + y1 - max(y0, 0)]
+
+    def place(self, shape, x, y):
+        mask = self.shapes.masks[shape]
+        window = self.occupied[x:x + mask.shape[0], y:y + mask.shape[1]]
+        self.free_cells -= int(np.count_nonzero(mask & ~window))
+        window |= mask
+        self._spectrum = None
+        for other, blocked in self.blocked.items():
+            self._stamp(blocked, self.shapes.kernel(shape, other), self.shapes.masks[other], x, y)
+        self.used_cells = max(self.used_cells, x + mask.shape[0])
+        self.placed.append((shape, x, y))
+
+    def release(self, part):
+        """Forget the maps of a part with no instances left"""
+        for shape in [s for s in self.blocked if s[0] == part]:
+            del self.blocked[shape]
+            del self.search[shape]
+
+
+def _resolution(parts, sheet):
+    smallest = min(float(np.min(np.ptp(p["outline"], axis=0))) for p in parts)
+    return max(smallest / PART_CELLS, float(np.sqrt(sheet[0] * sheet[1] / MAX_SHEET_CELLS)))
+
+
+def nest(parts, sheet=SHEET_SIZE, spacing=SPACING, rotations=ROTATIONS, resolution=None, fill=False):
+    """
+    Pack the parts (each with its `quantity`) onto as many sheets as needed.
+
+    Bottom-left-fill: las piezas se colocan de mayor a menor área en la
+    primera chapa abierta donde quepan, en la posición libre más a la
+    izquierda y después más abajo (el retal queda como una tira al final
+    del largo). Con `fill` se repiten juegos completos (todas las piezas
+    con sus cantidades) hasta llenar una sola chapa. Los agujeros de las
+    piezas no se aprovechan para colocar otras.
+    """
+    sheet = (float(sheet[0]), float(sheet[1]))
+    parts = [p for p in parts if p["area"] > 0]
+    if not parts:
+        return {"error": "No closed outlines to nest"}
+    cell = float(resolution or _resolution(parts, sheet))
+    pad = int(np.ceil(spacing / 2 / cell)) if spacing > 0 else 0
+    grid = (int(sheet[0] // cell), int(sheet[1] // cell))
+
+    masks = {}
+    for p_index, part in enumerate(parts):
+        seen = []
+        for rotation in dict.fromkeys(rotations):
+            mask = rasterize(_rotate(part["outline"], rotation), cell, pad)
+            # Rotaciones que dan la misma máscara (piezas simétricas) se prueban una vez
+            if any(m.shape == mask.shape and np.array_equal(m, mask) for m in seen):
+                continue
+            seen.append(mask)
+            if mask.shape[0] <= grid[0] and mask.shape[1] <= grid[1]:
+                masks[(p_index, rotation)] = mask
+    shape_set = ShapeSet(masks, grid)
+
+    by_area = sorted(range(len(parts)), key=lambda i: -parts[i]["area"])
+    instances = [i for i in by_area for _ in range(int(parts[i]["quantity"]))]
+    if fill:
+        # Juegos completos uno tras otro hasta que una pieza ya no quepa
+        queue = list(itertools.islice(itertools.cycle(instances), MAX_FILL_INSTANCES))
+        capped = True
+    else:
+        queue = instances[:MAX_INSTANCES]
+        capped = len(instances) > MAX_INSTANCES
+
+    sheets, unplaced, sets = [], {}, 0
+    if fill and any(not any(s[0] == i for s in masks) for i in range(len(parts))):
+        # Alguna pieza no cabe ni en una chapa vacía: ningún juego completo
+        queue, capped = [], False
+    remaining = {i: queue.count(i) for i in by_area}
+    for position, p_index in enumerate(queue):
+        shapes = [s for s in masks if s[0] == p_index]
+        remaining[p_index] -= 1
+        if not shapes:
+            unplaced[p_index] = unplaced.get(p_index, 0) + 1
+            continue
+        spot = None
+        for current in (sheets if not fill else sheets[:1]):
+            options = [(current.first_free(s), s) for s in shapes]
+            options = [(xy, s) for xy, s in options if xy is not None]
+            if options:
+                spot = (current, *min(options, key=lambda o: o[0]))
+                break
+        if spot is None and fill and sheets:
+            capped = False
+            break
+        if spot is None:
+            current = Sheet(shape_set)
+            sheets.append(current)
+            options = [(current.first_free(s), s) for s in shapes]
+            spot = (current, *min(((xy, s) for xy, s in options if xy is not None), key=lambda o: o[0]))
+        current, (x, y), shape = spot
+        current.place(shape, x, y)
+        if not remaining[p_index]:
+            for done in sheets:
+                done.release(p_index)
+        if fill and (position + 1) % len(instances) == 0:
+            sets += 1
+
+    return _report(parts, sheets, unplaced, sheet, cell, pad, spacing, rotations, sets if fill else None, capped)
+
+
+def _report(parts, sheets, unplaced, sheet, cell, pad, spacing, rotations, sets, capped=False):
+    sheet_area = sheet[0] * sheet[1]
+    placed_area = sum(parts[s[0]]["area"] for current in sheets for s, _, _ in current.placed)
+    used_length = min(sheets[-1].used_cells * cell, sheet[0]) if sheets else 0.0
+    consumed = (len(sheets) - 1) * sheet_area + used_length * sheet[1] if sheets else 0.0
+    placements = [
+        {
+            "part": parts[shape[0]]["name"],
+            "sheet": number,
+            "x": round((x + pad) * cell, 3),
+            "y": round((y + pad) * cell, 3),
+            "rotation": shape[1]
+        }
+        for number, current in enumerate(sheets) for shape, x, y in current.placed
+    ]
+    result = {
+        "sheet": {"length": sheet[0], "width": sheet[1]},
+        "spacing": spacing,
+        "rotations": list(rotations),
+        "resolution_mm": round(cell, 4),
+        "instances": len(placements) + sum(unplaced.values()),
+        "placed": len(placements),
+        "unplaced": {parts[i]["name"]: n for i, n in unplaced.items()},
+        "sheets_needed": len(sheets),
+        "part_area": round(placed_area, 2),
+        "sheet_area": round(len(sheets) * sheet_area, 2),
+        "utilization": round(placed_area / (len(sheets) * sheet_area), 4) if sheets else 0.0,
+        "scrap_area": round(len(sheets) * sheet_area - placed_area, 2),
+        "last_sheet_used_length": round(used_length, 2),
+        "consumed_area": round(consumed, 2),
+        "consumed_utilization": round(placed_area / consumed, 4) if consumed else 0.0,
+        "sheets": [
+            {
+                "parts": len(current.placed),
+                "utilization": round(sum(parts[s[0]]["area"] for s, _, _ in current.placed) / sheet_area, 4),
+                "used_length": round(min(current.used_cells * cell, sheet[0]), 2)
+            }
+            for current in sheets
+        ],
+        "placements": placements[:MAX_LISTED_PLACEMENTS],
+        # Se alcanzó MAX_INSTANCES (o MAX_FILL_INSTANCES con fill): las cifras se quedan cortas
+        "capped": capped,
+    }
+    if sets is not None:
+        result["sets_per_sheet"] = sets
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nest DXF parts onto sheets (file.dxf[:quantity] ...)")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--sheet", default=f"{SHEET_SIZE[0]:g}x{SHEET_SIZE[1]:g}", help="LENGTHxWIDTH in mm")
+    parser.add_argument("--spacing", type=float, default=SPACING)
+    parser.add_argument("--rotations", default=",".join(str(r) for r in ROTATIONS))
+    parser.add_argument("--resolution", type=float, default=None, help="grid cell size in mm")
+    parser.add_argument("--fill", action="store_true", help="how many full sets fit on one sheet")
+    args = parser.parse_args()
+
+    parts = []
+    for spec in args.files:
+        filepath, _, quantity = spec.partition(':')
+        parts.extend(parts_from_dxf(filepath, int(quantity or 1)))
+    sheet = tuple(float(v) for v in args.sheet.lower().split('x'))
+    rotations = tuple(float(r) for r in args.rotations.split(','))
+    try:
+        result = nest(parts, sheet, args.spacing, rotations, args.resolution, args.fill)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Perfilado bajo demanda de análisis y previews
+cProfile (.prof) o muestreo estadístico (speedscope JSON) más pico de memoria con tracemalloc
+"""
+
+import os
+import re
+import sys
+import time
+import json
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+from portable_config import get_config
+
+MODES = ('cprofile', 'sample')
+
+# Fracción de peticiones que se perfilan sin pedirlo (0 = nunca)
+SAMPLE_RATE = float(os.environ.get('POLLUX_PROFILE_SAMPLE_RATE', 0))
+
+# Intervalo del muestreador estadístico (segundos)
+SAMPLE_INTERVAL = float(os.environ.get('POLLUX_PROFILE_INTERVAL', 0.005))
+
+TOP_N = 20
+
+
+def default_output_dir():
+    return os.environ.get('POLLUX_PROFILE_DIR') or get_config().get_storage_path('profiles')
+
+
+def resolve_mode(requested=None, sample_rate=None):
+    """
+    Modo de perfilado para una petición, o None si no se perfila.
+
+    `requested` viene de la cabecera o del flag: '1'/'true' usan cProfile,
+    'cprofile' o 'sample' eligen el modo. Sin petición explícita se perfila
+    una fracción `sample_rate` del tráfico.
+    """
+    if requested:
+        requested = str(requested).strip().lower()
+        if requested in MODES:
+            return requested
+        if requested in ('1', 'true', 'yes', 'on'):
+            return 'cprofile'
+        return None
+    rate = SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate > 0 and random.random() < rate:
+        return 'cprofile'
+    return None
+
+
+def _function_label(file, line, name):
+    return f"{name} ({os.path.basename(file)}:{line})" if line else name
+
+
+class _StackSampler:
+    """Muestrea la pila de un hilo cada `interval` segundos desde un hilo auxiliar"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = []
+        self._frame_index = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _frame_id(self, code):
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({'name': code.co_name, 'file': code.co_filename, 'line': code.co_firstlineno})
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name, duration):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'pollux-profiling',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': duration,
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+    def top_functions(self, top_n):
+        own = {}
+        total = {}
+        for stack, weight in zip(self.samples, self.weights):
+            if not stack:
+                continue
+            own[stack[-1]] = own.get(stack[-1], 0.0) + weight
+            for index in set(stack):
+                total[index] = total.get(index, 0.0) + weight
+        ranked = sorted(own.items(), key=lambda item: item[1], reverse=True)[:top_n]
+        return [
+            {
+                'function': _function_label(self.frames[i]['file'], self.frames[i]['line'], self.frames[i]['name']),
+                'self_ms': round(seconds * 1000, 2),
+                'total_ms': round(total[i] * 1000, 2),
+            }
+            for i, seconds in ranked
+        ]
+
+
+def _cprofile_top(profiler, top_n):
+    stats = pstats.Stats(profiler)
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top_n]
+    return [
+        {
+            'function': _function_label(file, line, name),
+            'calls': primitive_calls,
+            'self_ms': round(own * 1000, 2),
+            'total_ms': round(cumulative * 1000, 2),
+        }
+        for (file, line, name), (primitive_calls, calls, own, cumulative, callers) in ranked
+    ]
+
+
+def safe_profile_id(profile_id):
+    """Profile id usable as a file name: only [A-Za-z0-9_-], a new uuid if empty"""
+    profile_id = re.sub(r'[^A-Za-z0-9_-]', '_', str(profile_id or ''))
+    return profile_id.strip('_') or uuid.uuid4().hex
+
+
+def profile_call(mode, profile_id, output_dir, func, *args):
+    """
+    Ejecutar `func(*args)` bajo el perfilador y devolver (resultado, resumen).
+
+    Se llama solo cuando el perfilado está activado, así que sin perfilado no
+    hay ningún coste. El perfil se escribe como `<profile_id>.prof` (cProfile)
+    o `<profile_id>.speedscope.json` (muestreo) en `output_dir`; el id se
+    limpia para que no pueda salir de ese directorio.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    profile_id = safe_profile_id(profile_id)
+    output_dir = output_dir or default_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    profiler = sampler = None
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+    else:
+        sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            result = profiler.runcall(func, *args)
+        else:
+            sampler.start()
+            try:
+                result = func(*args)
+            finally:
+                sampler.stop()
+    finally:
+        # También se guarda el perfil de una ejecución fallida
+        duration = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+
+        if profiler is not None:
+            path = os.path.join(output_dir, f"{profile_id}.prof")
+            profiler.dump_stats(path)
+            top = _cprofile_top(profiler, TOP_N)
+        else:
+            path = os.path.join(output_dir, f"{profile_id}.speedscope.json")
+            with open(path, 'w') as f:
+                json.dump(sampler.speedscope(profile_id, duration), f)
+            top = sampler.top_functions(TOP_N)
+
+    summary = {
+        'id': profile_id,
+        'mode': mode,
+        'wall_ms': round(duration * 1000, 2),
+        'peak_memory_mb': round(peak / (1024 * 1024), 2),
+        'output_path': path,
+        'top_functions': top,
+    }
+    return result, summary
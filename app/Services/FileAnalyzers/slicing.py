@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Laminado vectorizado de mallas STL: contornos por capa, área, perímetro y tiempo de impresión
+Las capas se generan por bloques y se entregan una a una (streaming)
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+
+import mesh_topology
+
+LAYER_HEIGHT = 0.2
+
+# Capas cortadas a la vez; los contornos solo existen en memoria para el bloque actual
+LAYER_CHUNK = 32
+
+# Modelo de tiempo de impresión FDM (mm, mm/s, s)
+PRINT_PROFILE = {
+    "perimeters": 2,
+    "line_width": 0.4,
+    "infill_density": 0.2,
+    "perimeter_speed": 40.0,
+    "infill_speed": 60.0,
+    "layer_overhead": 1.5,
+}
+
+
+def _layer_range(z_low, z_high, origin, layer_height):
+    """First and last layer index whose plane z cuts each [z_low, z_high) range"""
+    first = np.ceil((z_low - origin) / layer_height).astype(np.int64)
+    last = np.ceil((z_high - origin) / layer_height).astype(np.int64) - 1
+    return first, last
+
+
+def _chain(starts, ends):
+    """
+    Order segments into contours by matching end keys to start keys.
+
+    Devuelve (order, contour, closed): la permutación que recorre cada
+    contorno desde su primer segmento, la etiqueta de contorno de cada
+    segmento de `order` y si cada contorno se cierra. Los contornos se
+    ordenan por rango de lista con saltos de punteros, sin bucles por
+    segmento.
+    """
+    count = len(starts)
+    index = np.arange(count)
+    by_start = np.argsort(starts, kind='stable')
+    position = np.minimum(np.searchsorted(starts[by_start], ends), count - 1)
+    following = np.where(starts[by_start[position]] == ends, by_start[position], -1)
+    # Aristas no variedad: dos segmentos pueden apuntar al mismo siguiente; se queda el primero
+    previous = np.full(count, -1)
+    linked = np.flatnonzero(following >= 0)
+    previous[following[linked[::-1]]] = linked[::-1]
+    following[linked[previous[following[linked]] != linked]] = -1
+
+    linked = following >= 0
+    labels, contours = mesh_topology.connected_components(count, np.column_stack([index[linked], following[linked]]))
+    # Cabeza de cada contorno: el segmento sin anterior, o el menor índice si es un ciclo
+    open_contour = np.bincount(labels, weights=previous < 0, minlength=contours) > 0
+    head = np.full(contours, count)
+    np.minimum.at(head, labels, np.where((previous < 0) | ~open_contour[labels], index, count))
+    cycle_tail = previous[head[~open_contour]]
+    following[cycle_tail] = -1
+
+    # Distancia al final de la cadena por saltos de punteros
+    distance = (following >= 0).astype(np.int64)
+    pointer = following.copy()
+    while np.any(pointer >= 0):
+        active = pointer >= 0
+        distance[active] += distance[pointer[active]]
+        pointer[active] = pointer[pointer[active]]
+    order = np.lexsort((-distance, labels))
+    return order, labels[order], ~open_contour
+
+
+class Slicer:
+    """
+    Corta una malla con los planos z = z_min + (k + 1/2) * layer_height.
+
+    Cada triángulo solo se visita en los bloques de capas que abarca: se
+    ordenan por primera capa y se mantiene el conjunto activo. Los puntos
+    de corte se calculan sobre la malla soldada interpolando siempre desde
+    el vértice de abajo, así que dos caras vecinas producen exactamente el
+    mismo punto y el extremo de un segmento se identifica por la arista.
+    """
+
+    def __init__(self, triangles=None, layer_height=LAYER_HEIGHT, mesh=None):
+        if mesh is None:
+            mesh = mesh_topology.MeshTopology.from_triangles(np.asarray(triangles, dtype=np.float64))
+        self.mesh = mesh
+        self.layer_height = float(layer_height)
+        if self.layer_height <= 0:
+            raise ValueError("layer_height must be positive")
+        corners = mesh.vertices[mesh.faces]
+        z = corners[:, :, 2]
+        if len(z):
+            self.z_min, self.z_max = float(z.min()), float(z.max())
+        else:
+            self.z_min = self.z_max = 0.0
+        self.layers = int(np.ceil((self.z_max - self.z_min) / self.layer_height)) if len(z) else 0
+        self.origin = self.z_min + 0.5 * self.layer_height
+        first, last = _layer_range(z.min(axis=1), z.max(axis=1), self.origin, self.layer_height)
+        # Primera capa cuyo plano no queda por debajo de cada vértice: un vértice está por
+        # encima del plano k si k es menor; así el corte usa el mismo redondeo que el rango
+        self._vertex_layer = np.ceil((z - self.origin) / self.layer_height).astype(np.int64)
+        self._first = np.maximum(first, 0)
+        self._last = np.minimum(last, self.layers - 1)
+        self._order = np.argsort(self._first, kind='stable')
+        self._sorted_first = self._first[self._order]
+        # Malla invertida (volumen con signo negativo): los contornos van al revés
+        self._inverted = len(z) > 0 and np.einsum(
+            'ij,ij->', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])) < 0
+        # Vértices y arista (a -> b) de cada esquina de cara, en el orden de half_edge_index
+        self._corners = corners.reshape(-1, 3)
+        self._edge_ids = mesh.half_edge_index
+
+    def plane(self, layer):
+        return self.origin + layer * self.layer_height
+
+    def _segments(self, faces, layers):
+        """Start/end points and start/end edge ids of the cut of each (face, layer) pair"""
+        plane = self.plane(layers)
+        above = np.take(self._vertex_layer, faces, axis=0) > layers[:, None]
+        after = np.roll(above, -1, axis=1)
+        # El contorno exterior sale en sentido antihorario visto desde +Z: empieza
+        # en la arista que baja (arriba -> abajo) y termina en la que sube
+        down = np.argmax(above & ~after, axis=1)
+        up = np.argmax(~above & after, axis=1)
+        if self._inverted:
+            down, up = up, down
+        corner = faces * 3
+
+        def cut(edge, descending):
+            a = np.take(self._corners, corner + edge, axis=0)
+            b = np.take(self._corners, corner + (edge + 1) % 3, axis=0)
+            low, high = (b, a) if descending else (a, b)
+            # low y high están en capas distintas, así que high z > low z; el recorte solo
+            # absorbe el redondeo de un vértice que cae justo en el plano
+            t = np.clip((plane - low[:, 2]) / (high[:, 2] - low[:, 2]), 0.0, 1.0)
+            return low[:, :2] + t[:, None] * (high[:, :2] - low[:, :2]), np.take(self._edge_ids, corner + edge)
+
+        # La arista de inicio baja de a hacia b (sube si la malla está invertida)
+        start, start_edge = cut(down, not self._inverted)
+        end, end_edge = cut(up, self._inverted)
+        return start, end, start_edge, end_edge
+
+    def _pairs(self, active, first_layer, stop_layer):
+        """Expand the active faces into (face, layer) pairs inside [first_layer, stop_layer)"""
+        low = np.maximum(self._first[active], first_layer)
+        high = np.minimum(self._last[active], stop_layer - 1)
+        span = np.maximum(high - low + 1, 0)
+        faces = np.repeat(active, span)
+        offsets = np.arange(len(faces)) - np.repeat(np.cumsum(span) - span, span)
+        return faces, np.repeat(low, span) + offsets
+
+    def layers_iter(self, contours=True, chunk=LAYER_CHUNK):
+        """
+        Yield one dict per layer: index, z, area, perimeter and, with
+        `contours`, the list of contour point arrays and how many are open.
+        """
+        pending = 0
+        active = np.empty(0, dtype=np.int64)
+        edges = max(len(self.mesh.edges), 1)
+        for block in range(0, self.layers, chunk):
+            stop = min(block + chunk, self.layers)
+            entering = np.searchsorted(self._sorted_first, stop, side='left')
+            active = np.concatenate([active, self._order[pending:entering]])
+            pending = entering
+            active = active[self._last[active] >= block]
+
+            faces, layers = self._pairs(active, block, stop)
+            # Por capa: las etiquetas de contorno quedan en el mismo orden
+            by_layer = np.argsort(layers, kind='stable')
+            faces, layers = faces[by_layer], layers[by_layer]
+            start, end, start_edge, end_edge = self._segments(faces, layers)
+            local = layers - block
+            # Área con signo (agujeros en negativo) y perímetro sin necesidad de encadenar
+            area = 0.5 * np.bincount(local, weights=start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1],
+                                     minlength=stop - block)
+            perimeter = np.bincount(local, weights=np.linalg.norm(end - start, axis=1), minlength=stop - block)
+            segments = np.bincount(local, minlength=stop - block)
+
+            if contours and len(faces):
+                order, contour, closed = _chain(local * edges + start_edge, local * edges + end_edge)
+                contour_starts = np.flatnonzero(np.r_[True, contour[1:] != contour[:-1]])
+                contour_layer = local[order[contour_starts]]
+                layer_starts = np.searchsorted(contour_layer, np.arange(stop - block + 1))
+                points = start[order]
+                bounds = np.r_[contour_starts, len(order)]
+
+            for offset in range(stop - block):
+                layer = {
+                    "index": block + offset,
+                    "z": self.plane(block + offset),
+                    "area": float(area[offset]),
+                    "perimeter": float(perimeter[offset]),
+                    "segments": int(segments[offset]),
+                }
+                if contours:
+                    polygons, open_count = [], 0
+                    if len(faces):
+                        for c in range(layer_starts[offset], layer_starts[offset + 1]):
+                            polygon = points[bounds[c]:bounds[c + 1]]
+                            if not closed[contour[bounds[c]]]:
+                                # Cadena abierta: añadir el extremo final del último segmento
+                                polygon = np.vstack([polygon, end[order[bounds[c + 1] - 1]]])
+                                open_count += 1
+                            polygons.append(polygon)
+                    layer["contours"] = polygons
+                    layer["open_contours"] = open_count
+                yield layer
+
+
+def layer_time(area, perimeter, profile=PRINT_PROFILE):
+    """Seconds to print layers of the given cross-section area and perimeter"""
+    walls = perimeter * profile["perimeters"]
+    interior = np.maximum(area - walls * profile["line_width"], 0.0)
+    infill = interior * profile["infill_density"] / profile["line_width"]
+    printed = (area > 0) | (perimeter > 0)
+    return np.where(printed, walls / profile["perimeter_speed"] + infill / profile["infill_speed"]
+                    + profile["layer_overhead"], 0.0)
+
+
+def format_duration(seconds):
+    minutes = int(round(seconds / 60))
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
+def analyze(triangles=None, layer_height=LAYER_HEIGHT, mesh=None, profile=PRINT_PROFILE):
+    """
+    Layer count, per-layer area and perimeter arrays and an estimated print time.
+
+    Solo se guardan los arrays por capa: los contornos se descartan al
+    terminar cada bloque.
+    """
+    slicer = Slicer(triangles, layer_height, mesh)
+    area = np.zeros(slicer.layers)
+    perimeter = np.zeros(slicer.layers)
+    for layer in slicer.layers_iter(contours=False):
+        area[layer["index"]] = layer["area"]
+        perimeter[layer["index"]] = layer["perimeter"]
+    seconds = layer_time(area, perimeter, profile)
+    total = float(seconds.sum())
+    return {
+        "layer_height": slicer.layer_height,
+        "layers": slicer.layers,
+        "z_min": slicer.z_min,
+        "z_max": slicer.z_max,
+        "area": [round(float(a), 4) for a in area],
+        "perimeter": [round(float(p), 4) for p in perimeter],
+        "max_area": round(float(area.max()), 4) if slicer.layers else 0.0,
+        "sliced_volume": round(float(area.sum()) * slicer.layer_height, 4),
+        "print_profile": dict(profile),
+        "estimated_print_time_s": round(total, 1),
+        "estimated_print_time": format_duration(total),
+    }
+
+
+def main():
+    from analyze_stl import read_binary_stl, read_ascii_stl
+
+    parser = argparse.ArgumentParser(description="Slice an STL file and stream one JSON line per layer")
+    parser.add_argument("file")
+    parser.add_argument("--layer-height", type=float, default=LAYER_HEIGHT)
+    parser.add_argument("--contours", action="store_true", help="include contour points")
+    args = parser.parse_args()
+
+    triangles, _ = read_binary_stl(args.file)
+    if triangles is None:
+        triangles, _ = read_ascii_stl(args.file)
+    if triangles is None or len(triangles) == 0:
+        print(json.dumps({"error": "No valid triangles found in STL file"}))
+        sys.exit(1)
+
+    slicer = Slicer(triangles, args.layer_height)
+    total = 0.0
+    for layer in slicer.layers_iter(contours=args.contours):
+        layer["time_s"] = round(float(layer_time(layer["area"], layer["perimeter"])), 3)
+        total += layer["time_s"]
+        if args.contours:
+            layer["contours"] = [np.round(c, 5).tolist() for c in layer["contours"]]
+        print(json.dumps(layer), flush=True)
+    print(json.dumps({"layers": slicer.layers, "estimated_print_time_s": round(total, 1),
+                      "estimated_print_time": format_duration(total)}))
+
+
+if __name__ == "__main__":
+    main()
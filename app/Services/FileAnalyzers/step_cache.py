@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Caché de formas STEP ya transferidas: BRep binario (BinTools) más el ensamblaje en JSON, por hash del contenido
+Una segunda carga del mismo archivo no pasa por el traductor STEP; opcionalmente también queda en memoria (LRU)
+
+Uso:
+    python step_cache.py modelo.step       # cargar (o construir) y mostrar el resumen
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+from OCC.Core.BinTools import bintools, BinTools_FormatVersion_CURRENT
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.Bnd import Bnd_Box
+from OCC.Core.BRepBndLib import brepbndlib_Add
+from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Shape, TopoDS_Iterator
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
+from OCC.Core.gp import gp_Trsf
+from OCC.Extend.DataExchange import (
+    read_step_assembly,
+    StepAssembly,
+    AssemblyPrototype,
+    AssemblyInstance,
+)
+
+import metrics
+from portable_config import get_config
+
+FORMAT_VERSION = 1
+
+# Directorio de la caché (variable de entorno o storage/app/step_cache)
+CACHE_DIR = os.environ.get('POLLUX_STEP_CACHE_DIR') or get_config().get_storage_path('step_cache')
+
+# Ensamblajes que se quedan en memoria en el proceso (0 = sin LRU)
+LRU_SIZE = int(os.environ.get('POLLUX_STEP_CACHE_LRU', '4'))
+
+HASH_CHUNK = 1 << 20
+
+# Flecha del mallado relativa al tamaño del modelo
+MESH_RELATIVE_DEFLECTION = 0.001
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+# (ruta, tamaño, mtime) -> sha256, para no volver a leer el archivo en el mismo proceso
+_hashes = {}
+# Ensamblaje -> [lock, flecha relativa con la que ya está mallado]
+_meshing = weakref.WeakKeyDictionary()
+
+
+def content_hash(path):
+    """sha256 of the file content (remembered per path, size and mtime)"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                sha.update(chunk)
+        digest = _hashes[key] = sha.hexdigest()
+    return digest
+
+
+def cache_paths(digest, cache_dir=None):
+    """(brep, json) paths of a content hash"""
+    base = os.path.join(cache_dir or CACHE_DIR, digest[:2], digest)
+    return base + '.brep', base + '.json'
+
+
+def _color(color):
+    return None if color is None else [color.Red(), color.Green(), color.Blue()]
+
+
+def _quantity_color(rgb):
+    return None if rgb is None else Quantity_Color(rgb[0], rgb[1], rgb[2], Quantity_TOC_RGB)
+
+
+def _location(matrix):
+    trsf = gp_Trsf()
+    trsf.SetValues(*matrix[0], *matrix[1], *matrix[2])
+    return TopLoc_Location(trsf)
+
+
+def _atomic_write(path, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save(assembly, digest, cache_dir=None):
+    """
+    Write an assembly: the prototypes (then their colored subshapes) as the
+    children of one compound, so BinTools keeps the shared geometry, and the
+    names, colors and instance transforms in a JSON sidecar.
+    """
+    brep_path, json_path = cache_paths(digest, cache_dir)
+    compound = TopoDS_Compound()
+    builder = BRep_Builder()
+    builder.MakeCompound(compound)
+    prototypes = []
+    for prototype in assembly.prototypes:
+        builder.Add(compound, prototype.shape)
+    for prototype in assembly.prototypes:
+        subshapes = []
+        for shape, name, color in prototype.subshapes:
+            builder.Add(compound, shape)
+            subshapes.append({'name': name, 'color': _color(color)})
+        prototypes.append({'name': prototype.name, 'color': _color(prototype.color), 'subshapes': subshapes})
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'prototypes': prototypes,
+        'instances': [{
+            'prototype': instance.prototype,
+            'matrix': instance.matrix(),
+            'name': instance.name,
+            'color': _color(instance.color),
+        } for instance in assembly.instances],
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    def write_brep(path):
+        if not bintools.Write(compound, path, True, False, BinTools_FormatVersion_CURRENT):
+            raise OSError(f"BinTools could not write {path}")
+
+    def write_json(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    # El JSON se escribe el último: sin él la entrada no existe
+    _atomic_write(brep_path, write_brep)
+    _atomic_write(json_path, write_json)
+
+
+def load(digest, cache_dir=None):
+    """Assembly stored under `digest`, or None if missing or unreadable"""
+    brep_path, json_path = cache_paths(digest, cache_dir)
+    if not (os.path.exists(json_path) and os.path.exists(brep_path)):
+        return None
+    try:
+        with open(json_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            return None
+        compound = TopoDS_Shape()
+        if not bintools.Read(compound, brep_path):
+            return None
+    except (OSError, ValueError):
+        return None
+
+    children = []
+    iterator = TopoDS_Iterator(compound)
+    while iterator.More():
+        children.append(iterator.Value())
+        iterator.Next()
+    expected = len(meta['prototypes']) + sum(len(p['subshapes']) for p in meta['prototypes'])
+    if len(children) != expected:
+        return None
+
+    prototypes = []
+    position = len(meta['prototypes'])
+    for shape, entry in zip(children, meta['prototypes']):
+        subshapes = []
+        for sub in entry['subshapes']:
+            subshapes.append((children[position], sub['name'], _quantity_color(sub['color'])))
+            position += 1
+        prototypes.append(AssemblyPrototype(shape, entry['name'], _quantity_color(entry['color']), subshapes))
+    instances = [
+        AssemblyInstance(entry['prototype'], _location(entry['matrix']), entry['name'], _quantity_color(entry['color']))
+        for entry in meta['instances']
+    ]
+    return StepAssembly(prototypes, instances)
+
+
+def _remember(digest, assembly):
+    if LRU_SIZE <= 0:
+        return
+    with _lock:
+        _memory[digest] = assembly
+        _memory.move_to_end(digest)
+        while len(_memory) > LRU_SIZE:
+            _memory.popitem(last=False)
+
+
+def load_assembly(path, cache_dir=None):
+    """
+    StepAssembly of a STEP file: from memory, from the disk cache or, on the
+    first use of this content, from the STEP translator (and then cached).
+    """
+    digest = content_hash(path)
+    with _lock:
+        assembly = _memory.get(digest)
+        if assembly is not None:
+            _memory.move_to_end(digest)
+    if assembly is not None:
+        metrics.cache_lookup('step_memory', hit=True)
+        return assembly
+
+    assembly = load(digest, cache_dir)
+    metrics.cache_lookup('step_cache', hit=assembly is not None)
+    if assembly is None:
+        with metrics.stage('parse', 'step', os.path.getsize(path)):
+            assembly = read_step_assembly(path)
+        try:
+            save(assembly, digest, cache_dir)
+        except OSError:
+            # Sin disco para la caché: la forma se usa igualmente
+            pass
+    _remember(digest, assembly)
+    return assembly
+
+
+def mesh_assembly(assembly, relative_deflection=MESH_RELATIVE_DEFLECTION):
+    """
+    Mesh an assembly once with a linear deflection relative to its size.
+
+    El LRU comparte el mismo ensamblaje entre hilos: el mallado se hace bajo
+    un lock por ensamblaje y no se repite si ya está mallado con esa flecha,
+    así que nadie lee triangulaciones que otro hilo está rehaciendo.
+    """
+    with _lock:
+        state = _meshing.get(assembly)
+        if state is None:
+            state = _meshing[assembly] = [threading.Lock(), None]
+    with state[0]:
+        if state[1] != relative_deflection:
+            bbox = Bnd_Box()
+            brepbndlib_Add(assembly.compound(), bbox)
+            xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+            size = max(xmax - xmin, ymax - ymin, zmax - zmin)
+            assembly.mesh(linear_deflection=max(size * relative_deflection, 1e-3))
+            state[1] = relative_deflection
+    return assembly
+
+
+def load_shape(path, cache_dir=None):
+    """All the placed parts of a STEP file as one compound (geometry shared)"""
+    return load_assembly(path, cache_dir).compound()
+
+
+def clear_memory():
+    with _lock:
+        _memory.clear()
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python step_cache.py <step_file>", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    digest = content_hash(sys.argv[1])
+    hit = os.path.exists(cache_paths(digest)[1])
+    assembly = load_assembly(sys.argv[1])
+    print(json.dumps({
+        'sha256': digest,
+        'cache_path': cache_paths(digest)[0],
+        'hit': hit,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        'unique_parts': len(assembly.prototypes),
+        'instances': len(assembly.instances),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Análisis de STL por bloques con memoria acotada, para archivos mayores que la RAM
+El archivo se recorre en ventanas de memmap y la topología sale de una ordenación externa de aristas en disco
+"""
+
+import os
+import re
+import math
+import tempfile
+
+import numpy as np
+
+import mesh_topology
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage no se informa del pico de memoria
+    resource = None
+
+MB = 1 << 20
+
+# Memoria máxima del análisis por bloques (MB) y mínimo con el que se puede trabajar
+MEMORY_LIMIT_MB = int(os.environ.get('POLLUX_STL_MEMORY_MB', 2048))
+MIN_MEMORY_MB = 160
+
+# Pico aproximado por triángulo del análisis completo en memoria (soldadura, BVH,
+# soportes y laminado): por encima del límite se analiza por bloques
+IN_MEMORY_BYTES_PER_TRIANGLE = 1536
+
+# Memoria fija (Python, numpy, histograma de normales) y de trabajo por triángulo
+# de un bloque y por registro de un cubo de la ordenación externa
+BASE_MEMORY_MB = 96
+CHUNK_BYTES_PER_TRIANGLE = 1024
+BUCKET_BYTES_PER_RECORD = 128
+MAX_BUCKETS = 512
+
+# Bytes de texto por faceta de un STL ASCII típico (para estimar triángulos) y bloque de lectura
+ASCII_BYTES_PER_FACET = 250
+ASCII_BLOCK = 16 * MB
+
+# Normales redondeadas a 2 decimales: 201 valores por componente
+NORMAL_BINS = 201 ** 3
+
+STL_RECORD = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attr', '<u2')])
+EDGE_RECORD = np.dtype([('low', '<i8'), ('high', '<i8'), ('forward', 'u1')])
+
+_VERTEX_LINE = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)', re.IGNORECASE)
+_END_FACET = re.compile(rb'endfacet', re.IGNORECASE)
+
+
+def stl_format(path):
+    """('binary', exact triangle count) or ('ascii', estimated count), as read_binary_stl decides"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.read(84)
+    if len(header) < 84:
+        return 'ascii', size // ASCII_BYTES_PER_FACET
+    count = int(np.frombuffer(header[80:84], dtype='<u4')[0])
+    expected = 84 + 50 * count
+    if header[:80].decode('utf-8', errors='ignore').strip().lower().startswith('solid') and size != expected:
+        return 'ascii', size // ASCII_BYTES_PER_FACET
+    if size < expected:
+        raise ValueError(f"Truncated binary STL: expected {expected} bytes, got {size}")
+    return 'binary', count
+
+
+def should_stream(path, memory_limit_mb=MEMORY_LIMIT_MB):
+    """True when the in-memory analysis of the file would exceed the memory limit"""
+    try:
+        _, count = stl_format(path)
+    except (OSError, ValueError):
+        return False
+    return count * IN_MEMORY_BYTES_PER_TRIANGLE > memory_limit_mb * MB
+
+
+def _binary_chunks(path, count, chunk):
+    for start in range(0, count, chunk):
+        # Ventana de memmap por bloque: al soltarla sus páginas dejan de contar en el RSS
+        window = np.memmap(path, dtype=STL_RECORD, mode='r', offset=84 + 50 * start,
+                           shape=(min(chunk, count - start),))
+        triangles = window['vertices'].astype(np.float64)
+        del window
+        yield triangles
+
+
+def _ascii_chunks(path, chunk):
+    """Parse 'vertex x y z' lines block by block (3 per facet, as read_ascii_stl requires)"""
+    pending = []
+    pending_values = 0
+    vertices = facets = 0
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(ASCII_BLOCK)
+            text = tail + block
+            if block:
+                cut = text.rfind(b'\n') + 1
+                text, tail = text[:cut], text[cut:]
+            matches = _VERTEX_LINE.findall(text)
+            facets += len(_END_FACET.findall(text))
+            if matches:
+                values = np.array(matches, dtype=np.bytes_).astype(np.float64).ravel()
+                vertices += len(matches)
+                pending.append(values)
+                pending_values += len(values)
+            while pending_values >= chunk * 9 or (not block and pending_values):
+                values = np.concatenate(pending)
+                size = min(len(values) // 9, chunk) * 9
+                if size == 0:
+                    break
+                yield values[:size].reshape(-1, 3, 3)
+                pending = [values[size:]]
+                pending_values = len(values) - size
+            if not block:
+                break
+    if facets == 0 or vertices != facets * 3:
+        raise ValueError("Could not read STL file: not a valid binary or ASCII STL")
+
+
+def iter_chunks(path, chunk, file_format=None, count=None):
+    """(k, 3, 3) float64 triangle blocks of at most `chunk` triangles"""
+    if file_format is None:
+        file_format, count = stl_format(path)
+    if file_format == 'binary':
+        return _binary_chunks(path, count, chunk)
+    return _ascii_chunks(path, chunk)
+
+
+class GeometryReducer:
+    """
+    Bbox, área, volumen con signo, centro, histograma de normales y planos de
+    trabajo acumulados bloque a bloque: el resultado no depende del tamaño
+    de los bloques (el análisis en memoria es un único bloque).
+    """
+
+    def __init__(self):
+        self.triangles = 0
+        self.low = np.full(3, np.inf)
+        self.high = np.full(3, -np.inf)
+        self.area = 0.0
+        self.signed_volume = 0.0
+        self.point_sum = np.zeros(3)
+        # np.zeros no toca las páginas: solo ocupan memoria las normales que aparecen
+        self.normal_counts = np.zeros(NORMAL_BINS, dtype=np.int32)
+        self.planes = np.zeros(3, dtype=np.int64)
+
+    def add(self, triangles):
+        if len(triangles) == 0:
+            return
+        points = triangles.reshape(-1, 3)
+        self.triangles += len(triangles)
+        self.low = np.minimum(self.low, points.min(axis=0))
+        self.high = np.maximum(self.high, points.max(axis=0))
+        self.point_sum += points.sum(axis=0)
+
+        v1, v2, v3 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        cross = np.cross(v2 - v1, v3 - v1)
+        cross_norm = np.linalg.norm(cross, axis=1)
+        self.area += 0.5 * float(cross_norm.sum())
+        self.signed_volume += float(np.einsum('ij,ij->', v1, np.cross(v2, v3))) / 6.0
+
+        # Orientaciones: normales redondeadas a 2 decimales
+        valid = cross_norm > 0
+        normals = cross[valid] / cross_norm[valid, None]
+        rounded = np.round(normals * 100).astype(np.int64) + 100
+        keys, counts = np.unique((rounded[:, 0] * 201 + rounded[:, 1]) * 201 + rounded[:, 2], return_counts=True)
+        self.normal_counts[keys] += counts.astype(np.int32)
+
+        # Planos de trabajo: caras alineadas (> 0.8) con un eje
+        abs_normals = np.abs(normals)
+        max_component = np.argmax(abs_normals, axis=1)
+        aligned = abs_normals[np.arange(len(normals)), max_component] > 0.8
+        self.planes += np.bincount(max_component[aligned], minlength=3)
+
+    @property
+    def dimensions(self):
+        return self.high - self.low
+
+    @property
+    def volume(self):
+        return abs(self.signed_volume)
+
+    @property
+    def center_of_mass(self):
+        """Mean of the triangle corners"""
+        return self.point_sum / max(3 * self.triangles, 1)
+
+    def major_orientations(self, min_faces=10):
+        """Rounded normal directions shared by more than `min_faces` faces"""
+        return int(np.count_nonzero(self.normal_counts > min_faces))
+
+    def work_planes(self):
+        """(xy, xz, yz) aligned face counts"""
+        yz_faces, xz_faces, xy_faces = (int(n) for n in self.planes)
+        return xy_faces, xz_faces, yz_faces
+
+
+def _hash_bucket(low, high, buckets):
+    """Bucket of each key pair (multiplicative hash, uniform for grid keys)"""
+    mixed = (low.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) ^ \
+            (high.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F))
+    return ((mixed >> np.uint64(29)) % np.uint64(buckets)).astype(np.intp)
+
+
+class _Spill:
+    """Registros repartidos por hash en `count` archivos temporales (ordenación por distribución)"""
+
+    def __init__(self, directory, name, count, dtype):
+        self.count = count
+        self.dtype = dtype
+        self.paths = [os.path.join(directory, f"{name}-{i}.bin") for i in range(count)]
+        self.files = [open(path, 'wb') for path in self.paths]
+
+    def write(self, records, bucket):
+        order = np.argsort(bucket, kind='stable')
+        records = records[order]
+        bounds = np.searchsorted(bucket[order], np.arange(self.count + 1))
+        for i in np.flatnonzero(np.diff(bounds)):
+            records[bounds[i]:bounds[i + 1]].tofile(self.files[i])
+
+    def buckets(self):
+        """Each bucket loaded in turn (and deleted once read)"""
+        for f in self.files:
+            f.close()
+        for path in self.paths:
+            records = np.fromfile(path, dtype=self.dtype)
+            os.remove(path)
+            yield records
+
+
+def _bucket_count(records, bytes_per_record, budget):
+    return int(min(MAX_BUCKETS, max(1, math.ceil(records * bytes_per_record / budget))))
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where getrusage is missing)"""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def analyze(path, memory_limit_mb=MEMORY_LIMIT_MB, workdir=None):
+    """
+    Geometry and edge topology of an STL file with bounded memory.
+
+    Primera pasada: GeometryReducer por bloques. Segunda pasada: cada
+    vértice se ajusta a la rejilla de soldadura de mesh_topology (tolerancia
+    relativa a la diagonal del bbox) y se empaqueta en una clave int64; las
+    semiaristas (clave menor, mayor, sentido) y las claves de vértice se
+    reparten por hash en cubos en disco y cada cubo se ordena en memoria.
+    A diferencia de weld_points no se comparan celdas vecinas, y los
+    componentes conexos, el género y los shells no se calculan (necesitan
+    el grafo completo): quedan a None.
+    """
+    limit = max(int(memory_limit_mb), MIN_MEMORY_MB)
+    budget = (limit - BASE_MEMORY_MB) * MB
+    file_format, count = stl_format(path)
+    chunk = max(1024, budget // 2 // CHUNK_BYTES_PER_TRIANGLE)
+
+    reducer = GeometryReducer()
+    for triangles in iter_chunks(path, chunk, file_format, count):
+        reducer.add(triangles)
+    if reducer.triangles == 0:
+        raise ValueError("No valid triangles found in STL file")
+
+    # Misma rejilla que mesh_topology.weld_points (21 bits por eje)
+    origin = reducer.low
+    diagonal = float(np.linalg.norm(reducer.dimensions))
+    tolerance = max(diagonal * mesh_topology.WELD_RELATIVE_TOLERANCE,
+                    diagonal / mesh_topology._MAX_CELLS, np.finfo(np.float64).tiny)
+    bits = mesh_topology._CELL_BITS
+
+    edge_buckets = _bucket_count(3 * reducer.triangles, BUCKET_BYTES_PER_RECORD, budget // 2)
+    vertex_buckets = _bucket_count(3 * reducer.triangles, 32, budget // 2)
+    # Aristas de borde guardadas para contar lazos; si hay más, boundary_loops queda a None
+    max_boundary = budget // 4 // 64
+
+    degenerate = 0
+    with tempfile.TemporaryDirectory(prefix='pollux-stl-', dir=workdir) as directory:
+        edges = _Spill(directory, 'edges', edge_buckets, EDGE_RECORD)
+        vertices = _Spill(directory, 'vertices', vertex_buckets, np.int64)
+        for triangles in iter_chunks(path, chunk, file_format, count):
+            cells = np.floor((triangles.reshape(-1, 3) - origin) / tolerance).astype(np.int64) + 1
+            keys = ((cells[:, 0] << 2 * bits) | (cells[:, 1] << bits) | cells[:, 2]).reshape(-1, 3)
+            del cells
+            bad = (keys[:, 0] == keys[:, 1]) | (keys[:, 1] == keys[:, 2]) | (keys[:, 2] == keys[:, 0])
+            degenerate += int(bad.sum())
+            keys = keys[~bad]
+
+            unique = np.unique(keys)
+            vertices.write(unique, _hash_bucket(unique, unique, vertex_buckets))
+
+            start, end = keys.ravel(), keys[:, [1, 2, 0]].ravel()
+            records = np.empty(len(start), dtype=EDGE_RECORD)
+            records['low'] = np.minimum(start, end)
+            records['high'] = np.maximum(start, end)
+            records['forward'] = start < end
+            edges.write(records, _hash_bucket(records['low'], records['high'], edge_buckets))
+
+        vertex_count = sum(len(np.unique(bucket)) for bucket in vertices.buckets())
+
+        edge_count = boundary = manifold = non_manifold = inconsistent = 0
+        boundary_length = 0.0
+        boundary_edges = []
+        stored_boundary = 0
+        mask = (1 << bits) - 1
+        for records in edges.buckets():
+            if len(records) == 0:
+                continue
+            order = np.lexsort((records['high'], records['low']))
+            low, high = records['low'][order], records['high'][order]
+            starts = np.empty(len(order), dtype=bool)
+            starts[0] = True
+            starts[1:] = (low[1:] != low[:-1]) | (high[1:] != high[:-1])
+            first = np.flatnonzero(starts)
+            counts = np.diff(first, append=len(order))
+            forward = np.add.reduceat(records['forward'][order].astype(np.int64), first)
+            del order, records
+
+            edge_count += len(first)
+            manifold += int(np.count_nonzero(counts == 2))
+            non_manifold += int(np.count_nonzero(counts > 2))
+            # Una arista interior bien orientada se recorre una vez en cada sentido
+            inconsistent += int(np.count_nonzero((counts == 2) & (forward != 1)))
+
+            single = first[counts == 1]
+            boundary += len(single)
+            if len(single):
+                pairs = np.stack([low[single], high[single]], axis=1)
+                cells = np.stack([(pairs >> 2 * bits) & mask, (pairs >> bits) & mask, pairs & mask], axis=2)
+                corners = origin + (cells - 1) * tolerance
+                boundary_length += float(np.linalg.norm(corners[:, 1] - corners[:, 0], axis=1).sum())
+                stored_boundary += len(pairs)
+                if stored_boundary <= max_boundary:
+                    boundary_edges.append(pairs)
+
+    loops = 0
+    if boundary and stored_boundary <= max_boundary:
+        boundary_vertices, local = np.unique(np.concatenate(boundary_edges), return_inverse=True)
+        _, loops = mesh_topology.connected_components(len(boundary_vertices), local.reshape(-1, 2))
+    elif boundary:
+        loops = None
+
+    faces = reducer.triangles - degenerate
+    topology = {
+        "triangles": int(reducer.triangles),
+        "degenerate_triangles": degenerate,
+        "vertices": int(vertex_count),
+        "edges": int(edge_count),
+        "boundary_edges": int(boundary),
+        "manifold_edges": manifold,
+        "non_manifold_edges": non_manifold,
+        "inconsistent_edges": inconsistent,
+        "boundary_loops": None if loops is None else int(loops),
+        "components": None,
+        "euler_characteristic": int(vertex_count - edge_count + faces),
+        "genus": None,
+        "is_watertight": boundary == 0 and faces > 0,
+        "is_manifold": non_manifold == 0,
+        "is_consistently_oriented": inconsistent == 0,
+    }
+    return {
+        "format": file_format,
+        "geometry": reducer,
+        "topology": topology,
+        "boundary_length": boundary_length,
+        "streaming": {
+            "memory_limit_mb": limit,
+            "chunk_triangles": int(chunk),
+            "edge_buckets": edge_buckets,
+            "vertex_buckets": vertex_buckets,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    }
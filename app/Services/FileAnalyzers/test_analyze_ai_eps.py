@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Pruebas del análisis EPS: un archivo sin %%BoundingBox cae en la página por defecto de Ghostscript
+"""
+
+import subprocess
+
+import pytest
+
+import analyze_ai_eps
+import ghostscript_pool
+
+# EPS sin caja envolvente ni marcas: ni la cabecera ni el dispositivo bbox dan una caja
+BBOXLESS_EPS = b"%!PS-Adobe-3.0 EPSF-3.0\n%%Title: blank\n%%EndComments\nshowpage\n%%EOF\n"
+
+
+@pytest.fixture
+def bboxless_eps(tmp_path):
+    path = tmp_path / 'blank.eps'
+    path.write_bytes(BBOXLESS_EPS)
+    return str(path)
+
+
+@pytest.fixture
+def fake_ghostscript(monkeypatch):
+    """Salidas reales de gs 10 para este archivo, sin depender de que esté instalado"""
+    calls = []
+
+    def run_ghostscript(args, timeout=15, gs_path=None):
+        calls.append(args)
+        if '-c' in args:
+            return subprocess.CompletedProcess(args, 0, stdout='[595.0 842.0]\n', stderr='')
+        return subprocess.CompletedProcess(args, 0, stdout='',
+                                           stderr='%%BoundingBox: 0 0 0 0\n%%HiResBoundingBox: 0.000000 0.000000 0.000000 0.000000\n')
+
+    monkeypatch.setattr(ghostscript_pool, 'run_ghostscript', run_ghostscript)
+    monkeypatch.setattr(ghostscript_pool, '_default_pages', {})
+    return calls
+
+
+def test_bboxless_eps_uses_the_default_page(bboxless_eps, fake_ghostscript):
+    assert analyze_ai_eps.read_header_bbox(bboxless_eps) is None
+    result = analyze_ai_eps.analyze_ai_eps(bboxless_eps)
+    assert result["dimensions"] == {"width": 595.0, "height": 842.0, "depth": 0}
+    assert result["metadata"]["bounding_box_source"] == "ghostscript_page"
+    assert result["metadata"]["bounding_box_raw"] == "%%BoundingBox: 0 0 595 842"
+
+    # La página por defecto se pregunta una sola vez
+    analyze_ai_eps.analyze_ai_eps(bboxless_eps)
+    assert sum('-c' in args for args in fake_ghostscript) == 1
+
+
+@pytest.mark.skipif(not ghostscript_pool.is_available(), reason="Ghostscript not installed")
+def test_bboxless_eps_with_ghostscript(bboxless_eps, tmp_path):
+    result = analyze_ai_eps.analyze_ai_eps(bboxless_eps, preview_path=str(tmp_path / 'blank.png'))
+    assert result["metadata"]["bounding_box_source"] == "ghostscript_page"
+    assert result["dimensions"]["width"] > 0 and result["dimensions"]["height"] > 0
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché de mallas: acierto, fallo, invalidación al cambiar el STL y limpieza
+"""
+
+import os
+import struct
+
+import numpy as np
+import pytest
+
+import mesh_cache
+
+
+def write_stl(path, triangles):
+    triangles = np.asarray(triangles, dtype=np.float32)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 80 + struct.pack('<I', len(triangles)))
+        for triangle in triangles:
+            f.write(struct.pack('<3f', 0, 0, 0) + triangle.tobytes() + b'\0\0')
+    return str(path)
+
+
+def tetrahedron(size=10.0):
+    a, b, c, d = [0, 0, 0], [size, 0, 0], [0, size, 0], [0, 0, size]
+    return [[a, c, b], [a, b, d], [a, d, c], [b, c, d]]
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+def test_miss_then_hit(tmp_path, cache_dir):
+    path = write_stl(tmp_path / 'part.stl', tetrahedron())
+    assert mesh_cache.load(path, cache_dir) is None
+    built, hit = mesh_cache.load_or_build(path, cache_dir=cache_dir)
+    assert not hit
+    cached, hit = mesh_cache.load_or_build(path, cache_dir=cache_dir)
+    assert hit
+    assert cached.path == built.path
+    assert cached.topology['boundary_edges'] == 0
+    assert np.array_equal(cached.triangles(np.float32), np.asarray(tetrahedron(), dtype=np.float32))
+    assert cached.verify()
+
+
+def test_changed_source_invalidates_entry(tmp_path, cache_dir):
+    path = write_stl(tmp_path / 'part.stl', tetrahedron())
+    old, _ = mesh_cache.load_or_build(path, cache_dir=cache_dir)
+    write_stl(path, tetrahedron(20.0) + tetrahedron(5.0))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert mesh_cache.load(path, cache_dir) is None
+    new, hit = mesh_cache.load_or_build(path, cache_dir=cache_dir)
+    assert not hit
+    assert len(new.corners) == 8
+    # La versión anterior se borra al escribir la nueva
+    assert not os.path.exists(old.path)
+
+
+def test_load_triangles_does_not_build_on_miss(tmp_path, cache_dir):
+    path = write_stl(tmp_path / 'part.stl', tetrahedron())
+    triangles, source_format = mesh_cache.load_triangles(path, np.float32, cache_dir)
+    assert source_format == 'binary'
+    assert triangles.shape == (4, 3, 3)
+    assert not os.path.exists(cache_dir)
+
+    mesh_cache.build(path, cache_dir=cache_dir)
+    cached_triangles, _ = mesh_cache.load_triangles(path, np.float32, cache_dir)
+    assert np.array_equal(cached_triangles, triangles)
+
+
+def test_prune_removes_orphaned_and_least_recently_used(tmp_path, cache_dir):
+    kept = write_stl(tmp_path / 'kept.stl', tetrahedron())
+    old = write_stl(tmp_path / 'old.stl', tetrahedron(3.0))
+    deleted = write_stl(tmp_path / 'deleted.stl', tetrahedron(2.0))
+    entries = {path: mesh_cache.build(path, cache_dir=cache_dir).path for path in (kept, old, deleted)}
+    os.remove(deleted)
+    os.utime(entries[old], (1, 1))
+
+    assert mesh_cache.prune(cache_dir, max_bytes=0) == {
+        'removed_orphaned': 1, 'removed_evicted': 0, 'kept': 2,
+        'bytes': sum(os.path.getsize(entries[p]) for p in (kept, old))}
+    assert not os.path.exists(entries[deleted])
+
+    result = mesh_cache.prune(cache_dir, max_bytes=os.path.getsize(entries[kept]))
+    assert result['removed_evicted'] == 1
+    assert not os.path.exists(entries[old])
+    assert mesh_cache.load(kept, cache_dir) is not None
+
+
+def test_shells_are_stored_with_the_topology(tmp_path, cache_dir, monkeypatch):
+    path = write_stl(tmp_path / 'part.stl', tetrahedron())
+    built = mesh_cache.build(path, cache_dir=cache_dir)
+    assert built.shells['count'] == 1
+    assert built.shells['shells'][0]['volume'] == pytest.approx(1000 / 6, rel=1e-6)
+
+    # Un acierto no vuelve a calcular los shells
+    monkeypatch.setattr(mesh_cache.mesh_topology.MeshTopology, 'shells', None)
+    cached, hit = mesh_cache.load_or_build(path, cache_dir=cache_dir)
+    assert hit
+    assert cached.shells == built.shells
+    assert cached.boundary_length == 0
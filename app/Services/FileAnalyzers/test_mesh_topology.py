@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la soldadura de vértices: puntos a ambos lados del borde de una celda y tolerancia mínima
+"""
+
+import numpy as np
+import pytest
+
+import mesh_topology
+
+
+def test_points_across_a_cell_boundary_are_welded():
+    tolerance = 0.01
+    # Celdas de lado 0.01 desde el origen: 0.0299 y 0.0301 caen en celdas distintas
+    # y sus representantes (0.0201 y 0.0399) están a más de la tolerancia
+    points = np.array([[0, 0, 0], [1, 1, 1], [0.0201, 0.5, 0.5], [0.0299, 0.5, 0.5],
+                       [0.0399, 0.5, 0.5], [0.0301, 0.5, 0.5]])
+    vertices, remap = mesh_topology.weld_points(points, tolerance)
+    assert len(vertices) == 3
+    assert len(set(remap[2:])) == 1
+    assert remap[0] != remap[1]
+
+
+def test_neighbouring_points_further_than_the_tolerance_stay_apart():
+    points = np.array([[0, 0, 0], [1, 1, 1], [0.0295, 0.5, 0.5], [0.0405, 0.5, 0.5]])
+    vertices, remap = mesh_topology.weld_points(points, 0.01)
+    assert len(vertices) == 4
+
+
+def test_cracked_seam_closes_across_cells():
+    # Dos mitades de un tetraedro cuyos vértices compartidos difieren en 1e-7 relativo
+    a, b, c, d = np.eye(4, 3) * 10
+    jitter = np.array([3e-6, -3e-6, 2e-6])
+    triangles = np.array([[a, c, b], [a, b, d], [a + jitter, d + jitter, c + jitter], [b, c - jitter, d]])
+    stats = mesh_topology.analyze(triangles, tolerance=1e-4)
+    assert stats["is_watertight"]
+    assert stats["vertices"] == 4
+
+
+def test_tolerance_below_the_grid_resolution_is_rejected():
+    points = np.array([[0, 0, 0], [1000, 0, 0]])
+    with pytest.raises(ValueError, match="below the grid resolution"):
+        mesh_topology.weld_points(points, 1e-6)
+    # La tolerancia por defecto nunca queda por debajo
+    vertices, _ = mesh_topology.weld_points(points)
+    assert len(vertices) == 2
+
+
+def test_open_shells_report_no_volume():
+    a, b, c, d = np.array([[0, 0, 0], [10, 0, 0], [0, 10, 0], [0, 0, 10]], dtype=float)
+    closed = [[a, c, b], [a, b, d], [a, d, c], [b, c, d]]
+    # Misma pieza desplazada y sin una cara: un shell abierto
+    opened = [np.array(face) + 100 for face in closed[:3]]
+    shells = mesh_topology.MeshTopology.from_triangles(np.array(closed + opened)).shells()
+    by_watertight = {shell["is_watertight"]: shell for shell in shells["shells"]}
+    assert by_watertight[True]["volume"] == pytest.approx(1000 / 6)
+    assert by_watertight[False]["volume"] is None
+    assert by_watertight[False]["boundary_edges"] == 3
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Pruebas del spool de métricas: procesos sin /metrics propio que el servidor suma después
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'SPOOL_DIR', str(tmp_path))
+    yield tmp_path
+    monkeypatch.setattr(metrics, '_spool', None)
+
+
+def stage_count(stage, file_type):
+    with metrics.registry._lock:
+        series = metrics.registry._histograms[metrics.STAGE_HISTOGRAM]
+        return sum(count for key, (_, _, count) in series.items()
+                   if dict(key)['stage'] == stage and dict(key)['file_type'] == file_type)
+
+
+def test_flush_and_collect_round_trip(spool):
+    metrics.enable_spool()
+    metrics.cache_lookup('spool_test', hit=True)
+    metrics.observe_stage('parsing', 0.2, 'spooltest', 2048)
+    # observe_stage ya escribió el archivo y vació el registro
+    assert stage_count('parse', 'spooltest') == 0
+    assert len(list(spool.glob('*.json'))) == 1
+    metrics._spool = None
+
+    assert metrics.collect_spool() == 1
+    assert stage_count('parse', 'spooltest') == 1
+    assert metrics.registry.counter_value('pollux_cache_requests_total', cache='spool_test', result='hit') == 1
+    assert 'size_bucket="<1MB"' in metrics.registry.render()
+    assert not list(spool.iterdir())
+    assert metrics.collect_spool() == 0
+
+
+def test_analyzer_script_stages_reach_the_spool(spool, tmp_path):
+    ezdxf = pytest.importorskip('ezdxf')
+    document = ezdxf.new()
+    document.modelspace().add_lwpolyline([(0, 0), (10, 0), (10, 10), (0, 10)], close=True)
+    path = str(tmp_path / 'square.dxf')
+    document.saveas(path)
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyze_dxf_dwg.py')
+    env = dict(os.environ, POLLUX_METRICS_SPOOL_DIR=str(spool))
+    subprocess.run([sys.executable, script, path], check=True, capture_output=True, env=env, timeout=120)
+
+    before = stage_count('analyze', 'dxf')
+    assert metrics.collect_spool() >= 1
+    assert stage_count('parse', 'dxf') >= 1
+    assert stage_count('analyze', 'dxf') == before + 1
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Pruebas del anidado: llenado de chapa sin tope silencioso y precios solo con anidados completos
+"""
+
+import numpy as np
+import pytest
+
+import nesting
+
+
+def square(size, name='square', quantity=1):
+    outline = np.array([[0, 0], [size, 0], [size, size], [0, size]], dtype=float)
+    return {"name": name, "outline": outline, "area": size * size, "quantity": quantity}
+
+
+def test_fill_keeps_placing_past_the_instance_limit():
+    result = nesting.nest([square(10.0)], fill=True)
+    assert not result["capped"]
+    assert result["sets_per_sheet"] > nesting.MAX_INSTANCES
+    assert result["placed"] == result["sets_per_sheet"]
+    # Ni una pieza más cabe en la chapa: la rejilla de posiciones está llena
+    cells = result["resolution_mm"]
+    pitch = (np.ceil(10.0 / cells) + 2 * np.ceil(nesting.SPACING / 2 / cells)) * cells
+    assert result["sets_per_sheet"] >= (2440.0 // pitch) * (1220.0 // pitch)
+
+
+def test_fill_counts_only_complete_sets():
+    result = nesting.nest([square(400.0, 'big'), square(100.0, 'small', quantity=3)], fill=True)
+    assert not result["capped"]
+    assert result["placed"] >= 4 * result["sets_per_sheet"]
+    assert result["placed"] < 4 * (result["sets_per_sheet"] + 1)
+
+
+def test_fill_reports_the_safety_cap(monkeypatch):
+    monkeypatch.setattr(nesting, 'MAX_FILL_INSTANCES', 100)
+    result = nesting.nest([square(10.0)], fill=True)
+    assert result["capped"]
+    assert result["sets_per_sheet"] == 100
+
+
+def test_quantities_over_the_limit_are_reported(monkeypatch):
+    monkeypatch.setattr(nesting, 'MAX_INSTANCES', 10)
+    result = nesting.nest([square(50.0, quantity=25)])
+    assert result["capped"]
+    assert result["instances"] == 10
+
+
+def test_capped_nesting_is_not_used_for_pricing(monkeypatch):
+    complete = pytest.importorskip('analyze_dxf_dwg_complete')
+    area_cm2, counts = 1.0, {'LWPOLYLINE': 1}
+    monkeypatch.setattr(nesting, 'MAX_FILL_INSTANCES', 100)
+    capped = complete.calculate_manufacturing_metrics_2d(area_cm2, 40.0, counts, nesting.nest([square(10.0)], fill=True))
+    plain = complete.calculate_manufacturing_metrics_2d(area_cm2, 40.0, counts)
+    assert capped['nesting']['capped']
+    assert capped['weight_estimates'] == plain['weight_estimates']
+    assert capped['material_efficiency'] == plain['material_efficiency']
+
+    monkeypatch.setattr(nesting, 'MAX_FILL_INSTANCES', 200000)
+    nested = complete.calculate_manufacturing_metrics_2d(area_cm2, 40.0, counts, nesting.nest([square(10.0)], fill=True))
+    assert nested['material_efficiency'] == round(nested['nesting']['utilization'] * 100, 2)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Pruebas del laminado: vértices situados exactamente sobre la altura de un plano de corte
+"""
+
+import math
+
+import numpy as np
+
+import slicing
+
+
+def tetrahedron():
+    vertices = np.array([[0, 0, 2.95], [10, 0, 2.95], [0, 10, 2.95], [5, 5, 53.45]])
+    faces = [[0, 2, 1], [0, 1, 3], [1, 2, 3], [2, 0, 3]]
+    return vertices[faces]
+
+
+def uv_sphere(radius=10.0, segments=24, z=0.1):
+    """Closed sphere centred at height z with rings on the planes at layer_height=2"""
+    heights = np.arange(-radius + 1, radius, 2.0)
+    angles = np.linspace(0, 2 * math.pi, segments, endpoint=False)
+    ring_radius = np.sqrt(radius ** 2 - heights ** 2)
+    rings_xyz = np.stack([np.column_stack([r * np.cos(angles), r * np.sin(angles), np.full(segments, z)])
+                          for r, z in zip(ring_radius, heights)])
+    bottom, top = np.array([0, 0, -radius]), np.array([0, 0, radius])
+    triangles = []
+    for j in range(segments):
+        k = (j + 1) % segments
+        triangles.append([bottom, rings_xyz[0, k], rings_xyz[0, j]])
+        triangles.append([top, rings_xyz[-1, j], rings_xyz[-1, k]])
+        for i in range(len(heights) - 1):
+            a, b = rings_xyz[i, j], rings_xyz[i, k]
+            c, d = rings_xyz[i + 1, j], rings_xyz[i + 1, k]
+            triangles.append([a, b, d])
+            triangles.append([a, d, c])
+    return np.array(triangles) + [0, 0, z]
+
+
+def test_vertices_on_plane_height_give_finite_volume():
+    result = slicing.analyze(tetrahedron(), 0.2)
+    assert math.isfinite(result["sliced_volume"])
+    assert abs(result["sliced_volume"] - 100 * 50.5 / 6) < 1.0
+    assert all(math.isfinite(a) for a in result["area"])
+
+
+def test_sphere_rings_on_planes():
+    triangles = uv_sphere()
+    result = slicing.analyze(triangles, 2.0)
+    assert result["layers"] == 10
+    assert all(math.isfinite(a) and a > 0 for a in result["area"])
+    assert math.isfinite(result["estimated_print_time_s"])
+    assert result["estimated_print_time"].endswith("m")
+
+
+def test_contours_close_on_plane_vertices():
+    slicer = slicing.Slicer(uv_sphere(), 2.0)
+    assert np.allclose([slicer.plane(k) for k in range(slicer.layers)], np.arange(-9, 10, 2) + 0.1)
+    for layer in slicer.layers_iter():
+        assert layer["open_contours"] == 0
+        assert len(layer["contours"]) == 1
+        assert np.isfinite(layer["contours"][0]).all()
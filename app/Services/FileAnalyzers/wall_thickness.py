@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Espesor de pared de piezas STL por trazado de rayos sobre un BVH
+Rayos hacia el interior (normal negada) desde puntos muestreados en la superficie
+"""
+
+import time
+
+import numpy as np
+
+from mesh_bvh import BVH
+
+# Puntos muestreados en la superficie (uno por rayo)
+SAMPLES = 10000
+
+# Por debajo de este espesor (unidades del modelo, normalmente mm) la pared es fina
+THIN_WALL = 1.0
+
+# Segundos máximos de trazado: las muestras son independientes, así que parar
+# antes solo reduce la muestra (mallas con abanicos de triángulos muy largos)
+TIME_BUDGET = 5.0
+TRACE_CHUNK = 512
+
+PERCENTILES = (1, 5, 10, 25, 50, 75, 95)
+HISTOGRAM_BINS = 10
+MAX_THIN_REGIONS = 20
+
+# Las zonas finas se agrupan en celdas de esta fracción de la diagonal
+THIN_REGION_CELL = 0.02
+
+
+def sample_surface(triangles, count, seed=0):
+    """Area-weighted random points on the surface: (points, face index)"""
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    areas = np.linalg.norm(cross, axis=1)
+    rng = np.random.default_rng(seed)
+    faces = rng.choice(len(triangles), size=count, p=areas / areas.sum())
+    u, v = rng.random(count), rng.random(count)
+    flip = u + v > 1
+    u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+    corners = triangles[faces]
+    points = corners[:, 0] + u[:, None] * (corners[:, 1] - corners[:, 0]) + v[:, None] * (corners[:, 2] - corners[:, 0])
+    return points, faces
+
+
+def _thin_regions(points, thickness, cell):
+    """Zona más fina de cada celda de la rejilla, de menor a mayor espesor"""
+    if len(points) == 0:
+        return []
+    cells = np.floor(points / cell).astype(np.int64)
+    order = np.lexsort((thickness, cells[:, 2], cells[:, 1], cells[:, 0]))
+    ordered = cells[order]
+    first = np.r_[True, np.any(ordered[1:] != ordered[:-1], axis=1)]
+    sizes = np.diff(np.r_[np.flatnonzero(first), len(order)])
+    thinnest = order[first]
+    ranked = np.argsort(thickness[thinnest], kind='stable')[:MAX_THIN_REGIONS]
+    return [
+        {
+            "location": [round(float(x), 4) for x in points[thinnest[i]]],
+            "thickness": round(float(thickness[thinnest[i]]), 4),
+            "samples": int(sizes[i])
+        }
+        for i in ranked
+    ]
+
+
+def analyze(triangles, bvh=None, samples=SAMPLES, thin_wall=THIN_WALL, seed=0, time_budget=TIME_BUDGET):
+    """
+    Wall thickness statistics for a (n, 3, 3) triangle array.
+
+    Desde cada punto muestreado se lanza un rayo en la dirección de la
+    normal negada; la distancia al primer impacto contra una cara vista por
+    detrás es el espesor local. Los rayos que no salen de la pieza (mallas
+    abiertas) o que chocan con una cara de frente (autointersecciones) se
+    cuentan como no resueltos. Si el trazado supera `time_budget` segundos
+    se detiene y el resultado usa las muestras trazadas hasta entonces.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    # Sin superficie (malla vacía o solo caras degeneradas) no hay dónde muestrear
+    if len(triangles) == 0 or not lengths.sum() > 0:
+        return {"samples": 0, "resolved": 0}
+    bvh = bvh or BVH(triangles)
+
+    normals = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+    # Normales hacia fuera: con volumen con signo negativo la malla está invertida
+    if np.einsum('ij,ij->', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])) < 0:
+        normals = -normals
+
+    points, faces = sample_surface(triangles, samples, seed)
+    directions = -normals[faces]
+    epsilon = bvh.diagonal * 1e-7
+    distance = np.full(samples, np.inf)
+    hit = np.full(samples, -1, dtype=np.int64)
+    started = time.perf_counter()
+    traced = 0
+    while traced < samples and (traced == 0 or time.perf_counter() - started < time_budget):
+        batch = slice(traced, min(traced + TRACE_CHUNK, samples))
+        distance[batch], hit[batch] = bvh.intersect(points[batch], directions[batch], t_min=epsilon)
+        traced = batch.stop
+    points, directions, distance, hit = points[:traced], directions[:traced], distance[:traced], hit[:traced]
+
+    # Solo valen los impactos contra la cara interior de otra pared
+    hit_normals = normals[np.maximum(hit, 0)]
+    resolved = (hit >= 0) & (np.einsum('ij,ij->i', hit_normals, directions) > 0)
+    thickness = distance[resolved]
+
+    result = {
+        "samples": int(traced),
+        "requested_samples": int(samples),
+        "resolved": int(resolved.sum()),
+        "unresolved": int(traced - resolved.sum()),
+        "thin_wall_threshold": thin_wall,
+    }
+    if len(thickness) == 0:
+        return result
+
+    counts, edges = np.histogram(thickness, bins=HISTOGRAM_BINS,
+                                 range=(0.0, float(np.percentile(thickness, 99)) or float(thickness.max()) or 1.0))
+    # Los espesores por encima del percentil 99 van al último tramo
+    counts[-1] += int(np.count_nonzero(thickness > edges[-1]))
+    thin = thickness < thin_wall
+    surface_area = 0.5 * float(lengths.sum())
+    result.update({
+        "min": round(float(thickness.min()), 4),
+        "max": round(float(thickness.max()), 4),
+        "mean": round(float(thickness.mean()), 4),
+        "percentiles": {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, np.percentile(thickness, PERCENTILES))},
+        "histogram": {
+            "edges": [round(float(e), 4) for e in edges],
+            "counts": [int(c) for c in counts]
+        },
+        "thin_fraction": round(float(thin.mean()), 4),
+        "thin_area": round(float(thin.mean()) * surface_area, 4),
+        "thin_regions": _thin_regions(points[resolved][thin], thickness[thin], bvh.diagonal * THIN_REGION_CELL),
+    })
+    return result
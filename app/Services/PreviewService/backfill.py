@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Backfill de análisis y previews sobre storage/app/models y storage/app/uploads
+Procesa en paralelo solo lo que falta o está desfasado y se puede reanudar tras una interrupción
+
+Uso:
+    python backfill.py                       # analizar y generar previews pendientes
+    python backfill.py --dry-run             # solo contar qué falta y por qué
+    python backfill.py --tasks previews --preview-types 2d --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import importlib.util
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from path_config import config
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+from render_pool import RenderPool, RenderError, RenderTimeout
+
+ANALYZERS_DIR = Path(__file__).parent.parent / 'FileAnalyzers'
+
+# Previews por extensión (como previews:generate-missing); los formatos 2D tienen una sola vista
+PREVIEW_TYPES = {
+    'stl': ('2d', 'wireframe'),
+    'dxf': ('2d',),
+    'dwg': ('2d',),
+    'step': ('2d',),
+    'stp': ('2d',),
+    'eps': ('2d',),
+    'ai': ('2d',),
+}
+
+# Hilos que calculan el SHA-256 de los archivos nuevos o modificados
+HASH_THREADS = 4
+HASH_CHUNK = 1 << 20
+
+# Tiempo máximo por archivo (análisis + todas sus previews)
+FILE_TIMEOUT = 600
+
+
+def debug(msg):
+    """Print progress messages to stderr"""
+    print(msg, file=sys.stderr, flush=True)
+
+
+def load_analyzer_main():
+    """FileAnalyzers/main.py (EXTENSION_MAP, controller_script, run_analyzer, ANALYZER_VERSION)"""
+    spec = importlib.util.spec_from_file_location('file_analyzers_main', ANALYZERS_DIR / 'main.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def storage_path(path):
+    """Path relative to storage/app (what Laravel stores), or to the project root"""
+    for base in (config.STORAGE_APP, config.BASE_PATH):
+        relative = os.path.relpath(path, base)
+        if not relative.startswith('..'):
+            return relative.replace(os.sep, '/')
+    return path
+
+
+def scan(roots, extensions):
+    """Supported files under the roots, sorted so that runs are reproducible"""
+    found = []
+    for root in roots:
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if os.path.splitext(name)[1].lower() in extensions:
+                    found.append(os.path.join(directory, name))
+    return sorted(set(found))
+
+
+class Manifest:
+    """
+    Estado de cada archivo ya procesado, en JSONL de solo añadir.
+
+    Cada archivo terminado añade una línea (y se hace fsync), así que una
+    ejecución interrumpida pierde como mucho el archivo en curso. Al abrirlo
+    gana la última línea de cada ruta y el archivo se compacta.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última línea a medio escribir de una ejecución cortada
+                        continue
+                    self.entries[entry['path']] = entry
+        self._compact()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _compact(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def record(self, entry):
+        self.entries[entry['path']] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def preview_exists(relative_path):
+    return bool(relative_path) and os.path.exists(os.path.join(config.PREVIEW_STORE, relative_path))
+
+
+def pending_work(entry, sha256, ext, tasks, preview_types, versions, retry_failed):
+    """
+    What is missing or stale for one file: (analyze, preview types, reasons).
+
+    Un análisis o una preview se rehacen si no existen, si el contenido cambió
+    (SHA-256) o si su versión es anterior a la actual. Los fallos con el mismo
+    contenido y versión solo se reintentan con `retry_failed`.
+    """
+    analyzer_version, preview_version = versions
+    reasons = []
+    analyze = False
+    if 'analysis' in tasks:
+        if entry is None or entry.get('analysis') is None:
+            analyze, reason = True, 'new'
+        elif entry['sha256'] != sha256:
+            analyze, reason = True, 'changed'
+        elif entry.get('analyzer_version') != analyzer_version:
+            analyze, reason = True, 'analyzer_version'
+        elif entry['analysis'] == 'error' and retry_failed:
+            analyze, reason = True, 'failed'
+        if analyze:
+            reasons.append(f"analysis:{reason}")
+
+    previews = []
+    if 'previews' in tasks:
+        stored = (entry or {}).get('previews', {})
+        for preview_type in preview_types or PREVIEW_TYPES.get(ext, ()):
+            done = stored.get(preview_type)
+            if done is None:
+                reason = 'new'
+            elif entry['sha256'] != sha256:
+                reason = 'changed'
+            elif entry.get('preview_version') != preview_version:
+                reason = 'preview_version'
+            elif done == 'error':
+                reason = 'failed' if retry_failed else None
+            elif not preview_exists(done):
+                reason = 'missing_preview'
+            else:
+                reason = None
+            if reason:
+                previews.append(preview_type)
+                reasons.append(f"{preview_type}:{reason}")
+    return analyze, previews, reasons
+
+
+def hash_files(paths, manifest):
+    """(size, mtime_ns, sha256) per path; unchanged files reuse the manifest hash"""
+    stats, to_hash = {}, []
+    for path in paths:
+        stat = os.stat(path)
+        entry = manifest.get(storage_path(path))
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            stats[path] = (stat.st_size, stat.st_mtime_ns, entry['sha256'])
+        else:
+            stats[path] = (stat.st_size, stat.st_mtime_ns, None)
+            to_hash.append(path)
+    with ThreadPoolExecutor(HASH_THREADS) as executor:
+        for path, digest in zip(to_hash, executor.map(file_sha256, to_hash)):
+            stats[path] = stats[path][:2] + (digest,)
+    return stats
+
+
+def parse_file(file_path, ext):
+    """
+    Leer el archivo una vez para el analizador y las previews.
+
+    STL: se construye la caché de malla preprocesada (mesh_cache), que el
+    analizador y los renders abren con memmap; devuelve None. DXF: documento
+    ezdxf compartido. El resto de formatos (DWG, STEP, EPS) los lee cada
+    herramienta por su cuenta: None.
+    """
+    if ext == '.stl':
+        import mesh_cache
+        mesh_cache.load_or_build(file_path)
+        return None
+    if ext == '.dxf':
+        import ezdxf
+        with metrics.stage('parse', 'dxf', os.path.getsize(file_path)):
+            return ezdxf.readfile(file_path)
+    return None
+
+
+def process_file(file_path, analyze, preview_types, width, height):
+    """Parse once, analyze and render the requested previews (runs in a pool worker)"""
+    import hybrid_preview_server as server
+    started = time.perf_counter()
+    ext = os.path.splitext(file_path)[1].lower()
+    outcome = {'analysis': None, 'previews': {}, 'errors': {}}
+
+    try:
+        parsed = parse_file(file_path, ext)
+    except Exception:
+        # El analizador y el render leerán el archivo e informarán del error
+        parsed = None
+
+    if analyze:
+        analyzer_main = load_analyzer_main()
+        # Los mismos scripts que FileAnalysisController, para que el resultado coincida
+        script = analyzer_main.controller_script(ext)
+        try:
+            result = json.loads(analyzer_main.run_analyzer(script, file_path, parsed=parsed))
+            outcome['analysis'] = result
+            if 'error' in result:
+                outcome['errors']['analysis'] = result['error']
+        except Exception as e:
+            outcome['errors']['analysis'] = str(e)
+
+    if preview_types:
+        if parsed is not None:
+            server.preloaded[file_path] = parsed
+        try:
+            for preview_type in preview_types:
+                try:
+                    outcome['previews'][preview_type] = server.render_preview_file(
+                        file_path, ext.lstrip('.'), preview_type, width, height)
+                except Exception as e:
+                    outcome['errors'][preview_type] = getattr(e, 'detail', None) or str(e)
+        finally:
+            server.preloaded.pop(file_path, None)
+
+    outcome['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+def _preview_record(preview):
+    keys = ('relative_path', 'url', 'format', 'content_type', 'bytes', 'sha256', 'width', 'height')
+    return {key: preview.get(key) for key in keys}
+
+
+async def run_backfill(work, manifest, output, versions, args):
+    """Process the pending files in the pool, writing results and checkpoints as they finish"""
+    analyzer_version, preview_version = versions
+    pool = RenderPool(args.workers, args.timeout)
+    semaphore = asyncio.Semaphore(pool.workers)
+    totals = Counter()
+    done = 0
+
+    # Archivos con el mismo contenido (p. ej. en models y en uploads) se procesan una vez
+    groups = {}
+    for item in work:
+        key = (item['sha256'], item['ext'], item['analyze'], tuple(item['previews']))
+        groups.setdefault(key, []).append(item)
+
+    async def handle(items):
+        nonlocal done
+        first = items[0]
+        async with semaphore:
+            try:
+                outcome = await pool.run(process_file, first['file_path'], first['analyze'],
+                                         first['previews'], args.width, args.height)
+            except (RenderError, RenderTimeout) as e:
+                error = getattr(e, 'detail', None) or str(e)
+                outcome = {'analysis': None, 'previews': {}, 'elapsed_ms': None,
+                           'errors': {task: error for task in (['analysis'] if first['analyze'] else []) + first['previews']}}
+
+        for item in items:
+            previous = manifest.get(item['path']) or {}
+            same_content = previous.get('sha256') == item['sha256']
+            entry = {
+                'path': item['path'],
+                'size': item['size'],
+                'mtime_ns': item['mtime_ns'],
+                'sha256': item['sha256'],
+                'analyzer_version': previous.get('analyzer_version') if same_content else None,
+                'preview_version': previous.get('preview_version') if same_content else None,
+                'analysis': previous.get('analysis') if same_content else None,
+                'previews': dict(previous.get('previews', {})) if same_content else {},
+                'errors': outcome['errors'],
+                'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            if item['analyze']:
+                entry['analysis'] = 'error' if 'analysis' in outcome['errors'] else 'ok'
+                entry['analyzer_version'] = analyzer_version
+            if item['previews']:
+                for preview_type in item['previews']:
+                    preview = outcome['previews'].get(preview_type)
+                    entry['previews'][preview_type] = preview['relative_path'] if preview else 'error'
+                entry['preview_version'] = preview_version
+
+            output.write(json.dumps({
+                'file_path': item['path'],
+                'sha256': item['sha256'],
+                'size': item['size'],
+                'analyzer_version': analyzer_version if item['analyze'] else None,
+                'preview_version': preview_version if item['previews'] else None,
+                'analysis': outcome['analysis'],
+                'previews': {t: _preview_record(p) for t, p in outcome['previews'].items()},
+                'errors': outcome['errors'],
+                'elapsed_ms': outcome['elapsed_ms'],
+            }) + '\n')
+            output.flush()
+            manifest.record(entry)
+
+            done += 1
+            status = 'ok' if not outcome['errors'] else f"errors: {', '.join(outcome['errors'])}"
+            totals['failed' if outcome['errors'] else 'ok'] += 1
+            debug(f"[{done}/{len(work)}] {item['path']} {status} ({outcome['elapsed_ms']} ms)")
+
+    try:
+        await asyncio.gather(*(handle(items) for items in groups.values()))
+    finally:
+        pool.shutdown()
+    totals['deduplicated'] = len(work) - len(groups)
+    return totals
+
+
+def build_plan(args, manifest, versions, extensions):
+    paths = scan(args.roots, extensions)
+    stats = hash_files(paths, manifest)
+    work, reasons, up_to_date = [], Counter(), 0
+    for path in paths:
+        size, mtime_ns, sha256 = stats[path]
+        relative = storage_path(path)
+        ext = os.path.splitext(path)[1].lower()
+        entry = None if args.force else manifest.get(relative)
+        analyze, previews, why = pending_work(entry, sha256, ext.lstrip('.'), args.tasks,
+                                              args.preview_types, versions, args.retry_failed)
+        if not analyze and not previews:
+            up_to_date += 1
+            continue
+        reasons.update(reason.split(':', 1)[1] for reason in why)
+        work.append({'path': relative, 'file_path': path, 'ext': ext, 'size': size, 'mtime_ns': mtime_ns,
+                     'sha256': sha256, 'analyze': analyze, 'previews': previews})
+    if args.limit:
+        work = work[:args.limit]
+    return paths, work, reasons, up_to_date
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill missing or stale analyses and previews")
+    parser.add_argument('--roots', nargs='+', default=[config.MODELS_DIR, config.UPLOADS_DIR],
+                        help="Directories to scan (default: storage/app/models and storage/app/uploads)")
+    parser.add_argument('--tasks', default='analysis,previews', help="Comma separated: analysis, previews")
+    parser.add_argument('--preview-types', help="Comma separated preview types (default: per extension)")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--workers', type=int, default=config.RENDER_WORKERS)
+    parser.add_argument('--timeout', type=float, default=FILE_TIMEOUT, help="Seconds per file")
+    parser.add_argument('--manifest', default=os.path.join(config.BACKFILL_DIR, 'manifest.jsonl'))
+    parser.add_argument('--output', default=os.path.join(config.BACKFILL_DIR, 'results.jsonl'),
+                        help="JSONL results for bulk import (appended)")
+    parser.add_argument('--limit', type=int, help="Process at most this many files")
+    parser.add_argument('--force', action='store_true', help="Ignore the manifest and redo everything")
+    parser.add_argument('--retry-failed', action='store_true', help="Retry files that failed with the same content")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be processed")
+    args = parser.parse_args()
+    args.tasks = {task.strip() for task in args.tasks.split(',') if task.strip()}
+    if not args.tasks <= {'analysis', 'previews'}:
+        parser.error("--tasks accepts analysis and previews")
+    if args.preview_types:
+        args.preview_types = [t.strip() for t in args.preview_types.split(',') if t.strip()]
+
+    # Sin /metrics propio: lo que mida este proceso lo suma el servidor de previews
+    metrics.enable_spool()
+    analyzer_main = load_analyzer_main()
+    import hybrid_preview_server as server
+    versions = (analyzer_main.ANALYZER_VERSION, server.PREVIEW_VERSION)
+    extensions = set(analyzer_main.EXTENSION_MAP)
+
+    started = time.perf_counter()
+    manifest = Manifest(args.manifest)
+    paths, work, reasons, up_to_date = build_plan(args, manifest, versions, extensions)
+    summary = {
+        'scanned': len(paths),
+        'up_to_date': up_to_date,
+        'pending': len(work),
+        'reasons': dict(reasons),
+        'analyzer_version': versions[0],
+        'preview_version': versions[1],
+    }
+    debug(f"Scanned {len(paths)} files in {time.perf_counter() - started:.1f}s: {len(work)} to process")
+
+    if not args.dry_run and work:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        try:
+            with open(args.output, 'a', encoding='utf-8') as output:
+                totals = asyncio.run(run_backfill(work, manifest, output, versions, args))
+        finally:
+            manifest.close()
+        summary.update(totals)
+    else:
+        manifest.close()
+
+    summary['elapsed_s'] = round(time.perf_counter() - started, 2)
+    debug(json.dumps(summary, indent=2))
+    return 1 if summary.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
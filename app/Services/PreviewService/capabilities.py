@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Registro de capacidades del servidor de previews
+Detecta los backends opcionales sin importarlos y los carga en el primer uso
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import importlib
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+
+def _load_matplotlib():
+    import matplotlib
+    matplotlib.use('Agg')  # Backend sin GUI para Windows
+    import matplotlib.pyplot
+    from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 (registra la proyección 3d)
+
+
+def _load_pythonocc():
+    import OCC.Core.STEPControl
+    import OCC.Core.IFSelect
+    import OCC.Core.BRepMesh
+    import OCC.Core.Bnd
+    import OCC.Core.BRepBndLib  # noqa: F401
+
+
+def _load_pyvista():
+    import pyvista as pv
+    # Configurar para Windows
+    pv.set_plot_theme("document")
+    pv.global_theme.notebook = False
+
+
+# nombre -> (módulo que se busca con find_spec, función de carga o módulo a importar)
+BACKENDS = {
+    'numpy': ('numpy', 'numpy'),
+    'matplotlib': ('matplotlib', _load_matplotlib),
+    'numpy_stl': ('stl', 'stl.mesh'),
+    'pythonocc': ('OCC', _load_pythonocc),
+    'pyvista': ('pyvista', _load_pyvista),
+    'ezdxf': ('ezdxf', 'ezdxf'),
+}
+
+# Backends que necesita cada tipo de archivo
+FILE_TYPE_BACKENDS = {
+    'stl': ('numpy', 'matplotlib', 'numpy_stl'),
+    'step': ('numpy', 'matplotlib', 'pythonocc'),
+    'stp': ('numpy', 'matplotlib', 'pythonocc'),
+    'dxf': ('matplotlib', 'ezdxf'),
+    'dwg': ('matplotlib', 'ezdxf'),
+    'eps': (),
+    'ai': (),
+}
+
+# Precarga por defecto cuando todavía no hay estadísticas de tráfico
+DEFAULT_WARM_UP = ('numpy', 'matplotlib', 'numpy_stl')
+
+# Segundos entre escrituras del archivo de uso (los contadores viven en memoria)
+USAGE_FLUSH_SECONDS = float(os.environ.get('POLLUX_USAGE_FLUSH_SECONDS', '30'))
+
+_lock = threading.RLock()
+_probes = None
+_loaded = {}        # nombre -> ms de importación
+_failed = {}        # nombre -> error de importación
+_usage = {}         # nombre -> peticiones que lo han necesitado
+_usage_path = None
+_usage_lock = threading.Lock()
+_usage_dirty = False
+_flusher = None     # (hilo, evento de parada)
+
+
+def _cache_path():
+    key = hashlib.sha1('\0'.join([sys.executable, sys.version] + sys.path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"pollux_capabilities_{key}.json")
+
+
+def _environment_stamp():
+    """mtime de los directorios de sys.path: cambia al instalar o desinstalar paquetes"""
+    stamp = {}
+    for entry in sys.path:
+        try:
+            stamp[entry] = os.stat(entry or '.').st_mtime
+        except OSError:
+            continue
+    return stamp
+
+
+def probe(refresh=False):
+    """
+    Disponibilidad de cada backend sin importarlo (importlib.util.find_spec).
+
+    El resultado se guarda en disco y se reutiliza mientras el intérprete,
+    sys.path y las fechas de sus directorios no cambien.
+    """
+    global _probes
+    with _lock:
+        if _probes is not None and not refresh:
+            return _probes
+
+        cache_file = _cache_path()
+        stamp = _environment_stamp()
+        if not refresh:
+            try:
+                with open(cache_file) as f:
+                    cached = json.load(f)
+                if cached.get('stamp') == stamp and set(cached['backends']) == set(BACKENDS):
+                    _probes = cached['backends']
+                    return _probes
+            except (OSError, ValueError, KeyError):
+                pass
+
+        probes = {}
+        for name, (module, _) in BACKENDS.items():
+            started = time.perf_counter()
+            try:
+                spec = importlib.util.find_spec(module)
+            except (ImportError, ValueError):
+                spec = None
+            probes[name] = {
+                'available': spec is not None,
+                'origin': getattr(spec, 'origin', None),
+                'probe_ms': round((time.perf_counter() - started) * 1000, 3),
+            }
+        _probes = probes
+
+        try:
+            with open(cache_file, 'w') as f:
+                json.dump({'stamp': stamp, 'backends': probes}, f)
+        except OSError:
+            pass
+        return _probes
+
+
+def available(name):
+    """True if the backend is installed and has not failed to import"""
+    return name not in _failed and probe().get(name, {}).get('available', False)
+
+
+def load(name):
+    """Import a backend on first use (thread-safe); raises ImportError if unavailable"""
+    if name in _loaded:
+        return
+    with _lock:
+        if name in _loaded:
+            return
+        if name in _failed:
+            raise ImportError(_failed[name])
+        if not probe().get(name, {}).get('available'):
+            _failed[name] = f"{name} is not installed"
+            raise ImportError(_failed[name])
+
+        _, loader = BACKENDS[name]
+        started = time.perf_counter()
+        try:
+            if callable(loader):
+                loader()
+            else:
+                importlib.import_module(loader)
+        except Exception as e:
+            _failed[name] = f"{type(e).__name__}: {e}"
+            logger.warning(f"Backend {name} failed to import: {e}")
+            raise ImportError(_failed[name]) from e
+        _loaded[name] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Backend {name} imported in {_loaded[name]} ms")
+
+
+def backends_for(file_type):
+    return FILE_TYPE_BACKENDS.get((file_type or '').lower().lstrip('.'), ())
+
+
+class LazyModule:
+    """Módulo que se importa (vía su backend) al acceder al primer atributo"""
+
+    def __init__(self, module, backend):
+        self._module_name = module
+        self._backend = backend
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__.get('_module')
+        if module is None:
+            load(self._backend)
+            module = self._module = importlib.import_module(self._module_name)
+        return getattr(module, attr)
+
+
+def lazy(module, backend):
+    return LazyModule(module, backend)
+
+
+# --- Estadísticas de uso para la precarga ---
+
+def set_usage_file(path):
+    """Persist per-backend usage counts in `path` (loaded now, saved by flush_usage)"""
+    global _usage_path, _usage, _usage_dirty
+    try:
+        with open(path) as f:
+            usage = {k: int(v) for k, v in json.load(f).items() if k in BACKENDS}
+    except (OSError, ValueError, AttributeError):
+        usage = {}
+    with _usage_lock:
+        _usage_path, _usage, _usage_dirty = path, usage, False
+
+
+def record_use(file_type):
+    """Count the backends a request needed (in memory: safe on the event loop)"""
+    global _usage_dirty
+    names = backends_for(file_type)
+    if not names:
+        return
+    with _usage_lock:
+        for name in names:
+            _usage[name] = _usage.get(name, 0) + 1
+        _usage_dirty = True
+
+
+def flush_usage():
+    """Write the usage counts if they changed since the last flush (blocking I/O)"""
+    global _usage_dirty
+    with _usage_lock:
+        if not _usage_dirty or not _usage_path:
+            return False
+        path, snapshot, _usage_dirty = _usage_path, dict(_usage), False
+    try:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not save backend usage to {path}: {e}")
+        with _usage_lock:
+            _usage_dirty = True
+        return False
+    return True
+
+
+def start_usage_flusher(interval=None):
+    """Flush the usage counts every `interval` seconds from a daemon thread"""
+    global _flusher
+    interval = USAGE_FLUSH_SECONDS if interval is None else interval
+    with _lock:
+        if _flusher is not None:
+            return
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                flush_usage()
+
+        thread = threading.Thread(target=run, name='backend-usage-flush', daemon=True)
+        thread.start()
+        _flusher = (thread, stop)
+
+
+def stop_usage_flusher():
+    """Stop the flush thread and write the last counts (on shutdown)"""
+    global _flusher
+    with _lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        thread, stop = flusher
+        stop.set()
+        thread.join()
+    flush_usage()
+
+
+def warm_up_backends(min_share=0.05):
+    """Backends worth preloading: those used by at least `min_share` of past requests"""
+    with _usage_lock:
+        usage = dict(_usage)
+    if not usage:
+        return [name for name in DEFAULT_WARM_UP if available(name)]
+    top = max(usage.values())
+    return [name for name, count in sorted(usage.items(), key=lambda item: -item[1])
+            if count >= top * min_share and available(name)]
+
+
+def preload(names):
+    """Import the given backends (runs inside each render worker); returns the report"""
+    for name in names:
+        try:
+            load(name)
+        except ImportError:
+            pass
+    return report()
+
+
+def report():
+    """Probe results and import times for /health"""
+    probes = probe()
+    return {
+        name: {
+            'available': info['available'] and name not in _failed,
+            'loaded': name in _loaded,
+            'import_ms': _loaded.get(name),
+            'error': _failed.get(name),
+            'requests': _usage.get(name, 0),
+        }
+        for name, info in probes.items()
+    }
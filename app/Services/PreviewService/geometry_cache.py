@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Consultas geométricas sobre mallas cargadas: picking, punto más cercano y medidas
+Cada malla se lee una vez y su BVH queda en memoria (LRU por número de triángulos)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+import mesh_cache
+from mesh_bvh import BVH
+
+SUPPORTED_EXTENSIONS = ('.stl',)
+
+# Límites de la caché: mallas residentes y triángulos totales entre todas ellas
+MAX_MESHES = 8
+MAX_TRIANGLES = 20_000_000
+
+# Puntos o rayos por consulta
+MAX_QUERY = 100_000
+
+
+def _as_points(values, name):
+    """Validate a list of 3D points/vectors into an (n, 3) float64 array"""
+    array = np.asarray(values, dtype=np.float64)
+    if array.ndim == 1:
+        array = array.reshape(1, -1)
+    if array.ndim != 2 or array.shape[1] != 3 or len(array) == 0:
+        raise ValueError(f"{name} must be a non-empty list of [x, y, z]")
+    if len(array) > MAX_QUERY:
+        raise ValueError(f"{name}: at most {MAX_QUERY} entries per query")
+    if not np.all(np.isfinite(array)):
+        raise ValueError(f"{name} contains non-finite values")
+    return array
+
+
+def _rows(array):
+    return array.tolist()
+
+
+class Geometry:
+    """
+    Malla cargada con su BVH. Todas las coordenadas y distancias están en las
+    unidades del archivo, sin redondeo.
+    """
+
+    def __init__(self, path, triangles, file_format):
+        started = time.perf_counter()
+        self.path = path
+        self.format = file_format
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.float64)
+        self.bvh = BVH(self.triangles)
+        normals = np.cross(self.triangles[:, 1] - self.triangles[:, 0], self.triangles[:, 2] - self.triangles[:, 0])
+        lengths = np.linalg.norm(normals, axis=1)
+        self.normals = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+        self.build_ms = (time.perf_counter() - started) * 1000
+        self.last_used = time.time()
+
+    @property
+    def count(self):
+        return len(self.triangles)
+
+    def info(self):
+        lower, upper = self.bvh.bounds
+        return {
+            "file_path": self.path,
+            "format": self.format,
+            "triangles": self.count,
+            "bbox_min": _rows(lower),
+            "bbox_max": _rows(upper),
+            "diagonal": float(self.bvh.diagonal),
+            "build_ms": round(self.build_ms, 3),
+        }
+
+    def raycast(self, origins, directions, max_distance=None):
+        """First hit per ray: distance, point, face normal and triangle index (-1 = miss)"""
+        origins = _as_points(origins, "origins")
+        directions = _as_points(directions, "directions")
+        if len(directions) == 1 and len(origins) > 1:
+            directions = np.repeat(directions, len(origins), axis=0)
+        if len(origins) != len(directions):
+            raise ValueError("origins and directions must have the same length")
+        lengths = np.linalg.norm(directions, axis=1)
+        if np.any(lengths == 0):
+            raise ValueError("directions must be non-zero")
+        directions = directions / lengths[:, None]
+
+        started = time.perf_counter()
+        distance, triangle = self.bvh.intersect(origins, directions,
+                                                t_max=np.inf if max_distance is None else float(max_distance))
+        elapsed = time.perf_counter() - started
+        hit = triangle >= 0
+        points = origins + directions * np.where(hit, distance, 0.0)[:, None]
+        return {
+            "hits": [
+                {
+                    "hit": True,
+                    "distance": float(distance[i]),
+                    "point": _rows(points[i]),
+                    "normal": _rows(self.normals[triangle[i]]),
+                    "triangle": int(triangle[i])
+                } if hit[i] else {"hit": False}
+                for i in range(len(origins))
+            ],
+            "query_ms": round(elapsed * 1000, 4)
+        }
+
+    def closest(self, points):
+        """Closest surface point, distance and triangle for each query point"""
+        points = _as_points(points, "points")
+        started = time.perf_counter()
+        closest, distance, triangle = self.bvh.closest_points(points)
+        elapsed = time.perf_counter() - started
+        return {
+            "results": [
+                {
+                    "point": _rows(closest[i]),
+                    "distance": float(distance[i]),
+                    "normal": _rows(self.normals[triangle[i]]),
+                    "triangle": int(triangle[i])
+                }
+                for i in range(len(points))
+            ],
+            "query_ms": round(elapsed * 1000, 4)
+        }
+
+    def measure(self, points, snap=False):
+        """
+        Distancias entre puntos consecutivos (polilínea) y longitud total.
+        Con `snap` cada punto se lleva antes a la superficie más cercana.
+        """
+        points = _as_points(points, "points")
+        if len(points) < 2:
+            raise ValueError("points must contain at least two points")
+        started = time.perf_counter()
+        snapped = None
+        if snap:
+            points, snapped, _ = self.bvh.closest_points(points)
+        delta = np.diff(points, axis=0)
+        distance = np.linalg.norm(delta, axis=1)
+        elapsed = time.perf_counter() - started
+        result = {
+            "points": _rows(points),
+            "segments": [
+                {"delta": _rows(delta[i]), "distance": float(distance[i])}
+                for i in range(len(delta))
+            ],
+            "total_distance": float(distance.sum()),
+            "query_ms": round(elapsed * 1000, 4)
+        }
+        if snapped is not None:
+            result["snap_distances"] = [float(d) for d in snapped]
+        return result
+
+
+def load_geometry(path):
+    """Build a Geometry from the mesh cache if the analysis already built it, else from the STL"""
+    if os.path.splitext(path)[1].lower() not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Geometry queries support {', '.join(SUPPORTED_EXTENSIONS)} files")
+    triangles, source_format = mesh_cache.load_triangles(path)
+    with metrics.stage('mesh', 'stl', os.path.getsize(path)):
+        return Geometry(path, triangles, source_format)
+
+
+class GeometryCache:
+    """
+    LRU de geometrías por (ruta, mtime, tamaño): si el archivo cambia en disco
+    la entrada vieja deja de coincidir y se vuelve a cargar.
+    """
+
+    def __init__(self, max_meshes=MAX_MESHES, max_triangles=MAX_TRIANGLES):
+        self.max_meshes = int(max_meshes)
+        self.max_triangles = int(max_triangles)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Un cerrojo por archivo para no construir dos veces el mismo BVH
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(path):
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+
+    def _lookup(self, path):
+        key = self._key(path)
+        with self._lock:
+            geometry = self._entries.get(key)
+            if geometry is not None:
+                self._entries.move_to_end(key)
+                geometry.last_used = time.time()
+            return geometry
+
+    def cached(self, path):
+        """Cached geometry for an unchanged file, or None (only hits are counted)"""
+        geometry = self._lookup(path)
+        if geometry is not None:
+            self.hits += 1
+            metrics.cache_lookup('geometry', hit=True)
+        return geometry
+
+    def get(self, path):
+        """Geometry for `path`, loading and building the BVH on a miss: (geometry, cached)"""
+        geometry = self.cached(path)
+        if geometry is not None:
+            return geometry, True
+
+        with self._lock:
+            loading = self._loading.setdefault(path, threading.Lock())
+        with loading:
+            geometry = self.cached(path)
+            if geometry is not None:
+                return geometry, True
+            self.misses += 1
+            metrics.cache_lookup('geometry', hit=False)
+            key = self._key(path)
+            geometry = load_geometry(path)
+            with self._lock:
+                # Versiones anteriores del mismo archivo ya no sirven
+                for stale in [k for k in self._entries if k[0] == path]:
+                    del self._entries[stale]
+                self._entries[key] = geometry
+                self._evict()
+                self._loading.pop(path, None)
+        return geometry, False
+
+    def _evict(self):
+        total = sum(g.count for g in self._entries.values())
+        # La entrada más reciente se queda aunque ella sola supere el límite
+        while len(self._entries) > 1 and (len(self._entries) > self.max_meshes or total > self.max_triangles):
+            _, geometry = self._entries.popitem(last=False)
+            total -= geometry.count
+            self.evictions += 1
+
+    def drop(self, path):
+        """Forget every cached version of `path`: number of entries removed"""
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == path]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "meshes": len(entries),
+            "triangles": sum(g.count for g in entries),
+            "max_meshes": self.max_meshes,
+            "max_triangles": self.max_triangles,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "files": [{"file_path": g.path, "triangles": g.count} for g in entries]
+        }
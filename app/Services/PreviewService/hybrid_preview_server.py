@@ -7,11 +7,16 @@ Evita problemas de VTK en Windows mientras mantiene funcionalidad completa
 import sys
 import os
 import time
+
+# Inicio del arranque, para medir el tiempo hasta estar listo
+MODULE_IMPORT_STARTED = time.perf_counter()
+
 import json
+import asyncio
+import importlib.util
 import logging
 from pathlib import Path
-from typing import Optional, Dict, Any
-import uuid
+from typing import Optional, Dict, Any, List
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -21,91 +26,53 @@ print("Starting Hybrid Preview Server (matplotlib + numpy-stl)...")
 
 # Importar configuración de rutas
 from path_config import config
+# Módulos compartidos con los analizadores (métricas, Ghostscript)
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+import profiling
+from render_pool import RenderPool, RenderError, RenderTimeout
+from preview_store import PreviewStore
+from job_queue import JobQueue, PRIORITIES, TERMINAL_STATUSES, run_in_job_context, report
 
 # Verificar y crear directorios necesarios
 print(f"Project root: {config.BASE_PATH}")
 config.ensure_directories()
 
-# Importar dependencias básicas
+# Importar dependencias básicas (los backends pesados se cargan en el primer uso)
 try:
     logger.info("Starting server initialization...")
     
     from PIL import Image, ImageDraw, ImageFont
-    logger.info("PIL imported successfully")
     
-    from fastapi import FastAPI, HTTPException, Request
-    from fastapi.responses import JSONResponse, FileResponse
+    from fastapi import FastAPI, HTTPException, Request, Header
+    from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
     from fastapi.middleware.cors import CORSMiddleware
     from pydantic import BaseModel
     import uvicorn
     logger.info("FastAPI and related imports successful")
     
-    import numpy as np
-    logger.info("NumPy imported successfully")
-    
-    # Matplotlib para 2D
-    import matplotlib
-    matplotlib.use('Agg')  # Backend sin GUI para Windows
-    import matplotlib.pyplot as plt
-    from mpl_toolkits.mplot3d import Axes3D
-    logger.info("Matplotlib imported successfully - 2D/3D visualization supported")
-    
-    # numpy-stl para STL
-    from stl import mesh
-    logger.info("numpy-stl imported successfully - STL files supported")
-    
-    # PythonOCC para STEP
-    try:
-        from OCC.Core.STEPControl import STEPControl_Reader
-        from OCC.Core.IFSelect import IFSelect_RetDone
-        from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
-        from OCC.Core.TopoDS import TopoDS_Shape
-        from OCC.Core.BRep import BRep_Builder
-        from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Vec
-        from OCC.Core.Bnd import Bnd_Box
-        from OCC.Core.BRepBndLib import brepbndlib_Add
-        logger.info("PythonOCC imported successfully - STEP files supported")
-        HAS_PYTHONOCC = True
-    except ImportError as e:
-        logger.warning(f"PythonOCC import failed - STEP files will not be supported: {e}")
-        HAS_PYTHONOCC = False
-    
-    # PyVista (opcional, solo para funciones avanzadas)
-    try:
-        import pyvista as pv
-        # Configurar para Windows
-        pv.set_plot_theme("document")
-        pv.global_theme.notebook = False
-        logger.info("PyVista imported successfully - Advanced 3D features available")
-        HAS_PYVISTA = True
-    except ImportError as e:
-        logger.warning(f"PyVista import failed - Using matplotlib fallback: {e}")
-        HAS_PYVISTA = False
-    
-    # DXF support via ezdxf
-    try:
-        import ezdxf
-        logger.info("ezdxf imported successfully - DXF files supported")
-        HAS_DXF = True
-    except ImportError as e:
-        logger.warning(f"ezdxf import failed - DXF files will not be supported: {e}")
-        HAS_DXF = False
-    
-    # EPS support via subprocess + ghostscript
-    try:
-        import subprocess
-        # Verificar si ghostscript está disponible
-        subprocess.run(['gs', '--version'], capture_output=True, check=True)
-        logger.info("Ghostscript found - EPS files supported")
-        HAS_EPS = True
-    except (ImportError, subprocess.CalledProcessError, FileNotFoundError) as e:
-        logger.warning(f"Ghostscript not available - EPS files will not be supported: {e}")
-        HAS_EPS = False
-        
+    import capabilities
+    import ghostscript_pool
 except ImportError as e:
     logger.error(f"Critical import failed: {e}")
     sys.exit(1)
 
+# matplotlib, numpy-stl, PythonOCC, PyVista y ezdxf solo se detectan (find_spec);
+# se importan al renderizar o en la precarga de los workers
+np = capabilities.lazy('numpy', 'numpy')
+plt = capabilities.lazy('matplotlib.pyplot', 'matplotlib')
+mesh = capabilities.lazy('stl.mesh', 'numpy_stl')
+ezdxf = capabilities.lazy('ezdxf', 'ezdxf')
+
+HAS_PYTHONOCC = capabilities.available('pythonocc')
+HAS_PYVISTA = capabilities.available('pyvista')
+HAS_DXF = capabilities.available('ezdxf')
+# Solo se busca el ejecutable; la versión se detecta (y cachea) en el primer uso
+HAS_EPS = bool(ghostscript_pool.find_ghostscript())
+for backend, supported in capabilities.report().items():
+    logger.info(f"Backend {backend}: {'available' if supported['available'] else 'not available'}")
+logger.info(f"Ghostscript: {'available' if HAS_EPS else 'not available'}")
+
 # Configuración
 class Config:
     def __init__(self):
@@ -117,9 +84,59 @@ class Config:
         self.TEMP_DIR = config.TEMP_DIR
         self.PREVIEWS_DIR = config.PREVIEWS_DIR
         self.PUBLIC_PREVIEWS = config.PUBLIC_PREVIEWS
+        self.RENDER_WORKERS = config.RENDER_WORKERS
+        self.RENDER_TIMEOUT = config.RENDER_TIMEOUT
+        self.JOBS_DB = config.JOBS_DB
+        self.PREVIEW_STORE = config.PREVIEW_STORE
+        self.PREVIEW_STORE_URL = config.PREVIEW_STORE_URL
+        self.IMAGE_FORMAT = config.IMAGE_FORMAT
+        self.PNG_COMPRESSION = config.PNG_COMPRESSION
+        self.IMAGE_QUALITY = config.IMAGE_QUALITY
+        self.PROFILE_DIR = config.PROFILE_DIR
+        self.PROFILE_SAMPLE_RATE = config.PROFILE_SAMPLE_RATE
+        self.BACKEND_USAGE_FILE = config.BACKEND_USAGE_FILE
+        self.GEOMETRY_CACHE_MESHES = config.GEOMETRY_CACHE_MESHES
+        self.GEOMETRY_CACHE_TRIANGLES = config.GEOMETRY_CACHE_TRIANGLES
+        self.TURNTABLE_FRAMES = config.TURNTABLE_FRAMES
+        self.TURNTABLE_ELEVATION = config.TURNTABLE_ELEVATION
+        self.TURNTABLE_FRAME_MS = config.TURNTABLE_FRAME_MS
+        self.TURNTABLE_MAX_FRAME = config.TURNTABLE_MAX_FRAME
 
 server_config = Config()
 
+# Pool de procesos para el renderizado (se crea bajo demanda, también en workers spawn)
+render_pool = RenderPool(server_config.RENDER_WORKERS, server_config.RENDER_TIMEOUT)
+
+# Previews direccionadas por contenido (escritura única y atómica)
+preview_store = PreviewStore(
+    server_config.PREVIEW_STORE,
+    server_config.PREVIEW_STORE_URL,
+    image_format=server_config.IMAGE_FORMAT,
+    png_compression=server_config.PNG_COMPRESSION,
+    quality=server_config.IMAGE_QUALITY
+)
+
+# Cola de trabajos persistente; los despachadores se arrancan en el evento startup
+job_queue = JobQueue(server_config.JOBS_DB)
+job_wakeup: Optional[asyncio.Event] = None
+job_workers = []
+
+# Versión de los renders: subirla cuando cambie el aspecto de las previews
+# para que backfill.py las regenere
+PREVIEW_VERSION = "2025.11"
+
+# Giro completo en un solo render: sprite sheet (turntable) o WebP animado (turntable_animated)
+TURNTABLE_TYPES = ("turntable", "turntable_animated")
+
+# Documentos ezdxf ya leídos por quien llama (backfill.py), por ruta
+preloaded: Dict[str, Any] = {}
+
+# BVH de las mallas consultadas por /geometry (geometry_cache importa numpy: se crea en el primer uso)
+geometry_cache = None
+
+# Arranque: import del módulo, tiempo hasta aceptar peticiones y precarga de backends
+startup_info = {"import_ms": None, "time_to_ready_ms": None, "warm_up": "pending", "workers": []}
+
 # Modelos Pydantic
 class PreviewRequest(BaseModel):
     file_path: str
@@ -130,6 +147,27 @@ class PreviewRequest(BaseModel):
     background_color: Optional[str] = "#FFFFFF"  # Para compatibilidad con Laravel
     file_type: Optional[str] = None  # Para compatibilidad con Laravel
     options: Optional[Dict[str, Any]] = None
+    delivery: str = "inline"  # inline (base64 + URL) | url (solo URL y metadatos)
+    profile: Optional[str] = None  # cprofile | sample (también cabecera X-Pollux-Profile)
+
+class JobRequest(PreviewRequest):
+    kind: str = "preview"  # preview | analysis
+    priority: str = "normal"  # interactive | normal | backfill
+
+class GeometryRequest(BaseModel):
+    file_path: str
+
+class RaycastRequest(GeometryRequest):
+    origins: List[List[float]]
+    directions: List[List[float]]  # una dirección por rayo, o una sola para todos
+    max_distance: Optional[float] = None
+
+class ClosestPointRequest(GeometryRequest):
+    points: List[List[float]]
+
+class MeasureRequest(GeometryRequest):
+    points: List[List[float]]  # polilínea: se mide cada par consecutivo
+    snap: bool = False  # llevar cada punto a la superficie antes de medir
 
 # FastAPI app
 app = FastAPI(
@@ -146,14 +184,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Record request latency by route template and status code"""
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        metrics.observe_request(request.method, route, status_code, time.perf_counter() - started)
+
+def _render_pool_gauge(key):
+    return lambda: render_pool.stats()[key]
+
+metrics.registry.gauge('pollux_render_pool_workers', 'Render worker processes', _render_pool_gauge('workers'))
+metrics.registry.gauge('pollux_render_pool_active_jobs', 'Render jobs currently running', _render_pool_gauge('active_jobs'))
+metrics.registry.gauge('pollux_render_pool_queued_jobs', 'Render jobs waiting for a free worker', _render_pool_gauge('queued_jobs'))
+metrics.registry.gauge('pollux_render_pool_utilization', 'Busy fraction of the render workers since start', _render_pool_gauge('utilization'))
+metrics.registry.gauge('pollux_render_pool_restarts', 'Render pool restarts after a timeout or crash', _render_pool_gauge('restarts'))
+metrics.registry.gauge(
+    'pollux_job_queue_depth', 'Queued jobs per priority lane',
+    lambda: [({'lane': lane}, job_queue.depth().get(lane, 0)) for lane in PRIORITIES]
+)
+
 # Funciones de generación específicas por tipo de archivo
 
-def generate_dxf_preview(file_path: str, width: int = 800, height: int = 600) -> str:
+def stage(name: str):
+    """Start a pipeline stage: progress event for the job and latency metric"""
+    report(name)
+    metrics.mark(name)
+
+def save_figure(**savefig_kwargs) -> dict:
+    """Encode the current matplotlib figure once and store it by content hash"""
+    data, image_format = preview_store.encode_figure(plt.gcf(), **savefig_kwargs)
+    plt.close()
+    return preview_store.store_bytes(data, image_format)
+
+def load_stl_mesh(file_path: str):
+    """numpy-stl mesh from the mesh cache if the analysis already built it, else parsed from the STL"""
+    import mesh_cache
+    triangles, _ = mesh_cache.load_triangles(file_path, np.float32)
+    stl_mesh = mesh.Mesh(np.zeros(len(triangles), dtype=mesh.Mesh.dtype))
+    stl_mesh.vectors[:] = triangles
+    return stl_mesh
+
+def load_dxf_document(file_path: str):
+    """ezdxf document for a file, reusing the one preloaded by the caller"""
+    doc = preloaded.get(file_path)
+    return doc if doc is not None else ezdxf.readfile(file_path)
+
+def generate_dxf_preview(file_path: str, width: int = 800, height: int = 600) -> dict:
     """Generate preview for DXF file using ezdxf + matplotlib"""
     try:
-        doc = ezdxf.readfile(file_path)
+        stage('parsing')
+        doc = load_dxf_document(file_path)
         msp = doc.modelspace()
         
+        stage('rendering')
         fig, ax = plt.subplots(figsize=(width/100, height/100))
         ax.set_aspect('equal')
         ax.set_title('DXF Drawing Preview', fontweight='bold')
@@ -183,33 +273,30 @@ def generate_dxf_preview(file_path: str, width: int = 800, height: int = 600) ->
         ax.set_ylabel('Y')
         
         # Guardar
-        preview_filename = f"dxf_preview_{uuid.uuid4().hex[:8]}.png"
-        output_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-        plt.savefig(output_path, dpi=100, bbox_inches='tight')
-        plt.close()
-        
-        return preview_filename
+        stage('encoding')
+        return save_figure(dpi=100, bbox_inches='tight')
         
     except Exception as e:
         logger.error(f"Error generating DXF preview: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate DXF preview: {str(e)}")
 
-def generate_step_preview(file_path: str, width: int = 800, height: int = 600) -> str:
+def generate_step_preview(file_path: str, width: int = 800, height: int = 600) -> dict:
     """Generate preview for STEP file using PythonOCC + matplotlib"""
+    from OCC.Core.Bnd import Bnd_Box
+    from OCC.Core.BRepBndLib import brepbndlib_Add
+    import step_cache
     try:
-        # Leer archivo STEP
-        step_reader = STEPControl_Reader()
-        status = step_reader.ReadFile(file_path)
-        
-        if status != IFSelect_RetDone:
+        # Leer archivo STEP (caché BRep por contenido)
+        stage('parsing')
+        try:
+            assembly = step_cache.load_assembly(file_path)
+        except AssertionError:
             raise ValueError("Failed to read STEP file")
         
-        step_reader.TransferRoots()
-        shape = step_reader.OneShape()
-        
-        # Crear malla para visualización
-        mesh_tool = BRepMesh_IncrementalMesh(shape, 0.1)
-        mesh_tool.Perform()
+        # Crear malla para visualización (bajo el lock del ensamblaje compartido)
+        stage('meshing')
+        step_cache.mesh_assembly(assembly)
+        shape = assembly.compound()
         
         # Obtener bounding box
         bbox = Bnd_Box()
@@ -217,6 +304,7 @@ def generate_step_preview(file_path: str, width: int = 800, height: int = 600) -
         xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
         
         # Crear visualización simple con matplotlib
+        stage('rendering')
         fig = plt.figure(figsize=(width/100, height/100))
         ax = fig.add_subplot(111, projection='3d')
         
@@ -232,53 +320,48 @@ def generate_step_preview(file_path: str, width: int = 800, height: int = 600) -
         ax.set_zlabel('Z')
         
         # Guardar
-        preview_filename = f"step_preview_{uuid.uuid4().hex[:8]}.png"
-        output_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-        plt.savefig(output_path, dpi=100, bbox_inches='tight')
-        plt.close()
-        
-        return preview_filename
+        stage('encoding')
+        return save_figure(dpi=100, bbox_inches='tight')
         
     except Exception as e:
         logger.error(f"Error generating STEP preview: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate STEP preview: {str(e)}")
 
-def generate_eps_preview(file_path: str, width: int = 800, height: int = 600) -> str:
-    """Generate preview for EPS file using Ghostscript"""
+def generate_eps_preview(file_path: str, width: int = 800, height: int = 600) -> dict:
+    """Generate preview for EPS file using Ghostscript (the analysis comes from the same invocation)"""
+    import analyze_ai_eps
     try:
-        import subprocess
-        
-        # Crear archivo PNG temporal usando Ghostscript
-        preview_filename = f"eps_preview_{uuid.uuid4().hex[:8]}.png"
-        output_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-        
-        # Comando Ghostscript para convertir EPS a PNG
-        gs_command = [
-            'gs',
-            '-dNOPAUSE',
-            '-dBATCH',
-            '-sDEVICE=png16m',
-            f'-r100',  # resolución
-            f'-dEPSCrop',
-            f'-sOutputFile={output_path}',
-            file_path
-        ]
-        
-        result = subprocess.run(gs_command, capture_output=True, text=True, check=True)
+        # Crear archivo PNG usando Ghostscript (una sola invocación dentro del pool)
+        output_path = preview_store.temp_path('.png')
         
-        if not os.path.exists(output_path):
-            raise ValueError("Ghostscript failed to generate output file")
+        stage('rendering')
+        try:
+            # Rasterizar y analizar a la vez: la caja envolvente sale del propio PNG si falta en la cabecera
+            analysis = analyze_ai_eps.analyze_ai_eps(file_path, preview_path=output_path, resolution=100)
+            analysis["metadata"].pop("preview_path", None)
             
-        return preview_filename
+            stage('encoding')
+            if preview_store.image_format == 'png':
+                # El PNG de Ghostscript se mueve tal cual a su ubicación final
+                preview = preview_store.store_file(output_path, 'png')
+            else:
+                with Image.open(output_path) as image:
+                    data, image_format = preview_store.encode_image(image)
+                preview = preview_store.store_bytes(data, image_format)
+            preview['analysis'] = analysis
+            return preview
+        finally:
+            if os.path.exists(output_path):
+                os.remove(output_path)
         
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Ghostscript error: {e.stderr}")
-        raise HTTPException(status_code=500, detail=f"Ghostscript failed: {e.stderr}")
+    except RuntimeError as e:
+        logger.error(f"Ghostscript error: {e}")
+        raise HTTPException(status_code=500, detail=f"Ghostscript failed: {e}")
     except Exception as e:
         logger.error(f"Error generating EPS preview: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate EPS preview: {str(e)}")
 
-def generate_2d_matplotlib_preview(file_path: str, width: int = 800, height: int = 600) -> str:
+def generate_2d_matplotlib_preview(file_path: str, width: int = 800, height: int = 600) -> dict:
     """Generate 2D technical drawing using matplotlib"""
     try:
         file_ext = os.path.splitext(file_path)[1].lower()
@@ -294,16 +377,18 @@ def generate_2d_matplotlib_preview(file_path: str, width: int = 800, height: int
         logger.error(f"Error generating 2D matplotlib preview: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate 2D preview: {str(e)}")
 
-def generate_stl_2d_matplotlib(file_path: str, width: int, height: int) -> str:
+def generate_stl_2d_matplotlib(file_path: str, width: int, height: int) -> dict:
     """Generate 2D technical drawing for STL using matplotlib"""
     
     # Cargar STL
-    stl_mesh = mesh.Mesh.from_file(file_path)
+    stage('parsing')
+    stl_mesh = load_stl_mesh(file_path)
     
     # Obtener vértices únicos
     vertices = stl_mesh.vectors.reshape(-1, 3)
     
     # Crear figura con múltiples vistas
+    stage('rendering')
     fig = plt.figure(figsize=(12, 8))
     fig.suptitle('STL Technical Drawing', fontsize=16, fontweight='bold')
     
@@ -346,38 +431,36 @@ def generate_stl_2d_matplotlib(file_path: str, width: int, height: int) -> str:
     plt.tight_layout()
     
     # Guardar imagen
-    preview_filename = f"stl_2d_preview_{uuid.uuid4().hex[:8]}.png"
-    preview_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-    
-    plt.savefig(preview_path, dpi=100, bbox_inches='tight', 
-                facecolor='white', edgecolor='none')
-    plt.close()
+    stage('encoding')
+    preview = save_figure(dpi=100, bbox_inches='tight',
+                          facecolor='white', edgecolor='none')
     
-    logger.info(f"STL 2D preview generated: {preview_path}")
-    return preview_filename
+    logger.info(f"STL 2D preview generated: {preview['path']}")
+    return preview
 
-def generate_step_2d_matplotlib(file_path: str, width: int, height: int) -> str:
+def generate_step_2d_matplotlib(file_path: str, width: int, height: int) -> dict:
     """Generate 2D technical drawing for STEP using matplotlib"""
     
     if not HAS_PYTHONOCC:
         raise ValueError("PythonOCC not available for STEP processing")
+    from OCC.Core.Bnd import Bnd_Box
+    from OCC.Core.BRepBndLib import brepbndlib_Add
+    import step_cache
     
-    # Cargar STEP
-    step_loader = STEPControl_Reader()
-    status = step_loader.ReadFile(file_path)
-    
-    if status != IFSelect_RetDone:
+    # Cargar STEP (caché BRep por contenido)
+    stage('parsing')
+    try:
+        shape = step_cache.load_shape(file_path)
+    except AssertionError:
         raise ValueError("Failed to read STEP file")
     
-    step_loader.TransferRoots()
-    shape = step_loader.OneShape()
-    
     # Obtener bounding box
     bbox = Bnd_Box()
     brepbndlib_Add(shape, bbox)
     xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
     
     # Crear figura técnica
+    stage('rendering')
     fig = plt.figure(figsize=(12, 8))
     fig.suptitle('STEP Technical Drawing', fontsize=16, fontweight='bold')
     
@@ -437,17 +520,14 @@ VOLUME: {(xmax-xmin)*(ymax-ymin)*(zmax-zmin):.2f} mm³
     plt.tight_layout()
     
     # Guardar imagen
-    preview_filename = f"step_2d_preview_{uuid.uuid4().hex[:8]}.png"
-    preview_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-    
-    plt.savefig(preview_path, dpi=100, bbox_inches='tight',
-                facecolor='white', edgecolor='none')
-    plt.close()
+    stage('encoding')
+    preview = save_figure(dpi=100, bbox_inches='tight',
+                          facecolor='white', edgecolor='none')
     
-    logger.info(f"STEP 2D preview generated: {preview_path}")
-    return preview_filename
+    logger.info(f"STEP 2D preview generated: {preview['path']}")
+    return preview
 
-def generate_wireframe_matplotlib_preview(file_path: str, width: int = 800, height: int = 600) -> str:
+def generate_wireframe_matplotlib_preview(file_path: str, width: int = 800, height: int = 600) -> dict:
     """Generate wireframe technical drawing using matplotlib"""
     try:
         file_ext = os.path.splitext(file_path)[1].lower()
@@ -463,17 +543,19 @@ def generate_wireframe_matplotlib_preview(file_path: str, width: int = 800, heig
         logger.error(f"Error generating wireframe matplotlib preview: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate wireframe preview: {str(e)}")
 
-def generate_stl_wireframe_matplotlib(file_path: str, width: int, height: int) -> str:
+def generate_stl_wireframe_matplotlib(file_path: str, width: int, height: int) -> dict:
     """Generate wireframe technical drawing for STL using matplotlib"""
     
     # Cargar STL
-    stl_mesh = mesh.Mesh.from_file(file_path)
+    stage('parsing')
+    stl_mesh = load_stl_mesh(file_path)
     
     # Obtener vértices únicos y caras
     vertices = stl_mesh.vectors.reshape(-1, 3)
     faces = stl_mesh.vectors
     
     # Crear figura con múltiples vistas wireframe
+    stage('rendering')
     fig = plt.figure(figsize=(16, 10))
     fig.suptitle('STL Wireframe View', fontsize=16, fontweight='bold')
     
@@ -535,17 +617,14 @@ def generate_stl_wireframe_matplotlib(file_path: str, width: int, height: int) -
     plt.tight_layout()
     
     # Guardar imagen
-    preview_filename = f"stl_wireframe_preview_{uuid.uuid4().hex[:8]}.png"
-    preview_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
+    stage('encoding')
+    preview = save_figure(dpi=120, bbox_inches='tight',
+                          facecolor='white', edgecolor='none')
     
-    plt.savefig(preview_path, dpi=120, bbox_inches='tight', 
-                facecolor='white', edgecolor='none')
-    plt.close()
-    
-    logger.info(f"STL wireframe preview generated: {preview_path}")
-    return preview_filename
+    logger.info(f"STL wireframe preview generated: {preview['path']}")
+    return preview
 
-def generate_step_wireframe_matplotlib(file_path: str, width: int, height: int) -> str:
+def generate_step_wireframe_matplotlib(file_path: str, width: int, height: int) -> dict:
     """Generate wireframe technical drawing for STEP using matplotlib"""
     
     if not HAS_PYTHONOCC:
@@ -553,9 +632,6 @@ def generate_step_wireframe_matplotlib(file_path: str, width: int, height: int)
     
     # Simple wireframe - para STEP completo necesitaríamos más procesamiento
     # Por ahora retornamos un placeholder
-    preview_filename = f"step_wireframe_preview_{uuid.uuid4().hex[:8]}.png"
-    preview_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-    
     # Crear una imagen simple indicando que STEP wireframe no está completamente implementado
     fig, ax = plt.subplots(figsize=(10, 8))
     ax.text(0.5, 0.5, 'STEP Wireframe Preview\n(Advanced feature in development)', 
@@ -565,19 +641,73 @@ def generate_step_wireframe_matplotlib(file_path: str, width: int, height: int)
     ax.set_ylim(0, 1)
     ax.set_title('STEP Wireframe Preview')
     
-    plt.savefig(preview_path, dpi=100, bbox_inches='tight',
-                facecolor='white', edgecolor='none')
-    plt.close()
+    preview = save_figure(dpi=100, bbox_inches='tight',
+                          facecolor='white', edgecolor='none')
     
-    logger.info(f"STEP wireframe preview generated: {preview_path}")
-    return preview_filename
+    logger.info(f"STEP wireframe preview generated: {preview['path']}")
+    return preview
 
-def generate_2d_wireframe_preview(file_path: str, width: int = 800, height: int = 600) -> str:
+def generate_2d_wireframe_preview(file_path: str, width: int = 800, height: int = 600) -> dict:
     """Generate 2D wireframe using existing wireframe function - eliminates redundancy"""
     # Reutilizar la función wireframe existente que ya genera vistas 2D ortográficas
     logger.info("Using existing wireframe function for 2D wireframe (eliminates redundancy)")
     return generate_wireframe_matplotlib_preview(file_path, width, height)
 
+def load_step_triangles(file_path: str):
+    """(n, 3, 3) triangles of a STEP assembly: each unique part is meshed once and placed per instance"""
+    import step_cache
+    try:
+        assembly = step_cache.load_assembly(file_path)
+    except AssertionError:
+        raise ValueError("Failed to read STEP file")
+    stage('meshing')
+    step_cache.mesh_assembly(assembly)
+    return np.concatenate([triangles for _, triangles in assembly.iter_instance_triangles()])
+
+def generate_turntable_preview(file_path: str, width: int = 256, height: int = 256, animated: bool = False) -> dict:
+    """
+    Full-turn preview from a single load: N camera angles rendered by the NumPy
+    rasterizer in this worker, packed into a sprite sheet (or an animated WebP).
+    `width` x `height` is the size of each frame, scaled down (keeping the
+    aspect ratio) so that no side exceeds TURNTABLE_MAX_FRAME.
+    """
+    import turntable
+    limit = server_config.TURNTABLE_MAX_FRAME
+    if max(width, height) > limit:
+        scale = limit / max(width, height)
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    try:
+        stage('parsing')
+        if os.path.splitext(file_path)[1].lower() in ('.step', '.stp'):
+            triangles = load_step_triangles(file_path)
+        else:
+            import mesh_cache
+            triangles, _ = mesh_cache.load_triangles(file_path, np.float32)
+
+        stage('rendering')
+        frames = server_config.TURNTABLE_FRAMES
+        images = turntable.render_turntable(triangles, frames, width, height,
+                                            elevation=server_config.TURNTABLE_ELEVATION)
+
+        stage('encoding')
+        info = {"frames": frames, "frame_width": width, "frame_height": height}
+        if animated:
+            data, image_format = preview_store.encode_animation(images, server_config.TURNTABLE_FRAME_MS)
+            info.update(animated=True, frame_ms=server_config.TURNTABLE_FRAME_MS)
+        else:
+            columns = turntable.sprite_columns(frames)
+            data, image_format = preview_store.encode_image(turntable.pack_sprite_sheet(images, columns))
+            info.update(animated=False, columns=columns, rows=-(-frames // columns))
+        preview = preview_store.store_bytes(data, image_format)
+        preview['turntable'] = info
+
+        logger.info(f"Turntable preview generated ({frames} frames): {preview['path']}")
+        return preview
+
+    except Exception as e:
+        logger.error(f"Error generating turntable preview: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate turntable preview: {str(e)}")
+
 # Función eliminada: generate_stl_2d_wireframe era redundante
 # La función generate_stl_wireframe_matplotlib ya genera vistas 2D ortográficas
 
@@ -590,24 +720,90 @@ async def root():
         "message": "Pollux 3D Hybrid Preview Server",
         "version": "2.0",
         "capabilities": {
-            "matplotlib_2d": True,
-            "numpy_stl": True,
+            "matplotlib_2d": capabilities.available('matplotlib'),
+            "numpy_stl": capabilities.available('numpy_stl'),
             "pythonocc_step": HAS_PYTHONOCC,
             "pyvista_advanced": HAS_PYVISTA
         }
     }
 
 @app.post("/generate-preview")
-async def generate_preview(request: PreviewRequest):
+async def generate_preview(request: PreviewRequest, x_pollux_profile: Optional[str] = Header(None)):
     """Generate preview for a file"""
+    request.profile = request.profile or x_pollux_profile
     return await generate_preview_internal(request)
 
 @app.post("/generate_preview")  # Compatibilidad con Laravel (guión bajo)
-async def generate_preview_legacy(request: PreviewRequest):
+async def generate_preview_legacy(request: PreviewRequest, x_pollux_profile: Optional[str] = Header(None)):
     """Generate preview for a file (legacy endpoint)"""
+    request.profile = request.profile or x_pollux_profile
     return await generate_preview_internal(request)
 
-async def generate_preview_internal(request: PreviewRequest):
+def render_preview_file(file_path: str, file_type: str, preview_type: str, width: int, height: int) -> dict:
+    """Generate the preview image for a file (runs inside a render pool worker)"""
+    # Las etapas marcadas con stage() se miden por tipo de archivo y tamaño
+    with metrics.timeline(file_type, file_path):
+        return render_by_type(file_path, file_type, preview_type, width, height)
+
+def render_by_type(file_path: str, file_type: str, preview_type: str, width: int, height: int) -> dict:
+    """Dispatch to the preview generator for the file type"""
+    # Importar (una vez por worker) los backends que necesita este tipo de archivo
+    for backend in capabilities.backends_for(file_type):
+        if capabilities.available(backend):
+            try:
+                capabilities.load(backend)
+            except ImportError as e:
+                raise HTTPException(status_code=501, detail=f"{backend} not available: {e}")
+    
+    if file_type.lower() in ['stl']:
+        if preview_type == "2d":
+            return generate_2d_matplotlib_preview(file_path, width, height)
+        elif preview_type == "wireframe":
+            return generate_wireframe_matplotlib_preview(file_path, width, height)
+        elif preview_type == "wireframe_2d":
+            return generate_2d_wireframe_preview(file_path, width, height)
+        elif preview_type in TURNTABLE_TYPES:
+            return generate_turntable_preview(file_path, width, height, animated=preview_type == "turntable_animated")
+        else:
+            raise HTTPException(status_code=400, detail=f"Unsupported preview type: {preview_type}")
+            
+    elif file_type.lower() in ['dxf', 'dwg']:
+        if not HAS_DXF:
+            raise HTTPException(status_code=501, detail="DXF support not available - ezdxf not installed")
+        return generate_dxf_preview(file_path, width, height)
+        
+    elif file_type.lower() in ['step', 'stp']:
+        if not HAS_PYTHONOCC:
+            raise HTTPException(status_code=501, detail="STEP support not available - PythonOCC not installed")
+        if preview_type in TURNTABLE_TYPES:
+            return generate_turntable_preview(file_path, width, height, animated=preview_type == "turntable_animated")
+        return generate_step_preview(file_path, width, height)
+        
+    elif file_type.lower() in ['eps', 'ai']:
+        if not HAS_EPS:
+            raise HTTPException(status_code=501, detail="EPS support not available - Ghostscript not installed")
+        return generate_eps_preview(file_path, width, height)
+        
+    else:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
+
+def run_analysis_file(file_path: str, profile: Optional[str] = None, profile_id: Optional[str] = None) -> dict:
+    """Run the FileAnalyzers analyzer for a file (runs inside a render pool worker)"""
+    analyzers_dir = Path(__file__).parent.parent / 'FileAnalyzers'
+    spec = importlib.util.spec_from_file_location('file_analyzers_main', analyzers_dir / 'main.py')
+    analyzer_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(analyzer_main)
+    
+    ext = os.path.splitext(file_path)[1].lower()
+    analyzer_script = analyzer_main.EXTENSION_MAP.get(ext)
+    if not analyzer_script:
+        raise HTTPException(status_code=400, detail=f"No analyzer available for extension: {ext}")
+    
+    report('analyzing')
+    return json.loads(analyzer_main.run_analyzer(str(analyzers_dir / analyzer_script), file_path,
+                                                 profile=profile, profile_id=profile_id))
+
+async def generate_preview_internal(request: PreviewRequest, job_id: Optional[str] = None):
     """Internal preview generation logic"""
     try:
         # Convertir la ruta relativa de Laravel a ruta absoluta del sistema
@@ -618,97 +814,315 @@ async def generate_preview_internal(request: PreviewRequest):
         
         # Determinar tipo de archivo
         file_type = request.file_type or os.path.splitext(file_path)[1].lower().lstrip('.')
+        capabilities.record_use(file_type)
         
-        # Generar preview según el tipo de archivo
-        if file_type.lower() in ['stl']:
-            if request.preview_type == "2d":
-                preview_filename = generate_2d_matplotlib_preview(
-                    file_path, request.width, request.height
-                )
-            elif request.preview_type == "wireframe":
-                preview_filename = generate_wireframe_matplotlib_preview(
-                    file_path, request.width, request.height
-                )
-            elif request.preview_type == "wireframe_2d":
-                preview_filename = generate_2d_wireframe_preview(
-                    file_path, request.width, request.height
-                )
-            else:
-                raise HTTPException(status_code=400, detail=f"Unsupported preview type: {request.preview_type}")
-                
-        elif file_type.lower() in ['dxf', 'dwg']:
-            if not HAS_DXF:
-                raise HTTPException(status_code=501, detail="DXF support not available - ezdxf not installed")
-            preview_filename = generate_dxf_preview(file_path, request.width, request.height)
-            
-        elif file_type.lower() in ['step', 'stp']:
-            if not HAS_PYTHONOCC:
-                raise HTTPException(status_code=501, detail="STEP support not available - PythonOCC not installed")
-            preview_filename = generate_step_preview(file_path, request.width, request.height)
-            
-        elif file_type.lower() in ['eps', 'ai']:
-            if not HAS_EPS:
-                raise HTTPException(status_code=501, detail="EPS support not available - Ghostscript not installed")
-            preview_filename = generate_eps_preview(file_path, request.width, request.height)
-            
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
-        
-        # Read the generated image and convert to base64
-        preview_path = os.path.join(server_config.PREVIEWS_DIR, preview_filename)
-        if not os.path.exists(preview_path):
-            raise HTTPException(status_code=500, detail="Generated preview file not found")
-            
-        import base64
-        with open(preview_path, 'rb') as img_file:
-            img_data = base64.b64encode(img_file.read()).decode('utf-8')
-        
-        # Si tenemos file_id, copiar archivo a la estructura Laravel correcta
-        final_preview_path = preview_path
-        if request.file_id:
-            # Usar configuración para obtener el directorio correcto
-            laravel_preview_dir = config.get_laravel_preview_path(request.file_id)
-            
-            # Copiar archivo a la ubicación final
-            final_preview_path = os.path.join(laravel_preview_dir, preview_filename)
-            import shutil
-            shutil.copy2(preview_path, final_preview_path)
-            logger.info(f"Preview copied to Laravel structure: {final_preview_path}")
+        # Renderizar en el pool de procesos para no bloquear el event loop
+        render_args = (render_preview_file, file_path, file_type,
+                       request.preview_type, request.width, request.height)
+        profile = profiling.resolve_mode(request.profile, server_config.PROFILE_SAMPLE_RATE)
+        if profile:
+            # Perfilado opcional: el perfil se guarda con el id del trabajo
+            render_args = (profiling.profile_call, profile, job_id, server_config.PROFILE_DIR) + render_args
+        try:
+            preview = await render_pool.run(
+                run_in_job_context, server_config.JOBS_DB, job_id, *render_args
+            )
+        except RenderError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except RenderTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        profile_summary = None
+        if profile:
+            preview, profile_summary = preview
         
-        # DON'T clean up the temp file - keep it for debugging
-        # try:
-        #     os.remove(preview_path)
-        # except:
-        #     pass
-        
-        return {
+        # La imagen ya está en su ubicación final; solo se devuelve la URL
+        response = {
             "success": True,
-            "image_data": img_data,
-            "preview_filename": preview_filename,
-            "preview_url": f"/storage/previews/{request.file_id}/{preview_filename}" if request.file_id else f"/preview/{preview_filename}",
-            "final_path": final_preview_path,
+            "preview_filename": preview['relative_path'],
+            "preview_url": preview['url'],
+            "final_path": preview['path'],
+            "format": preview['format'],
+            "content_type": preview['content_type'],
+            "bytes": preview['bytes'],
+            "sha256": preview['sha256'],
+            "width": preview['width'],
+            "height": preview['height'],
             "generator": "matplotlib"
         }
+        if 'analysis' in preview:
+            # EPS/AI: el análisis sale de la misma invocación de Ghostscript que la imagen
+            response["analysis"] = preview['analysis']
+        if 'turntable' in preview:
+            # Cómo recortar los fotogramas del sprite sheet (o la duración de cada uno)
+            response["turntable"] = preview['turntable']
+            response["generator"] = "numpy"
+        if profile_summary:
+            response["profile"] = profile_summary
+        
+        # Modo "inline" (por defecto, compatible con Laravel): añadir la imagen en base64
+        if request.delivery == "inline":
+            import base64
+            with open(preview['path'], 'rb') as img_file:
+                response["image_data"] = base64.b64encode(img_file.read()).decode('utf-8')
         
+        return response
+        
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_details = f"Preview generation failed: {str(e)}\nTraceback: {traceback.format_exc()}"
         logger.error(error_details)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/preview/{filename}")
+async def execute_job(job: dict):
+    """Run a claimed job and store its result"""
+    job_id = job['id']
+    try:
+        if job['kind'] == 'analysis':
+            file_path = config.get_absolute_path(job['payload']['file_path'])
+            if not os.path.exists(file_path):
+                raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+            try:
+                profile = profiling.resolve_mode(job['payload'].get('profile'), server_config.PROFILE_SAMPLE_RATE)
+                result = await render_pool.run(
+                    run_in_job_context, server_config.JOBS_DB, job_id,
+                    run_analysis_file, file_path, profile, job_id
+                )
+            except RenderError as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+        else:
+            result = await generate_preview_internal(PreviewRequest(**job['payload']), job_id=job_id)
+        await asyncio.to_thread(job_queue.complete, job_id, result)
+    except HTTPException as e:
+        await asyncio.to_thread(job_queue.fail, job_id, e.detail)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        await asyncio.to_thread(job_queue.fail, job_id, str(e))
+
+async def job_dispatcher(max_priority: Optional[int] = None):
+    """Pull jobs from the queue, highest priority lane first"""
+    while True:
+        job = await asyncio.to_thread(job_queue.claim, max_priority)
+        if job is None:
+            # Esperar a un submit local o sondear por trabajos de otros procesos
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            job_wakeup.clear()
+            continue
+        await execute_job(job)
+
+@app.post("/jobs")
+async def submit_job(request: JobRequest, x_pollux_profile: Optional[str] = Header(None)):
+    """Queue an analysis or preview and return its job id immediately"""
+    request.profile = request.profile or x_pollux_profile
+    if request.kind not in ('preview', 'analysis'):
+        raise HTTPException(status_code=400, detail=f"Unsupported job kind: {request.kind}")
+    if request.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unsupported priority: {request.priority}")
+    
+    payload = request.model_dump(exclude={'kind', 'priority'})
+    job_id = await asyncio.to_thread(job_queue.submit, request.kind, payload, request.priority)
+    if job_wakeup is not None:
+        job_wakeup.set()
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Current status, stage and result of a job"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job that has not started yet"""
+    if await asyncio.to_thread(job_queue.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "cancelled": await asyncio.to_thread(job_queue.cancel, job_id)}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Stream job progress as Server-Sent Events until the job finishes"""
+    if await asyncio.to_thread(job_queue.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def stream():
+        last_id = int(request.headers.get('last-event-id') or 0)
+        idle = 0.0
+        while True:
+            events = await asyncio.to_thread(job_queue.events, job_id, last_id)
+            for event in events:
+                last_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['status']}\ndata: {json.dumps(event)}\n\n"
+                if event['status'] in TERMINAL_STATUSES:
+                    return
+            if not events:
+                job = await asyncio.to_thread(job_queue.get, job_id)
+                if job is None or job['status'] in TERMINAL_STATUSES:
+                    return
+            if await request.is_disconnected():
+                return
+            idle = 0.0 if events else idle + 0.25
+            if idle >= 15:
+                # Comentario SSE para mantener viva la conexión
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(0.25)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+def get_geometry_cache():
+    global geometry_cache
+    if geometry_cache is None:
+        import geometry_cache as geometry_module
+        geometry_cache = geometry_module.GeometryCache(server_config.GEOMETRY_CACHE_MESHES,
+                                                       server_config.GEOMETRY_CACHE_TRIANGLES)
+    return geometry_cache
+
+async def run_geometry_query(request: GeometryRequest, query: str, *args):
+    """Resolve the file, get its cached BVH and run one query (400 on invalid input)"""
+    try:
+        file_path = config.get_absolute_path(request.file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    
+    cache = await asyncio.to_thread(get_geometry_cache)
+    try:
+        # Siempre en un hilo: incluso una consulta pequeña recorre el BVH de una
+        # malla grande y bloquearía al resto de peticiones (SSE, /health)
+        geometry, cached = await asyncio.to_thread(cache.get, file_path)
+        result = await asyncio.to_thread(getattr(geometry, query), *args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["cached"] = cached
+    result["triangles"] = geometry.count
+    return result
+
+@app.post("/geometry/load")
+async def geometry_load(request: GeometryRequest):
+    """Load a mesh and build its BVH ahead of the first query"""
+    return await run_geometry_query(request, "info")
+
+@app.post("/geometry/raycast")
+async def geometry_raycast(request: RaycastRequest):
+    """Batched ray picking: first hit per ray in model units"""
+    return await run_geometry_query(request, "raycast",
+                                    request.origins, request.directions, request.max_distance)
+
+@app.post("/geometry/closest-point")
+async def geometry_closest_point(request: ClosestPointRequest):
+    """Closest surface point and distance for each query point"""
+    return await run_geometry_query(request, "closest", request.points)
+
+@app.post("/geometry/measure")
+async def geometry_measure(request: MeasureRequest):
+    """Point-to-point distances, optionally snapped to the surface"""
+    return await run_geometry_query(request, "measure", request.points, request.snap)
+
+@app.delete("/geometry")
+async def geometry_unload(request: GeometryRequest):
+    """Drop a mesh from the geometry cache"""
+    try:
+        file_path = config.get_absolute_path(request.file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"removed": geometry_cache.drop(file_path) if geometry_cache is not None else 0}
+
+@app.get("/preview/{filename:path}")
 async def get_preview(filename: str):
     """Serve preview image"""
-    preview_path = os.path.join(server_config.PREVIEWS_DIR, filename)
+    # Previews direccionadas por contenido: nunca cambian, se pueden cachear siempre
+    try:
+        stored_path = preview_store.resolve(filename)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    if os.path.isfile(stored_path):
+        return FileResponse(stored_path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    
+    preview_path = os.path.join(server_config.PREVIEWS_DIR, os.path.basename(filename))
     if os.path.exists(preview_path):
         return FileResponse(preview_path)
     else:
         raise HTTPException(status_code=404, detail="Preview not found")
 
+async def warm_up_workers():
+    """Importar en cada worker los backends más usados, después de quedar listos"""
+    names = await asyncio.to_thread(capabilities.warm_up_backends)
+    startup_info["warm_up"] = "running"
+    started = time.perf_counter()
+    try:
+        reports = await asyncio.gather(*[
+            render_pool.run(capabilities.preload, names) for _ in range(server_config.RENDER_WORKERS)
+        ])
+    except Exception as e:
+        startup_info["warm_up"] = f"failed: {e}"
+        logger.warning(f"Backend warm-up failed: {e}")
+        return
+    startup_info.update({
+        "warm_up": "done",
+        "warm_up_backends": names,
+        "warm_up_ms": round((time.perf_counter() - started) * 1000, 1),
+        "workers": reports,
+    })
+    logger.info(f"Warmed up {', '.join(names) or 'no backends'} in {startup_info['warm_up_ms']} ms")
+
+@app.on_event("startup")
+async def start_render_pool():
+    global job_wakeup
+    capabilities.set_usage_file(server_config.BACKEND_USAGE_FILE)
+    capabilities.start_usage_flusher()
+    render_pool.start()
+    
+    requeued = job_queue.recover()
+    if requeued:
+        logger.info(f"Requeued {requeued} interrupted jobs")
+    
+    # Con más de un worker, el primero queda reservado al carril interactivo
+    job_wakeup = asyncio.Event()
+    for index in range(server_config.RENDER_WORKERS):
+        lane = PRIORITIES['interactive'] if index == 0 and server_config.RENDER_WORKERS > 1 else None
+        job_workers.append(asyncio.create_task(job_dispatcher(lane)))
+    
+    # La precarga corre en segundo plano: /health responde sin esperar a matplotlib
+    job_workers.append(asyncio.create_task(warm_up_workers()))
+    startup_info["time_to_ready_ms"] = round((time.perf_counter() - MODULE_IMPORT_STARTED) * 1000, 1)
+
+@app.on_event("shutdown")
+async def stop_render_pool():
+    for task in job_workers:
+        task.cancel()
+    render_pool.shutdown()
+    await asyncio.to_thread(capabilities.stop_usage_flusher)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: stage latencies (workers and analyzer scripts included), cache hits, queue and pool"""
+    # Etapas de los workers del pool (también de trabajos fallidos o cortados) y de los analizadores
+    await asyncio.to_thread(metrics.collect_spool)
+    body = await asyncio.to_thread(metrics.registry.render)
+    return Response(content=body, media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
+        "render_pool": render_pool.stats(),
+        "job_queue": await asyncio.to_thread(job_queue.depth),
         "dependencies": {
             "matplotlib": True,
             "numpy_stl": True,
@@ -716,9 +1130,14 @@ async def health_check():
             "pyvista": HAS_PYVISTA,
             "ezdxf": HAS_DXF,
             "ghostscript": HAS_EPS
-        }
+        },
+        "startup": startup_info,
+        "capabilities": capabilities.report(),
+        "geometry_cache": geometry_cache.stats() if geometry_cache is not None else None
     }
 
+startup_info["import_ms"] = round((time.perf_counter() - MODULE_IMPORT_STARTED) * 1000, 1)
+
 if __name__ == "__main__":
     print(f"Starting server on {server_config.HOST}:{server_config.PORT}")
     uvicorn.run(app, host=server_config.HOST, port=server_config.PORT, log_level="info")
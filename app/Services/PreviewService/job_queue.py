@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajos persistente (SQLite) para análisis y previews
+Sin broker externo: los trabajos sobreviven a un reinicio del servidor
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Carriles de prioridad: un número menor se atiende antes
+PRIORITIES = {
+    'interactive': 0,  # Peticiones del visor / usuario esperando
+    'normal': 5,
+    'backfill': 9,     # Regeneración masiva en segundo plano
+}
+
+TERMINAL_STATUSES = ('done', 'failed', 'cancelled')
+
+# Reintentos tras una caída del proceso antes de marcar el trabajo como fallido
+MAX_ATTEMPTS = 3
+
+# Un trabajo en curso es de quien lo tomó mientras ese proceso viva y su lease
+# no caduque; cada informe de progreso la renueva
+LEASE_SECONDS = float(os.environ.get('POLLUX_JOB_LEASE_SECONDS', '3600'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id);
+"""
+
+# Columnas añadidas después de crear la tabla en instalaciones existentes
+_ADDED_COLUMNS = {
+    'owner': 'TEXT',
+    'lease_expires_at': 'REAL',
+}
+
+
+def _boot_id():
+    """Identificador del arranque de la máquina (None si el sistema no lo expone)"""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) terminaría el proceso en Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+            return code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Dueño de los trabajos que toma este proceso: arranque, pid y un token propio
+# (tras un reinicio en un contenedor el pid puede repetirse)
+OWNER = f"{_boot_id() or '-'}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def owner_alive(owner):
+    """False if the process that claimed a job is gone (other boot, dead pid or an earlier run of this pid)"""
+    try:
+        boot, pid, token = owner.split(':')
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+    current_boot, current_pid, current_token = OWNER.split(':')
+    if boot != current_boot:
+        return False
+    if pid == int(current_pid):
+        return token == current_token
+    return _pid_alive(pid)
+
+
+class JobQueue:
+    """Cola de trabajos con prioridades guardada en un archivo SQLite"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, kind in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Una conexión por operación: se usa desde el event loop, hilos y workers
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _add_event(conn, job_id, status, stage=None, progress=None, message=None):
+        conn.execute(
+            'INSERT INTO job_events (job_id, ts, status, stage, progress, message) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, time.time(), status, stage, progress, message)
+        )
+
+    def recover(self):
+        """
+        Devolver a la cola los trabajos en curso cuyo dueño ya no existe o
+        cuya lease ha caducado (los de otros servidores vivos se respetan)
+        """
+        error = 'Too many attempts'
+        now = time.time()
+        with self._transaction() as conn:
+            running = conn.execute(
+                "SELECT id, attempts, owner, lease_expires_at FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            orphaned = [row for row in running
+                        if row['lease_expires_at'] is None or row['lease_expires_at'] < now
+                        or not owner_alive(row['owner'])]
+            requeued = 0
+            for row in orphaned:
+                if row['attempts'] >= MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, owner = NULL WHERE id = ?",
+                        (error, now, row['id'])
+                    )
+                    # Mismo evento terminal que fail(): los suscriptores SSE dejan de esperar
+                    self._add_event(conn, row['id'], 'failed', message=error)
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0, owner = NULL, "
+                        "lease_expires_at = NULL WHERE id = ?", (row['id'],)
+                    )
+                    self._add_event(conn, row['id'], 'queued', message='Requeued after restart')
+                    requeued += 1
+        return requeued
+
+    def submit(self, kind, payload, priority='normal'):
+        """Encolar un trabajo y devolver su id inmediatamente"""
+        if isinstance(priority, str):
+            if priority not in PRIORITIES:
+                raise ValueError(f"Unknown priority: {priority}")
+            priority = PRIORITIES[priority]
+
+        job_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, priority, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, kind, int(priority), json.dumps(payload), time.time())
+            )
+            self._add_event(conn, job_id, 'queued')
+        return job_id
+
+    def claim(self, max_priority=None):
+        """Tomar el siguiente trabajo (el de mayor prioridad y más antiguo) o None"""
+        with self._transaction() as conn:
+            query = "SELECT * FROM jobs WHERE status = 'queued'"
+            params = ()
+            if max_priority is not None:
+                query += ' AND priority <= ?'
+                params = (max_priority,)
+            row = conn.execute(query + ' ORDER BY priority, created_at LIMIT 1', params).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, "
+                "owner = ?, lease_expires_at = ? WHERE id = ?",
+                (now, OWNER, now + LEASE_SECONDS, row['id'])
+            )
+            self._add_event(conn, row['id'], 'running')
+        job = self._row_to_dict(row)
+        job.update(status='running', owner=OWNER)
+        return job
+
+    def progress(self, job_id, stage, progress=None, message=None):
+        """Registrar la etapa actual de un trabajo (parsing, meshing, rendering, encoding...)"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, progress = COALESCE(?, progress), lease_expires_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (stage, progress, time.time() + LEASE_SECONDS, job_id)
+            )
+            self._add_event(conn, job_id, 'running', stage, progress, message)
+
+    def complete(self, job_id, result):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', stage = 'done', progress = 1, result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+            self._add_event(conn, job_id, 'done', 'done', 1.0)
+
+    def fail(self, job_id, error):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (str(error), time.time(), job_id)
+            )
+            self._add_event(conn, job_id, 'failed', message=str(error))
+
+    def cancel(self, job_id):
+        """Cancelar un trabajo que todavía no ha empezado"""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            ).rowcount
+            if updated:
+                self._add_event(conn, job_id, 'cancelled')
+        return bool(updated)
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_dict(row) if row else None
+
+    def events(self, job_id, after_id=0):
+        """Eventos de un trabajo posteriores a `after_id` (para SSE)"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT * FROM job_events WHERE job_id = ? AND id > ? ORDER BY id',
+                (job_id, after_id)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def depth(self):
+        """Trabajos en cola por carril de prioridad"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT priority, COUNT(*) AS n FROM jobs WHERE status = 'queued' GROUP BY priority"
+            ).fetchall()
+        finally:
+            conn.close()
+        names = {value: name for name, value in PRIORITIES.items()}
+        return {names.get(row['priority'], str(row['priority'])): row['n'] for row in rows}
+
+    @staticmethod
+    def _row_to_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload']) if job['payload'] else None
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+
+# --- Contexto de trabajo dentro de los workers del pool de render ---
+
+_current = threading.local()
+_worker_queues = {}
+
+
+def run_in_job_context(db_path, job_id, func, *args):
+    """Ejecutar `func(*args)` en un worker con `report()` apuntando al trabajo"""
+    if job_id and db_path not in _worker_queues:
+        _worker_queues[db_path] = JobQueue(db_path)
+    _current.queue = _worker_queues[db_path] if job_id else None
+    _current.job_id = job_id
+    try:
+        return func(*args)
+    finally:
+        _current.queue = None
+        _current.job_id = None
+
+
+def report(stage, progress=None, message=None):
+    """Informar del avance del trabajo actual (no hace nada fuera de un trabajo)"""
+    queue = getattr(_current, 'queue', None)
+    if queue is None:
+        return
+    try:
+        queue.progress(_current.job_id, stage, progress, message)
+    except sqlite3.Error:
+        # El progreso es informativo: nunca debe romper un render
+        pass
@@ -55,6 +55,42 @@ class PathConfig:
         # Configuración del servidor
         self.HOST = self.config['python_server']['host']
         self.PORT = self.config['python_server']['port']
+        
+        # Pool de procesos de renderizado (variables de entorno tienen prioridad)
+        server = self.config['python_server']
+        self.RENDER_WORKERS = int(os.environ.get('PREVIEW_RENDER_WORKERS', server.get('render_workers') or os.cpu_count() or 1))
+        self.RENDER_TIMEOUT = float(os.environ.get('PREVIEW_RENDER_TIMEOUT', server.get('render_timeout', 120)))
+        
+        # Previews direccionadas por contenido y su codificación
+        self.PREVIEW_STORE = os.path.join(self.PUBLIC_PREVIEWS, 'by-hash')
+        self.PREVIEW_STORE_URL = '/storage/previews/by-hash'
+        self.IMAGE_FORMAT = os.environ.get('PREVIEW_IMAGE_FORMAT', server.get('image_format', 'png'))
+        self.PNG_COMPRESSION = int(os.environ.get('PREVIEW_PNG_COMPRESSION', server.get('png_compression', 6)))
+        self.IMAGE_QUALITY = int(os.environ.get('PREVIEW_IMAGE_QUALITY', server.get('image_quality', 80)))
+        
+        # Base de datos SQLite de la cola de trabajos
+        self.JOBS_DB = os.path.join(self.BASE_PATH, self.config['storage'].get('jobs_db', 'storage/app/preview_jobs.sqlite3'))
+        
+        # Perfilado bajo demanda (cabecera X-Pollux-Profile) o por muestreo del tráfico
+        self.PROFILE_DIR = os.path.join(self.STORAGE_APP, 'profiles')
+        self.PROFILE_SAMPLE_RATE = float(os.environ.get('PREVIEW_PROFILE_SAMPLE_RATE', server.get('profile_sample_rate', 0)))
+        
+        # Uso de cada backend (numpy, matplotlib, OCC...) para precargar los más pedidos
+        self.BACKEND_USAGE_FILE = os.path.join(self.STORAGE_APP, 'preview_backend_usage.json')
+        
+        # Mallas con BVH residentes para las consultas /geometry (LRU)
+        self.GEOMETRY_CACHE_MESHES = int(os.environ.get('PREVIEW_GEOMETRY_CACHE_MESHES', server.get('geometry_cache_meshes', 8)))
+        self.GEOMETRY_CACHE_TRIANGLES = int(os.environ.get('PREVIEW_GEOMETRY_CACHE_TRIANGLES', server.get('geometry_cache_triangles', 20_000_000)))
+        
+        # Previews turntable (giro completo en una sola pasada): fotogramas, elevación y duración de cada uno
+        self.TURNTABLE_FRAMES = int(os.environ.get('PREVIEW_TURNTABLE_FRAMES', server.get('turntable_frames', 24)))
+        self.TURNTABLE_ELEVATION = float(os.environ.get('PREVIEW_TURNTABLE_ELEVATION', server.get('turntable_elevation', 25)))
+        self.TURNTABLE_FRAME_MS = int(os.environ.get('PREVIEW_TURNTABLE_FRAME_MS', server.get('turntable_frame_ms', 80)))
+        # Lado máximo de cada fotograma: el sprite sheet crece con frames x ancho x alto
+        self.TURNTABLE_MAX_FRAME = int(os.environ.get('PREVIEW_TURNTABLE_MAX_FRAME', server.get('turntable_max_frame', 256)))
+        
+        # Manifiesto y resultados JSONL de backfill.py
+        self.BACKFILL_DIR = os.path.join(self.STORAGE_APP, 'backfill')
     
     def ensure_directories(self):
         """Crea todos los directorios necesarios si no existen"""
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Almacén de previews direccionado por contenido
+Cada render se codifica una vez y se escribe una sola vez, de forma atómica
+"""
+
+import io
+import os
+import hashlib
+import tempfile
+
+from PIL import Image, features
+
+import metrics
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+
+def resolve_format(image_format):
+    """Fall back to PNG when the installed Pillow cannot encode the format"""
+    image_format = (image_format or 'png').lower()
+    if image_format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    if image_format != 'png' and not features.check(image_format):
+        return 'png'
+    return image_format
+
+
+class PreviewStore:
+    """
+    Guarda imágenes en `root/<hh>/<sha256>.<ext>` y las sirve bajo `url_prefix`.
+
+    Dos renders idénticos comparten archivo, y un archivo a medio escribir
+    nunca es visible (se escribe a un temporal y se hace os.replace).
+    """
+
+    def __init__(self, root, url_prefix, image_format='png', png_compression=6, quality=80):
+        self.root = str(root)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.image_format = resolve_format(image_format)
+        self.png_compression = int(png_compression)
+        self.quality = int(quality)
+
+    def _pil_options(self, image_format):
+        if image_format == 'png':
+            return {'optimize': self.png_compression >= 9, 'compress_level': self.png_compression}
+        return {'quality': self.quality}
+
+    def encode_image(self, image, image_format=None):
+        """Encode a PIL image once in the configured format"""
+        image_format = resolve_format(image_format or self.image_format)
+        buffer = io.BytesIO()
+        if image_format != 'png' and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        image.save(buffer, format=image_format.upper(), **self._pil_options(image_format))
+        return buffer.getvalue(), image_format
+
+    def encode_animation(self, images, duration_ms=100):
+        """Encode frames as a looping animated WebP (animated PNG without WebP support)"""
+        image_format = 'webp' if features.check('webp') else 'png'
+        buffer = io.BytesIO()
+        options = {'quality': self.quality} if image_format == 'webp' else {'compress_level': self.png_compression}
+        images[0].save(buffer, format=image_format.upper(), save_all=True, append_images=images[1:],
+                       duration=duration_ms, loop=0, **options)
+        return buffer.getvalue(), image_format
+
+    def encode_figure(self, fig, image_format=None, **savefig_kwargs):
+        """Encode a matplotlib figure in memory (no intermediate file)"""
+        image_format = resolve_format(image_format or self.image_format)
+        buffer = io.BytesIO()
+        if image_format == 'avif':
+            # matplotlib no conoce AVIF: PNG sin comprimir y recodificar con Pillow
+            fig.savefig(buffer, format='png', pil_kwargs={'compress_level': 0}, **savefig_kwargs)
+            buffer.seek(0)
+            with Image.open(buffer) as image:
+                return self.encode_image(image, 'avif')
+        fig.savefig(buffer, format=image_format,
+                    pil_kwargs=self._pil_options(image_format), **savefig_kwargs)
+        return buffer.getvalue(), image_format
+
+    def _entry(self, digest, image_format, size, data=None, path=None):
+        relative_path = f"{digest[:2]}/{digest}.{image_format}"
+        width = height = None
+        try:
+            with Image.open(io.BytesIO(data) if data is not None else path) as image:
+                width, height = image.size
+        except Exception:
+            pass
+        return {
+            'relative_path': relative_path,
+            'path': os.path.join(self.root, digest[:2], f"{digest}.{image_format}"),
+            'url': f"{self.url_prefix}/{relative_path}",
+            'format': image_format,
+            'content_type': CONTENT_TYPES[image_format],
+            'bytes': size,
+            'sha256': digest,
+            'width': width,
+            'height': height,
+        }
+
+    def store_bytes(self, data, image_format):
+        """Write encoded image bytes to their content-addressed location"""
+        digest = hashlib.sha256(data).hexdigest()
+        entry = self._entry(digest, image_format, len(data), data=data)
+        exists = os.path.exists(entry['path'])
+        metrics.cache_lookup('preview_store', hit=exists)
+        if not exists:
+            directory = os.path.dirname(entry['path'])
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, entry['path'])
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return entry
+
+    def store_file(self, tmp_path, image_format):
+        """Move a file rendered by an external tool (e.g. Ghostscript) into the store"""
+        sha = hashlib.sha256()
+        with open(tmp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        entry = self._entry(digest, image_format, os.path.getsize(tmp_path), path=tmp_path)
+        os.makedirs(os.path.dirname(entry['path']), exist_ok=True)
+        os.replace(tmp_path, entry['path'])
+        return entry
+
+    def temp_path(self, suffix):
+        """Temporary path on the store's filesystem so os.replace stays atomic"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.root, suffix=suffix)
+        os.close(fd)
+        return path
+
+    def resolve(self, relative_path):
+        """Absolute path for a relative store path, rejecting path traversal"""
+        path = os.path.realpath(os.path.join(self.root, relative_path))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Invalid preview path: {relative_path}")
+        return path
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Pool de procesos para el renderizado de previews
+Saca matplotlib, numpy-stl y OCC del event loop de uvicorn
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RenderError(Exception):
+    """Picklable error raised by a render job (carries the HTTP status)"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class RenderTimeout(Exception):
+    """A render job exceeded its time limit and its worker was killed"""
+
+
+def _init_worker(spool_dir):
+    """Los workers no tienen /metrics: sus etapas van al spool que lee el servidor"""
+    metrics.enable_spool(spool_dir)
+
+
+def _run_job(func, args):
+    """
+    Ejecutar un trabajo en el worker convirtiendo los HTTPException en RenderError.
+
+    Las métricas del trabajo salen al spool también si falla; las etapas ya
+    cerradas de un trabajo que se mata por timeout se escribieron al cerrarse.
+    """
+    try:
+        return func(*args)
+    except RenderError:
+        raise
+    except Exception as e:
+        status_code = getattr(e, 'status_code', None)
+        if status_code is not None:
+            raise RenderError(status_code, getattr(e, 'detail', str(e))) from None
+        raise RenderError(500, str(e)) from None
+    finally:
+        metrics.flush()
+
+
+def _warm_up():
+    return True
+
+
+class RenderPool:
+    """
+    ProcessPoolExecutor acotado con timeout por trabajo.
+
+    pyplot no es thread-safe, así que cada render corre en su propio proceso.
+    Cuando un trabajo supera el timeout se matan los workers y se recrea el
+    pool; los trabajos que estaban en vuelo se reintentan una vez.
+
+    Como mucho hay `workers` trabajos enviados al executor: el resto espera
+    en un semáforo, así que el timeout solo mide la ejecución y no la cola.
+    """
+
+    def __init__(self, workers, timeout):
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self._executor = None
+        self._generation = 0
+        self._slots = None
+        self.queued_jobs = 0
+        self.active_jobs = 0
+        self.completed_jobs = 0
+        self.failed_jobs = 0
+        self.timed_out_jobs = 0
+        self.restarts = 0
+        self.started_at = time.time()
+        self.busy_seconds = 0.0
+
+    def _create_executor(self):
+        # spawn también en Linux: hacer fork desde el proceso de uvicorn es frágil
+        context = multiprocessing.get_context('spawn')
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(metrics.spool_dir(),))
+        self._generation += 1
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._create_executor()
+        return self._executor
+
+    def start(self):
+        """Arrancar todos los workers para que el primer render no pague el spawn"""
+        for _ in range(self.workers):
+            self.executor.submit(_warm_up)
+
+    def _kill_workers(self):
+        executor = self._executor
+        self._executor = None
+        if executor is None:
+            return
+        for process in list((executor._processes or {}).values()):
+            try:
+                process.kill()
+            except Exception:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, func, *args, timeout=None):
+        """Ejecutar `func(*args)` en el pool sin bloquear el event loop"""
+        timeout = timeout or self.timeout
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        self.queued_jobs += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued_jobs -= 1
+        try:
+            return await self._run(func, args, timeout)
+        finally:
+            self._slots.release()
+
+    async def _run(self, func, args, timeout):
+        loop = asyncio.get_running_loop()
+        self.active_jobs += 1
+        started = time.time()
+        try:
+            for attempt in range(2):
+                generation = self._generation
+                future = loop.run_in_executor(self.executor, _run_job, func, args)
+                try:
+                    # asyncio.wait no cancela ni propaga la cancelación del futuro: un
+                    # CancelledError aquí solo puede venir de quien espera (cliente desconectado)
+                    done, _ = await asyncio.wait({future}, timeout=timeout)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                if not done:
+                    future.cancel()
+                    self.timed_out_jobs += 1
+                    logger.error(f"Render job timed out after {timeout}s - restarting worker pool")
+                    if generation == self._generation:
+                        self._kill_workers()
+                    raise RenderTimeout(f"Preview rendering timed out after {timeout}s")
+                try:
+                    if future.cancelled():
+                        # Otro trabajo provocó el reinicio del pool (cancel_futures cancela los pendientes)
+                        raise BrokenProcessPool("Render job was cancelled by a pool restart")
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # Reintentar una vez en el pool nuevo
+                    if generation == self._generation:
+                        self._kill_workers()
+                    if attempt == 1:
+                        raise BrokenProcessPool("Render worker pool was restarted twice") from e
+                    logger.warning("Render worker pool was restarted - retrying job")
+                    continue
+                self.completed_jobs += 1
+                return result
+        except (RenderError, RenderTimeout, BrokenProcessPool):
+            self.failed_jobs += 1
+            raise
+        finally:
+            self.active_jobs -= 1
+            self.busy_seconds += time.time() - started
+
+    def stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            "workers": self.workers,
+            "timeout_seconds": self.timeout,
+            "active_jobs": self.active_jobs,
+            "queued_jobs": self.queued_jobs,
+            "completed_jobs": self.completed_jobs,
+            "failed_jobs": self.failed_jobs,
+            "timed_out_jobs": self.timed_out_jobs,
+            "restarts": self.restarts,
+            "utilization": round(min(1.0, self.busy_seconds / (elapsed * self.workers)), 4)
+        }
@@ -24,11 +24,17 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import APIKeyHeader
-from fastapi import Depends, FastAPI, Request, Response
+from fastapi import Depends, FastAPI, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 from pydantic import BaseModel
 
+# Métricas compartidas con los analizadores
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+import profiling
+import mesh_topology
+
 # Import configuration
 try:
     from config import config, Config
@@ -86,8 +92,7 @@ except ImportError as e:
 
 # STEP file support via PythonOCC
 try:
-    from OCC.Core.STEPControl import STEPControl_Reader
-    from OCC.Core.IFSelect import IFSelect_RetDone
+    import step_cache
     from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
     from OCC.Core.TopoDS import TopoDS_Shape
     from OCC.Core.BRep import BRep_Builder
@@ -207,6 +212,7 @@ class PreviewResponse(BaseModel):
     metadata: Optional[FileMetadata] = None
     processing_time: float = 0.0
     cached: bool = False
+    profile: Optional[dict] = None
 
 class HealthResponse(BaseModel):
     """Response model for health check"""
@@ -230,13 +236,17 @@ class HealthResponse(BaseModel):
 start_time = time.time()
 
 @app.middleware("http")
-async def count_requests(request: Request, call_next):
-    """Count the number of requests made to the server"""
-    if not hasattr(request.app.state, "request_count"):
-        request.app.state.request_count = 0
-    request.app.state.request_count += 1
-    response = await call_next(request)
-    return response
+async def observe_requests(request: Request, call_next):
+    """Record request latency by route template and status code"""
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        metrics.observe_request(request.method, route, status_code, time.perf_counter() - started)
 
 
 
@@ -259,17 +269,17 @@ def get_absolute_file_path(file_path: str) -> Path:
         raise ValueError(f"Path is not a file: {file_path}")
     return abs_path
 
-def save_preview(image: Image.Image, file_id: str, preview_type: str) -> str:
-    """Save preview image and return its path"""
+def save_preview(image_bytes: bytes, file_id: str, preview_type: str) -> str:
+    """Save already encoded preview bytes and return their path"""
     preview_path = config.PREVIEW_DIR / f"{file_id}_{preview_type}.png"
-    image.save(preview_path)
+    preview_path.write_bytes(image_bytes)
     return str(preview_path)
 
-def encode_image(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string"""
+def encode_image(image: Image.Image) -> bytes:
+    """Encode PIL Image as PNG once (reused for the file and the base64 payload)"""
     buffered = io.BytesIO()
     image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    return buffered.getvalue()
 
 def analyze_file(file_path: Path, file_type: str) -> FileMetadata:
     """Analizar archivo y extraer metadatos"""
@@ -285,7 +295,7 @@ def analyze_file(file_path: Path, file_type: str) -> FileMetadata:
             from stl import mesh
             mesh_data = mesh.Mesh.from_file(str(file_path))
             metadata.update({
-                "vertex_count": len(mesh_data.vectors),
+                "vertex_count": len(mesh_topology.weld_points(mesh_data.vectors)[0]),
                 "face_count": len(mesh_data.vectors),
                 "bounds": {
                     "min": mesh_data.min_.tolist(),
@@ -293,12 +303,12 @@ def analyze_file(file_path: Path, file_type: str) -> FileMetadata:
                 }
             })
         elif file_type.lower() == "step":
-            # Análisis STEP con pythonOCC
-            reader = STEPControl_Reader()
-            status = reader.ReadFile(str(file_path))
-            if status == IFSelect_RetDone:
-                reader.TransferRoots()
-                shape = reader.OneShape()
+            # Análisis STEP con pythonOCC (caché BRep por contenido)
+            try:
+                shape = step_cache.load_shape(str(file_path))
+            except AssertionError:
+                shape = None
+            if shape is not None:
                 bbox = Bnd_Box()
                 brepbndlib_Add(shape, bbox)
                 xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
@@ -328,18 +338,15 @@ def render_preview(
         if file_path.suffix.lower() == ".stl":
             mesh = pv.read(str(file_path))
         elif file_path.suffix.lower() in [".step", ".stp"]:
-            # Convertir STEP a malla usando OCC
-            reader = STEPControl_Reader()
-            status = reader.ReadFile(str(file_path))
-            if status != IFSelect_RetDone:
+            # Convertir STEP a malla usando OCC (caché BRep por contenido)
+            try:
+                assembly = step_cache.load_assembly(str(file_path))
+            except AssertionError:
                 raise ValueError("Error reading STEP file")
 
-            reader.TransferRoots()
-            shape = reader.OneShape()
-
-            # Crear malla para visualización
-            mesh_maker = BRepMesh_IncrementalMesh(shape, 0.1)
-            mesh_maker.Perform()
+            # Crear malla para visualización (bajo el lock del ensamblaje compartido)
+            step_cache.mesh_assembly(assembly)
+            shape = assembly.compound()
 
             # Convertir a formato PyVista
             mesh = wrap(shape)
@@ -375,12 +382,41 @@ def render_preview(
         logger.error(f"Error rendering preview: {e}")
         raise
 
+def build_preview(file_path: Path, request: PreviewRequest):
+    """Analyze, render and encode a preview; returns (metadata, PNG bytes)"""
+    file_size = file_path.stat().st_size
+    with metrics.stage('parse', request.file_type, file_size):
+        metadata = analyze_file(file_path, request.file_type)
+
+    # Generar vista previa
+    try:
+        with metrics.stage('render', request.file_type, file_size):
+            image = render_preview(
+                file_path,
+                request.preview_type,
+                request.width,
+                request.height,
+                request.background_color
+            )
+    except Exception as e:
+        logger.exception("Error generating preview")
+        # Generar imagen de error
+        image = Image.new('RGB', (request.width, request.height), request.background_color)
+        draw = ImageDraw.Draw(image)
+        draw.text((10, 10), f"Error: {str(e)}", fill="black")
+        metadata = None
+
+    # Encode once (reused for the file and the base64 payload)
+    with metrics.stage('encode', request.file_type, file_size):
+        return metadata, encode_image(image)
+
 @app.post("/generate_preview", response_model=PreviewResponse)
 @limiter.limit("20/minute")
 async def generate_preview(
     request: PreviewRequest,
     background_tasks: BackgroundTasks,
-    api_key: Optional[str] = Depends(get_api_key)
+    api_key: Optional[str] = Depends(get_api_key),
+    x_pollux_profile: Optional[str] = Header(None)
 ):
     """
     Generate a preview image for a CAD file
@@ -401,30 +437,20 @@ async def generate_preview(
         except (FileNotFoundError, ValueError) as e:
             raise HTTPException(status_code=404, detail=str(e))
 
-        # Analizar archivo y extraer metadatos
+        # Analizar, renderizar y codificar (bajo el perfilador si se pide)
         start_time = time.time()
-        metadata = analyze_file(file_path, request.file_type)
+        profile = profiling.resolve_mode(x_pollux_profile)
+        if profile:
+            # Id nuevo para el perfil: file_id lo elige el cliente
+            (metadata, image_bytes), profile_summary = profiling.profile_call(
+                profile, None, None, build_preview, file_path, request)
+        else:
+            metadata, image_bytes = build_preview(file_path, request)
+            profile_summary = None
 
-        # Generar vista previa
-        try:
-            image = render_preview(
-                file_path,
-                request.preview_type,
-                request.width,
-                request.height,
-                request.background_color
-            )
-        except Exception as e:
-            logger.exception("Error generating preview")
-            # Generar imagen de error
-            image = Image.new('RGB', (request.width, request.height), request.background_color)
-            draw = ImageDraw.Draw(image)
-            draw.text((10, 10), f"Error: {str(e)}", fill="black")
-            metadata = None
-
-        # Save preview and encode for response
-        preview_path = save_preview(image, request.file_id, request.preview_type)
-        image_data = encode_image(image)
+        # Save and inline the same encoded bytes
+        preview_path = save_preview(image_bytes, request.file_id, request.preview_type)
+        image_data = base64.b64encode(image_bytes).decode()
 
         # Schedule cleanup in background
         background_tasks.add_task(lambda: Path(preview_path).unlink(missing_ok=True))
@@ -438,7 +464,8 @@ async def generate_preview(
             status="success",
             metadata=metadata,
             processing_time=processing_time,
-            cached=False
+            cached=False,
+            profile=profile_summary
         )
 
     except Exception as e:
@@ -454,10 +481,6 @@ async def health_check(request: Request, api_key: Optional[str] = Depends(get_ap
     import psutil
     import platform
 
-    # Ensure request counter exists
-    if not hasattr(app.state, "request_count"):
-        app.state.request_count = 0
-
     # Count temp files
     temp_files = len(list(Path(config.TEMP_DIR).glob('*')))
 
@@ -484,18 +507,24 @@ async def health_check(request: Request, api_key: Optional[str] = Depends(get_ap
         python_version=platform.python_version(),
         start_time=process_start,
         service_uptime=time.time() - start_time,
-        request_count=app.state.request_count
+        request_count=metrics.request_count()
     )
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request and per-stage latencies"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/preview", response_model=PreviewResponse)
 @limiter.limit("20/minute")
 async def preview_endpoint(
     request: PreviewRequest,
     background_tasks: BackgroundTasks,
-    api_key: Optional[str] = Depends(get_api_key)
+    api_key: Optional[str] = Depends(get_api_key),
+    x_pollux_profile: Optional[str] = Header(None)
 ):
     """Alias para /generate_preview para mantener consistencia de APIs"""
-    return await generate_preview(request, background_tasks, api_key)
+    return await generate_preview(request, background_tasks, api_key, x_pollux_profile)
 
 @app.get("/api/health", response_model=HealthResponse)
 @limiter.limit("60/minute")
@@ -1,21 +1,23 @@
 #!/usr/bin/env python3
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from pydantic import BaseModel
 import uvicorn
 import os
+import sys
 import base64
 import io
-from PIL import Image
+from pathlib import Path
+from typing import List, Optional
+
+# Métricas compartidas con los analizadores
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+import profiling
+from viewer_pool import ViewerPool, validate_job
 
 # PythonOCC imports
 try:
-    from OCC.Core.STEPControl import STEPControl_Reader
-    from OCC.Core.IFSelect import IFSelect_RetDone
-    from OCC.Display.SimpleGui import init_display
-    from OCC.Core.V3d import V3d_SpotLight
-    from OCC.Core.Quantity import Quantity_Color, Quantity_NOC_WHITE, Quantity_TOC_RGB
-    from OCC.Core.BRepTools import breptools_Clean
-    from OCC.Core.AIS import AIS_WireFrame, AIS_Shaded
+    import step_cache
     OCC_AVAILABLE = True
 except ImportError as e:
     print(f"PythonOCC import error: {e}")
@@ -23,64 +25,95 @@ except ImportError as e:
 
 app = FastAPI()
 
+# Flecha de mallado relativa al tamaño del modelo (el coeficiente por defecto de AIS)
+MESH_RELATIVE_DEFLECTION = 0.001
+
+# Visores offscreen de larga vida (uno por hilo)
+VIEWERS = int(os.environ.get('POLLUX_STEP_VIEWERS', '2'))
+RENDER_TIMEOUT = float(os.environ.get('POLLUX_STEP_RENDER_TIMEOUT', '120'))
+
+# render_type -> (modo, cámaras por defecto)
+RENDER_TYPES = {
+    '2d': ('shaded', ['top']),
+    'wireframe': ('wireframe', ['iso']),
+    '3d': ('shaded', ['iso']),
+}
+
+viewer_pool = ViewerPool(VIEWERS)
+
+def _viewer_pool_gauge(key):
+    return lambda: viewer_pool.stats()[key]
+
+metrics.registry.gauge('pollux_viewer_pool_viewers', 'Offscreen OCC viewers', _viewer_pool_gauge('viewers'))
+metrics.registry.gauge('pollux_viewer_pool_active_jobs', 'STEP renders currently running', _viewer_pool_gauge('active_jobs'))
+metrics.registry.gauge('pollux_viewer_pool_queued_jobs', 'STEP renders waiting for a viewer', _viewer_pool_gauge('queued_jobs'))
+metrics.registry.gauge('pollux_viewer_pool_utilization', 'Busy fraction of the viewers since start', _viewer_pool_gauge('utilization'))
+
 class PreviewRequest(BaseModel):
     file_id: str
     file_path: str
     render_type: str = '2d'
+    width: int = 800
+    height: int = 600
+    # Varias cámaras en un solo render (iso, top, bottom, front, rear, left, right)
+    views: Optional[List[str]] = None
 
 def load_step_file(filepath):
-    """Load a STEP file and return the shape."""
-    reader = STEPControl_Reader()
-    status = reader.ReadFile(filepath)
-
-    if status != IFSelect_RetDone:
-        raise RuntimeError(f"Error reading STEP file: {status}")
-
-    reader.TransferRoot()
-    return reader.OneShape()
-
-def setup_display(width=800, height=600):
-    """Initialize the display with white background."""
-    display, start_display, add_menu, add_function_to_menu = init_display(
-        size=(width, height)
-    )
-    display.View.SetBackgroundColor(Quantity_Color(1, 1, 1, Quantity_TOC_RGB))
-    return display
-
-def capture_view(display, shape, render_type):
-    """Capture a view of the shape based on render_type."""
-    display.EraseAll()
-
-    # Clean the shape
-    breptools_Clean(shape)
-
-    if render_type == 'wireframe':
-        # Wireframe view
-        display.DisplayShape(shape, update=True, transparency=0.0,
-                           mode=AIS_WireFrame)
-    elif render_type == '2d':
-        # 2D view (top view)
-        display.DisplayShape(shape, update=False)
-        display.View_Top()
-        display.FitAll()
-    else:  # '3d'
-        # Full 3D rendered view
-        display.DisplayShape(shape, update=False, mode=AIS_Shaded)
-        display.View_Iso()
-
-    # Add lighting
-    light = V3d_SpotLight()
-    display.View.SetLightOn(light)
-
-    # Update and fit
-    display.FitAll()
-
-    # Capture the view
-    return display.View.Capture()
+    """Load a STEP assembly and return its placed shapes as one compound.
+
+    The transferred assembly comes from the BRep cache when this content was
+    read before. Each unique part is meshed once; its instances share the
+    geometry and the triangulation, so the viewer does not mesh them again.
+    """
+    try:
+        assembly = step_cache.load_assembly(filepath)
+    except AssertionError as e:
+        raise RuntimeError(f"Error reading STEP file: {e}")
+    metrics.mark('mesh')
+    # Mallado bajo el lock del ensamblaje: el LRU lo comparte con otras peticiones
+    step_cache.mesh_assembly(assembly, MESH_RELATIVE_DEFLECTION)
+    return assembly.compound()
+
+def render_job(request):
+    """(mode, views) of a request; ValueError if it cannot be rendered."""
+    if request.render_type not in RENDER_TYPES:
+        raise ValueError(f"Unknown render type: {request.render_type}")
+    mode, default_views = RENDER_TYPES[request.render_type]
+    views = request.views or default_views
+    validate_job(views, request.width, request.height, mode)
+    return mode, views
+
+def render_step_preview(request):
+    """Load, render and encode a STEP preview: {view: base64 PNG}."""
+    mode, views = render_job(request)
+
+    with metrics.timeline('step', request.file_path):
+        # Load the STEP file (meshed once per unique part)
+        metrics.mark('parse')
+        shape = load_step_file(request.file_path)
+
+        # Render every camera in a single viewer checkout
+        metrics.mark('render')
+        images = viewer_pool.render(shape, views, request.width, request.height, mode,
+                                    timeout=RENDER_TIMEOUT)
+
+        # Convert to base64
+        metrics.mark('encode')
+        encoded = {}
+        for view, image in images.items():
+            buffered = io.BytesIO()
+            image.save(buffered, format="PNG")
+            encoded[view] = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return encoded
 
 @app.post("/preview")
-async def generate_preview(request: PreviewRequest):
+def generate_preview(request: PreviewRequest, x_pollux_profile: Optional[str] = Header(None)):
     """Generate preview for STEP files with different render types."""
+    try:
+        render_job(request)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
     if not OCC_AVAILABLE:
         raise HTTPException(500, "PythonOCC not available")
 
@@ -88,29 +121,42 @@ async def generate_preview(request: PreviewRequest):
         raise HTTPException(404, f"File not found: {request.file_path}")
 
     try:
-        # Load the STEP file
-        shape = load_step_file(request.file_path)
-
-        # Setup display
-        display = setup_display()
-
-        # Capture view based on render type
-        image = capture_view(display, shape, request.render_type)
-
-        # Convert to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        image_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-        return {
+        profile = profiling.resolve_mode(x_pollux_profile)
+        if profile:
+            # Id nuevo para el perfil: file_id lo elige el cliente
+            images, profile_summary = profiling.profile_call(
+                profile, None, None, render_step_preview, request)
+        else:
+            images = render_step_preview(request)
+
+        response = {
             "file_id": request.file_id,
-            "image_data": image_base64,
+            "image_data": next(iter(images.values())),
             "render_type": request.render_type
         }
+        if request.views:
+            response["images"] = images
+        if profile:
+            response["profile"] = profile_summary
+        return response
 
     except Exception as e:
         raise HTTPException(500, f"Error generating preview: {str(e)}")
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latencies"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/viewers")
+async def viewers_endpoint():
+    """Offscreen viewer pool utilization"""
+    return viewer_pool.stats()
+
+@app.on_event("shutdown")
+async def shutdown_viewers():
+    viewer_pool.shutdown()
+
 if __name__ == "__main__":
     print("Starting STEP preview server on http://127.0.0.1:8001")
     uvicorn.run(app, host="127.0.0.1", port=8001)
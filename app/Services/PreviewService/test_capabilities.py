@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las estadísticas de uso de backends: contadores en memoria y escritura en segundo plano
+"""
+
+import json
+import time
+
+import pytest
+
+import capabilities
+
+
+@pytest.fixture
+def usage_file(tmp_path):
+    path = tmp_path / 'usage.json'
+    path.write_text(json.dumps({'numpy': 3, 'unknown': 9}))
+    capabilities.set_usage_file(str(path))
+    yield path
+    capabilities.stop_usage_flusher()
+    capabilities.set_usage_file(str(tmp_path / 'missing.json'))
+
+
+def test_requests_are_counted_in_memory_and_flushed_later(usage_file):
+    capabilities.record_use('stl')
+    capabilities.record_use('stl')
+    assert json.loads(usage_file.read_text()) == {'numpy': 3, 'unknown': 9}
+    assert capabilities.report()['numpy']['requests'] == 5
+
+    assert capabilities.flush_usage()
+    assert json.loads(usage_file.read_text()) == {'numpy': 5, 'matplotlib': 2, 'numpy_stl': 2}
+    # Sin cambios no se vuelve a escribir
+    assert not capabilities.flush_usage()
+
+
+def test_flusher_thread_writes_periodically_and_on_stop(usage_file):
+    capabilities.start_usage_flusher(interval=0.05)
+    capabilities.record_use('dxf')
+    deadline = time.time() + 5
+    while json.loads(usage_file.read_text()).get('ezdxf') != 1 and time.time() < deadline:
+        time.sleep(0.02)
+    assert json.loads(usage_file.read_text())['ezdxf'] == 1
+
+    capabilities.record_use('dxf')
+    capabilities.stop_usage_flusher()
+    assert json.loads(usage_file.read_text())['ezdxf'] == 2
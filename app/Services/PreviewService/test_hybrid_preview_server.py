@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Pruebas del servidor híbrido en proceso (sin uvicorn): rutas de preview y consultas de geometría
+"""
+
+import os
+import sys
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import mesh_cache
+import hybrid_preview_server as server
+
+
+def write_stl(path, triangles):
+    triangles = np.asarray(triangles, dtype=np.float32)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 80 + struct.pack('<I', len(triangles)))
+        for triangle in triangles:
+            f.write(struct.pack('<3f', 0, 0, 0) + triangle.tobytes() + b'\0\0')
+    return str(path)
+
+
+def cube(size=10.0):
+    """Closed axis-aligned cube from (0, 0, 0) to (size, size, size)"""
+    corners = np.array([[x, y, z] for x in (0, size) for y in (0, size) for z in (0, size)], dtype=np.float32)
+    quads = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    return np.array([corners[[a, b, c]] for a, b, c, d in quads] + [corners[[a, c, d]] for a, b, c, d in quads])
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'mesh_cache')
+    monkeypatch.setattr(mesh_cache, 'CACHE_DIR', directory)
+    return directory
+
+
+def test_stl_preview_does_not_build_the_mesh_cache(tmp_path, cache_dir):
+    path = write_stl(tmp_path / 'cube.stl', cube())
+    stl_mesh = server.load_stl_mesh(path)
+    assert stl_mesh.vectors.shape == (12, 3, 3)
+    assert not os.path.exists(cache_dir)
+
+    # Con la caché ya construida (análisis o backfill) se lee de ella
+    mesh_cache.build(path)
+    assert np.array_equal(server.load_stl_mesh(path).vectors, stl_mesh.vectors)
+
+
+@pytest.fixture
+def client(cache_dir, monkeypatch):
+    """Cliente sin eventos de arranque (ni pool ni cola) y rutas absolutas de prueba"""
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(server.config, 'get_absolute_path', lambda path: path)
+    monkeypatch.setattr(server, 'geometry_cache', None)
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def cube_path(tmp_path):
+    return write_stl(tmp_path / 'cube.stl', cube())
+
+
+def test_raycast_hits_and_misses(client, cube_path):
+    response = client.post('/geometry/raycast', json={
+        'file_path': cube_path,
+        'origins': [[5, 5, 20], [50, 50, 20]],
+        'directions': [[0, 0, -1]],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body['triangles'] == 12
+    assert not body['cached']
+    hit, miss = body['hits']
+    assert hit['hit'] and hit['distance'] == pytest.approx(10)
+    assert hit['point'] == pytest.approx([5, 5, 10])
+    assert abs(hit['normal'][2]) == pytest.approx(1)
+    assert miss == {'hit': False}
+
+    # La segunda consulta reutiliza el BVH
+    again = client.post('/geometry/raycast', json={
+        'file_path': cube_path, 'origins': [[5, 5, -20]], 'directions': [[0, 0, 1]], 'max_distance': 5})
+    assert again.json()['cached']
+    assert again.json()['hits'] == [{'hit': False}]
+
+
+def test_closest_point_and_measure(client, cube_path):
+    closest = client.post('/geometry/closest-point', json={'file_path': cube_path, 'points': [[5, 5, 15], [-3, 5, 5]]})
+    assert closest.status_code == 200
+    above, beside = closest.json()['results']
+    assert above['point'] == pytest.approx([5, 5, 10]) and above['distance'] == pytest.approx(5)
+    assert beside['point'] == pytest.approx([0, 5, 5]) and beside['distance'] == pytest.approx(3)
+
+    measure = client.post('/geometry/measure', json={'file_path': cube_path, 'points': [[0, 0, 0], [3, 4, 0], [3, 4, 10]]})
+    assert measure.status_code == 200
+    assert [s['distance'] for s in measure.json()['segments']] == pytest.approx([5, 10])
+    assert measure.json()['total_distance'] == pytest.approx(15)
+
+    snapped = client.post('/geometry/measure', json={
+        'file_path': cube_path, 'points': [[5, 5, 12], [5, 5, -2]], 'snap': True})
+    assert snapped.json()['total_distance'] == pytest.approx(10)
+    assert snapped.json()['snap_distances'] == pytest.approx([2, 2])
+
+
+@pytest.mark.parametrize('route, body', [
+    ('/geometry/raycast', {'origins': [[0, 0, 0]], 'directions': [[0, 0, 0]]}),
+    ('/geometry/raycast', {'origins': [[0, 0, 0], [1, 1, 1]], 'directions': [[0, 0, 1], [0, 1, 0], [1, 0, 0]]}),
+    ('/geometry/closest-point', {'points': [[0, 0]]}),
+    ('/geometry/measure', {'points': [[0, 0, 0]]}),
+])
+def test_invalid_geometry_queries_return_400(client, cube_path, route, body):
+    assert client.post(route, json={'file_path': cube_path, **body}).status_code == 400
+
+
+def test_geometry_query_on_missing_file_returns_404(client, tmp_path):
+    response = client.post('/geometry/closest-point', json={'file_path': str(tmp_path / 'missing.stl'), 'points': [[0, 0, 0]]})
+    assert response.status_code == 404
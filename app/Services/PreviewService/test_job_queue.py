@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la cola de trabajos: recover solo devuelve a la cola los trabajos de procesos caídos
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'))
+
+
+def set_owner(queue, job_id, owner, lease_expires_at=None):
+    conn = sqlite3.connect(queue.db_path)
+    with conn:
+        conn.execute('UPDATE jobs SET owner = ?, lease_expires_at = COALESCE(?, lease_expires_at) WHERE id = ?',
+                     (owner, lease_expires_at, job_id))
+    conn.close()
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_jobs_of_live_owners_are_not_requeued(queue):
+    mine = queue.submit('preview', {'n': 1})
+    other = queue.submit('preview', {'n': 2})
+    assert queue.claim()['owner'] == job_queue.OWNER
+    queue.claim()
+    boot = job_queue.OWNER.split(':')[0]
+    # Otro servidor vivo (el proceso de pytest padre) con su propio trabajo
+    set_owner(queue, other, f"{boot}:{os.getppid()}:abcdef12")
+
+    assert queue.recover() == 0
+    assert queue.get(mine)['status'] == 'running'
+    assert queue.get(other)['status'] == 'running'
+
+
+@pytest.mark.parametrize('owner', [
+    lambda boot, pid: f"{boot}:{dead_pid()}:abcdef12",          # proceso terminado
+    lambda boot, pid: f"{boot}:{pid}:00000000",                 # ejecución anterior con el mismo pid
+    lambda boot, pid: f"another-boot:{pid}:abcdef12",           # antes de reiniciar la máquina
+    lambda boot, pid: None,                                     # tomado antes de existir la columna
+])
+def test_jobs_of_gone_owners_are_requeued(queue, owner):
+    job_id = queue.submit('preview', {})
+    queue.claim()
+    boot, pid, _ = job_queue.OWNER.split(':')
+    set_owner(queue, job_id, owner(boot, pid))
+
+    assert queue.recover() == 1
+    job = queue.get(job_id)
+    assert job['status'] == 'queued'
+    assert job['owner'] is None
+    assert queue.claim()['id'] == job_id
+
+
+def test_expired_lease_is_requeued_and_progress_renews_it(queue):
+    job_id = queue.submit('preview', {})
+    queue.claim()
+    set_owner(queue, job_id, job_queue.OWNER, time.time() - 1)
+    queue.progress(job_id, 'rendering', 0.5)
+    assert queue.recover() == 0
+
+    set_owner(queue, job_id, job_queue.OWNER, time.time() - 1)
+    assert queue.recover() == 1
+
+
+def test_exhausted_jobs_fail_instead_of_requeueing(queue):
+    job_id = queue.submit('preview', {})
+    for _ in range(job_queue.MAX_ATTEMPTS):
+        queue.claim()
+        set_owner(queue, job_id, None)
+        queue.recover()
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert queue.events(job_id)[-1]['status'] == 'failed'
+
+
+def test_existing_databases_gain_the_owner_columns(tmp_path):
+    path = str(tmp_path / 'old.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.executescript(job_queue._SCHEMA.replace(',\n    owner TEXT,\n    lease_expires_at REAL', ''))
+    conn.close()
+    queue = JobQueue(path)
+    queue.submit('preview', {})
+    assert queue.claim()['owner'] == job_queue.OWNER
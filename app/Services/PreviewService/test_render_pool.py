@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Pruebas del pool de renderizado: timeout por trabajo, reinicio del pool, cancelación y métricas
+"""
+
+import sys
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+from render_pool import RenderPool, RenderError, RenderTimeout
+
+
+@pytest.fixture(autouse=True)
+def spool(tmp_path, monkeypatch):
+    """Spool de métricas de los workers en un directorio temporal"""
+    monkeypatch.setattr(metrics, 'SPOOL_DIR', str(tmp_path))
+    return tmp_path
+
+
+def sleep_job(seconds, value=None):
+    time.sleep(seconds)
+    return value
+
+
+def failing_job():
+    raise ValueError("bad input")
+
+
+def staged_job(fail=False, hang=0):
+    """Two stages, then fail or hang (the hang never finishes its render stage)"""
+    with metrics.timeline('stl'):
+        metrics.mark('parse')
+        time.sleep(0.01)
+        metrics.mark('render')
+        time.sleep(hang)
+        if fail:
+            raise ValueError("render failed")
+    return True
+
+
+def stage_count(stage, file_type='stl'):
+    with metrics.registry._lock:
+        series = metrics.registry._histograms[metrics.STAGE_HISTOGRAM]
+        return sum(count for key, (_, _, count) in series.items()
+                   if dict(key)['stage'] == stage and dict(key)['file_type'] == file_type)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_queue_time_does_not_count_towards_timeout():
+    async def scenario():
+        pool = RenderPool(1, timeout=1.5)
+        try:
+            await pool.run(sleep_job, 0, timeout=30)
+            return await asyncio.gather(*(pool.run(sleep_job, 0.6, i) for i in range(3)))
+        finally:
+            pool.shutdown()
+
+    assert run(scenario()) == [0, 1, 2]
+
+
+def test_timeout_restarts_pool_and_retries_jobs_in_flight():
+    async def scenario():
+        pool = RenderPool(2, timeout=30)
+        try:
+            await asyncio.gather(pool.run(sleep_job, 0, timeout=30), pool.run(sleep_job, 0, timeout=30))
+            hung = pool.run(sleep_job, 60, timeout=0.5)
+            survivor = pool.run(sleep_job, 1.0, 'done', timeout=30)
+            results = await asyncio.gather(hung, survivor, return_exceptions=True)
+            return results, pool.stats(), await pool.run(sleep_job, 0, 'after', timeout=30)
+        finally:
+            pool.shutdown()
+
+    (hung, survivor), stats, after = run(scenario())
+    assert isinstance(hung, RenderTimeout)
+    assert survivor == 'done'
+    assert after == 'after'
+    assert stats['timed_out_jobs'] == 1
+    assert stats['restarts'] == 1
+
+
+def test_job_errors_become_render_errors():
+    async def scenario():
+        pool = RenderPool(1, timeout=30)
+        try:
+            with pytest.raises(RenderError) as error:
+                await pool.run(failing_job)
+            return error.value, pool.stats()
+        finally:
+            pool.shutdown()
+
+    error, stats = run(scenario())
+    assert error.status_code == 500
+    assert 'bad input' in error.detail
+    assert stats['failed_jobs'] == 1
+
+
+def test_caller_cancellation_is_not_retried():
+    async def scenario():
+        pool = RenderPool(1, timeout=30)
+        try:
+            await pool.run(sleep_job, 0)
+            task = asyncio.ensure_future(pool.run(sleep_job, 0.5))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return pool.stats(), await pool.run(sleep_job, 0, 'next')
+        finally:
+            pool.shutdown()
+
+    stats, following = run(scenario())
+    assert stats['active_jobs'] == 0
+    assert stats['queued_jobs'] == 0
+    assert stats['restarts'] == 0
+    assert following == 'next'
+
+
+def test_metrics_of_failed_and_timed_out_jobs_reach_the_server():
+    async def scenario():
+        pool = RenderPool(2, timeout=30)
+        try:
+            await pool.run(staged_job)
+            with pytest.raises(RenderError):
+                await pool.run(staged_job, True)
+            with pytest.raises(RenderTimeout):
+                await pool.run(staged_job, False, 60, timeout=1)
+        finally:
+            pool.shutdown()
+
+    parse, render = stage_count('parse'), stage_count('render')
+    run(scenario())
+    assert metrics.collect_spool() >= 3
+    # Éxito, fallo y timeout: tres parse; el render cortado por el timeout no llega a cerrarse
+    assert stage_count('parse') - parse == 3
+    assert stage_count('render') - render == 2
+    assert metrics.collect_spool() == 0
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Pruebas del turntable: simplificación de mallas densas al presupuesto de píxeles
+"""
+
+import numpy as np
+
+import turntable
+
+
+def uv_sphere(segments, rings, radius=50.0):
+    u = np.linspace(0, 2 * np.pi, segments + 1)
+    v = np.linspace(0, np.pi, rings + 1)
+    grid = radius * np.stack([np.outer(np.cos(u), np.sin(v)), np.outer(np.sin(u), np.sin(v)),
+                              np.outer(np.ones_like(u), np.cos(v))], axis=-1)
+    a, b, c, d = grid[:-1, :-1], grid[1:, :-1], grid[1:, 1:], grid[:-1, 1:]
+    return np.concatenate([np.stack([a, b, c], axis=2).reshape(-1, 3, 3),
+                           np.stack([a, c, d], axis=2).reshape(-1, 3, 3)]).astype(np.float32)
+
+
+def test_dense_mesh_is_clustered_before_the_frames(monkeypatch):
+    triangles = uv_sphere(200, 100)
+    calls = []
+    render_frame = turntable.render_frame
+    monkeypatch.setattr(turntable, 'render_frame', lambda mesh, *args: calls.append(len(mesh)) or render_frame(mesh, *args))
+    frames = turntable.render_turntable(triangles, 3, 64, 64)
+    assert len(frames) == 3
+    assert 0 < calls[0] < len(triangles) // 4
+    assert len(set(calls)) == 1
+
+    # Mismas vistas que con la malla completa, salvo diferencias de menos de un píxel
+    monkeypatch.setattr(turntable, 'cluster_vertices', lambda mesh, cell: mesh)
+    full = turntable.render_turntable(triangles, 3, 64, 64)
+    for clustered, reference in zip(frames, full):
+        difference = np.abs(np.asarray(clustered, dtype=int) - np.asarray(reference, dtype=int))
+        assert difference.mean() < 1
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Pruebas del pool de visores offscreen: validación previa y descarte solo por fallos de render
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import viewer_pool
+from viewer_pool import ViewerPool
+
+
+class FakeViewer:
+    pass
+
+
+@pytest.fixture
+def fake_occ(monkeypatch):
+    """Viewers without OpenGL: render_views returns the view names"""
+    created = []
+
+    def create_viewer(width, height):
+        created.append(FakeViewer())
+        return created[-1]
+
+    def render_views(viewer, shape, views, width, height, mode='shaded'):
+        if shape == 'broken':
+            raise RuntimeError("render failed")
+        return {view: (viewer, width, height) for view in views}
+
+    monkeypatch.setattr(viewer_pool, 'create_viewer', create_viewer)
+    monkeypatch.setattr(viewer_pool, 'render_views', render_views)
+    monkeypatch.setattr(viewer_pool, 'reset_viewer', lambda viewer: None)
+    return created
+
+
+@pytest.mark.parametrize('views, width, height, mode', [
+    (['iso', 'sideways'], 800, 600, 'shaded'),
+    ([], 800, 600, 'shaded'),
+    (['iso'], 800, 600, 'hidden_line'),
+    (['iso'], 0, 600, 'shaded'),
+    (['iso'], 800, viewer_pool.MAX_SIZE + 1, 'shaded'),
+])
+def test_invalid_jobs_are_rejected_before_reaching_a_viewer(fake_occ, views, width, height, mode):
+    pool = ViewerPool(1)
+    try:
+        with pytest.raises(ValueError):
+            pool.submit('shape', views, width, height, mode)
+        assert pool.render('shape', ['top'], timeout=10)['top'][1:] == (800, 600)
+        assert pool.stats()['failed_jobs'] == 0
+        assert len(fake_occ) == 1
+    finally:
+        pool.shutdown()
+
+
+def test_render_failures_discard_the_viewer(fake_occ):
+    pool = ViewerPool(1)
+    try:
+        first = pool.render('shape', ['iso'], timeout=10)['iso'][0]
+        assert pool.render('shape', ['top'], timeout=10)['top'][0] is first
+        with pytest.raises(RuntimeError):
+            pool.render('broken', ['iso'], timeout=10)
+        assert pool.render('shape', ['iso'], timeout=10)['iso'][0] is not first
+        assert pool.stats()['viewers_created'] == 2
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize('body', [
+    {'render_type': 'xray'},
+    {'views': ['iso', 'sideways']},
+    {'width': 100000},
+    {'height': -1},
+])
+def test_step_server_answers_bad_requests_with_400(tmp_path, body):
+    import step_preview_server
+    client = TestClient(step_preview_server.app)
+    response = client.post('/preview', json={'file_id': '1', 'file_path': str(tmp_path / 'missing.step'), **body})
+    assert response.status_code == 400
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Vistas en órbita (turntable) de una malla ya cargada: N cámaras en una sola pasada
+Rasterizador NumPy (z-buffer, sombreado plano) y empaquetado en sprite sheet o animación
+"""
+
+import math
+
+import numpy as np
+from PIL import Image
+
+# Sobremuestreo para el antialiasing (se reduce con LANCZOS al final)
+SUPERSAMPLE = 2
+
+# Elementos (triángulo x píxel candidato) por lote del rasterizador
+RASTER_BATCH = 1 << 21
+
+# Color base del modelo, fondo y luz (dirección hacia la luz en espacio de cámara)
+MODEL_COLOR = np.array([70, 130, 180], dtype=np.float32)
+BACKGROUND = (255, 255, 255)
+LIGHT_DIRECTION = np.array([-0.4, -1.0, 0.6], dtype=np.float32)
+AMBIENT = 0.35
+
+# Fracción del lado menor que ocupa la esfera envolvente del modelo
+FILL = 0.9
+
+# Lado de la celda de agrupado de vértices en píxeles de salida: con más
+# triángulos que píxeles la malla se simplifica una vez, antes de los fotogramas
+CLUSTER_PIXELS = 1.0
+
+
+def orbit_rotations(frames, elevation=25.0):
+    """
+    Rotation matrices of a full turn around Z (Z up), one per frame.
+
+    The camera looks along +Y from below Y; `elevation` (degrees) tilts it
+    so the model is seen from above.
+    """
+    tilt = math.radians(elevation)
+    ct, st = math.cos(tilt), math.sin(tilt)
+    rx = np.array([[1, 0, 0], [0, ct, -st], [0, st, ct]])
+    rotations = []
+    for i in range(frames):
+        azimuth = 2 * math.pi * i / frames
+        ca, sa = math.cos(azimuth), math.sin(azimuth)
+        rz = np.array([[ca, -sa, 0], [sa, ca, 0], [0, 0, 1]])
+        rotations.append((rx @ rz).astype(np.float32))
+    return rotations
+
+
+def face_normals(triangles):
+    """Unit normals of (n, 3, 3) triangles (zero for degenerate ones)"""
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def cluster_vertices(triangles, cell):
+    """
+    Vertex-clustering simplification of (n, 3, 3) triangles on a grid of
+    `cell`-sized cubes.
+
+    Every vertex moves to the mean of the vertices in its cell; triangles that
+    collapse (two corners in one cell) and duplicates are dropped. With a cell
+    of one output pixel the silhouette moves by less than a pixel from any
+    direction, so it is done once for all the frames of an orbit.
+    """
+    points = triangles.reshape(-1, 3)
+    cells = np.floor((points - points.min(axis=0)) / cell).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, clusters = np.unique(keys, return_inverse=True)
+    clusters = clusters.reshape(-1, 3)
+    counts = np.bincount(clusters.ravel()).astype(np.float64)
+    centers = np.stack([np.bincount(clusters.ravel(), weights=points[:, axis]) / counts
+                        for axis in range(3)], axis=1).astype(np.float32)
+
+    keep = ((clusters[:, 0] != clusters[:, 1]) & (clusters[:, 1] != clusters[:, 2])
+            & (clusters[:, 0] != clusters[:, 2]))
+    clusters = clusters[keep]
+    _, first = np.unique(np.sort(clusters, axis=1), axis=0, return_index=True)
+    return centers[clusters[np.sort(first)]]
+
+
+def _rasterize(screen, depth, ids, width, height, zbuffer, face_ids):
+    """
+    Z-buffer the triangles of one bucket, all with a bounding box of at most
+    k x k pixels: every triangle tests the same k x k grid of candidates.
+    `ids` are the face indices written to `face_ids` where a triangle wins.
+    """
+    n = len(screen)
+    if n == 0:
+        return
+    x0 = np.floor(screen[:, :, 0].min(axis=1)).astype(np.int64)
+    y0 = np.floor(screen[:, :, 1].min(axis=1)).astype(np.int64)
+    span = np.maximum(np.ceil(screen[:, :, 0].max(axis=1)) - x0,
+                      np.ceil(screen[:, :, 1].max(axis=1)) - y0).astype(np.int64)
+    k = int(span.max()) + 1
+    grid = np.arange(k)
+    chunk = max(1, RASTER_BATCH // (k * k))
+
+    for start in range(0, n, chunk):
+        s = screen[start:start + chunk]
+        d = depth[start:start + chunk]
+        # Centros de píxel candidatos: (m, k, k)
+        px = (x0[start:start + chunk, None, None] + grid[None, None, :]).astype(np.float32) + 0.5
+        py = (y0[start:start + chunk, None, None] + grid[None, :, None]).astype(np.float32) + 0.5
+
+        ax, ay = s[:, 0, 0, None, None], s[:, 0, 1, None, None]
+        bx, by = s[:, 1, 0, None, None], s[:, 1, 1, None, None]
+        cx, cy = s[:, 2, 0, None, None], s[:, 2, 1, None, None]
+        area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w0 = ((bx - px) * (cy - py) - (by - py) * (cx - px)) / area
+            w1 = ((cx - px) * (ay - py) - (cy - py) * (ax - px)) / area
+            w2 = 1 - w0 - w1
+            inside = ((w0 >= 0) & (w1 >= 0) & (w2 >= 0) & (area != 0)
+                      & (px >= 0) & (px < width) & (py >= 0) & (py < height))
+
+        m, iy, ix = np.nonzero(inside)
+        if len(m) == 0:
+            continue
+        z = (w0[m, iy, ix] * d[m, 0] + w1[m, iy, ix] * d[m, 1] + w2[m, iy, ix] * d[m, 2])
+        pixels = (py[m, iy, 0].astype(np.int64) * width + px[m, 0, ix].astype(np.int64))
+        np.minimum.at(zbuffer, pixels, z)
+        winner = z <= zbuffer[pixels]
+        face_ids[pixels[winner]] = ids[m[winner] + start]
+
+
+def render_frame(triangles, normals, rotation, center, scale, width, height):
+    """One flat-shaded orthographic view as a PIL RGB image"""
+    w, h = width * SUPERSAMPLE, height * SUPERSAMPLE
+    view = (triangles - center) @ rotation.T
+    # x a la derecha, z hacia arriba, y es la profundidad (la cámara mira hacia +Y)
+    screen = np.empty(view.shape[:2] + (2,), dtype=np.float32)
+    screen[..., 0] = view[..., 0] * scale * SUPERSAMPLE + w / 2
+    screen[..., 1] = h / 2 - view[..., 2] * scale * SUPERSAMPLE
+    depth = view[..., 1]
+
+    light = LIGHT_DIRECTION / np.linalg.norm(LIGHT_DIRECTION)
+    # Iluminación a dos caras: las normales de los STL no siempre están bien orientadas
+    shade = AMBIENT + (1 - AMBIENT) * np.abs((normals @ rotation.T) @ light)
+    colors = np.vstack([np.clip(shade[:, None] * MODEL_COLOR, 0, 255).astype(np.uint8),
+                        np.array([BACKGROUND], dtype=np.uint8)])
+
+    zbuffer = np.full(w * h, np.inf, dtype=np.float32)
+    face_ids = np.full(w * h, len(triangles), dtype=np.int64)
+
+    # Cubetas por tamaño del rectángulo envolvente (potencias de 2): casi todos los
+    # triángulos de una malla fina ocupan pocos píxeles y se rasterizan juntos
+    extent = np.maximum(np.ptp(screen[:, :, 0], axis=1), np.ptp(screen[:, :, 1], axis=1))
+    buckets = np.ceil(np.log2(np.maximum(extent, 1) + 1)).astype(np.int64)
+    order = np.argsort(buckets, kind='stable')
+    bounds = np.searchsorted(buckets[order], np.arange(buckets.max() + 2)) if len(order) else [0]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi > lo:
+            idx = order[lo:hi]
+            _rasterize(screen[idx], depth[idx], idx, w, h, zbuffer, face_ids)
+
+    image = Image.fromarray(colors[face_ids].reshape(h, w, 3), 'RGB')
+    if SUPERSAMPLE > 1:
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def render_turntable(triangles, frames, width, height, elevation=25.0):
+    """
+    Render `frames` views of a full turn of (n, 3, 3) triangles.
+
+    The geometry is loaded once by the caller; every frame is just a rotation,
+    a projection and a z-buffer pass. The scale comes from the bounding sphere,
+    so the model keeps its size while it turns. Meshes with more triangles
+    than output pixels are clustered to the pixel grid first.
+    """
+    triangles = np.asarray(triangles, dtype=np.float32)
+    if len(triangles) == 0:
+        raise ValueError("The mesh has no triangles")
+    points = triangles.reshape(-1, 3)
+    lower, upper = points.min(axis=0), points.max(axis=0)
+    center = (lower + upper) / 2
+    radius = float(np.linalg.norm(upper - lower)) / 2 or 1.0
+    scale = FILL * min(width, height) / (2 * radius)
+    if len(triangles) > width * height:
+        triangles = cluster_vertices(triangles, CLUSTER_PIXELS / scale)
+    normals = face_normals(triangles)
+    return [render_frame(triangles, normals, rotation, center, scale, width, height)
+            for rotation in orbit_rotations(frames, elevation)]
+
+
+def sprite_columns(frames):
+    """Columns of a near-square sprite sheet grid"""
+    return max(1, math.ceil(math.sqrt(frames)))
+
+
+def pack_sprite_sheet(images, columns=None):
+    """
+    Tile equally sized frames row by row into one image.
+
+    Frame i sits at column i % columns, row i // columns.
+    """
+    columns = columns or sprite_columns(len(images))
+    rows = math.ceil(len(images) / columns)
+    width, height = images[0].size
+    sheet = Image.new('RGB', (columns * width, rows * height), BACKGROUND)
+    for i, image in enumerate(images):
+        sheet.paste(image, ((i % columns) * width, (i // columns) * height))
+    return sheet
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Pool de visores OCC offscreen de larga vida para los renders STEP
+Cada visor vive en su propio hilo (el contexto OpenGL es de ese hilo) y se reutiliza entre trabajos
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import Future
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'FileAnalyzers'))
+import metrics
+
+# OpenGL por software de Mesa (llvmpipe): no hace falta GPU ni servidor X con aceleración
+if os.environ.get('POLLUX_VIEWER_SOFTWARE_GL', '1') == '1':
+    os.environ.setdefault('LIBGL_ALWAYS_SOFTWARE', '1')
+    os.environ.setdefault('GALLIUM_DRIVER', 'llvmpipe')
+
+logger = logging.getLogger(__name__)
+
+# Cámaras disponibles -> método de Viewer3d
+VIEWS = {
+    'iso': 'View_Iso',
+    'top': 'View_Top',
+    'bottom': 'View_Bottom',
+    'front': 'View_Front',
+    'rear': 'View_Rear',
+    'left': 'View_Left',
+    'right': 'View_Right',
+}
+
+MODES = ('shaded', 'wireframe')
+
+# Lado máximo de la imagen offscreen (cada visor reserva su framebuffer a ese tamaño)
+MAX_SIZE = int(os.environ.get('POLLUX_VIEWER_MAX_SIZE', '4096'))
+
+# Display3d::GetImageData lee en un Image_PixMap estático compartido por todos los visores
+_readback_lock = threading.Lock()
+
+
+def validate_job(views, width, height, mode='shaded'):
+    """Raise ValueError for a job no viewer can render (checked before it is queued)"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown render mode: {mode}")
+    if not views:
+        raise ValueError("At least one view is required")
+    unknown = [view for view in views if view not in VIEWS]
+    if unknown:
+        raise ValueError(f"Unknown view(s): {', '.join(map(str, unknown))}")
+    for name, value in (('width', width), ('height', height)):
+        if not isinstance(value, int) or not 1 <= value <= MAX_SIZE:
+            raise ValueError(f"{name} must be between 1 and {MAX_SIZE} pixels")
+
+
+def create_viewer(width, height):
+    """Offscreen Viewer3d with default lights and a white background (created once per worker)"""
+    from OCC.Display.OCCViewer import Viewer3d
+    from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
+
+    viewer = Viewer3d()
+    viewer.Create(display_glinfo=False)
+    viewer.SetSize(width, height)
+    viewer.SetModeShaded()
+    viewer.View.SetBackgroundColor(Quantity_Color(1, 1, 1, Quantity_TOC_RGB))
+    viewer.size = (width, height)
+    return viewer
+
+
+def reset_viewer(viewer):
+    """Remove every displayed object (EraseAll only hides them and they would pile up)"""
+    viewer.Context.RemoveAll(False)
+
+
+def capture(viewer, width, height):
+    """PIL RGB image of the current view"""
+    from PIL import Image
+    from OCC.Core.Graphic3d import Graphic3d_BT_RGBA
+
+    with _readback_lock:
+        data = viewer.GetImageData(width, height, Graphic3d_BT_RGBA)
+    if data is None:
+        raise RuntimeError("Offscreen viewer could not read back the image")
+    # OpenGL devuelve las filas de abajo arriba
+    image = Image.frombytes('RGBA', (width, height), data)
+    return image.transpose(Image.Transpose.FLIP_TOP_BOTTOM).convert('RGB')
+
+
+def render_views(viewer, shape, views, width, height, mode='shaded'):
+    """
+    Display an already meshed shape once and capture it from several cameras.
+
+    Returns {view: PIL image} in the order of `views`.
+    """
+    from OCC.Core.AIS import AIS_Shaded, AIS_WireFrame
+
+    validate_job(views, width, height, mode)
+    if viewer.size != (width, height):
+        viewer.SetSize(width, height)
+        viewer.size = (width, height)
+    reset_viewer(viewer)
+    for ais_shape in viewer.DisplayShape(shape):
+        viewer.Context.SetDisplayMode(ais_shape, AIS_WireFrame if mode == 'wireframe' else AIS_Shaded, False)
+
+    images = {}
+    for view in views:
+        getattr(viewer, VIEWS[view])()
+        viewer.FitAll()
+        images[view] = capture(viewer, width, height)
+    return images
+
+
+class ViewerPool:
+    """
+    Visores offscreen reutilizables, uno por hilo trabajador.
+
+    Crear un contexto OpenGL por petición es caro y pierde memoria: aquí cada
+    hilo crea su visor una vez y atiende trabajos de una cola. Los trabajos
+    inválidos se rechazan al encolarlos; si un render falla, el visor se
+    descarta y el siguiente trabajo crea uno nuevo.
+    """
+
+    def __init__(self, size, width=800, height=600):
+        self.size = max(1, int(size))
+        self.width = width
+        self.height = height
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.viewers_created = 0
+        self.active_jobs = 0
+        self.completed_jobs = 0
+        self.failed_jobs = 0
+        self.wait_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.size:
+                thread = threading.Thread(target=self._worker, name=f'occ-viewer-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+
+    def submit(self, shape, views, width=None, height=None, mode='shaded'):
+        """Queue a render job: Future of {view: PIL image} (ValueError if the job is invalid)"""
+        args = (shape, list(views), self.width if width is None else width,
+                self.height if height is None else height, mode)
+        validate_job(*args[1:])
+        self.start()
+        future = Future()
+        self._jobs.put((future, time.time(), args))
+        return future
+
+    def render(self, shape, views, width=None, height=None, mode='shaded', timeout=None):
+        """Render and wait for the images"""
+        return self.submit(shape, views, width, height, mode).result(timeout)
+
+    def _worker(self):
+        viewer = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, queued_at, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.time()
+            with self._lock:
+                self.wait_seconds += started - queued_at
+                self.active_jobs += 1
+            try:
+                if viewer is None:
+                    viewer = create_viewer(args[2], args[3])
+                    with self._lock:
+                        self.viewers_created += 1
+                with metrics.stage('render', 'step'):
+                    images = render_views(viewer, *args)
+            except BaseException as e:
+                logger.error(f"Offscreen render failed, discarding its viewer: {e}")
+                viewer = None
+                with self._lock:
+                    self.failed_jobs += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.completed_jobs += 1
+                future.set_result(images)
+            finally:
+                if viewer is not None:
+                    try:
+                        reset_viewer(viewer)
+                    except Exception:
+                        viewer = None
+                with self._lock:
+                    self.active_jobs -= 1
+                    self.busy_seconds += time.time() - started
+
+    def stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        with self._lock:
+            jobs = self.completed_jobs + self.failed_jobs
+            return {
+                "viewers": self.size,
+                "viewers_created": self.viewers_created,
+                "active_jobs": self.active_jobs,
+                "queued_jobs": self._jobs.qsize(),
+                "completed_jobs": self.completed_jobs,
+                "failed_jobs": self.failed_jobs,
+                "average_wait_ms": round(self.wait_seconds / jobs * 1000, 2) if jobs else 0.0,
+                "utilization": round(min(1.0, self.busy_seconds / (elapsed * self.size)), 4)
+            }
@@ -0,0 +1,33 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        // Disposición de las previews turntable (fotogramas, columnas, filas...) para el visor
+        Schema::table('file_previews', function (Blueprint $table) {
+            if (!Schema::hasColumn('file_previews', 'layout')) {
+                $table->json('layout')->nullable()->after('render_type');
+            }
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::table('file_previews', function (Blueprint $table) {
+            if (Schema::hasColumn('file_previews', 'layout')) {
+                $table->dropColumn('layout');
+            }
+        });
+    }
+};
@@ -0,0 +1,44 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        // URL y metadatos de la imagen que guarda el servicio de previews (almacén por hash)
+        Schema::table('file_previews', function (Blueprint $table) {
+            if (!Schema::hasColumn('file_previews', 'image_url')) {
+                $table->string('image_url')->nullable()->after('image_path');
+            }
+            if (!Schema::hasColumn('file_previews', 'format')) {
+                $table->string('format', 8)->nullable()->after('render_type');
+                $table->unsignedBigInteger('bytes')->nullable()->after('format');
+                $table->string('sha256', 64)->nullable()->index()->after('bytes');
+                $table->unsignedInteger('width')->nullable()->after('sha256');
+                $table->unsignedInteger('height')->nullable()->after('width');
+            }
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::table('file_previews', function (Blueprint $table) {
+            if (Schema::hasColumn('file_previews', 'format')) {
+                $table->dropIndex(['sha256']);
+                $table->dropColumn(['format', 'bytes', 'sha256', 'width', 'height']);
+            }
+            if (Schema::hasColumn('file_previews', 'image_url')) {
+                $table->dropColumn('image_url');
+            }
+        });
+    }
+};
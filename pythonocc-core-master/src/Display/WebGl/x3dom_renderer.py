@@ -15,12 +15,12 @@
 ##You should have received a copy of the GNU Lesser General Public License
 ##along with pythonOCC.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import os
 import sys
 from string import Template
 import tempfile
 import uuid
-from xml.etree import ElementTree
 
 from OCC.Core.Tesselator import ShapeTesselator
 from OCC import VERSION
@@ -28,6 +28,16 @@ from OCC import VERSION
 from OCC.Extend.TopologyUtils import is_edge, is_wire, discretize_edge, discretize_wire
 from OCC.Display.WebGl.simple_server import start_server
 
+try:
+    import numpy as np
+
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+# number of floats (or indices) formatted per write() when streaming arrays
+X3D_WRITE_CHUNK = 3 * 4096
+
 
 def spinning_cursor():
     while True:
@@ -205,6 +215,79 @@ def indexed_lineset_to_x3d_string(str_linesets, header=True, footer=True, ils_id
     return x3dfile_str
 
 
+def write_x3d_floats(stream, values, chunk_size=X3D_WRITE_CHUNK):
+    """writes a flat sequence of floats (tuple, list or numpy array) to a
+    text stream, chunk by chunk: the whole array is never turned into a
+    single string"""
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start : start + chunk_size]
+        if hasattr(chunk, "tolist"):
+            chunk = chunk.tolist()
+        stream.write(("%.7g " * len(chunk)) % tuple(chunk))
+
+
+def write_x3d_polyline_indices(stream, vertex_counts, chunk_size=X3D_WRITE_CHUNK):
+    """writes the coordIndex of consecutive polylines: the indices of each
+    polyline followed by the -1 separator"""
+    first = 0
+    chunk = []
+    for count in vertex_counts:
+        chunk.extend(range(first, first + count))
+        chunk.append(-1)
+        first += count
+        if len(chunk) >= chunk_size:
+            stream.write(("%i " * len(chunk)) % tuple(chunk))
+            chunk = []
+    if chunk:
+        stream.write(("%i " * len(chunk)) % tuple(chunk))
+
+
+def write_x3d_triangle_set(stream, vertices, normals):
+    """writes a TriangleSet from flat vertex and normal buffers, 3 floats
+    per triangle corner (as returned by ShapeTesselator.GetVerticesPositionAsTuple
+    and GetNormalsAsTuple)"""
+    stream.write("<TriangleSet solid='false'>\n<Coordinate point='")
+    write_x3d_floats(stream, vertices)
+    stream.write("'></Coordinate>\n<Normal vector='")
+    write_x3d_floats(stream, normals)
+    stream.write("'></Normal>\n</TriangleSet>\n")
+
+
+def write_x3d_indexed_lineset(
+    stream, points, vertex_counts, line_color=(0, 0, 0), def_id="edges"
+):
+    """writes many polylines as a single IndexedLineSet: points is a flat
+    buffer of all the polyline vertices, vertex_counts the number of vertices
+    of each polyline. One node instead of one per edge keeps the document
+    small and the browser fast."""
+    stream.write("<Switch whichChoice='0' id='swBRP'>\n\t<Group>\n")
+    stream.write(f"\t\t<Transform scale='1 1 1'><Shape DEF='{def_id}'>\n")
+    stream.write(
+        f"\t\t\t<Appearance><Material emissiveColor='{line_color[0]} {line_color[1]} {line_color[2]}'/></Appearance>\n"
+    )
+    stream.write("\t\t\t<IndexedLineSet coordIndex='")
+    write_x3d_polyline_indices(stream, vertex_counts)
+    stream.write("'><Coordinate point='")
+    write_x3d_floats(stream, points)
+    stream.write("'/></IndexedLineSet>\n")
+    stream.write("\t\t</Shape></Transform>\n\t</Group>\n</Switch>\n")
+
+
+def write_x3d_polyline_file(filename, edge_point_set, def_id="edges"):
+    """streams a single discretized edge or wire to an X3D file"""
+    points = (
+        np.asarray(edge_point_set, dtype=np.float32).ravel()
+        if HAVE_NUMPY
+        else [c for p in edge_point_set for c in p]
+    )
+    with open(filename, "w") as x3d_file:
+        x3d_file.write(X3DFILE_HEADER_TEMPLATE.substitute({"VERSION": f"{VERSION}"}))
+        write_x3d_indexed_lineset(
+            x3d_file, points, [len(edge_point_set)], def_id=def_id
+        )
+        x3d_file.write("</Scene>\n</X3D>\n")
+
+
 class HTMLHeader:
     def __init__(self, bg_gradient_color1="#ced7de", bg_gradient_color2="#808080"):
         self._bg_gradient_color1 = bg_gradient_color1
@@ -288,12 +371,15 @@ class X3DExporter:
         self._specular_color = specular_color
         self._transparency = transparency
         self._mesh_quality = mesh_quality
-        # the list of indexed face sets that compose the shape
+        self._line_color = line_color
+        # the (vertices, normals) buffers of the triangle sets that compose the shape
         # if ever the map_faces_to_mesh option is enabled, this list
         # maybe composed of dozains of TriangleSet
         self._triangle_sets = []
-        self._line_sets = []
-        self._x3d_string = ""  # the string that contains the x3d description
+        # all the edges, merged: a flat buffer of their points and the
+        # number of points of each edge
+        self._edge_points = []
+        self._edge_vertex_counts = []
 
     def compute(self):
         shape_tesselator = ShapeTesselator(self._shape)
@@ -306,68 +392,98 @@ class X3DExporter:
             mesh_quality=self._mesh_quality,
             parallel=True,
         )
-        self._triangle_sets.append(shape_tesselator.ExportShapeToX3DTriangleSet())
+        if HAVE_NUMPY:
+            # the tesselator copies straight into the float32 buffers, no
+            # intermediate tuple of python floats is built
+            nbr_floats = shape_tesselator.ObjGetTriangleCount() * 9
+            vertices = np.empty(nbr_floats, dtype=np.float32)
+            normals = np.empty(nbr_floats, dtype=np.float32)
+            shape_tesselator.GetVerticesPositionInto(vertices)
+            shape_tesselator.GetNormalsInto(normals)
+        else:
+            vertices = shape_tesselator.GetVerticesPositionAsTuple()
+            normals = shape_tesselator.GetNormalsAsTuple()
+        self._triangle_sets.append((vertices, normals))
         # then process edges
         if self._export_edges:
-            # get number of edges
+            # the tesselator has no bulk accessor for edges: read the points
+            # one by one, but into a single buffer for all the edges
             nbr_edges = shape_tesselator.ObjGetEdgeCount()
-            for i_edge in range(nbr_edges):
-                nbr_vertices = shape_tesselator.ObjEdgeGetVertexCount(i_edge)
-                edge_point_set = [
-                    shape_tesselator.GetEdgeVertex(i_edge, i_vert)
-                    for i_vert in range(nbr_vertices)
-                ]
-                ils = export_edge_to_indexed_lineset(edge_point_set)
-                self._line_sets.append(ils)
-
-    def to_x3dfile_string(self, shape_id):
-        x3dfile_str = X3DFILE_HEADER_TEMPLATE.substitute({"VERSION": f"{VERSION}"})
-        for triangle_set in self._triangle_sets:
-            x3dfile_str += "<Switch whichChoice='0' id='swBRP'>"
-            x3dfile_str += f"<Transform scale='1 1 1'>\n<Shape DEF='shape{shape_id}' onclick='select(this);'>\n"
-            x3dfile_str += "<Appearance>\n"
+            counts = [
+                shape_tesselator.ObjEdgeGetVertexCount(i_edge)
+                for i_edge in range(nbr_edges)
+            ]
+            counts = [count if count > 1 else 0 for count in counts]
+            edge_vertices = (
+                shape_tesselator.GetEdgeVertex(i_edge, i_vert)
+                for i_edge, nbr_vertices in enumerate(counts)
+                for i_vert in range(nbr_vertices)
+            )
+            if HAVE_NUMPY:
+                points = np.empty((sum(counts), 3), dtype=np.float32)
+                for i_point, vertex in enumerate(edge_vertices):
+                    points[i_point] = vertex
+            else:
+                points = [coord for vertex in edge_vertices for coord in vertex]
+            self._edge_points = points.ravel() if HAVE_NUMPY else points
+            self._edge_vertex_counts = [count for count in counts if count]
+
+    def write(self, stream, shape_id):
+        """streams the x3d document to a text stream (an open file, a
+        socket.makefile("w"), io.StringIO...). Coordinates are formatted
+        chunk by chunk from the buffers filled by compute(), so no string
+        of the whole mesh is built; the buffers themselves are still
+        proportional to the number of triangles."""
+        stream.write(X3DFILE_HEADER_TEMPLATE.substitute({"VERSION": f"{VERSION}"}))
+        for vertices, normals in self._triangle_sets:
+            stream.write("<Switch whichChoice='0' id='swBRP'>")
+            stream.write(
+                f"<Transform scale='1 1 1'>\n<Shape DEF='shape{shape_id}' onclick='select(this);'>\n"
+            )
+            stream.write("<Appearance>\n")
             #
             # set Material or shader
             #
             if self._vs is None and self._fs is None:
-                x3dfile_str += f"<Material id='material_{shape_id}' diffuseColor="
-                x3dfile_str += f"'{self._color[0]} {self._color[1]} {self._color[2]}' "
-                x3dfile_str += f"shininess='{self._shininess}' "
-                x3dfile_str += f"specularColor='{self._specular_color[0]} {self._specular_color[1]} {self._specular_color[2]}' "
-                x3dfile_str += f"transparency='{self._transparency}'/>\n"
+                stream.write(
+                    f"<Material id='material_{shape_id}' diffuseColor="
+                    f"'{self._color[0]} {self._color[1]} {self._color[2]}' "
+                    f"shininess='{self._shininess}' "
+                    f"specularColor='{self._specular_color[0]} {self._specular_color[1]} {self._specular_color[2]}' "
+                    f"transparency='{self._transparency}'/>\n"
+                )
             else:  # set shaders
-                x3dfile_str += (
+                stream.write(
                     '<ComposedShader><ShaderPart type="VERTEX" style="display:none;">\n'
                 )
-                x3dfile_str += self._vs
-                x3dfile_str += "</ShaderPart>\n"
-                x3dfile_str += '<ShaderPart type="FRAGMENT" style="display:none;">\n'
-                x3dfile_str += self._fs
-                x3dfile_str += "</ShaderPart></ComposedShader>\n"
-            x3dfile_str += "</Appearance>\n"
+                stream.write(self._vs)
+                stream.write("</ShaderPart>\n")
+                stream.write('<ShaderPart type="FRAGMENT" style="display:none;">\n')
+                stream.write(self._fs)
+                stream.write("</ShaderPart></ComposedShader>\n")
+            stream.write("</Appearance>\n")
             # export triangles
-            x3dfile_str += triangle_set
-            x3dfile_str += "</Shape></Transform></Switch>\n"
-        # and now, process edges
-        if self._export_edges:
-            # below '0' means show all
-            # -1 means doesn't show line
-            # the "Switch" node selects the group to be displayed
-
-            x3dfile_str += indexed_lineset_to_x3d_string(
-                self._line_sets, header=False, footer=False
+            write_x3d_triangle_set(stream, vertices, normals)
+            stream.write("</Shape></Transform></Switch>\n")
+        # and now, process edges, all of them in one IndexedLineSet
+        if self._export_edges and self._edge_vertex_counts:
+            write_x3d_indexed_lineset(
+                stream,
+                self._edge_points,
+                self._edge_vertex_counts,
+                self._line_color,
+                def_id=f"edg{shape_id}",
             )
-        x3dfile_str += "</Scene>\n</X3D>\n"
+        stream.write("</Scene>\n</X3D>\n")
 
-        #
-        # use ElementTree to ensure xml file quality
-        #
-        xml_et = ElementTree.fromstring(x3dfile_str)
-        return ElementTree.tostring(xml_et, encoding="utf8").decode("utf8")
+    def to_x3dfile_string(self, shape_id):
+        x3d_string = io.StringIO()
+        self.write(x3d_string, shape_id)
+        return x3d_string.getvalue()
 
     def write_to_file(self, filename, shape_id):
         with open(filename, "w") as f:
-            f.write(self.to_x3dfile_string(shape_id))
+            self.write(f, shape_id)
 
 
 class X3DomRenderer:
@@ -405,13 +521,8 @@ class X3DomRenderer:
             print("X3D exporter, discretize an edge")
             pnts = discretize_edge(shape)
             edge_hash = f"edg{uuid.uuid4().hex}"
-            line_set = export_edge_to_indexed_lineset(pnts)
-            x3dfile_content = indexed_lineset_to_x3d_string(
-                [line_set], ils_id=edge_hash
-            )
             edge_full_path = os.path.join(self._path, f"{edge_hash}.x3d")
-            with open(edge_full_path, "w") as edge_file:
-                edge_file.write(x3dfile_content)
+            write_x3d_polyline_file(edge_full_path, pnts)
             # store this edge hash
             self._x3d_edges[edge_hash] = [color, line_width]
             return self._x3d_shapes, self._x3d_edges
@@ -420,13 +531,8 @@ class X3DomRenderer:
             print("X3D exporter, discretize a wire")
             pnts = discretize_wire(shape)
             wire_hash = f"wir{uuid.uuid4().hex}"
-            line_set = export_edge_to_indexed_lineset(pnts)
-            x3dfile_content = indexed_lineset_to_x3d_string(
-                [line_set], ils_id=wire_hash
-            )
             wire_full_path = os.path.join(self._path, f"{wire_hash}.x3d")
-            with open(wire_full_path, "w") as wire_file:
-                wire_file.write(x3dfile_content)
+            write_x3d_polyline_file(wire_full_path, pnts)
             # store this edge hash
             self._x3d_edges[wire_hash] = [color, line_width]
             return self._x3d_shapes, self._x3d_edges
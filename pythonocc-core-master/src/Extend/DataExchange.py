@@ -18,11 +18,13 @@
 import os
 from typing import Union, List
 
-from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Edge, TopoDS_Shape
+from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Edge, TopoDS_Shape, topods
+from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_REVERSED
+from OCC.Core.TopExp import TopExp_Explorer
 from OCC.Core.BRepTools import breptools
 from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
 from OCC.Core.StlAPI import stlapi, StlAPI_Writer
-from OCC.Core.BRep import BRep_Builder
+from OCC.Core.BRep import BRep_Builder, BRep_Tool
 from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Pnt2d
 from OCC.Core.Bnd import Bnd_Box2d
 from OCC.Core.IGESControl import (
@@ -41,12 +43,14 @@ from OCC.Core.TDocStd import TDocStd_Document
 from OCC.Core.XCAFDoc import (
     XCAFDoc_DocumentTool,
     XCAFDoc_ColorTool,
+    XCAFDoc_ColorGen,
+    XCAFDoc_ColorSurf,
+    XCAFDoc_ColorCurv,
 )
 from OCC.Core.STEPCAFControl import STEPCAFControl_Reader
 from OCC.Core.TDF import TDF_LabelSequence, TDF_Label
 from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
 from OCC.Core.TopLoc import TopLoc_Location
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
 from OCC.Core.TColStd import TColStd_IndexedDataMapOfStringString
 from OCC.Core.TCollection import TCollection_AsciiString
 from OCC.Core.RWPly import RWPly_CafWriter
@@ -69,6 +73,13 @@ try:
 except ImportError:
     HAVE_SVGWRITE = False
 
+try:
+    import numpy as np
+
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
 
 def check_svgwrite_installed():
     if not HAVE_SVGWRITE:
@@ -77,6 +88,13 @@ def check_svgwrite_installed():
         )
 
 
+def check_numpy_installed():
+    if not HAVE_NUMPY:
+        raise IOError(
+            "fast stl export not available because the numpy package is not installed. use $pip install numpy'"
+        )
+
+
 ##########################
 # Step import and export #
 ##########################
@@ -186,23 +204,129 @@ def write_step_file(
         raise IOError(f"{filename} not saved to filesystem.")
 
 
-def read_step_file_with_names_colors(filename: str):
-    """Returns list of tuples (topods_shape, label, color)
-    Use OCAF.
+class AssemblyPrototype:
+    """A unique part of an assembly: its shape is stored once, whatever the
+    number of instances"""
+
+    def __init__(self, shape: TopoDS_Shape, name: str, color, subshapes):
+        self.shape = shape
+        self.name = name
+        # Quantity_Color or None
+        self.color = color
+        # list of (subshape, name, color) for the colored faces/edges of the part
+        self.subshapes = subshapes
+        self._triangles = None
+
+    def triangles(self):
+        """(n, 3, 3) float32 triangles of the meshed part, in its own frame.
+        Computed once and shared by all the instances."""
+        if self._triangles is None:
+            self._triangles = shape_triangles(self.shape)
+        return self._triangles
+
+
+class AssemblyInstance:
+    """A placement of a prototype in the assembly"""
+
+    def __init__(self, prototype: int, location: TopLoc_Location, name: str, color):
+        # index in StepAssembly.prototypes
+        self.prototype = prototype
+        # product of the component locations from the root of the assembly
+        self.location = location
+        self.name = name
+        # Quantity_Color or None (instance color, else the part color)
+        self.color = color
+
+    def matrix(self):
+        """3x4 transformation matrix of the instance"""
+        trsf = self.location.Transformation()
+        return [[trsf.Value(row, col) for col in range(1, 5)] for row in range(1, 4)]
+
+
+class StepAssembly:
+    """Scene graph of a STEP file: unique prototypes plus instance transforms.
+
+    Shared parts are not copied: `located_shape` moves the prototype shape,
+    which shares its geometry (and its triangulation once meshed).
+    """
+
+    def __init__(
+        self, prototypes: List[AssemblyPrototype], instances: List[AssemblyInstance]
+    ):
+        self.prototypes = prototypes
+        self.instances = instances
+
+    def located_shape(self, instance: AssemblyInstance) -> TopoDS_Shape:
+        return self.prototypes[instance.prototype].shape.Moved(instance.location)
+
+    def compound(self) -> TopoDS_Compound:
+        """All the instances in one compound (geometry shared with the prototypes)"""
+        compound = TopoDS_Compound()
+        builder = BRep_Builder()
+        builder.MakeCompound(compound)
+        for instance in self.instances:
+            builder.Add(compound, self.located_shape(instance))
+        return compound
+
+    def instance_counts(self) -> List[int]:
+        counts = [0] * len(self.prototypes)
+        for instance in self.instances:
+            counts[instance.prototype] += 1
+        return counts
+
+    def mesh(
+        self,
+        linear_deflection: float = 0.9,
+        angular_deflection: float = 0.5,
+        parallel: bool = True,
+    ) -> None:
+        """Mesh each prototype once; the instances share its triangulation."""
+        for prototype in self.prototypes:
+            mesh = BRepMesh_IncrementalMesh(
+                prototype.shape, linear_deflection, False, angular_deflection, parallel
+            )
+            mesh.Perform()
+            if not mesh.IsDone():
+                raise AssertionError(f"Mesh of {prototype.name} is not done.")
+            prototype._triangles = None
+
+    def iter_instance_triangles(self):
+        """Yield (instance, triangles) with the prototype triangles placed by
+        the instance transform (mesh the assembly first)."""
+        check_numpy_installed()
+        for instance in self.instances:
+            triangles = self.prototypes[instance.prototype].triangles()
+            if instance.location.IsIdentity():
+                yield instance, triangles
+                continue
+            matrix = np.array(instance.matrix())
+            placed = triangles @ matrix[:, :3].T.astype(np.float32) + matrix[:, 3]
+            yield instance, placed.astype(np.float32)
+
+
+def _label_color(label: TDF_Label):
+    """Color attached to a label (generic, surface or curve), or None"""
+    color = Quantity_Color(0.5, 0.5, 0.5, Quantity_TOC_RGB)
+    for color_type in (XCAFDoc_ColorGen, XCAFDoc_ColorSurf, XCAFDoc_ColorCurv):
+        if XCAFDoc_ColorTool.GetColor(label, color_type, color):
+            return color
+    return None
+
+
+def read_step_assembly(filename: str) -> StepAssembly:
+    """Read a STEP file with its assembly structure, names and colors.
+
+    Each referred part becomes one AssemblyPrototype (read once) and each
+    placement an AssemblyInstance with its accumulated location, so memory
+    scales with the unique parts. Instance colors follow the XCAF rule: a
+    color set on an outer component overrides the inner ones and the part
+    color.
     """
     if not os.path.isfile(filename):
         raise FileNotFoundError(f"{filename} not found.")
-    # the list:
-    output_shapes = {}
 
-    # create an handle to a document
     doc = TDocStd_Document("pythonocc-doc-step-import")
-
-    # Get root assembly
     shape_tool = XCAFDoc_DocumentTool.ShapeTool(doc.Main())
-    color_tool = XCAFDoc_DocumentTool.ColorTool(doc.Main())
-    # layer_tool = XCAFDoc_DocumentTool_LayerTool(doc.Main())
-    # mat_tool = XCAFDoc_DocumentTool_MaterialTool(doc.Main())
 
     step_reader = STEPCAFControl_Reader()
     step_reader.SetColorMode(True)
@@ -212,177 +336,278 @@ def read_step_file_with_names_colors(filename: str):
     step_reader.SetGDTMode(True)
 
     status = step_reader.ReadFile(filename)
-    if status == IFSelect_RetDone:
-        step_reader.Transfer(doc)
-
-    locs = []
-
-    def _get_sub_shapes(lab, loc):
-        l_subss = TDF_LabelSequence()
-        shape_tool.GetSubShapes(lab, l_subss)
-        # print("Nb subshapes   :", l_subss.Length())
-        l_comps = TDF_LabelSequence()
-        shape_tool.GetComponents(lab, l_comps)
-
-        name = lab.GetLabelName()
-        print("Name :", name)
-
-        if shape_tool.IsAssembly(lab):
-            l_c = TDF_LabelSequence()
-            shape_tool.GetComponents(lab, l_c)
-            for i in range(l_c.Length()):
-                label = l_c.Value(i + 1)
-                if shape_tool.IsReference(label):
-                    # print("\n########  reference label :", label)
-                    label_reference = TDF_Label()
-                    shape_tool.GetReferredShape(label, label_reference)
-                    loc = shape_tool.GetLocation(label)
-                    locs.append(loc)
-                    _get_sub_shapes(label_reference, loc)
-                    locs.pop()
-
-        elif shape_tool.IsSimpleShape(lab):
-            # print("\n########  simpleshape label :", lab)
-            shape = shape_tool.GetShape(lab)
-            # print("    all ass locs   :", locs)
-
-            loc = TopLoc_Location()
-            for location in locs:
-                loc = loc.Multiplied(location)
-
-            c = Quantity_Color(0.5, 0.5, 0.5, Quantity_TOC_RGB)  # default color
-            color_set = False
-            if (
-                color_tool.GetInstanceColor(shape, 0, c)
-                or color_tool.GetInstanceColor(shape, 1, c)
-                or color_tool.GetInstanceColor(shape, 2, c)
-            ):
-                color_tool.SetInstanceColor(shape, 0, c)
-                color_tool.SetInstanceColor(shape, 1, c)
-                color_tool.SetInstanceColor(shape, 2, c)
-                color_set = True
-                n = c.Name(c.Red(), c.Green(), c.Blue())
-                print(
-                    "    instance color Name & RGB: ",
-                    c,
-                    n,
-                    c.Red(),
-                    c.Green(),
-                    c.Blue(),
+    if status != IFSelect_RetDone:
+        raise AssertionError("Error: can't read file.")
+    step_reader.Transfer(doc)
+
+    prototypes = []
+    instances = []
+    # prototype index by part shape (same label -> same TopoDS_Shape)
+    prototype_index = {}
+
+    def _prototype(label):
+        shape = shape_tool.GetShape(label)
+        index = prototype_index.get(shape)
+        if index is None:
+            subshapes = []
+            labels = TDF_LabelSequence()
+            shape_tool.GetSubShapes(label, labels)
+            for i in range(labels.Length()):
+                sub_label = labels.Value(i + 1)
+                subshapes.append(
+                    (
+                        shape_tool.GetShape(sub_label),
+                        sub_label.GetLabelName(),
+                        _label_color(sub_label),
+                    )
                 )
+            index = len(prototypes)
+            prototype_index[shape] = index
+            prototypes.append(
+                AssemblyPrototype(
+                    shape, label.GetLabelName(), _label_color(label), subshapes
+                )
+            )
+        return index
+
+    def _walk(label, location, name, color):
+        if shape_tool.IsAssembly(label):
+            components = TDF_LabelSequence()
+            shape_tool.GetComponents(label, components)
+            for i in range(components.Length()):
+                component = components.Value(i + 1)
+                if not shape_tool.IsReference(component):
+                    continue
+                referred = TDF_Label()
+                shape_tool.GetReferredShape(component, referred)
+                _walk(
+                    referred,
+                    location.Multiplied(shape_tool.GetLocation(component)),
+                    component.GetLabelName(),
+                    color or _label_color(component),
+                )
+        elif shape_tool.IsSimpleShape(label):
+            index = _prototype(label)
+            instances.append(
+                AssemblyInstance(
+                    index, location, name, color or prototypes[index].color
+                )
+            )
 
-            if not color_set:
-                if (
-                    XCAFDoc_ColorTool.GetColor(lab, 0, c)
-                    or XCAFDoc_ColorTool.GetColor(lab, 1, c)
-                    or XCAFDoc_ColorTool.GetColor(lab, 2, c)
-                ):
-                    color_tool.SetInstanceColor(shape, 0, c)
-                    color_tool.SetInstanceColor(shape, 1, c)
-                    color_tool.SetInstanceColor(shape, 2, c)
-
-                    n = c.Name(c.Red(), c.Green(), c.Blue())
-                    print(
-                        "    shape color Name & RGB: ",
-                        c,
-                        n,
-                        c.Red(),
-                        c.Green(),
-                        c.Blue(),
-                    )
+    roots = TDF_LabelSequence()
+    shape_tool.GetFreeShapes(roots)
+    for i in range(roots.Length()):
+        root = roots.Value(i + 1)
+        _walk(root, TopLoc_Location(), root.GetLabelName(), _label_color(root))
 
-            shape_disp = BRepBuilderAPI_Transform(shape, loc.Transformation()).Shape()
-            if shape_disp not in output_shapes:
-                output_shapes[shape_disp] = [lab.GetLabelName(), c]
-            for i in range(l_subss.Length()):
-                lab_subs = l_subss.Value(i + 1)
-                # print("\n########  simpleshape subshape label :", lab)
-                shape_sub = shape_tool.GetShape(lab_subs)
-
-                c = Quantity_Color(0.5, 0.5, 0.5, Quantity_TOC_RGB)  # default color
-                color_set = False
-                if (
-                    color_tool.GetInstanceColor(shape_sub, 0, c)
-                    or color_tool.GetInstanceColor(shape_sub, 1, c)
-                    or color_tool.GetInstanceColor(shape_sub, 2, c)
-                ):
-                    color_tool.SetInstanceColor(shape_sub, 0, c)
-                    color_tool.SetInstanceColor(shape_sub, 1, c)
-                    color_tool.SetInstanceColor(shape_sub, 2, c)
-                    color_set = True
-                    n = c.Name(c.Red(), c.Green(), c.Blue())
-                    print(
-                        "    instance color Name & RGB: ",
-                        c,
-                        n,
-                        c.Red(),
-                        c.Green(),
-                        c.Blue(),
-                    )
+    return StepAssembly(prototypes, instances)
+
+
+def read_step_file_with_names_colors(filename: str):
+    """Returns a dict {topods_shape: [label name, color]}
+    Use OCAF. Built from read_step_assembly: the placed shapes share the
+    geometry of their part.
+    """
+    assembly = read_step_assembly(filename)
+    output_shapes = {}
+
+    for instance in assembly.instances:
+        prototype = assembly.prototypes[instance.prototype]
+        default = Quantity_Color(0.5, 0.5, 0.5, Quantity_TOC_RGB)  # default color
+        shape_disp = assembly.located_shape(instance)
+        if shape_disp not in output_shapes:
+            output_shapes[shape_disp] = [prototype.name, instance.color or default]
+        for shape_sub, name, color in prototype.subshapes:
+            # position the subshape to display
+            shape_to_disp = shape_sub.Moved(instance.location)
+            if shape_to_disp not in output_shapes:
+                output_shapes[shape_to_disp] = [name, color or default]
 
-                if not color_set:
-                    if (
-                        XCAFDoc_ColorTool.GetColor(lab_subs, 0, c)
-                        or XCAFDoc_ColorTool.GetColor(lab_subs, 1, c)
-                        or XCAFDoc_ColorTool.GetColor(lab_subs, 2, c)
-                    ):
-                        color_tool.SetInstanceColor(shape, 0, c)
-                        color_tool.SetInstanceColor(shape, 1, c)
-                        color_tool.SetInstanceColor(shape, 2, c)
-
-                        n = c.Name(c.Red(), c.Green(), c.Blue())
-                        print(
-                            "    shape color Name & RGB: ",
-                            c,
-                            n,
-                            c.Red(),
-                            c.Green(),
-                            c.Blue(),
-                        )
-                shape_to_disp = BRepBuilderAPI_Transform(
-                    shape_sub, loc.Transformation()
-                ).Shape()
-                # position the subshape to display
-                if shape_to_disp not in output_shapes:
-                    output_shapes[shape_to_disp] = [lab_subs.GetLabelName(), c]
-
-    def _get_shapes():
-        labels = TDF_LabelSequence()
-        shape_tool.GetFreeShapes(labels)
-        print("Number of shapes at root :", labels.Length())
-        for i in range(labels.Length()):
-            root_item = labels.Value(i + 1)
-            _get_sub_shapes(root_item, None)
-
-    _get_shapes()
     return output_shapes
 
 
 #########################
 # STL import and export #
 #########################
+# binary STL layout: 80 bytes header, uint32 triangle count, then one
+# 50 bytes record per triangle (normal, 3 vertices, attribute byte count)
+STL_HEADER_SIZE = 84
+STL_RECORD_DTYPE = [
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attribute", "<u2"),
+]
+STL_DEFAULT_HEADER = b"pythonocc binary STL"
+
+
+def _stl_header(header: bytes, count: int) -> bytes:
+    if count >= 2**32:
+        raise ValueError("binary STL cannot hold more than 2**32 - 1 triangles")
+    return header[:80].ljust(80, b"\0") + int(count).to_bytes(4, "little")
+
+
+def _fill_stl_records(records, triangles) -> None:
+    """Fill a record array from a (n, 3, 3) triangle array (unit face normals)"""
+    vertices = np.asarray(triangles, dtype=np.float32).reshape(-1, 3, 3)
+    normals = np.cross(
+        vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0]
+    )
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    records["normal"] = normals
+    records["vertices"] = vertices
+    records["attribute"] = 0
+
+
+def stl_binary_buffer(triangles, header: bytes = STL_DEFAULT_HEADER):
+    """Build a complete binary STL file in a single numpy buffer.
+
+    Args:
+        triangles: array like of shape (n, 3, 3) (or (n * 9,), the layout
+                   returned by ShapeTesselator.GetVerticesPositionAsTuple)
+        header: at most 80 bytes, padded with zeros
+
+    Returns:
+        A uint8 array with the header, the triangle count and the records
+    """
+    check_numpy_installed()
+    triangles = np.asarray(triangles, dtype=np.float32).reshape(-1, 3, 3)
+    count = len(triangles)
+    buffer = np.empty(STL_HEADER_SIZE + count * 50, dtype=np.uint8)
+    buffer[:STL_HEADER_SIZE] = np.frombuffer(_stl_header(header, count), np.uint8)
+    records = buffer[STL_HEADER_SIZE:].view(np.dtype(STL_RECORD_DTYPE))
+    _fill_stl_records(records, triangles)
+    return buffer
+
+
+def write_stl_triangles(
+    triangles, filename: str, header: bytes = STL_DEFAULT_HEADER
+) -> None:
+    """Write a (n, 3, 3) triangle array as a binary STL file with one write call."""
+    buffer = stl_binary_buffer(triangles, header)
+    with open(filename, "wb") as f:
+        f.write(buffer)
+
+
+class StlBinaryWriter:
+    """Streaming binary STL writer.
+
+    Triangles are appended by chunks and the triangle count is patched into
+    the header when the writer is closed, so huge shapes can be exported
+    one face at a time::
+
+        with StlBinaryWriter("big.stl") as writer:
+            for triangles in iter_face_triangles(shape):
+                writer.write(triangles)
+    """
+
+    def __init__(self, filename: str, header: bytes = STL_DEFAULT_HEADER):
+        check_numpy_installed()
+        self.filename = filename
+        self.header = header
+        self.count = 0
+        self._file = open(filename, "wb")
+        self._file.write(_stl_header(header, 0))
+
+    def write(self, triangles) -> None:
+        triangles = np.asarray(triangles, dtype=np.float32).reshape(-1, 3, 3)
+        records = np.empty(len(triangles), dtype=np.dtype(STL_RECORD_DTYPE))
+        _fill_stl_records(records, triangles)
+        self._file.write(records)
+        self.count += len(triangles)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(_stl_header(self.header, self.count))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_face_triangles(shape: TopoDS_Shape):
+    """Yield the triangles of each meshed face of a shape.
+
+    The Poly_Triangulation of each face is read with two array copies
+    (nodes and triangles), moved by the face location and reoriented for
+    reversed faces. Faces without triangulation are skipped: mesh the
+    shape first (BRepMesh_IncrementalMesh or ShapeTesselator.Compute).
+
+    Yields:
+        float32 arrays of shape (n, 3, 3)
+    """
+    check_numpy_installed()
+    explorer = TopExp_Explorer(shape, TopAbs_FACE)
+    while explorer.More():
+        face = topods.Face(explorer.Current())
+        explorer.Next()
+        location = TopLoc_Location()
+        triangulation = BRep_Tool.Triangulation(face, location)
+        if triangulation is None or triangulation.NbTriangles() == 0:
+            continue
+        nodes = triangulation.MapNodeArray().to_numpy_array()
+        indices = triangulation.MapTriangleArray().to_numpy_array() - 1
+        if face.Orientation() == TopAbs_REVERSED:
+            indices = indices[:, [0, 2, 1]]
+        if not location.IsIdentity():
+            trsf = location.Transformation()
+            matrix = np.array(
+                [[trsf.Value(row, col) for col in range(1, 5)] for row in range(1, 4)]
+            )
+            nodes = nodes @ matrix[:, :3].T + matrix[:, 3]
+        yield nodes[indices].astype(np.float32)
+
+
+def shape_triangles(shape: TopoDS_Shape):
+    """All the triangles of a meshed shape as a single (n, 3, 3) float32 array"""
+    chunks = list(iter_face_triangles(shape))
+    if not chunks:
+        return np.empty((0, 3, 3), dtype=np.float32)
+    return np.concatenate(chunks)
+
+
+def tesselator_triangles(tesselator):
+    """(n, 3, 3) float32 triangle array of a computed ShapeTesselator"""
+    check_numpy_installed()
+    vertices = tesselator.GetVerticesPositionAsTuple()
+    return np.asarray(vertices, dtype=np.float32).reshape(-1, 3, 3)
+
+
 def write_stl_file(
     shape: TopoDS_Shape,
     filename: str,
-    mode: str = "ascii",
+    mode: str = "binary",
     linear_deflection: float = 0.9,
     angular_deflection: float = 0.5,
+    parallel: bool = True,
+    stream: bool = False,
 ) -> None:
     """Export a shape to STL format.
 
     The shape is first meshed using the specified deflection parameters before export.
+    Binary files are written from the face triangulations with numpy (one buffer
+    and one write call, or face by face if `stream` is set); ascii files, or
+    binary files when numpy is not installed, go through StlAPI_Writer.
 
     Args:
         shape: The shape to export
         filename: Target STL file path
         mode: Export format, either "ascii" or "binary".
-              Defaults to "ascii".
+              Defaults to "binary".
         linear_deflection: Maximum distance between mesh and actual surface.
                           Lower values produce more accurate but larger meshes.
                           Defaults to 0.9
         angular_deflection: Maximum angle between mesh elements in radians.
                           Lower values produce smoother meshes.
                           Defaults to 0.5
+        parallel: Mesh the faces in parallel. Defaults to True
+        stream: Write the binary file face by face instead of building the
+                whole buffer in memory (for huge shapes). Defaults to False
 
     Raises:
         AssertionError: If shape is null or meshing fails
@@ -399,16 +624,24 @@ def write_stl_file(
 
     # Mesh the shape
     mesh = BRepMesh_IncrementalMesh(
-        shape, linear_deflection, False, angular_deflection, True
+        shape, linear_deflection, False, angular_deflection, parallel
     )
     mesh.Perform()
     if not mesh.IsDone():
         raise AssertionError("Mesh is not done.")
 
     # Export to STL
-    writer = StlAPI_Writer()
-    writer.SetASCIIMode(mode == "ascii")
-    writer.Write(shape, filename)
+    if mode == "binary" and HAVE_NUMPY:
+        if stream:
+            with StlBinaryWriter(filename) as writer:
+                for triangles in iter_face_triangles(shape):
+                    writer.write(triangles)
+        else:
+            write_stl_triangles(shape_triangles(shape), filename)
+    else:
+        writer = StlAPI_Writer()
+        writer.SetASCIIMode(mode == "ascii")
+        writer.Write(shape, filename)
 
     if not os.path.isfile(filename):
         raise IOError("File not written to disk.")
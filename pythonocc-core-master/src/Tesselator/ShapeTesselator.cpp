@@ -443,43 +443,39 @@ const Standard_Real* ShapeTesselator::NormalsList() const {
 std::vector<float> ShapeTesselator::GetVerticesPositionAsTuple() const {
     if (!computed) return {};
     
-    std::vector<float> result;
-    result.reserve(tot_triangle_count * 9);  // 3 vertices * 3 coords
-    
-    for (Standard_Integer i = 0; i < tot_triangle_count; ++i) {
-        const auto base_idx = i * 3;
-        for (int j = 0; j < 3; ++j) {
-            const auto vertex_idx = consolidated_triangle_indices[base_idx + j] * 3;
-            result.insert(result.end(), {
-                static_cast<float>(consolidated_vertices[vertex_idx]),
-                static_cast<float>(consolidated_vertices[vertex_idx + 1]),
-                static_cast<float>(consolidated_vertices[vertex_idx + 2])
-            });
-        }
-    }
-    
+    std::vector<float> result(tot_triangle_count * 9);  // 3 vertices * 3 coords
+    CopyVerticesPosition(result.data());
     return result;
 }
 
 std::vector<float> ShapeTesselator::GetNormalsAsTuple() const {
     if (!computed) return {};
     
-    std::vector<float> result;
-    result.reserve(tot_triangle_count * 9);
+    std::vector<float> result(tot_triangle_count * 9);
+    CopyNormals(result.data());
+    return result;
+}
+
+void ShapeTesselator::CopyVerticesPosition(float* out) const {
+    if (!computed) return;
     
-    for (Standard_Integer i = 0; i < tot_triangle_count; ++i) {
-        const auto base_idx = i * 3;
-        for (int j = 0; j < 3; ++j) {
-            const auto normal_idx = consolidated_triangle_indices[base_idx + j] * 3;
-            result.insert(result.end(), {
-                static_cast<float>(consolidated_normals[normal_idx]),
-                static_cast<float>(consolidated_normals[normal_idx + 1]),
-                static_cast<float>(consolidated_normals[normal_idx + 2])
-            });
-        }
+    for (Standard_Integer i = 0; i < tot_triangle_count * 3; ++i) {
+        const auto vertex_idx = consolidated_triangle_indices[i] * 3;
+        *out++ = static_cast<float>(consolidated_vertices[vertex_idx]);
+        *out++ = static_cast<float>(consolidated_vertices[vertex_idx + 1]);
+        *out++ = static_cast<float>(consolidated_vertices[vertex_idx + 2]);
     }
+}
+
+void ShapeTesselator::CopyNormals(float* out) const {
+    if (!computed) return;
     
-    return result;
+    for (Standard_Integer i = 0; i < tot_triangle_count * 3; ++i) {
+        const auto normal_idx = consolidated_triangle_indices[i] * 3;
+        *out++ = static_cast<float>(consolidated_normals[normal_idx]);
+        *out++ = static_cast<float>(consolidated_normals[normal_idx + 1]);
+        *out++ = static_cast<float>(consolidated_normals[normal_idx + 2]);
+    }
 }
 
 void ShapeTesselator::GetVertex(Standard_Integer index, float& x, float& y, float& z) const {
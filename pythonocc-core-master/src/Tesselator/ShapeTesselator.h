@@ -148,6 +148,14 @@ public:
     //! @return Vector of normal vectors for all triangles
     std::vector<float> GetNormalsAsTuple() const;
 
+    //! Write the vertex positions of all triangles into a caller-provided buffer
+    //! @param out Buffer of at least ObjGetTriangleCount() * 9 floats
+    void CopyVerticesPosition(float* out) const;
+
+    //! Write the normals of all triangles into a caller-provided buffer
+    //! @param out Buffer of at least ObjGetTriangleCount() * 9 floats
+    void CopyNormals(float* out) const;
+
     //! Get vertex coordinates by index
     //! @param index Vertex index
     //! @param x,y,z Output coordinates
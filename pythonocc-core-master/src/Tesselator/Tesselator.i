@@ -21,6 +21,31 @@
 %{
 #include <ShapeTesselator.h>
 #include <Standard.hxx>
+#include <cstring>
+
+// Fills a writable, C-contiguous float32 buffer (numpy array, array.array('f')...)
+// with the 9 floats per triangle written by copy, without building a python sequence
+static PyObject* ShapeTesselator_CopyInto(const ShapeTesselator* self, PyObject* buffer,
+                                          void (ShapeTesselator::*copy)(float*) const) {
+    Py_buffer view;
+    if (PyObject_GetBuffer(buffer, &view, PyBUF_WRITABLE | PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0) {
+        return NULL;
+    }
+    const Py_ssize_t size = static_cast<Py_ssize_t>(self->ObjGetTriangleCount()) * 9;
+    if (view.itemsize != sizeof(float) || view.format == NULL || strcmp(view.format, "f") != 0) {
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_TypeError, "expected a float32 buffer");
+        return NULL;
+    }
+    if (view.len != size * static_cast<Py_ssize_t>(sizeof(float))) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError, "expected a buffer of %zd floats", size);
+        return NULL;
+    }
+    (self->*copy)(static_cast<float*>(view.buf));
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
 %}
 
 %include ../SWIG_files/common/ExceptionCatcher.i
@@ -72,3 +97,14 @@ class ShapeTesselator {
         std::vector<float> GetVerticesPositionAsTuple();
         std::vector<float> GetNormalsAsTuple();
 };
+
+%extend ShapeTesselator {
+    %feature("autodoc", "Copy the vertex positions of all triangles into a float32 buffer of ObjGetTriangleCount() * 9 items");
+    PyObject* GetVerticesPositionInto(PyObject* buffer) {
+        return ShapeTesselator_CopyInto($self, buffer, &ShapeTesselator::CopyVerticesPosition);
+    }
+    %feature("autodoc", "Copy the normals of all triangles into a float32 buffer of ObjGetTriangleCount() * 9 items");
+    PyObject* GetNormalsInto(PyObject* buffer) {
+        return ShapeTesselator_CopyInto($self, buffer, &ShapeTesselator::CopyNormals);
+    }
+};
@@ -20,16 +20,20 @@
 import os
 
 from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeTorus
+from OCC.Core.Tesselator import ShapeTesselator
 from OCC.Core.TopoDS import TopoDS_Compound
 
 from OCC.Extend.DataExchange import (
     read_step_file,
     read_step_file_with_names_colors,
+    read_step_assembly,
     read_stl_file,
     read_iges_file,
     read_gltf_file,
     write_step_file,
     write_stl_file,
+    write_stl_triangles,
+    tesselator_triangles,
     write_iges_file,
     write_ply_file,
     write_obj_file,
@@ -84,6 +88,20 @@ def test_read_step_file_names_colors():
     read_step_file_with_names_colors(STEP_AP214_SAMPLE_FILE)
 
 
+def test_read_step_assembly():
+    assembly = read_step_assembly(STEP_AP214_SAMPLE_FILE)
+    # the as1 assembly places the same bolts and nuts several times
+    assert 0 < len(assembly.prototypes) < len(assembly.instances)
+    assert sum(assembly.instance_counts()) == len(assembly.instances)
+    assert not assembly.compound().IsNull()
+    assembly.mesh()
+    placed = list(assembly.iter_instance_triangles())
+    assert len(placed) == len(assembly.instances)
+    for instance, triangles in placed:
+        prototype = assembly.prototypes[instance.prototype]
+        assert triangles.shape == prototype.triangles().shape
+
+
 def test_read_iges_file():
     list_of_shapes = read_iges_file(IGES_SAMPLE_FILE)
     assert isinstance(list_of_shapes, list)
@@ -162,6 +180,28 @@ def test_stl_binary():
     check_is_file(stl_binary_filename)
 
 
+def test_stl_binary_stream():
+    stl_binary_filename = get_test_fullname("sample_binary.stl")
+    stl_stream_filename = get_test_fullname("sample_binary_stream.stl")
+    write_stl_file(A_TOPODS_SHAPE, stl_binary_filename)
+    write_stl_file(A_TOPODS_SHAPE, stl_stream_filename, stream=True)
+    check_is_file(stl_stream_filename)
+    with open(stl_binary_filename, "rb") as f1, open(stl_stream_filename, "rb") as f2:
+        assert f1.read() == f2.read()
+    # the written file can be read back
+    assert not read_stl_file(stl_stream_filename).IsNull()
+
+
+def test_stl_binary_from_tesselator():
+    tess = ShapeTesselator(A_TOPODS_SHAPE)
+    tess.Compute()
+    triangles = tesselator_triangles(tess)
+    assert triangles.shape == (tess.ObjGetTriangleCount(), 3, 3)
+    stl_filename = get_test_fullname("sample_tesselator.stl")
+    write_stl_triangles(triangles, stl_filename)
+    assert os.path.getsize(stl_filename) == 84 + 50 * len(triangles)
+
+
 def test_write_ply():
     ply_filename = get_test_fullname("sample.ply")
     write_ply_file(A_TOPODS_SHAPE, ply_filename)
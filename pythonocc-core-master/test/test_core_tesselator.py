@@ -15,10 +15,13 @@
 ##You should have received a copy of the GNU Lesser General Public License
 ##along with pythonOCC.  If not, see <http://www.gnu.org/licenses/>.
 
+from array import array
 import json
 import os
 from xml.etree import ElementTree as ET
 
+import pytest
+
 from OCC.Core.BRepPrimAPI import (
     BRepPrimAPI_MakeBox,
     BRepPrimAPI_MakeTorus,
@@ -152,3 +155,23 @@ def test_tessellate_twice():
     torus_tess = ShapeTesselator(another_torus)
     torus_tess.Compute()
     torus_tess.Compute()
+
+
+def test_copy_triangles_into_buffer():
+    """GetVerticesPositionInto/GetNormalsInto fill a float32 buffer with
+    the same values as the tuple accessors"""
+    a_box = BRepPrimAPI_MakeBox(10, 20, 30).Shape()
+    tess = ShapeTesselator(a_box)
+    tess.Compute()
+    nbr_floats = tess.ObjGetTriangleCount() * 9
+    vertices = array("f", bytes(4 * nbr_floats))
+    normals = array("f", bytes(4 * nbr_floats))
+    tess.GetVerticesPositionInto(vertices)
+    tess.GetNormalsInto(normals)
+    assert list(vertices) == list(tess.GetVerticesPositionAsTuple())
+    assert list(normals) == list(tess.GetNormalsAsTuple())
+    # wrong size or type
+    with pytest.raises(ValueError):
+        tess.GetVerticesPositionInto(array("f", bytes(4)))
+    with pytest.raises(TypeError):
+        tess.GetNormalsInto(array("d", bytes(8 * nbr_floats)))
@@ -17,7 +17,9 @@
 ##You should have received a copy of the GNU Lesser General Public License
 ##along with pythonOCC.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import random
+from xml.etree import ElementTree
 
 from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeTorus, BRepPrimAPI_MakeBox
 from OCC.Display.WebGl import threejs_renderer, x3dom_renderer
@@ -116,3 +118,33 @@ def test_x3d_wire():
         dict_shape, dict_edge = my_x3dom_renderer.DisplayShape(wire, mesh_quality=1.0)
         assert not dict_shape
         assert dict_edge
+
+
+def test_x3d_export_edges_single_lineset():
+    """Test: the edges of a box are streamed as one IndexedLineSet"""
+    box_shp = BRepPrimAPI_MakeBox(10.0, 20.0, 30.0).Shape()
+    exporter = x3dom_renderer.X3DExporter(
+        box_shp,
+        None,
+        None,
+        True,
+        (0.65, 0.65, 0.7),
+        (0.2, 0.2, 0.2),
+        0.9,
+        0.0,
+        (0, 0, 0),
+        2.0,
+        1.0,
+    )
+    exporter.compute()
+    stream = io.StringIO()
+    exporter.write(stream, 0)
+    x3d_root = ElementTree.fromstring(stream.getvalue())
+    line_sets = x3d_root.findall(".//IndexedLineSet")
+    assert len(line_sets) == 1
+    coord_index = line_sets[0].get("coordIndex").split()
+    assert coord_index.count("-1") == 12
+    points = line_sets[0].find("Coordinate").get("point").split()
+    assert len(points) == 3 * (len(coord_index) - 12)
+    assert len(x3d_root.findall(".//TriangleSet")) == 1
+    assert exporter.to_x3dfile_string(0) == stream.getvalue()